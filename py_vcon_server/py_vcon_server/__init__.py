@@ -1,27 +1,26 @@
 # Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
 import sys
-import time
 import asyncio
 import fastapi
 import vcon
+import vcon.http_client
 
 # For dev purposes, look for relative vcon package
 sys.path.append("..")
 
 import py_vcon_server.settings
 import py_vcon_server.db
+import py_vcon_server.db.vcon_cache
 import py_vcon_server.states
 import py_vcon_server.queue
 from py_vcon_server.logging_utils import init_logger
 import logging
-import nest_asyncio
 
 VERBOSE = False
 
 logger = init_logger(__name__)
 logger.debug("root logging handlers: {}".format(logging.getLogger().handlers))
 logger.debug("logging handlers: {}".format(logger.handlers))
-nest_asyncio.apply()
 
 __version__ = "0.5.0"
 
@@ -29,6 +28,8 @@ JOB_INTERFACE = None
 JOB_MANAGER = None
 BACKGROUND_JOBS_RUNNING = False
 BACKGROUND_JOB_TASK = None
+# Maximum seconds to wait for a job to be queued before checking the queues again
+BACKGROUND_JOB_WAIT = 1.0
 
 
 # TODO make this a setting
@@ -91,11 +92,11 @@ async def run_background_jobs(job_interface) -> None:
   while(BACKGROUND_JOBS_RUNNING):
     job_id = await job_interface.run_one_job()
 
-    # Prevent a fast spin when no job in queue
+    # Wait for a job to be queued, rather than spinning when no job in queue
     if(job_id is None):
       if(VERBOSE):
-        logger.debug("no job waiting a bit")
-      await asyncio.sleep(0.5)
+        logger.debug("no job waiting for queued job")
+      await job_interface.wait_for_jobs(BACKGROUND_JOB_WAIT)
       if(VERBOSE):
         logger.debug("no job done waiting")
 
@@ -116,9 +117,9 @@ async def startup():
     py_vcon_server.settings.LAUNCH_VCON_API,
     py_vcon_server.settings.NUM_WORKERS)
 
-  # Need to fork job worker processes before we connect or send commands to Redis due to
-  # async Redis multiprocessing issue which causes hangs.
-  # Start the job scheduler and worker pool
+  # Start the job scheduler and worker pool.  The worker processes are
+  # spawned, not forked, so they do not share this process's event loop or
+  # Redis connections.  Each worker creates its own when it runs its first job.
   global JOB_INTERFACE
   global JOB_MANAGER
   global RUN_BACKGROUND_JOBS
@@ -133,9 +134,9 @@ async def startup():
         py_vcon_server.states.SERVER_STATE.server_key()
       )
 
-  if(False):
-    #if(py_vcon_server.settings.NUM_WORKERS > 0):
-    logger.debug("Starting pipeline server with {} workers".format(
+  if(py_vcon_server.settings.RUN_BACKGROUND_JOBS and
+    py_vcon_server.settings.NUM_WORKERS > 0):
+    logger.info("Starting pipeline server with {} workers".format(
         py_vcon_server.settings.NUM_WORKERS
       ))
     JOB_MANAGER = py_vcon_server.job_worker_pool.JobSchedulerManager(
@@ -146,8 +147,6 @@ async def startup():
       await JOB_MANAGER.async_start()
     else:
       JOB_MANAGER.start(wait_scheduler = True)
-    # extra time for processes to get started
-    time.sleep(5.0)
 
   elif(py_vcon_server.settings.RUN_BACKGROUND_JOBS):
     global BACKGROUND_JOBS_RUNNING
@@ -158,11 +157,20 @@ async def startup():
   await py_vcon_server.states.SERVER_STATE.starting()
 
   py_vcon_server.db.VCON_STORAGE = py_vcon_server.db.VconStorage.instantiate(py_vcon_server.settings.VCON_STORAGE_URL)
+  if(py_vcon_server.settings.VCON_CACHE_MAX_ENTRIES > 0):
+    py_vcon_server.db.VCON_STORAGE = py_vcon_server.db.vcon_cache.CachedVconStorage(
+        py_vcon_server.db.VCON_STORAGE,
+        py_vcon_server.settings.VCON_CACHE_MAX_ENTRIES,
+        py_vcon_server.settings.VCON_CACHE_MAX_BYTES,
+        py_vcon_server.settings.VCON_CACHE_INVALIDATION_URL
+      )
+    await py_vcon_server.db.VCON_STORAGE.start()
 
   py_vcon_server.queue.JOB_QUEUE = py_vcon_server.queue.JobQueue(py_vcon_server.settings.QUEUE_DB_URL)
 
   py_vcon_server.pipeline.PIPELINE_DB = py_vcon_server.pipeline.PipelineDb(py_vcon_server.settings.PIPELINE_DB_URL)
   await py_vcon_server.pipeline.PIPELINE_DB.test()
+  await py_vcon_server.pipeline.PIPELINE_DB.start_cache()
 
   await py_vcon_server.states.SERVER_STATE.running()
   logger.info("event startup completed")
@@ -205,6 +213,9 @@ async def shutdown():
   # Shutdown the filter_plugins as some create stateful connections
   vcon.filter_plugins.FilterPluginRegistry.shutdown_plugins()
 
+  # Close pooled HTTP connections used for vCon media fetch
+  await vcon.http_client.close_client()
+
   logger.info("event shutdown completed")
 
 # Enable Admin entry points
@@ -10,6 +10,8 @@ import pydantic
 import py_vcon_server
 import py_vcon_server.logging_utils
 import py_vcon_server.settings
+import py_vcon_server.db
+import py_vcon_server.db.vcon_cache
 import py_vcon_server.pipeline
 import py_vcon_server.restful_api
 from . import __version__
@@ -81,6 +83,40 @@ class ServerState(pydantic.BaseModel, **vcon.pydantic_utils.SET_ALLOW):
       )
 
 
+class VconCacheStats(pydantic.BaseModel):
+    hits: int = pydantic.Field(
+      title = "cache hits",
+      description = "number of vCon gets found in this server's vCon cache"
+      )
+    misses: int = pydantic.Field(
+      title = "cache misses",
+      description = "number of vCon gets not found in this server's vCon cache and got from VconStorage"
+      )
+    hit_rate: float = pydantic.Field(
+      title = "cache hit rate",
+      description = "hits / (hits + misses)",
+      examples = [0.75]
+      )
+    invalidations: int = pydantic.Field(
+      title = "invalidations",
+      description = "number of cached vCons dropped as they were changed or deleted"
+      )
+    entries: int = pydantic.Field(
+      title = "number of cached vCons"
+      )
+    bytes: int = pydantic.Field(
+      title = "approximate size in bytes of the cached vCons"
+      )
+    max_entries: int = pydantic.Field(
+      title = "maximum number of cached vCons",
+      description = "as configured in VCON_CACHE_MAX_ENTRIES"
+      )
+    max_bytes: int = pydantic.Field(
+      title = "maximum size of the cached vCons",
+      description = "as configured in VCON_CACHE_MAX_BYTES"
+      )
+
+
 class QueueProperties(pydantic.BaseModel):
     weight: int = pydantic.Field(
       title = "server's queue weight",
@@ -182,7 +218,7 @@ def init(restapi):
 
     logger.debug( "Returning server info")
 
-    return(fastapi.responses.JSONResponse(content=info))
+    return(py_vcon_server.restful_api.JSONResponse(content=info))
 
 
   @restapi.get("/server/queues",
@@ -215,7 +251,34 @@ def init(restapi):
       py_vcon_server.restful_api.log_exception(e)
       return(py_vcon_server.restful_api.InternalErrorResponse(e))
 
-    return(fastapi.responses.JSONResponse(content=queue_info))
+    return(py_vcon_server.restful_api.JSONResponse(content=queue_info))
+
+
+  @restapi.get("/server/vcon_cache",
+    response_model = VconCacheStats,
+    responses = py_vcon_server.restful_api.ERROR_RESPONSES,
+    tags = [ py_vcon_server.restful_api.SERVER_TAG ])
+  async def get_server_vcon_cache_stats() -> VconCacheStats:
+    """
+    Get the hit rate and size statistics of this server's vCon cache.
+
+    The vCon cache is enabled by setting VCON_CACHE_MAX_ENTRIES to
+    a value greater than zero.
+
+    Returns: VconCacheStats - statistics of the vCon cache in this server process
+    """
+
+    try:
+      if(not isinstance(py_vcon_server.db.VCON_STORAGE, py_vcon_server.db.vcon_cache.CachedVconStorage)):
+        return(py_vcon_server.restful_api.NotFoundResponse("vCon cache not enabled"))
+
+      cache_stats = py_vcon_server.db.VCON_STORAGE.stats()
+
+    except Exception as e:
+      py_vcon_server.restful_api.log_exception(e)
+      return(py_vcon_server.restful_api.InternalErrorResponse(e))
+
+    return(py_vcon_server.restful_api.JSONResponse(content=cache_stats))
 
 
   @restapi.post("/server/queue/{name}",
@@ -325,7 +388,7 @@ def init(restapi):
     logger.debug( "servers type: {}".format(type(server_dict)))
     logger.debug( "servers: {}".format(server_dict))
 
-    return(fastapi.responses.JSONResponse(content=server_dict))
+    return(py_vcon_server.restful_api.JSONResponse(content=server_dict))
 
 
   @restapi.delete("/servers/{server_key}",
@@ -393,7 +456,7 @@ def init(restapi):
 
     logger.debug( "Returning queues: {} ".format(queue_names))
 
-    return(fastapi.responses.JSONResponse(content=queue_names))
+    return(py_vcon_server.restful_api.JSONResponse(content=queue_names))
 
 
   @restapi.get("/queue/{name}",
@@ -430,7 +493,7 @@ def init(restapi):
 
     logger.debug( "Returning queue: {} jobs: {}".format(name, jobs))
 
-    return(fastapi.responses.JSONResponse(content=jobs))
+    return(py_vcon_server.restful_api.JSONResponse(content=jobs))
 
 
   @restapi.put("/queue/{name}",
@@ -464,7 +527,7 @@ def init(restapi):
     logger.debug( "job: {} added to queue: {}".format(job, name))
 
     # return queue length
-    return(fastapi.responses.JSONResponse(content = queue_length))
+    return(py_vcon_server.restful_api.JSONResponse(content = queue_length))
 
 
   @restapi.post("/queue/{name}",
@@ -530,7 +593,7 @@ def init(restapi):
 
     logger.debug( "Deleted queue: {}, {} jobs removed from queue.".format(name, len(jobs)))
 
-    return(fastapi.responses.JSONResponse(content = jobs))
+    return(py_vcon_server.restful_api.JSONResponse(content = jobs))
 
 
   @restapi.get("/in_progress",
@@ -553,7 +616,7 @@ def init(restapi):
 
     logger.debug( "Got in progress jobs: {}.".format(jobs))
 
-    return(fastapi.responses.JSONResponse(content = jobs))
+    return(py_vcon_server.restful_api.JSONResponse(content = jobs))
 
 
   @restapi.put("/in_progress/{job_id}",
@@ -715,7 +778,7 @@ def init(restapi):
 
     logger.debug("Returning pipeline: {}".format(name))
 
-    return(fastapi.responses.JSONResponse(content = vcon.pydantic_utils.get_dict(pipe_def, exclude_none=True)))
+    return(py_vcon_server.restful_api.JSONResponse(content = vcon.pydantic_utils.get_dict(pipe_def, exclude_none=True)))
 
 
   @restapi.delete("/pipeline/{name}",
@@ -768,5 +831,5 @@ def init(restapi):
 
     logger.debug("Returning list of pipelines: {}".format(names))
 
-    return(fastapi.responses.JSONResponse(content = names))
+    return(py_vcon_server.restful_api.JSONResponse(content = names))
 
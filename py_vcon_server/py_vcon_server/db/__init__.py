@@ -1,10 +1,12 @@
 # Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
 import typing
+import hashlib
 import urllib
 import asyncio
 import pkgutil
 import importlib
 import vcon
+import vcon.json_codec
 import py_vcon_server.logging_utils
 #from py_vcon_server.processor import ProcessorIO
 
@@ -14,6 +16,133 @@ class VconNotFound(Exception):
   """ Rasied when the vCon for the given UUID does not exist """
 
 
+class PartialVconNotSaved(Exception):
+  """ Raised when attempting to save a partial **Vcon** (see **Vcon.is_partial**) over the whole vCon """
+
+
+class InvalidExclusion(Exception):
+  """ Raised when a path to be excluded from a partial **Vcon** is not valid """
+
+
+class RevisionMismatch(Exception):
+  """ Raised when the saved revision of a **Vcon** is not the expected revision (see **VconStorage.set_if_revision**) """
+
+
+# Redis pub/sub channel on which storage bindings publish the UUIDs of changed
+# or deleted vCons, so that cached copies are dropped (see vcon_cache)
+INVALIDATION_CHANNEL = "vcon_cache_invalidate"
+
+# always included in partial vCons
+REQUIRED_KEYS = [vcon.Vcon.VCON_VERSION, vcon.Vcon.UUID]
+
+
+def parse_exclusions(exclude: typing.Union[str, typing.List[str]]) -> typing.List[typing.Tuple[str, typing.Union[str, None]]]:
+  """
+  Parse the paths to be excluded from a partial **Vcon**.
+
+  Parameters:
+    **exclude** (Union[str, List[str]]) - list or comma separated string of
+      paths to exclude.  A path is either a top level vCon key (e.g. "attachments")
+      or a top level object array key and the parameter to exclude from each
+      of its objects (e.g. "dialog.body").
+
+  Returns:
+    list of (top level key, parameter or None) tuples
+  """
+  if(isinstance(exclude, str)):
+    exclude = exclude.split(",")
+
+  exclusions = []
+  for path in exclude:
+    path = path.strip()
+    if(path == ""):
+      continue
+    elements = path.split(".")
+    if(len(elements) > 2 or "" in elements):
+      raise InvalidExclusion("invalid path to exclude: \"{}\" must be key or key.parameter".format(path))
+    if(elements[0] in REQUIRED_KEYS and len(elements) == 1):
+      raise InvalidExclusion("\"{}\" cannot be excluded".format(path))
+
+    exclusion = (elements[0], elements[1] if len(elements) == 2 else None)
+    if(exclusion not in exclusions):
+      exclusions.append(exclusion)
+
+  return(exclusions)
+
+
+def exclusion_paths(exclusions: typing.List[typing.Tuple[str, typing.Union[str, None]]]) -> typing.List[str]:
+  """ Get the string form of the parsed exclusions (see **parse_exclusions**) """
+  return([key if parameter is None else "{}.{}".format(key, parameter) for key, parameter in exclusions])
+
+
+def project_vcon_dict(
+    vcon_dict: dict,
+    exclusions: typing.List[typing.Tuple[str, typing.Union[str, None]]]
+  ) -> dict:
+  """
+  Get the part of the unsigned vCon dict without the excluded keys and parameters.
+  The containers from which nothing was excluded are shared, not copied.
+
+  Parameters:
+    **vcon_dict** (dict) - unsigned vCon dict
+    **exclusions** (List[Tuple[str, Union[str, None]]]) - paths to be excluded (see **parse_exclusions**)
+
+  Returns:
+    the partial vCon dict
+  """
+  excluded_keys = set(key for key, parameter in exclusions if parameter is None)
+  excluded_parameters = {}
+  for key, parameter in exclusions:
+    if(parameter is not None):
+      excluded_parameters.setdefault(key, set()).add(parameter)
+
+  partial_dict = {}
+  for key, value in vcon_dict.items():
+    if(key in excluded_keys):
+      continue
+    parameters = excluded_parameters.get(key, None)
+    if(parameters is not None and isinstance(value, list)):
+      value = [{name: element for name, element in list_object.items() if name not in parameters}
+        if isinstance(list_object, dict) else list_object for list_object in value]
+    partial_dict[key] = value
+
+  return(partial_dict)
+
+
+def make_partial_vcon(
+    a_vcon: vcon.Vcon,
+    exclusions: typing.List[typing.Tuple[str, typing.Union[str, None]]]
+  ) -> vcon.Vcon:
+  """
+  Construct the partial **Vcon** without the excluded parts of the given
+  **Vcon**, which must not be used after this.  Signed and encrypted
+  **Vcon**s are returned whole.
+  """
+  if(a_vcon.get_state() != vcon.VconStates.UNSIGNED):
+    return(a_vcon)
+
+  partial_dict = project_vcon_dict(a_vcon.dumpd(True, False), exclusions)
+  partial_vcon = vcon.Vcon()
+  # a_vcon is not used after this
+  partial_vcon.loadd(partial_dict, True, exclusion_paths(exclusions))
+
+  return(partial_vcon)
+
+
+def json_revision(vcon_json: bytes) -> str:
+  """ Default revision of a **Vcon** for storage which does not keep revisions, the SHA-256 hash of its JSON """
+  return(hashlib.sha256(vcon_json).hexdigest())
+
+
+def check_savable(save_vcon: typing.Union[vcon.Vcon, dict, str]) -> None:
+  """ Raise **PartialVconNotSaved** if the **Vcon** is partial and would replace the whole vCon in storage """
+  if(isinstance(save_vcon, vcon.Vcon) and save_vcon.is_partial()):
+    raise PartialVconNotSaved("partial vCon: {} cannot be saved, excluded: {}".format(
+        save_vcon.uuid,
+        save_vcon.get_partial_paths()
+      ))
+
+
 def import_bindings(path: typing.List[str], module_prefix: str, label: str):
   """ Import the modules and interface registrations """
   for finder, module_name, is_package in pkgutil.iter_modules(
@@ -70,6 +199,37 @@ class VconStorage():
     raise Exception("set not implemented")
 
 
+  async def update(self, save_vcon : vcon.Vcon) -> None:
+    """
+    Update a **Vcon** which was got from persistent storage.
+    Storage implementations may only write the changes made
+    to the **Vcon** since it was got (see **Vcon.get_journal_operations**).
+    By default the whole **Vcon** is written using **set**.
+    """
+    await self.set(save_vcon)
+
+
+  async def set_many(self, save_vcons : typing.List[typing.Union[vcon.Vcon, dict, str]]) -> None:
+    """
+    Add or update a list of Vcons in persistent storage.
+    Storage implementations may save them in one request.
+    By default each is saved using **set**.
+    """
+    for save_vcon in save_vcons:
+      await self.set(save_vcon)
+
+
+  async def update_many(self, save_vcons : typing.List[vcon.Vcon]) -> None:
+    """
+    Update or add a list of **Vcon**s, only writing the changes for
+    those got from persistent storage (see **update**).
+    Storage implementations may save them in one request.
+    By default each is saved using **update**.
+    """
+    for save_vcon in save_vcons:
+      await self.update(save_vcon)
+
+
   async def commit(
       self,
       processor_output #: VconProcessorIO
@@ -79,17 +239,26 @@ class VconStorage():
     output of a **VconProcessor** or **Pipeline**.
 
     Saves **Vcon**s which have been marked as modified
-    or new in the given **VconProcessorIO**
+    or new in the given **VconProcessorIO**.  Only the changes
+    are written for **Vcon**s which were got from storage
+    (see **update_many**).
     """
+    modified_vcons = []
     num_vcons = processor_output.num_vcons()
     for index in range(0, num_vcons):
       if(processor_output.is_vcon_modified(index)):
-        vcon_dict = await processor_output.get_vcon(
+        # update does not modify the Vcon, other than its journal, no need for a copy
+        vcon_object = await processor_output.get_vcon(
           index,
-          py_vcon_server.processor.VconTypes.DICT
+          py_vcon_server.processor.VconTypes.OBJECT,
+          True
           )
 
-        await self.set(vcon_dict)
+        modified_vcons.append(vcon_object)
+
+    # Save them all at once (e.g. redacted and amended copies created by a pipeline)
+    if(len(modified_vcons) > 0):
+      await self.update_many(modified_vcons)
 
 
   async def get(self, vcon_uuid : str) -> typing.Union[None, vcon.Vcon]:
@@ -97,6 +266,126 @@ class VconStorage():
     raise Exception("get not implemented")
 
 
+  async def get_raw(self, vcon_uuid : str) -> typing.Tuple[bytes, str]:
+    """
+    Get the JSON serialized form of a Vcon from storage using its UUID as the key.
+    Storage implementations may return the stored JSON without constructing a **Vcon**.
+    By default the **Vcon** is got using **get** and serialized.
+
+    Returns: JSON bytes of the **Vcon** and the revision (see **get_revision**)
+      of the JSON, read together from storage
+    """
+    a_vcon = await self.get(vcon_uuid)
+    vcon_json = vcon.json_codec.dumpb(a_vcon.dumpd(True, False))
+
+    return(vcon_json, json_revision(vcon_json))
+
+
+  async def get_partial(
+      self,
+      vcon_uuid : str,
+      exclude : typing.Union[str, typing.List[str]]
+    ) -> typing.Tuple[vcon.Vcon, str]:
+    """
+    Get part of a Vcon from storage, without the excluded parameters or
+    objects (e.g. "dialog.body", see **parse_exclusions**).  The **Vcon** is
+    partial (see **Vcon.is_partial**) and cannot be saved.  Storage
+    implementations may only read the included parts from the DB.
+    By default the **Vcon** is got using **get_raw** and the parts excluded.
+    Signed and encrypted **Vcon**s are got whole.
+
+    Returns: the partial **Vcon** and the revision (see **get_revision**)
+      of the **Vcon** it was read from
+    """
+    exclusions = parse_exclusions(exclude)
+    vcon_json, revision = await self.get_raw(vcon_uuid)
+    a_vcon = vcon.Vcon()
+    a_vcon.loads(vcon_json)
+
+    return(make_partial_vcon(a_vcon, exclusions), revision)
+
+
+  async def get_revision(self, vcon_uuid : str) -> typing.Union[str, None]:
+    """
+    Get the revision of the Vcon in storage.  The revision changes
+    every time the **Vcon** is saved and may be used to detect changes
+    without getting the **Vcon** (e.g. as an HTTP ETag).
+    Storage implementations may keep a revision which is set when saved.
+    By default the revision is the SHA-256 hash of the JSON from **get_raw**.
+
+    Returns: revision string or None if the **Vcon** does not exist
+    """
+    try:
+      vcon_json, revision = await self.get_raw(vcon_uuid)
+
+    except VconNotFound:
+      return(None)
+
+    return(revision)
+
+
+  async def set_if_revision(
+      self,
+      save_vcon : typing.Union[vcon.Vcon, dict, str],
+      revision : typing.Union[str, None]
+    ) -> str:
+    """
+    Add or update a Vcon in persistent storage, if the saved revision is
+    the given revision (see **get_revision**).
+    Storage implementations should check the revision and save atomically.
+    By default the revision is checked and then the **Vcon** saved using **set**.
+
+    Parameters:
+      **save_vcon** (Union[Vcon, dict, str]) - the **Vcon** to save
+      **revision** (Union[str, None]) - the expected revision of the saved **Vcon**,
+        "*" for any revision of an existing **Vcon**, None to save without checking.
+
+    Raises: **RevisionMismatch** if the saved revision is not the given revision
+
+    Returns: the new revision of the saved **Vcon**
+    """
+    if(isinstance(save_vcon, str)):
+      save_vcon = vcon.json_codec.loads(save_vcon)
+    if(isinstance(save_vcon, vcon.Vcon)):
+      vcon_uuid = save_vcon.uuid
+    else:
+      vcon_uuid = vcon.Vcon.get_dict_uuid(save_vcon)
+
+    if(revision is not None):
+      check_savable(save_vcon)
+      current_revision = await self.get_revision(vcon_uuid)
+      if(current_revision is None or (revision != "*" and revision != current_revision)):
+        raise RevisionMismatch("vCon: {} revision: {} does not match: {}".format(
+            vcon_uuid,
+            current_revision,
+            revision
+          ))
+
+    await self.set(save_vcon)
+
+    return(await self.get_revision(vcon_uuid))
+
+
+  async def get_many(self, vcon_uuids : typing.List[str]) -> typing.List[typing.Union[None, vcon.Vcon]]:
+    """
+    Get a list of Vcons from storage using their UUIDs as the keys.
+    Storage implementations may get them in one request.
+    By default each is got using **get**.
+
+    Returns: list of **Vcon**s in the same order as **vcon_uuids**,
+      None for those which do not exist
+    """
+    vcons = []
+    for vcon_uuid in vcon_uuids:
+      try:
+        vcons.append(await self.get(vcon_uuid))
+
+      except VconNotFound:
+        vcons.append(None)
+
+    return(vcons)
+
+
   async def jq_query(
       self,
       vcon_uuid: str,
@@ -125,6 +414,16 @@ class VconStorage():
     raise Exception("delete not implemented")
 
 
+  async def delete_many(self, vcon_uuids : typing.List[str]) -> None:
+    """
+    Delete the Vcons from storage identified by their UUIDs as the keys.
+    Storage implementations may delete them in one request.
+    By default each is deleted using **delete**.
+    """
+    for vcon_uuid in vcon_uuids:
+      await self.delete(vcon_uuid)
+
+
   # TODO: Need connection status method
 
 
@@ -2,14 +2,37 @@
 """ Redis implementation of the Vcon storage DB interface """
 
 import typing
-import json
+import secrets
+import redis.exceptions
 import vcon
+import vcon.json_codec
+import vcon.journal
 import py_vcon_server.db
 import py_vcon_server.db.redis.redis_mgr
 import py_vcon_server.logging_utils
 
 logger = py_vcon_server.logging_utils.init_logger(__name__)
 
+
+def revision_key(vcon_key: str) -> str:
+  """ Get the redis key for the revision of the vCon stored at the given key (vcon:<UUID>) """
+  return("vcon_revision:{}".format(vcon_key[len("vcon:"):]))
+
+
+def new_revision() -> str:
+  """ Generate a new, unique revision for a saved vCon """
+  return(secrets.token_hex(8))
+
+
+def invalidation(vcon_uuids: typing.List[str]) -> str:
+  """
+  Message published on **py_vcon_server.db.INVALIDATION_CHANNEL**, in the
+  same transaction as the change to the vCons, so that every change through
+  this binding drops the cached copies in all servers.
+  """
+  return(vcon.json_codec.dumps({"uuids": vcon_uuids}))
+
+
 class RedisVconStorage(py_vcon_server.db.VconStorage):
   """ Redis binding of VconStorage """
   def __init__(self):
@@ -42,10 +65,10 @@ class RedisVconStorage(py_vcon_server.db.VconStorage):
       logger.error("RedisVconStorage not shutdown")
 
 
-  async def set(self, save_vcon : typing.Union[vcon.Vcon, dict, str]) -> None:
-    """ save **Vcon** to redis storage """
-    redis_con = self._redis_mgr.get_client()
-
+  @staticmethod
+  def _vcon_key_dict(save_vcon : typing.Union[vcon.Vcon, dict, str]) -> typing.Tuple[str, dict]:
+    """ Get the redis key and dict to be saved for the **Vcon** """
+    py_vcon_server.db.check_savable(save_vcon)
     if(isinstance(save_vcon, vcon.Vcon)):
       # Don't deepcopy as we don't modify the dict
       # TODO: handle signed and encrypted where UUID is not a top level member
@@ -57,27 +80,448 @@ class RedisVconStorage(py_vcon_server.db.VconStorage):
       uuid = vcon.Vcon.get_dict_uuid(save_vcon)
 
     elif(isinstance(save_vcon, str)):
-      vcon_dict = json.loads(save_vcon)
+      vcon_dict = vcon.json_codec.loads(save_vcon)
       uuid = vcon.Vcon.get_dict_uuid(vcon_dict)
 
     else:
       raise Exception("Invalid type: {} for Vcon to be saved to redis".format(type(save_vcon)))
 
-    await redis_con.json().set("vcon:{}".format(uuid), "$", vcon_dict)
+    return("vcon:{}".format(uuid), vcon_dict)
+
+
+  @staticmethod
+  def _load_vcon(vcon_dict: dict, revision: typing.Union[str, None]) -> vcon.Vcon:
+    """ Construct the **Vcon** from the dict and revision got from redis """
+    # Migration of older versions changes the dict, so it is no longer as stored
+    as_stored = vcon_dict.get(vcon.Vcon.VCON_VERSION, None) == vcon.Vcon.CURRENT_VCON_VERSION
+
+    a_vcon = vcon.Vcon()
+    # The dict was just parsed from the redis reply, no need to copy it
+    a_vcon.loadd(vcon_dict, True)
+
+    # Journal the changes so that update only needs to write the changes
+    if(as_stored):
+      a_vcon.start_journal(revision)
+
+    return(a_vcon)
+
+
+  async def set(self, save_vcon : typing.Union[vcon.Vcon, dict, str]) -> None:
+    """ save **Vcon** to redis storage """
+    await self.set_if_revision(save_vcon, None)
+
+
+  @staticmethod
+  def _queue_set(pipe, save_vcon : typing.Union[vcon.Vcon, dict, str]) -> typing.Tuple[str, str]:
+    """
+    Queue the commands to save the whole **Vcon** with a new revision.
+
+    Returns: (vCon UUID, new revision)
+    """
+    key, vcon_dict = RedisVconStorage._vcon_key_dict(save_vcon)
+    saved_revision = new_revision()
+    pipe.execute_command("JSON.SET", key, "$", vcon.json_codec.dumpb(vcon_dict))
+    pipe.set(revision_key(key), saved_revision)
+    return(key[len("vcon:"):], saved_revision)
+
+
+  async def set_if_revision(
+      self,
+      save_vcon : typing.Union[vcon.Vcon, dict, str],
+      revision : typing.Union[str, None]
+    ) -> str:
+    """
+    Save the **Vcon** to redis storage with a new revision.  The revision
+    is checked and the vCon saved in one transaction, watching the revision
+    key so that a concurrent save causes **RevisionMismatch**.
+    """
+    redis_con = self._redis_mgr.get_client()
+
+    key, vcon_dict = self._vcon_key_dict(save_vcon)
+    saved_revision = new_revision()
+    async with redis_con.pipeline(transaction = True) as pipe:
+      if(revision is not None):
+        await pipe.watch(key, revision_key(key))
+        # immediate mode until multi
+        exists = await pipe.exists(key)
+        current_revision = await pipe.get(revision_key(key))
+        if(not exists or (revision != "*" and revision != current_revision)):
+          raise py_vcon_server.db.RevisionMismatch("vCon: {} revision: {} does not match: {}".format(
+              key,
+              current_revision,
+              revision
+            ))
+        pipe.multi()
+
+      pipe.execute_command("JSON.SET", key, "$", vcon.json_codec.dumpb(vcon_dict))
+      pipe.set(revision_key(key), saved_revision)
+      pipe.publish(py_vcon_server.db.INVALIDATION_CHANNEL, invalidation([key[len("vcon:"):]]))
+      try:
+        await pipe.execute()
+
+      except redis.exceptions.WatchError as e:
+        raise py_vcon_server.db.RevisionMismatch("vCon: {} saved concurrently, revision: {} does not match".format(
+            key,
+            revision
+          )) from e
+
+    return(saved_revision)
+
+
+  async def get_revision(self, vcon_uuid : str) -> typing.Union[str, None]:
+    """ Get the revision of the **Vcon** saved in redis storage """
+    redis_con = self._redis_mgr.get_client()
+    key = "vcon:{}".format(vcon_uuid)
+
+    revision = await redis_con.get(revision_key(key))
+    if(revision is None):
+      if(not await redis_con.exists(key)):
+        return(None)
+
+      # saved before revisions were kept
+      await redis_con.set(revision_key(key), new_revision(), nx = True)
+      revision = await redis_con.get(revision_key(key))
+
+    return(revision)
+
+
+  async def set_many(self, save_vcons : typing.List[typing.Union[vcon.Vcon, dict, str]]) -> None:
+    """ save the **Vcon**s to redis storage in one pipelined transaction """
+    await self._set_many(save_vcons)
+
+
+  async def _set_many(self, save_vcons : typing.List[typing.Union[vcon.Vcon, dict, str]]) -> typing.List[str]:
+    """ save the **Vcon**s in one pipelined transaction, returning the new revisions """
+    if(len(save_vcons) == 0):
+      return([])
+
+    redis_con = self._redis_mgr.get_client()
+    pipe = redis_con.pipeline(transaction = True)
+    saved = [self._queue_set(pipe, save_vcon) for save_vcon in save_vcons]
+    pipe.publish(py_vcon_server.db.INVALIDATION_CHANNEL, invalidation([vcon_uuid for vcon_uuid, revision in saved]))
+
+    await pipe.execute()
+    return([revision for vcon_uuid, revision in saved])
+
 
   async def get(self, vcon_uuid : str) -> typing.Union[None, vcon.Vcon]:
-    """ Get Vcon from redis storage """
+    """ Get Vcon from redis storage, along with its revision in the same transaction """
     redis_con = self._redis_mgr.get_client()
+    key = "vcon:{}".format(vcon_uuid)
+
+    pipe = redis_con.pipeline(transaction = True)
+    pipe.execute_command("JSON.GET", key)
+    pipe.get(revision_key(key))
+    vcon_json, revision = await pipe.execute()
+    # logger.debug("Got {} vcon: {}".format(vcon_uuid, vcon_json))
+    if(vcon_json is None):
+      raise py_vcon_server.db.VconNotFound("vCon not found for UUID: {}".format(vcon_uuid))
+
+    return(self._load_vcon(vcon.json_codec.loads(vcon_json), revision))
+
 
-    vcon_dict = await redis_con.json().get("vcon:{}".format(vcon_uuid))
-    # logger.debug("Got {} vcon: {}".format(vcon_uuid, vcon_dict))
-    if(vcon_dict is None):
+  async def get_raw(self, vcon_uuid : str) -> typing.Tuple[bytes, str]:
+    """
+    Get the JSON for the Vcon as stored in redis, without parsing it,
+    along with its revision in the same transaction.  Stored vCons of
+    older versions are migrated to the current version.
+    """
+    redis_con = self._redis_mgr.get_client()
+    key = "vcon:{}".format(vcon_uuid)
+
+    pipe = redis_con.pipeline(transaction = True)
+    pipe.execute_command("JSON.GET", key, "$.{}".format(vcon.Vcon.VCON_VERSION))
+    pipe.execute_command("JSON.GET", key)
+    pipe.get(revision_key(key))
+    version_json, vcon_json, revision = await pipe.execute()
+    if(vcon_json is None):
       raise py_vcon_server.db.VconNotFound("vCon not found for UUID: {}".format(vcon_uuid))
 
-    a_vcon = vcon.Vcon()
-    a_vcon.loadd(vcon_dict)
+    if(revision is None):
+      # saved before revisions were kept
+      revision = await self.get_revision(vcon_uuid)
+
+    # list of matches, empty for signed and encrypted vCons
+    versions = vcon.json_codec.loads(version_json)
+    if(len(versions) > 0 and versions[0] != vcon.Vcon.CURRENT_VCON_VERSION):
+      a_vcon = self._load_vcon(vcon.json_codec.loads(vcon_json), revision)
+      return(vcon.json_codec.dumpb(a_vcon.dumpd(True, False)), revision)
+
+    if(isinstance(vcon_json, str)):
+      vcon_json = vcon_json.encode("utf-8")
+
+    return(vcon_json, revision)
+
+
+  async def get_partial(
+      self,
+      vcon_uuid : str,
+      exclude : typing.Union[str, typing.List[str]]
+    ) -> typing.Tuple[vcon.Vcon, str]:
+    """
+    Get part of the Vcon from redis storage.  Only the JSON paths of the
+    included keys and object parameters are read, so excluded parameters
+    (e.g. dialog bodies) are not read from redis.  The revision is read
+    in the same transaction as the included parts.  If the **Vcon** was
+    saved since its keys were read, it is got whole and the parts excluded.
+    """
+    exclusions = py_vcon_server.db.parse_exclusions(exclude)
+    excluded_keys = set(key for key, parameter in exclusions if parameter is None)
+    excluded_parameters = {}
+    for key, parameter in exclusions:
+      if(parameter is not None):
+        excluded_parameters.setdefault(key, set()).add(parameter)
+    list_keys = list(excluded_parameters.keys())
+
+    redis_con = self._redis_mgr.get_client()
+    key = "vcon:{}".format(vcon_uuid)
+
+    # The top level keys and the parameter names of the objects in the lists with exclusions
+    pipe = redis_con.pipeline(transaction = True)
+    pipe.exists(key)
+    pipe.get(revision_key(key))
+    pipe.execute_command("JSON.GET", key, vcon.journal.json_path(vcon.Vcon.VCON_VERSION))
+    pipe.execute_command("JSON.OBJKEYS", key, "$")
+    for list_key in list_keys:
+      pipe.execute_command("JSON.TYPE", key, vcon.journal.json_path(list_key))
+      pipe.execute_command("JSON.OBJKEYS", key, vcon.journal.json_path(list_key) + "[*]")
+    results = await pipe.execute(raise_on_error = False)
+    if(not results[0]):
+      raise py_vcon_server.db.VconNotFound("vCon not found for UUID: {}".format(vcon_uuid))
+    for result in results:
+      if(isinstance(result, Exception)):
+        raise result
+
+    keys_revision = results[1]
+    versions = vcon.json_codec.loads(results[2])
+    if(keys_revision is None or len(versions) == 0 or versions[0] != vcon.Vcon.CURRENT_VCON_VERSION):
+      # saved before revisions were kept, signed, encrypted or older version to be migrated
+      return(await super().get_partial(vcon_uuid, exclude))
+
+    top_keys = results[3][0]
+    # list key: parameter names of each object (None if not an object)
+    object_keys = {}
+    for index, list_key in enumerate(list_keys):
+      types = results[4 + 2 * index]
+      if(len(types) > 0 and types[0] in ("array", ["array"])):
+        object_keys[list_key] = results[5 + 2 * index]
+
+    paths = []
+    for top_key in top_keys:
+      if(top_key in excluded_keys):
+        continue
+
+      if(top_key in object_keys):
+        for index, parameter_names in enumerate(object_keys[top_key]):
+          if(parameter_names is None):
+            paths.append(vcon.journal.json_path(top_key, index))
+          else:
+            paths.extend(vcon.journal.json_path(top_key, index, parameter_name)
+              for parameter_name in parameter_names if parameter_name not in excluded_parameters[top_key])
+
+      else:
+        paths.append(vcon.journal.json_path(top_key))
+
+    pipe = redis_con.pipeline(transaction = True)
+    pipe.execute_command("JSON.GET", key, *paths)
+    pipe.get(revision_key(key))
+    values_json, revision = await pipe.execute(raise_on_error = False)
+    if(revision != keys_revision):
+      # saved or deleted since the keys were read
+      return(await super().get_partial(vcon_uuid, exclude))
+    if(isinstance(values_json, Exception)):
+      raise values_json
+
+    values = vcon.json_codec.loads(values_json)
+    if(len(paths) == 1):
+      values = {paths[0]: values}
+
+    def path_value(path: str) -> typing.Any:
+      matches = values.get(path, [])
+      if(len(matches) == 0):
+        # changed since the keys were read
+        raise Exception("vCon: {} changed while getting partial vCon, path: {} not found".format(vcon_uuid, path))
+      return(matches[0])
+
+    partial_dict = {}
+    for top_key in top_keys:
+      if(top_key in excluded_keys):
+        continue
+
+      if(top_key in object_keys):
+        list_objects = []
+        for index, parameter_names in enumerate(object_keys[top_key]):
+          if(parameter_names is None):
+            list_objects.append(path_value(vcon.journal.json_path(top_key, index)))
+          else:
+            list_objects.append({parameter_name: path_value(vcon.journal.json_path(top_key, index, parameter_name))
+              for parameter_name in parameter_names if parameter_name not in excluded_parameters[top_key]})
+        partial_dict[top_key] = list_objects
+
+      else:
+        partial_dict[top_key] = path_value(vcon.journal.json_path(top_key))
+
+    partial_vcon = vcon.Vcon()
+    partial_vcon.loadd(partial_dict, True, py_vcon_server.db.exclusion_paths(exclusions))
+
+    return(partial_vcon, revision)
+
+
+  async def get_many(self, vcon_uuids : typing.List[str]) -> typing.List[typing.Union[None, vcon.Vcon]]:
+    """ Get the Vcons and their revisions from redis storage using one JSON.MGET and MGET """
+    if(len(vcon_uuids) == 0):
+      return([])
+
+    redis_con = self._redis_mgr.get_client()
+    keys = ["vcon:{}".format(vcon_uuid) for vcon_uuid in vcon_uuids]
+
+    pipe = redis_con.pipeline(transaction = True)
+    pipe.execute_command("JSON.MGET", *keys, ".")
+    pipe.mget([revision_key(key) for key in keys])
+    vcon_jsons, revisions = await pipe.execute()
+
+    return([None if vcon_json is None else self._load_vcon(vcon.json_codec.loads(vcon_json), revision)
+      for vcon_json, revision in zip(vcon_jsons, revisions)])
+
+
+  async def update(self, save_vcon: vcon.Vcon) -> None:
+    """
+    Update a **Vcon** got from redis storage, only writing the changes made
+    to it (see **Vcon.get_journal_operations**).  The changes are applied as
+    RedisJSON ARRAPPEND and SET operations in one pipelined transaction,
+    watching the revision so that they are only applied to the revision the
+    **Vcon** was got at.  The whole **Vcon** is written, also only over the
+    revision it was got at, if the changes are not available or cannot be
+    applied.
+
+    Raises: **RevisionMismatch** if the **Vcon** was saved or deleted since it was got
+    """
+    await self.update_many([save_vcon])
+
+
+  async def update_many(self, save_vcons: typing.List[vcon.Vcon]) -> None:
+    """
+    Update or add the **Vcon**s in one pipelined transaction, only writing
+    the changes for those got from redis storage (see **update**).
+    Nothing is saved if any of the **Vcon**s got from redis storage was
+    saved or deleted since it was got.
+
+    Raises: **RevisionMismatch** if a **Vcon** was saved or deleted since it was got
+    """
+    # (Vcon, journal operations or None to write the whole Vcon, revision to be saved over)
+    updates = []
+    for save_vcon in save_vcons:
+      operations = save_vcon.get_journal_operations()
+      if(operations is not None and len(operations) == 0):
+        # not changed
+        continue
+
+      revision = save_vcon.get_journal_revision()
+      if(revision is None):
+        # not got from storage, nothing to check the changes against
+        operations = None
+      updates.append((save_vcon, operations, revision))
+
+    saved_revisions, not_applied = await self._update_checked(updates)
+
+    # ARRAPPEND replies with null for the path if it is not an array, write
+    # the whole Vcon over the revision just saved
+    if(len(not_applied) > 0):
+      rewritten = await self._update_checked(
+        [(save_vcon, None, saved_revisions[save_vcon.uuid]) for save_vcon in not_applied])
+      saved_revisions.update(rewritten[0])
+
+    # Storage now has the changes
+    for save_vcon in save_vcons:
+      save_vcon.start_journal(saved_revisions.get(save_vcon.uuid, save_vcon.get_journal_revision()))
+
+
+  async def _update_checked(
+      self,
+      updates: typing.List[typing.Tuple[vcon.Vcon, typing.Union[list, None], typing.Union[str, None]]]
+    ) -> typing.Tuple[typing.Dict[str, str], typing.List[vcon.Vcon]]:
+    """
+    Apply the journal operations, or write the whole **Vcon**, for each of
+    the updates in one pipelined transaction.  The revision keys are watched
+    and checked so that the updates are only saved over the given revisions.
+
+    Parameters:
+      **updates** (List[Tuple[Vcon, Union[list, None], Union[str, None]]]) - the **Vcon**,
+        its journal operations or None to write the whole **Vcon** and the revision
+        it is to be saved over or None to save without checking
+
+    Raises: **RevisionMismatch** if a saved revision is not the given revision
+
+    Returns: new revisions by vCon UUID and the **Vcon**s for which the
+      journal operations could not all be applied
+    """
+    if(len(updates) == 0):
+      return({}, [])
+
+    redis_con = self._redis_mgr.get_client()
+    async with redis_con.pipeline(transaction = True) as pipe:
+      checked = [(save_vcon, revision) for save_vcon, operations, revision in updates if revision is not None]
+      if(len(checked) > 0):
+        revision_keys = [revision_key("vcon:{}".format(save_vcon.uuid)) for save_vcon, revision in checked]
+        await pipe.watch(*revision_keys)
+        # immediate mode until multi
+        current_revisions = await pipe.mget(revision_keys)
+        for (save_vcon, revision), current_revision in zip(checked, current_revisions):
+          if(current_revision != revision):
+            raise py_vcon_server.db.RevisionMismatch("vCon: {} revision: {} does not match: {}".format(
+                save_vcon.uuid,
+                current_revision,
+                revision
+              ))
+        pipe.multi()
+
+      saved_revisions = {}
+      # (Vcon, number of journal operations queued)
+      queued = []
+      for save_vcon, operations, revision in updates:
+        if(operations is None):
+          vcon_uuid, saved_revisions[save_vcon.uuid] = self._queue_set(pipe, save_vcon)
+          queued.append((save_vcon, 0))
+          continue
+
+        key = "vcon:{}".format(save_vcon.uuid)
+        for operation, path, value in operations:
+          if(operation == vcon.journal.APPEND):
+            pipe.execute_command("JSON.ARRAPPEND", key, path,
+              *[vcon.json_codec.dumpb(element) for element in value])
+
+          else:
+            pipe.execute_command("JSON.SET", key, path, vcon.json_codec.dumpb(value))
+        saved_revisions[save_vcon.uuid] = new_revision()
+        pipe.set(revision_key(key), saved_revisions[save_vcon.uuid])
+        queued.append((save_vcon, len(operations)))
+
+      pipe.publish(py_vcon_server.db.INVALIDATION_CHANNEL,
+        invalidation([save_vcon.uuid for save_vcon, operations, revision in updates]))
+      try:
+        results = await pipe.execute(raise_on_error = False)
+
+      except redis.exceptions.WatchError as e:
+        raise py_vcon_server.db.RevisionMismatch("vCons: {} saved concurrently".format(
+            [save_vcon.uuid for save_vcon, revision in checked]
+          )) from e
+
+    not_applied = []
+    result_index = 0
+    for save_vcon, operation_count in queued:
+      # journal operation results followed by those of the whole vCon or revision set
+      command_count = operation_count + (2 if operation_count == 0 else 1)
+      command_results = results[result_index:result_index + command_count]
+      result_index += command_count
+      errors = [result for result in command_results[operation_count:] if isinstance(result, Exception)]
+      if(len(errors) > 0):
+        raise errors[0]
+
+      if(any(isinstance(result, Exception) or result == [None] for result in command_results[:operation_count])):
+        not_applied.append(save_vcon)
+
+    return(saved_revisions, not_applied)
 
-    return(a_vcon)
 
   async def jq_query(
       self,
@@ -99,7 +543,7 @@ class RedisVconStorage(py_vcon_server.db.VconStorage):
     """ Get the JSON path query results for the given **Vcon** """
     redis_con = self._redis_mgr.get_client()
 
-    query_list = await redis_con.json().get("vcon:{}".format(vcon_uuid), json_path_query_string)
+    query_list = await py_vcon_server.db.redis.redis_mgr.json_commands(redis_con).get("vcon:{}".format(vcon_uuid), json_path_query_string)
 
     return(query_list)
 
@@ -107,6 +551,18 @@ class RedisVconStorage(py_vcon_server.db.VconStorage):
   async def delete(self, vcon_uuid : str) -> None:
     """ Delete the Vcon with the given UUID """
 
+    await self.delete_many([vcon_uuid])
+
+
+  async def delete_many(self, vcon_uuids : typing.List[str]) -> None:
+    """ Delete the Vcons with the given UUIDs in one request """
+    if(len(vcon_uuids) == 0):
+      return
+
     redis_con = self._redis_mgr.get_client()
-    await redis_con.delete(f"vcon:{str(vcon_uuid)}")
+    keys = ["vcon:{}".format(vcon_uuid) for vcon_uuid in vcon_uuids]
+    pipe = redis_con.pipeline(transaction = True)
+    pipe.delete(*keys, *[revision_key(key) for key in keys])
+    pipe.publish(py_vcon_server.db.INVALIDATION_CHANNEL, invalidation(vcon_uuids))
+    await pipe.execute()
 
@@ -13,6 +13,7 @@ import asyncio
 import traceback
 import redis.asyncio.connection
 import redis.asyncio.client
+import vcon.json_codec
 import py_vcon_server.logging_utils
 
 
@@ -21,6 +22,14 @@ FAIL_NEXT = 0
 
 logger = py_vcon_server.logging_utils.init_logger(__name__)
 
+def json_commands(client: redis.asyncio.client.Redis):
+  """
+  Get the RedisJSON commands for the given client, using the vcon
+  package JSON codec (see **vcon.json_codec**) to encode and decode.
+  """
+  return(client.json(encoder = vcon.json_codec.ENCODER, decoder = vcon.json_codec.DECODER))
+
+
 class RedisPoolNotInitialized(Exception):
   """ raised when redis_mgr is not initialized """
 
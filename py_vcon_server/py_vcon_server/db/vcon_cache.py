@@ -0,0 +1,409 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+"""
+Read-through, in process cache of **Vcon**s in front of a **VconStorage** binding.
+
+The REST API, jq/JSONpath queries and back-to-back pipelines often get the
+same vCon several times.  **CachedVconStorage** keeps the most recently got
+vCons in a least recently used cache bounded by the number of entries and
+the approximate size in bytes, so that a repeated get does not go to the
+storage DB and parse the vCon again.
+
+Entries are invalidated when a vCon is set, updated or deleted through the
+cache.  Changes made by other servers, pipeline worker processes or any
+other **VconStorage** instance are seen from the Redis pub/sub messages on
+**py_vcon_server.db.INVALIDATION_CHANNEL**, which the Redis storage binding
+publishes in the same transaction as each change.  If the subscription is
+lost, invalidations may have been missed, so the whole cache is cleared when
+it is re-established.
+"""
+import typing
+import asyncio
+import collections
+import vcon
+import vcon.json_codec
+import py_vcon_server.db
+import py_vcon_server.db.redis.redis_mgr
+import py_vcon_server.logging_utils
+
+logger = py_vcon_server.logging_utils.init_logger(__name__)
+
+INVALIDATION_CHANNEL = py_vcon_server.db.INVALIDATION_CHANNEL
+
+
+def estimate_size(value: typing.Any) -> int:
+  """
+  Approximate size in bytes of a JSON style value (e.g. vCon dict), without
+  serializing it.  Dominated by the strings (e.g. base64url encoded bodies).
+  """
+  if(isinstance(value, str)):
+    return(len(value) + 2)
+
+  if(isinstance(value, dict)):
+    return(sum(len(key) + 4 + estimate_size(element) for key, element in value.items()) + 2)
+
+  if(isinstance(value, list)):
+    return(sum(estimate_size(element) + 1 for element in value) + 2)
+
+  return(8)
+
+
+class CachedVconStorage(py_vcon_server.db.VconStorage):
+  """ LRU cache of **Vcon**s wrapping any **VconStorage** binding """
+  def __init__(
+      self,
+      vcon_storage: py_vcon_server.db.VconStorage,
+      max_entries: int = 1000,
+      max_bytes: int = 256 * 1024 * 1024,
+      invalidation_url: typing.Union[str, None] = None
+    ):
+    """
+    Parameters:
+      **vcon_storage** (VconStorage) - the storage binding to cache **Vcon**s from
+      **max_entries** (int) - maximum number of **Vcon**s kept in the cache
+      **max_bytes** (int) - maximum approximate total size of the cached **Vcon**s
+      **invalidation_url** (str) - Redis URL of the vCon storage, subscribed to
+        for the changes made by other servers.  None for a cache local to this
+        process.
+    """
+    self._storage = vcon_storage
+    self._max_entries = max_entries
+    self._max_bytes = max_bytes
+    self._invalidation_url = invalidation_url
+    # UUID: (vCon dict as got from storage, estimated size, journal started, journal revision)
+    self._entries: "collections.OrderedDict[str, typing.Tuple[dict, int, bool, typing.Union[str, None]]]" = collections.OrderedDict()
+    self._bytes = 0
+    self._hits = 0
+    self._misses = 0
+    self._invalidations = 0
+    # incremented on every invalidation so that a get racing with a set does not cache the old vCon
+    self._generation = 0
+    self._redis_mgr = None
+    self._subscriber_task = None
+
+
+  def setup(self, db_url: str) -> None:
+    """ The wrapped **VconStorage** is already setup """
+    raise Exception("CachedVconStorage wraps a VconStorage which is already setup")
+
+
+  async def start(self) -> None:
+    """ Start listening for invalidations of vCons changed in storage """
+    if(self._invalidation_url is not None and self._redis_mgr is None):
+      self._redis_mgr = py_vcon_server.db.redis.redis_mgr.RedisMgr(self._invalidation_url, "VconCache")
+      self._redis_mgr.create_pool()
+      self._subscriber_task = asyncio.create_task(self._subscribe())
+
+
+  async def shutdown(self) -> None:
+    """ Stop listening for invalidations and shutdown the wrapped **VconStorage** """
+    if(self._subscriber_task is not None):
+      self._subscriber_task.cancel()
+      try:
+        await self._subscriber_task
+
+      except asyncio.CancelledError:
+        pass
+      self._subscriber_task = None
+
+    if(self._redis_mgr is not None):
+      rm = self._redis_mgr
+      self._redis_mgr = None
+      await rm.shutdown_pool()
+
+    self.clear()
+    await self._storage.shutdown()
+
+
+  def stats(self) -> typing.Dict[str, typing.Union[int, float]]:
+    """
+    Get the cache statistics.
+
+    Returns:
+      dict containing **hits**, **misses**, **hit_rate**, **invalidations**,
+      **entries**, **bytes**, **max_entries** and **max_bytes**
+    """
+    lookups = self._hits + self._misses
+    return({
+        "hits": self._hits,
+        "misses": self._misses,
+        "hit_rate": self._hits / lookups if lookups > 0 else 0.0,
+        "invalidations": self._invalidations,
+        "entries": len(self._entries),
+        "bytes": self._bytes,
+        "max_entries": self._max_entries,
+        "max_bytes": self._max_bytes
+      })
+
+
+  def clear(self) -> None:
+    """ Drop all of the cached **Vcon**s """
+    self._generation += 1
+    self._entries.clear()
+    self._bytes = 0
+
+
+  def invalidate(self, vcon_uuids: typing.List[str]) -> None:
+    """ Drop the cached **Vcon**s for the given UUIDs from this process's cache """
+    self._generation += 1
+    for vcon_uuid in vcon_uuids:
+      entry = self._entries.pop(vcon_uuid, None)
+      if(entry is not None):
+        self._bytes -= entry[1]
+        self._invalidations += 1
+
+
+  def _cached_vcon(self, vcon_uuid: str) -> typing.Union[vcon.Vcon, None]:
+    """ Construct a **Vcon** from the cache, None if not cached """
+    entry = self._entries.get(vcon_uuid, None)
+    if(entry is None):
+      self._misses += 1
+      return(None)
+
+    self._entries.move_to_end(vcon_uuid)
+    self._hits += 1
+    vcon_dict, size, journaled, revision = entry
+    a_vcon = vcon.Vcon()
+    # copies the containers, the caller may modify the Vcon
+    a_vcon.loadd(vcon_dict)
+    if(journaled):
+      a_vcon.start_journal(revision)
+
+    return(a_vcon)
+
+
+  def _add(self, vcon_uuid: str, a_vcon: vcon.Vcon, generation: int) -> None:
+    """ Cache the **Vcon** just got from storage, unless invalidated since **generation** """
+    if(self._max_entries <= 0 or generation != self._generation):
+      return
+
+    vcon_dict = a_vcon.dumpd()
+    size = estimate_size(vcon_dict)
+    if(size > self._max_bytes):
+      return
+
+    replaced = self._entries.pop(vcon_uuid, None)
+    if(replaced is not None):
+      self._bytes -= replaced[1]
+    self._entries[vcon_uuid] = (vcon_dict, size, a_vcon.get_journal_operations() is not None,
+      a_vcon.get_journal_revision())
+    self._bytes += size
+    while(len(self._entries) > self._max_entries or self._bytes > self._max_bytes):
+      evicted_uuid, evicted = self._entries.popitem(last = False)
+      self._bytes -= evicted[1]
+
+
+  def _on_invalidation(self, message: str) -> None:
+    """
+    Handle an invalidation message published by the storage.  Changes made
+    through this cache are seen here too, dropping any copy got meanwhile.
+    """
+    try:
+      invalidation = vcon.json_codec.loads(message)
+      self.invalidate(invalidation["uuids"])
+
+    except Exception as e:
+      logger.warning("invalid vCon cache invalidation message: {} {}".format(message, e))
+      self.clear()
+
+
+  async def _subscribe(self) -> None:
+    """ Listen for invalidations of vCons changed in storage, until cancelled """
+    while(self._redis_mgr is not None):
+      pubsub = None
+      try:
+        redis_con = self._redis_mgr.get_client()
+        pubsub = redis_con.pubsub()
+        await pubsub.subscribe(INVALIDATION_CHANNEL)
+        # Invalidations may have been missed while not subscribed
+        self.clear()
+        async for message in pubsub.listen():
+          if(message.get("type", None) == "message"):
+            self._on_invalidation(message["data"])
+
+      except asyncio.CancelledError:
+        raise
+
+      except Exception as e:
+        logger.warning("vCon cache invalidation subscription failed: {}".format(e))
+        self.clear()
+        await asyncio.sleep(1.0)
+
+      finally:
+        if(pubsub is not None):
+          try:
+            await pubsub.reset()
+          except Exception:
+            pass
+
+
+  @staticmethod
+  def _uuid_and_vcon(save_vcon: typing.Union[vcon.Vcon, dict, str]) -> typing.Tuple[str, typing.Union[vcon.Vcon, dict]]:
+    """ Get the UUID of the **Vcon** to be saved, parsing it once if a JSON string """
+    if(isinstance(save_vcon, vcon.Vcon)):
+      return(save_vcon.uuid, save_vcon)
+
+    if(isinstance(save_vcon, str)):
+      save_vcon = vcon.json_codec.loads(save_vcon)
+
+    return(vcon.Vcon.get_dict_uuid(save_vcon), save_vcon)
+
+
+  async def get(self, vcon_uuid : str) -> typing.Union[None, vcon.Vcon]:
+    """ Get the **Vcon** from the cache or from storage if not cached """
+    a_vcon = self._cached_vcon(vcon_uuid)
+    if(a_vcon is None):
+      generation = self._generation
+      a_vcon = await self._storage.get(vcon_uuid)
+      self._add(vcon_uuid, a_vcon, generation)
+
+    return(a_vcon)
+
+
+  def _revisioned_entry(self, vcon_uuid: str) -> typing.Union[typing.Tuple[dict, int, bool, typing.Union[str, None]], None]:
+    """ Get the cache entry, None if not cached or its revision is not known """
+    entry = self._entries.get(vcon_uuid, None)
+    if(entry is None or entry[3] is None):
+      self._misses += 1
+      return(None)
+
+    self._entries.move_to_end(vcon_uuid)
+    self._hits += 1
+
+    return(entry)
+
+
+  async def get_raw(self, vcon_uuid : str) -> typing.Tuple[bytes, str]:
+    """
+    Get the JSON and revision for the **Vcon** from the cache or from
+    storage if not cached (or not cached with its revision).
+    """
+    entry = self._revisioned_entry(vcon_uuid)
+    if(entry is None):
+      # Not cached as a Vcon is not constructed
+      return(await self._storage.get_raw(vcon_uuid))
+
+    return(vcon.json_codec.dumpb(entry[0]), entry[3])
+
+
+  async def get_partial(
+      self,
+      vcon_uuid : str,
+      exclude : typing.Union[str, typing.List[str]]
+    ) -> typing.Tuple[vcon.Vcon, str]:
+    """
+    Get part of the **Vcon** and its revision from the cache or from
+    storage if not cached (or not cached with its revision).
+    """
+    entry = self._revisioned_entry(vcon_uuid)
+    if(entry is None):
+      # Not cached as only part of the Vcon is got
+      return(await self._storage.get_partial(vcon_uuid, exclude))
+
+    exclusions = py_vcon_server.db.parse_exclusions(exclude)
+    partial_vcon = vcon.Vcon()
+    if(vcon.Vcon.VCON_VERSION in entry[0]):
+      # copies the containers, the caller may modify the Vcon
+      partial_vcon.loadd(py_vcon_server.db.project_vcon_dict(entry[0], exclusions),
+        False, py_vcon_server.db.exclusion_paths(exclusions))
+
+    else:
+      # signed or encrypted are got whole
+      partial_vcon.loadd(entry[0])
+
+    return(partial_vcon, entry[3])
+
+
+  async def get_many(self, vcon_uuids : typing.List[str]) -> typing.List[typing.Union[None, vcon.Vcon]]:
+    """ Get the **Vcon**s from the cache, those not cached from storage in one request """
+    vcons = [self._cached_vcon(vcon_uuid) for vcon_uuid in vcon_uuids]
+    missed = [index for index, a_vcon in enumerate(vcons) if a_vcon is None]
+    if(len(missed) > 0):
+      generation = self._generation
+      got_vcons = await self._storage.get_many([vcon_uuids[index] for index in missed])
+      for index, a_vcon in zip(missed, got_vcons):
+        if(a_vcon is not None):
+          self._add(vcon_uuids[index], a_vcon, generation)
+        vcons[index] = a_vcon
+
+    return(vcons)
+
+
+  async def set(self, save_vcon : typing.Union[vcon.Vcon, dict, str]) -> None:
+    """ Save the **Vcon** to storage and invalidate it in the caches """
+    vcon_uuid, save_vcon = self._uuid_and_vcon(save_vcon)
+    self.invalidate([vcon_uuid])
+    await self._storage.set(save_vcon)
+    self.invalidate([vcon_uuid])
+
+
+  async def set_if_revision(
+      self,
+      save_vcon : typing.Union[vcon.Vcon, dict, str],
+      revision : typing.Union[str, None]
+    ) -> str:
+    """ Save the **Vcon** to storage if at the given revision and invalidate it in the caches """
+    vcon_uuid, save_vcon = self._uuid_and_vcon(save_vcon)
+    self.invalidate([vcon_uuid])
+    saved_revision = await self._storage.set_if_revision(save_vcon, revision)
+    self.invalidate([vcon_uuid])
+
+    return(saved_revision)
+
+
+  async def get_revision(self, vcon_uuid : str) -> typing.Union[str, None]:
+    """ The revision is got from storage as it may have been saved by another server """
+    return(await self._storage.get_revision(vcon_uuid))
+
+
+  async def set_many(self, save_vcons : typing.List[typing.Union[vcon.Vcon, dict, str]]) -> None:
+    """ Save the **Vcon**s to storage and invalidate them in the caches """
+    uuids_vcons = [self._uuid_and_vcon(save_vcon) for save_vcon in save_vcons]
+    vcon_uuids = [vcon_uuid for vcon_uuid, save_vcon in uuids_vcons]
+    self.invalidate(vcon_uuids)
+    await self._storage.set_many([save_vcon for vcon_uuid, save_vcon in uuids_vcons])
+    self.invalidate(vcon_uuids)
+
+
+  async def update(self, save_vcon : vcon.Vcon) -> None:
+    """ Update the **Vcon** in storage and invalidate it in the caches """
+    self.invalidate([save_vcon.uuid])
+    await self._storage.update(save_vcon)
+    self.invalidate([save_vcon.uuid])
+
+
+  async def update_many(self, save_vcons : typing.List[vcon.Vcon]) -> None:
+    """ Update the **Vcon**s in storage and invalidate them in the caches """
+    vcon_uuids = [save_vcon.uuid for save_vcon in save_vcons]
+    self.invalidate(vcon_uuids)
+    await self._storage.update_many(save_vcons)
+    self.invalidate(vcon_uuids)
+
+
+  async def jq_query(
+      self,
+      vcon_uuid: str,
+      jq_query_string: str
+    ) -> typing.Union[dict, None]:
+    """ Get the jq query results for the (cached) **Vcon** """
+    a_vcon = await self.get(vcon_uuid)
+
+    return(a_vcon.jq(jq_query_string))
+
+
+  async def json_path_query(self, vcon_uuid : str, json_path_query_string : str) -> list:
+    """ JSON path queries are run by the storage DB """
+    return(await self._storage.json_path_query(vcon_uuid, json_path_query_string))
+
+
+  async def delete(self, vcon_uuid : str) -> None:
+    """ Delete the **Vcon** from storage and invalidate it in the caches """
+    self.invalidate([vcon_uuid])
+    await self._storage.delete(vcon_uuid)
+    self.invalidate([vcon_uuid])
+
+
+  async def delete_many(self, vcon_uuids : typing.List[str]) -> None:
+    """ Delete the **Vcon**s from storage and invalidate them in the caches """
+    self.invalidate(vcon_uuids)
+    await self._storage.delete_many(vcon_uuids)
+    self.invalidate(vcon_uuids)
@@ -7,10 +7,10 @@ import time
 import copy
 import traceback
 import asyncio
-import nest_asyncio
 import concurrent.futures
 import multiprocessing
 import multiprocessing.managers
+import multiprocessing.util
 import py_vcon_server.logging_utils
 import logging
 #import multiprocessing_logging
@@ -23,16 +23,33 @@ logger = py_vcon_server.logging_utils.init_logger(__name__)
 
 #multiprocessing_logging.install_mp_handler()
 # DO NOT COMMIT with VERBOSE
-VERBOSE = True
+VERBOSE = False
 
-# multiprocessing.managers.DictProxy does not seem to work nor
-# does logging with spawn
-#CONTEXT_METHOD = "spawn"
+# Spawn the scheduler and worker processes so that they do not inherit
+# the parent's (e.g. FastAPI's) event loop, signal handlers, file handles
+# or Redis connections.  Each process creates its own event loop
+# (see run_in_process_loop) and its own Redis connection pools when first used.
+CONTEXT_METHOD = "spawn"
 
+# The event loop of this scheduler or worker process
+PROCESS_LOOP: typing.Union[asyncio.AbstractEventLoop, None] = None
 
-CONTEXT_METHOD = None
-#CONTEXT_METHOD = "fork"
-#CONTEXT_METHOD = "forkserver"
+
+def run_in_process_loop(coro: typing.Coroutine) -> typing.Any:
+  """
+  Run the coroutine to completion in the event loop of this scheduler
+  or worker process.  The loop is created on first use and used for all
+  following jobs, so that connection pools bound to the loop may be
+  reused from job to job.  Must not be called from within a running loop.
+
+  Returns: the result of the coroutine
+  """
+  global PROCESS_LOOP
+  if(PROCESS_LOOP is None or PROCESS_LOOP.is_closed()):
+    PROCESS_LOOP = asyncio.new_event_loop()
+    asyncio.set_event_loop(PROCESS_LOOP)
+
+  return(PROCESS_LOOP.run_until_complete(coro))
 
 
 class JobSchedulerFailedToStart(Exception):
@@ -51,6 +68,39 @@ class JobInterface():
     #raise Exception("get_job not implemented")
 
 
+  async def get_jobs(self, max_jobs: int) -> typing.List[typing.Dict[str, typing.Any]]:
+    """
+    Get the definitions of up to **max_jobs** jobs to run, e.g. one for each idle worker.
+    Called in the context of the scheduler/dispatcher process.  The default
+    implementation calls **get_job** for each.
+
+    Returns: list of job definitions, empty if no jobs are available
+    """
+    jobs: typing.List[typing.Dict[str, typing.Any]] = []
+    while(len(jobs) < max_jobs):
+      job_def = await self.get_job()
+      if(job_def is None):
+        break
+      jobs.append(job_def)
+
+    return(jobs)
+
+
+  async def wait_for_jobs(self, timeout: float) -> bool:
+    """
+    Wait for new jobs to become available, after **get_jobs** returned none.
+    Called in the context of the scheduler/dispatcher process.  The default
+    implementation polls, it just sleeps a bit.
+
+    Parameters:
+      **timeout** (float) - maximum seconds to wait
+
+    Returns: True if new jobs may be available, False on timeout
+    """
+    await asyncio.sleep(min(timeout, 0.1))
+    return(False)
+
+
   @staticmethod
   async def do_job(
       job_definition: typing.Dict[str, typing.Any]
@@ -88,6 +138,14 @@ class JobInterface():
     pass
 
 
+  @staticmethod
+  async def worker_done() -> None:
+    """
+    Release the resources (e.g. DB connections) created by **do_job**.
+    Called in the context of each worker process, as it exits.
+    """
+
+
 class JobSchedulerManager():
   """ Top level interface and manager for job scheduler and worker pool """
 
@@ -106,7 +164,7 @@ class JobSchedulerManager():
       {
         "run": True
       })
-    self._run_list: multiprocessing.managers.ListProxy = multiprocessing.Manager().list([])
+    self._run_list: multiprocessing.managers.ListProxy = manager.list([])
 
   async def async_start(self) -> None:
     if(self._job_scheduler):
@@ -290,9 +348,7 @@ class JobScheduler():
       logger.info("start scheduler time: {}".format(start))
 
       if(asyncio.iscoroutinefunction(func)):
-        nest_asyncio.apply()
-        loop = asyncio.get_event_loop()
-        result = loop.run_until_complete(func(*args, **kwargs))
+        result = run_in_process_loop(func(*args, **kwargs))
       else:
         result = func(*args, **kwargs)
 
@@ -352,38 +408,29 @@ class JobScheduler():
     if(self._scheduler_task):
       raise Exception("scheduler task already looped")
 
+    logger.debug("creating worker pool")
+    job_worker_pool = JobWorkerPool(
+        self._num_workers,
+        self._run_states,
+        self._run_list,
+        self._job_state_updater.do_job,
+        self._job_state_updater
+      )
+    # Spawned worker processes take a while to import, do not schedule
+    # jobs which would wait on them.
+    await job_worker_pool.wait_for_init()
+
     logger.debug("getting do_scheduler coro")
     scheduler_coro = JobScheduler.do_scheduling(
         self._run_states,
         self._run_list,
         self._num_workers,
-        self._job_state_updater
+        self._job_state_updater,
+        job_worker_pool
       )
 
     logger.debug("creating async do_scheduler task")
-    loop = asyncio.get_event_loop()
-    loop.set_debug(True)
-    logging.getLogger("asyncio").setLevel(logging.DEBUG)
     self._scheduler_task = asyncio.create_task(scheduler_coro)
-    logger.debug("created async do_scheduler task too slow: {}".format(
-        loop.slow_callback_duration
-      ))
-
-    # logger.debug("start_async waiting for workers to initialize")
-    # worker_started = False
-    # while(self._run_states["run"] == True and not worker_started):
-    #   # wait until job process initialized
-    #   for key in self._run_states.keys():
-    #     logger.debug("run_states key: {}".format(key))
-    #     try:
-    #       if(isinstance(int(key), int) and self._run_states[key].get("type", None) == "worker"):
-    #         worker_started = True
-    #         logger.debug("start_async workers initialized")
-    #         break
-    #     except ValueError:
-    #       pass
-
-    #   await asyncio.sleep(1.0)
 
     logger.debug("start_async workers initialized, starting scheduling")
 
@@ -393,52 +440,54 @@ class JobScheduler():
       run_states,
       run_list,
       num_workers: int,
-      job_state_updater: JobInterface
+      job_state_updater: JobInterface,
+      job_worker_pool: typing.Union["JobWorkerPool", None] = None
     ) -> None:
-    """ Main function of scheduling run in scheduler process """
-    logger.debug("creating worker pool")
-    job_worker_pool = JobWorkerPool(
-        num_workers,
-        run_states,
-        run_list,
-        job_state_updater.do_job,
-        job_state_updater
-      )
-
-    # logger.debug("do_scheduler waiting for workers to initialize")
-    # worker_started = False
-    # while(run_states["run"] == True and not worker_started):
-    #   # wait until job process initialized
-    #   for key in run_states.keys():
-    #     logger.debug("run_states key: {}".format(key))
-    #     try:
-    #       if(isinstance(int(key), int) and run_states[key].get("type", None) == "worker"):
-    #         worker_started = True
-    #         logger.debug("do_scheduler workers initialized")
-    #         break
-    #     except ValueError:
-    #       pass
-
-    #   await asyncio.sleep(0.1)
+    """
+    Main function of scheduling run in scheduler process or task
 
-    # logger.debug("do_scheduler workers initialized, starting scheduling")
+    Parameters:
+      **job_worker_pool** (JobWorkerPool) - already started worker pool
+        (created and started here if None)
+    """
+    if(job_worker_pool is None):
+      logger.debug("creating worker pool")
+      job_worker_pool = JobWorkerPool(
+          num_workers,
+          run_states,
+          run_list,
+          job_state_updater.do_job,
+          job_state_updater
+        )
+      await job_worker_pool.wait_for_init()
+      logger.debug("do_scheduler workers initialized, starting scheduling")
 
     #job_futures = []
+    # check_jobs returns as soon as a job finishes or, if workers are idle, new
+    # jobs may be available (job_notice), so there is no need to wake up
+    # before that other than to check for shutdown.
     timeout = 1.0
+    job_notice: typing.Union[asyncio.Future, None] = None
     job_count = 0
+    scheduler_state = None
     while(run_states["run"] == True):
       try:
-        # Note: if there are no jobs running or completed, this does not yield
-        num_job_futures = await job_worker_pool.check_jobs(timeout)
+        num_job_futures = await job_worker_pool.check_jobs(timeout, job_notice)
+        # A completed notice would make check_jobs return immediately from
+        # here on, it is only replaced when workers are idle and no jobs are
+        # available.
+        if(job_notice is not None and job_notice.done()):
+          job_notice = None
         if(VERBOSE):
           logger.debug("num futures: {} run_states: {}".format(num_job_futures, run_states))
 
         new_started = 0
         while(num_job_futures < num_workers):
           if(VERBOSE):
-            logger.debug("getting a job")
-          job_def = await job_state_updater.get_job()
-          if(job_def):
+            logger.debug("getting jobs for {} idle workers".format(num_workers - num_job_futures))
+          # Get jobs for all of the idle workers at once
+          job_defs = await job_state_updater.get_jobs(num_workers - num_job_futures)
+          for job_def in job_defs:
             logger.debug("got a job")
             new_started += 1
             num_job_futures += 1
@@ -448,21 +497,26 @@ class JobScheduler():
             logger.info("job id: {} count: {} submitted".format(job_id, job_count))
 
           # No jobs available to schedule
-          else:
+          if(len(job_defs) == 0):
             if(VERBOSE):
               logger.debug("no jobs")
-            # yield to other tasks.  check_jobs does not yeild if 
-            # nothing is running
-            if(num_job_futures <= 0):
-              await asyncio.sleep(0.1)
+            # wait for jobs to be queued, along with running jobs to finish
+            if(job_notice is None):
+              job_notice = asyncio.ensure_future(job_state_updater.wait_for_jobs(timeout))
             break
 
-        run_states["scheduler"] = "started: {} new jobs in {} workers".format(new_started, num_workers)
+        # run_states is a Manager proxy, only update it when changed
+        new_state = "started: {} new jobs in {} workers".format(new_started, num_workers)
+        if(new_state != scheduler_state):
+          run_states["scheduler"] = new_state
+          scheduler_state = new_state
 
       except Exception as e:
         logger.error("do_scheduling caught exception: {}".format(e))
         raise e
 
+    if(job_notice is not None):
+      job_notice.cancel()
     run_states["scheduler"] = "done scheduling new jobs, waiting for shutdown"
     # Shutting down, wait for running jobs to complete
     #job_worker_pool.stop_unstarted()
@@ -471,7 +525,6 @@ class JobScheduler():
       num_job_futures = await job_worker_pool.check_jobs(timeout)
       if(num_job_futures == 0):
         break
-      await asyncio.sleep(0.1)
 
     job_worker_pool.wait_for_workers()
 
@@ -591,23 +644,57 @@ class JobWorkerPool():
     self._workers = concurrent.futures.ProcessPoolExecutor(
       max_workers = num_workers,
       initializer = JobWorkerPool.process_init,
-      initargs = (run_states, run_list),
+      initargs = (run_states, run_list, job_state_updater.worker_done),
       # so as to not inherit signal handlers and file handles from parent/FastAPI
       # use spawn:
       mp_context = multiprocessing.get_context(method = CONTEXT_METHOD))
       #max_tasks_per_child = 1)
     logger.debug("job worker executor created")
 
-    job_definition = {"job_id": None }
-    job_fut = self._workers.submit(
-        JobWorkerPool._job_exception_wrapper,
-        self._run_states,
-        JobWorkerPool._do_nothing,
-        job_definition
-      )
+    # With spawn, the executor only starts a new process when none are idle.
+    # Submit a do nothing job for each worker to start all of the workers now.
+    for worker_index in range(num_workers):
+      job_definition = {"job_id": None }
+      job_fut = self._workers.submit(
+          JobWorkerPool._job_exception_wrapper,
+          self._run_states,
+          JobWorkerPool._do_nothing,
+          job_definition
+        )
+
+      job_fut.job_data = job_definition
+      self._job_futures.append(job_fut)
+
+
+  async def wait_for_init(self, timeout: float = 60.0) -> int:
+    """
+    Wait for the worker processes to be spawned and initialized, so that the
+    first jobs are not delayed by the worker process startup.
+
+    Parameters:
+      **timeout** (float) - maximum seconds to wait
+
+    Returns: the number of initialized worker processes
+    """
+    give_up = time.time() + timeout
+    while(True):
+      num_initialized = 0
+      for process_info in self._run_states.values():
+        if(isinstance(process_info, dict) and
+          process_info.get("type", None) == "worker" and
+          process_info.get("init", None)):
+          num_initialized += 1
+
+      if(num_initialized >= self._num_workers or
+        not self._run_states["run"] or
+        time.time() > give_up):
+        logger.debug("{} of {} workers initialized".format(
+            num_initialized,
+            self._num_workers
+          ))
+        return(num_initialized)
 
-    job_fut.job_data = job_definition
-    self._job_futures.append(job_fut)
+      await asyncio.sleep(0.1)
 
 
   @staticmethod
@@ -644,16 +731,7 @@ class JobWorkerPool():
       logger.info("start job: {} time: {}".format(job_id, start))
 
       if(asyncio.iscoroutinefunction(func)):
-        nest_asyncio.apply()
-        loop = asyncio.get_event_loop()
-
-        result = loop.run_until_complete(func(*args, **kwargs))
-        # cannot run this before run_until_complete as loop is not started yet
-        try:
-          for task in asyncio.all_tasks():
-            logger.debug("running task in job process: {}".format(task))
-        except RuntimeError as e:
-          logger.debug("no loop in job process to get tasks")
+        result = run_in_process_loop(func(*args, **kwargs))
 
       else:
         result = func(*args, **kwargs)
@@ -696,14 +774,17 @@ class JobWorkerPool():
   @staticmethod
   def process_init(
       run_states: multiprocessing.managers.DictProxy,
-      run_list: multiprocessing.managers.ListProxy
+      run_list: multiprocessing.managers.ListProxy,
+      worker_done: typing.Callable[[], typing.Coroutine]
     ):
     """ Job process initialization function """
-    # DO NOT COMMIT THIS:
-    # make sure we don't get a DB from parent process
-    if(py_vcon_server.pipeline.VCON_STORAGE is not None):
-      logger.error("job process got VCON_STORAGE from parent")
-    py_vcon_server.pipeline.VCON_STORAGE = None
+    # Release the job resources in this process's loop as the process exits
+    multiprocessing.util.Finalize(
+        None,
+        JobWorkerPool._process_exit,
+        args = (worker_done,),
+        exitpriority = 10
+      )
 
     start = time.time()
     logger.debug("worker process initializing time: {}".format(start))
@@ -721,6 +802,22 @@ class JobWorkerPool():
     # logger.debug("worker process started")
 
 
+  @staticmethod
+  def _process_exit(
+      worker_done: typing.Callable[[], typing.Coroutine]
+    ) -> None:
+    """ Job process exit function """
+    try:
+      run_in_process_loop(worker_done())
+
+    except Exception as e:
+      logger.exception(e)
+
+    if(PROCESS_LOOP is not None):
+      PROCESS_LOOP.close()
+    logger.debug("worker process exiting pid: {}".format(os.getpid()))
+
+
   def run_job(self,
       job_definition: typing.Dict[str, typing.Any]
     ) -> None:
@@ -743,23 +840,57 @@ class JobWorkerPool():
 
   async def check_jobs(
       self,
-      timeout: float
+      timeout: float,
+      job_notice: typing.Union[asyncio.Future, None] = None
     ) -> int:
     """
-    Check for finished, canceled, or excepted jobs.
+    Wait, without blocking the event loop, until at least one job has
+    finished, been canceled or raised an exception, or until the timeout.
+    Update the job states of all of the jobs which are done.
+
+    Parameters:
+      **timeout** (float) - maximum seconds to wait for a job to be done
+      **job_notice** (asyncio.Future) - optional, also stop waiting when
+        this is done (e.g. new jobs may be available)
+
     Returns: count of in process jobs
     """
-    completed_states = concurrent.futures.wait(
-      self._job_futures,
+    if(len(self._job_futures) == 0):
+      if(job_notice is not None):
+        await asyncio.wait([job_notice], timeout = timeout)
+      return(0)
+
+    # The worker process futures are wrapped once, the first time they are
+    # checked, so that the event loop is woken up as soon as they are done.
+    for job_fut in self._job_futures:
+      if(getattr(job_fut, "job_waiter", None) is None):
+        job_fut.job_waiter = asyncio.wrap_future(job_fut)
+
+    waiters = [job_fut.job_waiter for job_fut in self._job_futures]
+    if(job_notice is not None):
+      waiters.append(job_notice)
+    await asyncio.wait(
+      waiters,
       timeout = timeout,
-      return_when = concurrent.futures.FIRST_COMPLETED)
+      return_when = asyncio.FIRST_COMPLETED)
+
+    done_jobs = []
+    not_done_jobs = []
+    for job_fut in self._job_futures:
+      if(job_fut.job_waiter.done()):
+        done_jobs.append(job_fut)
+        # The outcome is handled from the worker future below
+        if(not job_fut.job_waiter.cancelled()):
+          job_fut.job_waiter.exception()
+      else:
+        not_done_jobs.append(job_fut)
     if(VERBOSE):
       logger.debug("check_jobs completed: {} running: {}".format(
-        len(completed_states.done),
-        len(completed_states.not_done)
+        len(done_jobs),
+        len(not_done_jobs)
         ))
 
-    for done_job in completed_states.done:
+    for done_job in done_jobs:
       #print("job type: {} id: {}".format(type(done_job), done_job.job_data["id"]))
       job_data = done_job.job_data
       if(done_job.cancelled()):
@@ -863,8 +994,8 @@ class JobWorkerPool():
       else:
         logger.error("unknown job state ???: {} {}".format(job_data, done_job))
 
-    #print("running tasks: {}".format(completed_states.not_done))
-    self._job_futures = list(completed_states.not_done)
+    self._job_futures = [job_fut for job_fut in self._job_futures
+      if(job_fut not in done_jobs)]
 
     return(len(self._job_futures))
 
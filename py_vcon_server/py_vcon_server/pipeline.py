@@ -1,12 +1,13 @@
 # Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
 """ Vcon Pipeline processor objects and methods """
 import os
+import copy
 import typing
 import time
 import asyncio
-import json
 import pydantic
 import redis
+import vcon.json_codec
 import vcon.pydantic_utils
 import py_vcon_server.processor
 import py_vcon_server.job_worker_pool
@@ -19,6 +20,8 @@ logger = py_vcon_server.logging_utils.init_logger(__name__)
 
 PIPELINE_NAMES_KEY = "pipelines"
 PIPELINE_NAME_PREFIX = "pipeline:"
+PIPELINE_VERSION_KEY = "pipeline_version"
+PIPELINE_NOTICE_CHANNEL = "pipeline_changes"
 
 PIPELINE_DB = None
 VCON_STORAGE = None
@@ -126,7 +129,14 @@ class PipelineDefinition(pydantic.BaseModel):
 
 
 class PipelineDb():
-  """ DB interface for Pipeline objects """
+  """
+  DB interface for Pipeline objects
+
+  Once **start_cache** is called, **PipelineDefinition**s are cached in
+  this process.  Each change to a pipeline bumps the pipeline version
+  and is published, so that the cached copies in all processes are
+  dropped as soon as a pipeline is changed.
+  """
   def __init__(self, redis_url: str):
     logger.info("connecting PipelineDb redis_mgr pid: {}".format(os.getpid()))
     self._redis_mgr = py_vcon_server.db.redis.redis_mgr.RedisMgr(redis_url, "PipelineDB")
@@ -137,21 +147,24 @@ class PipelineDb():
 
     # Lua scripts
 
-    #keys = [ PIPELINE_NAMES_KEY, PIPELINE_NAME_PREFI + name ]
-    #args = [ name, pipeline ]
+    #keys = [ PIPELINE_NAMES_KEY, PIPELINE_NAME_PREFI + name, PIPELINE_VERSION_KEY ]
+    #args = [ name, pipeline, PIPELINE_NOTICE_CHANNEL ]
     lua_script_set_pipeline = """
     -- Add the pipeline name to the name list if its new
     if redis.call("SISMEMBER", KEYS[1], ARGV[1]) == 0 then
       local num_added = redis.call("SADD", KEYS[1],  ARGV[1])
       -- Don't care if the name already exists
     end
-    local ret = redis.call("JSON.SET", KEYS[2], "$", ARGV[2])
-    return(ret)
+    redis.call("JSON.SET", KEYS[2], "$", ARGV[2])
+    -- Tell the caches that the pipeline changed
+    local version = redis.call("INCR", KEYS[3])
+    redis.call("PUBLISH", ARGV[3], cjson.encode({name = ARGV[1], version = version}))
+    return(version)
     """
     self._do_lua_set_pipeline = redis_con.register_script(lua_script_set_pipeline)
 
-    #keys = [ PIPELINE_NAMES_KEY, PIPELINE_NAME_PREFIX + name ]
-    #args = [ name ]
+    #keys = [ PIPELINE_NAMES_KEY, PIPELINE_NAME_PREFIX + name, PIPELINE_VERSION_KEY ]
+    #args = [ name, PIPELINE_NOTICE_CHANNEL ]
     lua_script_delete_pipeline = """
     local ret = -2
     if redis.call("SISMEMBER", KEYS[1], ARGV[1]) == 1 then
@@ -163,10 +176,22 @@ class PipelineDb():
     end
     -- Always try to delete the pipeline even if its not in the list
     redis.call("DEL", KEYS[2])
-    return(ret)
+    -- Tell the caches that the pipeline changed
+    local version = redis.call("INCR", KEYS[3])
+    redis.call("PUBLISH", ARGV[2], cjson.encode({name = ARGV[1], version = version}))
+    return({ret, version})
     """
     self._do_lua_delete_pipeline = redis_con.register_script(lua_script_delete_pipeline)
 
+    # Pipeline cache, see start_cache
+    # name: (version, PipelineDefinition or None if not found)
+    self._pipelines: typing.Dict[str, typing.Tuple[int, typing.Union[PipelineDefinition, None]]] = {}
+    # highest pipeline version seen
+    self._version = 0
+    self._cache_task: typing.Union[asyncio.Task, None] = None
+    self._cached = False
+    self._hits = 0
+    self._misses = 0
 
 
   async def test(self):
@@ -188,6 +213,17 @@ class PipelineDb():
 
   async def shutdown(self):
     """ Shutdown the DB connection """
+    if(self._cache_task is not None):
+      self._cache_task.cancel()
+      try:
+        await self._cache_task
+
+      except asyncio.CancelledError:
+        pass
+      self._cache_task = None
+    self._cached = False
+    self._pipelines.clear()
+
     if(self._redis_mgr):
       logger.debug("shutting down PipelineDb redis_mgr")
       await self._redis_mgr.shutdown_pool()
@@ -195,6 +231,83 @@ class PipelineDb():
       logger.info("shutdown PipelineDb redis_mgr")
 
 
+  async def start_cache(self) -> None:
+    """
+    Start caching **PipelineDefinition**s in this process.  The cache is
+    only used while subscribed to the pipeline change notices.
+    """
+    if(self._cache_task is None):
+      self._cache_task = asyncio.create_task(self._subscribe_changes())
+
+
+  def cache_stats(self) -> typing.Dict[str, typing.Union[int, bool]]:
+    """
+    Get the pipeline cache statistics.
+
+    Returns:
+      dict containing **cached** (bool, cache in use), **hits**, **misses**,
+      **entries** and **version**
+    """
+    return({
+        "cached": self._cached,
+        "hits": self._hits,
+        "misses": self._misses,
+        "entries": len(self._pipelines),
+        "version": self._version
+      })
+
+
+  def _on_change(self, name: str, version: int) -> None:
+    """ Drop the cached copy of the changed pipeline """
+    self._pipelines.pop(name, None)
+    if(version > self._version):
+      self._version = version
+
+
+  def _on_change_notice(self, message: str) -> None:
+    """ Handle a pipeline change notice """
+    try:
+      change = vcon.json_codec.loads(message)
+      self._on_change(change["name"], int(change["version"]))
+
+    except Exception as e:
+      logger.warning("invalid pipeline change notice: {} {}".format(message, e))
+      self._pipelines.clear()
+
+
+  async def _subscribe_changes(self) -> None:
+    """ Listen for pipeline changes, until cancelled """
+    while(self._redis_mgr is not None):
+      pubsub = None
+      try:
+        redis_con = self._redis_mgr.get_client()
+        pubsub = redis_con.pubsub()
+        await pubsub.subscribe(PIPELINE_NOTICE_CHANNEL)
+        # Changes may have been missed while not subscribed
+        self._pipelines.clear()
+        self._version = max(self._version, int(await redis_con.get(PIPELINE_VERSION_KEY) or 0))
+        self._cached = True
+        async for message in pubsub.listen():
+          if(message.get("type", None) == "message"):
+            self._on_change_notice(message["data"])
+
+      except asyncio.CancelledError:
+        raise
+
+      except Exception as e:
+        logger.warning("pipeline change subscription failed: {}".format(e))
+        await asyncio.sleep(1.0)
+
+      finally:
+        self._cached = False
+        self._pipelines.clear()
+        if(pubsub is not None):
+          try:
+            await pubsub.reset()
+          except Exception:
+            pass
+
+
   async def get_pipeline_names(
       self,
     )-> typing.List[str]:
@@ -224,15 +337,17 @@ class PipelineDb():
     Returns: none
     """
     assert(isinstance(name, str))
-    keys = [ PIPELINE_NAMES_KEY, PIPELINE_NAME_PREFIX + name ]
+    keys = [ PIPELINE_NAMES_KEY, PIPELINE_NAME_PREFIX + name, PIPELINE_VERSION_KEY ]
     if(isinstance(pipeline, dict)):
-      args = [ name, json.dumps(pipeline) ]
+      args = [ name, vcon.json_codec.dumpb(pipeline), PIPELINE_NOTICE_CHANNEL ]
     else:
-      args = [ name, json.dumps(vcon.pydantic_utils.get_dict(pipeline, exclude_none=True)) ]
+      args = [ name, vcon.json_codec.dumpb(vcon.pydantic_utils.get_dict(pipeline, exclude_none=True)), PIPELINE_NOTICE_CHANNEL ]
 
     result = await self._do_lua_set_pipeline(keys = keys, args = args)
-    if(result != "OK"):
+    if(not isinstance(result, int)):
       raise Exception("set_pipeline {} Lua failed: {} pipeline: {}".format(name, result, pipeline))
+    # Don't wait for our own change notice
+    self._on_change(name, result)
 
 
   async def get_pipeline(
@@ -240,19 +355,51 @@ class PipelineDb():
       name: str
     )-> PipelineDefinition:
     """
-    Get the named **PipelineDefinition** from DB.
+    Get the named **PipelineDefinition** from the cache or DB.
 
     Parameters:
       **name**: str - name of the PipelineDefinition to retieve
 
     Returns: PipelineDefinition if found, 
              exception PipelineNotFound if name does not exist
+
+    The returned PipelineDefinition may be shared with other callers and
+    should not be modified.
+    """
+    cached = self._pipelines.get(name, None)
+    if(cached is not None):
+      self._hits += 1
+      if(cached[1] is None):
+        raise PipelineNotFound("Pipeline {} not found".format(name))
+      return(cached[1])
+
+    self._misses += 1
+    version, pipe_def = await self._load_pipeline(name)
+    # Don't cache if the pipeline may have changed while loading it
+    if(self._cached and version >= self._version):
+      self._pipelines[name] = (version, pipe_def)
+
+    if(pipe_def is None):
+      raise PipelineNotFound("Pipeline {} not found".format(name))
+    return(pipe_def)
+
+
+  async def _load_pipeline(
+      self,
+      name: str
+    )-> typing.Tuple[int, typing.Union[PipelineDefinition, None]]:
+    """
+    Get the named **PipelineDefinition** and the pipeline version from the DB.
+
+    Returns: (version, PipelineDefinition or None if name does not exist)
     """
     redis_con = self._redis_mgr.get_client()
+    # Version read first, so that the pipeline is at least this new
+    version = int(await redis_con.get(PIPELINE_VERSION_KEY) or 0)
     if(VERBOSE):
       logger.debug("getting pipeline: {} redis con: {} pid: {}".format(name, redis_con, os.getpid()))
     try:
-      pipeline_dict = await redis_con.json().get(PIPELINE_NAME_PREFIX + name, "$")
+      pipeline_dict = await py_vcon_server.db.redis.redis_mgr.json_commands(redis_con).get(PIPELINE_NAME_PREFIX + name, "$")
       if(VERBOSE):
         logger.debug("returned from getting pipeline: {}".format(name))
     except Exception as e:
@@ -262,14 +409,14 @@ class PipelineDb():
     if(pipeline_dict is None):
       if(VERBOSE):
         logger.debug("pipeline: {} not found".format(name))
-      raise PipelineNotFound("Pipeline {} not found".format(name))
+      return(version, None)
 
     if(len(pipeline_dict) != 1):
       logger.debug("pipeline get({}) error: {}".format(name, pipeline_dict))
       raise PipelineInvalid("Pipeline {} got: {}".format(name, pipeline_dict))
 
     logger.debug("got pipeline: {}".format(name))
-    return(PipelineDefinition(**pipeline_dict[0]))
+    return(version, PipelineDefinition(**pipeline_dict[0]))
 
 
   async def delete_pipeline(
@@ -286,9 +433,11 @@ class PipelineDb():
              exception PipelineNotFound if name does not exist
     """
     assert(isinstance(name, str))
-    keys = [ PIPELINE_NAMES_KEY, PIPELINE_NAME_PREFIX + name ]
-    args = [ name ]
-    result = await self._do_lua_delete_pipeline(keys = keys, args = args)
+    keys = [ PIPELINE_NAMES_KEY, PIPELINE_NAME_PREFIX + name, PIPELINE_VERSION_KEY ]
+    args = [ name, PIPELINE_NOTICE_CHANNEL ]
+    result, version = await self._do_lua_delete_pipeline(keys = keys, args = args)
+    # Don't wait for our own change notice
+    self._on_change(name, version)
     if(result == -1):
       raise PipelineNotFound("delete of Pipeline: {} not found".format(name))
 
@@ -413,7 +562,9 @@ class PipelineRunner():
             await next_proc_input.get_vcon(vcon_index, py_vcon_server.processor.VconTypes.UUID),
             vcon_index
           ))
-        next_proc_input = await processor.process(next_proc_input, processor_type_options)
+        # Processors which do not modify vCons share the vCon forms rather than getting copies
+        with next_proc_input.readonly_access(not processor.may_modify_vcons()):
+          next_proc_input = await processor.process(next_proc_input, processor_type_options)
 
       else:
         logger.debug("Skipping pipeline {} processor: {} on vCon: {} (index: {})".format(
@@ -462,6 +613,7 @@ class PipelineJobHandler(py_vcon_server.job_worker_pool.JobInterface):
     if(self._job_queue == None):
       logger.debug("initialising Queue DB: {} pid: {}".format(self._job_queue_db_url, os.getpid()))
       self._job_queue = py_vcon_server.queue.JobQueue(self._job_queue_db_url)
+      await self._job_queue.start_job_notices()
       try:
         logger.debug("getting queue list pid: {}".format(os.getpid()))
         #remote_pdb.set_trace()
@@ -474,6 +626,7 @@ class PipelineJobHandler(py_vcon_server.job_worker_pool.JobInterface):
     if(self._pipeline_db == None):
       logger.debug("initialising Pipeline DB: {}".format(self._pipeline_db_url))
       self._pipeline_db = py_vcon_server.pipeline.PipelineDb(self._pipeline_db_url)
+      await self._pipeline_db.start_cache()
       logger.debug("initialed Pipeline DB")
       # test/debug junk for python multiprocessing, asycnio, redis interaction problem
       # Multiprocessing is currently disabled
@@ -526,6 +679,12 @@ class PipelineJobHandler(py_vcon_server.job_worker_pool.JobInterface):
       self._pipeline_db = None
       await pipeline_db.shutdown()
 
+    await PipelineJobHandler.worker_done()
+
+
+  @staticmethod
+  async def worker_done() -> None:
+    """ Release the DBs created by **do_job** in this worker process. """
     global VCON_STORAGE
     if(VCON_STORAGE):
       logger.debug("shutting down PipelineJobHandler in done VconStorage")
@@ -541,12 +700,47 @@ class PipelineJobHandler(py_vcon_server.job_worker_pool.JobInterface):
       await jq.shutdown()
 
 
+  async def wait_for_jobs(self, timeout: float) -> bool:
+    """
+    Wait until a job is pushed to one of this server's queues, rather than
+    polling the queues.  Called in the context of the scheduler/dispatcher process.
+
+    Parameters:
+      **timeout** (float) - maximum seconds to wait
+
+    Returns: True if a job was pushed, False on timeout
+    """
+    await self._init_databases()
+    return(await self._job_queue.wait_for_job_notice(timeout))
+
+
   async def get_job(self) -> typing.Union[typing.Dict[str, typing.Any], None]:
     """ Get the definition of the next job to run. Called in the context of the scheduler/dispatcher process. """
+    jobs = await self.get_jobs(1)
+    if(len(jobs) == 0):
+      return(None)
+
+    return(jobs[0])
+
+
+  async def get_jobs(self, max_jobs: int) -> typing.List[typing.Dict[str, typing.Any]]:
+    """
+    Get the definitions of up to **max_jobs** jobs to run, e.g. one for each idle worker.
+    Called in the context of the scheduler/dispatcher process.
+
+    The server's queues are checked no more than once through the weighted
+    queue cycle.  Consecutive turns of the same queue in the cycle are
+    dequeued together with one **JobQueue.pop_queued_jobs** call.
+
+    Parameters:
+      **max_jobs** (int) - maximum number of jobs to get
+
+    Returns: list of job definitions, empty if no jobs are available
+    """
     jobs_locks_not_available: list = []
     #  init DBs in scheduler context
     await self._init_databases()
-    job: typing.Union[typing.Dict[str, typing.Any], None] = None
+    jobs: typing.List[typing.Dict[str, typing.Any]] = []
 
     # Check for updates to server queue config every self._queue_check_time seconds
     now = time.time()
@@ -560,28 +754,20 @@ class PipelineJobHandler(py_vcon_server.job_worker_pool.JobInterface):
     if(VERBOSE):
       logger.debug("got job queue cycle count: {}".format(queue_cycle_count))
     queues_checked = 0
+    # Jobs pushed from here on wake up wait_for_jobs
+    self._job_queue.clear_job_notice(self._queue_iterator.get_queue_names())
 
     # loop no more than once through the queue cycle before giving up and not getting a job
-    while(queues_checked < queue_cycle_count):
-      # get server's next queue from list (considering weights)
-      queues_checked += 1
-      queue_name = self._queue_iterator.get_next_queue()
+    while(queues_checked < queue_cycle_count and len(jobs) < max_jobs):
+      # get server's next queue from list (considering weights) and
+      # the number of turns in a row to take jobs from it.
+      queue_name, queue_turns = self._queue_iterator.get_next_queue_run(max_jobs - len(jobs))
+      queues_checked += queue_turns
       if(VERBOSE):
-        logger.debug("attempting schedule queue: {}".format(queue_name))
-      # TODO: we can do some optimization here and skip repeated weighted queues
-      # i.e. those with weight greter than 1 will be repeated, if we just checked
-      # the queue and it was empty, no sense in getting pipeline def and checking
-      # queue multiple times in a row.
+        logger.debug("attempting schedule queue: {} turns: {}".format(queue_name, queue_turns))
 
       # Get the pipeline definition
       try:
-        # seem to hang in redis here, trying to yeild first
-        #logger.debug("yeilding before getting pipeline def")
-        #await asyncio.sleep(0)
-        # The following was part of debuging multiprocessing, asyncio, redis problem
-        # see what else is running
-        # for task in asyncio.all_tasks():
-        #   logger.debug("running task: {}".format(task))
         if(VERBOSE):
           logger.debug("getting pipeline def")
         pipe_def = await self._pipeline_db.get_pipeline(queue_name)
@@ -601,25 +787,14 @@ class PipelineJobHandler(py_vcon_server.job_worker_pool.JobInterface):
         logger.debug("get_pipeline exception: {}".format(e))
         raise e
 
-      # Get job from queue and mark it as in process
+      # Get jobs from queue and mark them as in process
       try:
-        logger.debug("getting job for queue: {}".format(queue_name))
-        # try yeilding to avoid getting stuck in redis
-        await asyncio.sleep(0)
-        job = await self._job_queue.pop_queued_job(
+        logger.debug("getting up to {} jobs for queue: {}".format(queue_turns, queue_name))
+        queue_jobs = await self._job_queue.pop_queued_jobs(
             queue_name,
-            self._server_key
+            self._server_key,
+            queue_turns
           )
-        if(job is None):
-          logger.error("pop_queued_job is not supposed to return None, should have thrown exception")
-          continue
-
-      except py_vcon_server.queue.EmptyJobQueue:
-        # No jobs in queue, go to next queue
-        # TODO: This will be too noisy, disable it after debugging
-        if(VERBOSE):
-          logger.debug("queue: {} is emtpy".format(queue_name))
-        continue
 
       except py_vcon_server.queue.QueueDoesNotExist:
         # TODO: throttle down the logging of repeated messages or create
@@ -628,53 +803,67 @@ class PipelineJobHandler(py_vcon_server.job_worker_pool.JobInterface):
           logger.warning("queue: {} does not exist".format(queue_name))
         continue
 
-      # the job is already labeled with the queue to which it belongs
-      # so on need to set job["queue"] = queue_name
-
-      logger.debug("got job from queue: {} job: {}".format(queue_name, job))
-
-      # Add pipeline def to job
-      job["pipeline"] = vcon.pydantic_utils.get_dict(pipe_def, exclude_none=True)
+      if(len(queue_jobs) == 0):
+        # No jobs in queue, go to next queue
+        if(VERBOSE):
+          logger.debug("queue: {} is emtpy".format(queue_name))
+        continue
 
-      # Get locks if pipeline needs them
-      if(pipe_def.pipeline_options.save_vcons):
-        locks: typing.List[str] = []
-        queue_job = job["job"]
-        job_type = queue_job.get("job_type", None)
-        if(job_type == "vcon_uuid"):
-          for vcon_uuid in job.get("vcon_uuid", []):
-            lock = "None"
-            if(lock):
-              locks.append(lock)
-            else:
-              # If cannot get all locks
-              #TODO: release locks that were taken
-              for lock in locks:
-                pass
-              logger.info("lock not available for vCon: {} job: {}".format(
-                  vcon_uuid,
-                  job["id"]
-                ))
-              jobs_locks_not_available.append(job)
+      pipeline_dict = vcon.pydantic_utils.get_dict(pipe_def, exclude_none=True)
+      for job in queue_jobs:
+        # the job is already labeled with the queue to which it belongs
+        # so on need to set job["queue"] = queue_name
+
+        logger.debug("got job from queue: {} job: {}".format(queue_name, job))
+
+        # Add pipeline def to job
+        job["pipeline"] = copy.deepcopy(pipeline_dict)
+
+        # Get locks if pipeline needs them
+        if(pipe_def.pipeline_options.save_vcons):
+          locks: typing.List[str] = []
+          queue_job = job["job"]
+          job_type = queue_job.get("job_type", None)
+          if(job_type == "vcon_uuid"):
+            all_locked = True
+            for vcon_uuid in job.get("vcon_uuid", []):
+              lock = "None"
+              if(lock):
+                locks.append(lock)
+              else:
+                # If cannot get all locks
+                #TODO: release locks that were taken
+                for lock in locks:
+                  pass
+                logger.info("lock not available for vCon: {} job: {}".format(
+                    vcon_uuid,
+                    job["id"]
+                  ))
+                jobs_locks_not_available.append(job)
+                all_locked = False
+                break
+
+            if(not all_locked):
               # skip to next queue job
-              break
+              continue
 
-          # Add the locks to the job
-          job["locks"] = locks
+            # Add the locks to the job
+            job["locks"] = locks
 
-          # Successfuly got a job and locked its vCons
-          logger.debug("got job: {} and locked its vCons".format(job["id"]))
-          break
+            # Successfuly got a job and locked its vCons
+            logger.debug("got job: {} and locked its vCons".format(job["id"]))
+
+          else:
+            logger.error("unsupported job_type: {} not queued in failure queue: {}".format(
+                job_type,
+                pipe_def.pipeline_options.failure_queue
+              ))
+            continue
 
         else:
-          logger.error("unsupported job_type: {} not queued in failure queue: {}".format(
-              job_type,
-              pipe_def.pipeline_options.get("failure_queue", None)
-            ))
-          continue
+          logger.debug("read only vCon for job: {}, no locks needed".format(job["id"]))
 
-      else:
-        logger.debug("read only vCon for job: {}, no locks needed".format(job["id"]))
+        jobs.append(job)
 
 
     # Put jobs which were not lockable back in the queue
@@ -685,7 +874,7 @@ class PipelineJobHandler(py_vcon_server.job_worker_pool.JobInterface):
       #TODO move from inprocess back to queue
       await self._job_queue.requeue_in_progress_job(unlockable["id"])
 
-    return(job)
+    return(jobs)
 
 
   @staticmethod
@@ -760,8 +949,8 @@ class PipelineJobHandler(py_vcon_server.job_worker_pool.JobInterface):
           pipeline_output.get_queue_job_count() > 0
         ):
         logger.info("instantiating JobQueue in PipelineJobHandler.do_job")
-        VCON_STORAGE = py_vcon_server.queue.JobQueue.instantiate(
-            py_vcon_server.settings.JOB_QUEUE_URL
+        JOB_QUEUE = py_vcon_server.queue.JobQueue(
+            py_vcon_server.settings.QUEUE_DB_URL
           )
 
       # Commit jobs to be queued.
@@ -8,6 +8,7 @@ import time
 import datetime
 import asyncio
 import importlib
+import contextlib
 import pydantic
 #from py_vcon_server.db import VconStorage
 import py_vcon_server.logging_utils
@@ -67,13 +68,26 @@ class VconTypes(enum.Enum):
   OBJECT = 4
 
 class MultifariousVcon():
-  """ Container object for various forms of vCon and cashing of the different forms """
+  """
+  Container object for various forms of vCon and cashing of the different forms
+
+  The cached forms are shared copy-on-write.  Readers (**get_vcon** with
+  readonly = True) get the cached form itself, without a copy.  A copy of the
+  object or dict form is only made for a caller that may modify it.  The copy
+  is private to the caller until given back with **update_vcon**, which
+  replaces all of the cached forms (i.e. marks them dirty) so that the other
+  forms get rebuilt from the modified one when next asked for.
+  """
   def __init__(
       self,
       vcon_storage #: VconStorage
     ):
     self._vcon_forms: typing.Dict[str, typing.Any] = {}
     self._vcon_storage = vcon_storage
+    # number of copies made of the object and dict forms for callers that may modify them
+    self.copies = 0
+    # number of times the cached forms were replaced (dirtied) via update_vcon
+    self.updates = 0
 
 
   def update_vcon(self,
@@ -85,12 +99,17 @@ class MultifariousVcon():
     ) -> None:
     """
     Updated the vCon in this MultifariousVcon (not vCon Storage)
+
+    The given forms are cached as is (not copied) and shared with readers.
+    The caller MUST NOT modify them after this call.
     """
     vcon_type = self.get_vcon_type(new_vcon)
     if(vcon_type == VconTypes.UNKNOWN):
       raise Exception("Unknown/unsupported vcon type: {} for new_vcon".format(type(new_vcon)))
 
     # Clear the cache of all forms of the Vcon
+    if(len(self._vcon_forms) > 0):
+      self.updates += 1
     self._vcon_forms = {}
     self._vcon_forms[vcon_type] = new_vcon
 
@@ -115,20 +134,40 @@ class MultifariousVcon():
 
       # String JSON, don't parse to get UUID, wait until we need to
 
+
+  def _copy_on_write(self,
+    vcon_form: typing.Union[str, dict, vcon.Vcon, None],
+    readonly: bool
+    ) -> typing.Union[str, dict, vcon.Vcon, None]:
+    """ Copy the shared object or dict form for a caller that may modify it """
+    if(readonly or not isinstance(vcon_form, (dict, vcon.Vcon))):
+      return(vcon_form)
+
+    self.copies += 1
+    return(copy.deepcopy(vcon_form))
+
+
   async def get_vcon(self,
-    vcon_type: VconTypes
+    vcon_type: VconTypes,
+    readonly: bool = False
     ) -> typing.Union[str, dict, vcon.Vcon, None]:
     """
     Get, retrieve or construct the vCon in the form requested.
-    Object and dict forms are deepcopied.
     update_vcon must be used to make changes otherwise the different forms can get out of sync,
+
+    Parameters:
+      **vcon_type** (VconTypes) - the form of the vCon to get
+      **readonly** (bool) - if True, the cached object or dict form is returned
+        as is, shared with other readers, and MUST NOT be modified.  If False
+        (default), the object and dict forms are deep copied for the caller.
+
+    Returns:
+      the vCon in the requested form or None if not available
     """
     # First check if we have it in the form we want
     got_vcon = self._vcon_forms.get(vcon_type, None)
     if(got_vcon is not None):
-      if(vcon_type in (VconTypes.DICT, VconTypes.OBJECT)):
-        got_vcon = copy.deepcopy(got_vcon)
-      return(got_vcon)
+      return(self._copy_on_write(got_vcon, readonly))
 
     # Clean out any Nones
     #logger.debug("keys: {}".format(self._vcon_forms.keys()))
@@ -150,7 +189,7 @@ class MultifariousVcon():
         self._vcon_forms[VconTypes.OBJECT] = vcon_object
 
       if(vcon_type == VconTypes.OBJECT):
-        return(copy.deepcopy(vcon_object))
+        return(self._copy_on_write(vcon_object, readonly))
 
     if(vcon_type == VconTypes.UUID):
       uuid = None
@@ -194,17 +233,18 @@ class MultifariousVcon():
       if(vcon_object is not None):
         self._vcon_forms[VconTypes.OBJECT] = vcon_object
 
-      return(copy.deepcopy(vcon_object))
+      return(self._copy_on_write(vcon_object, readonly))
 
     if(vcon_type == VconTypes.DICT):
       vcon_dict = None
+      # The dict is shared with the cached object, readers do not need a copy
       if(VconTypes.OBJECT in forms):
-        vcon_dict = self._vcon_forms[VconTypes.OBJECT].dumpd()
+        vcon_dict = self._vcon_forms[VconTypes.OBJECT].dumpd(True, False)
 
       elif(VconTypes.JSON in forms):
         vcon_dict = None
         vcon_object = None
-        vcon_json = copy.deepcopy(self._vcon_forms[VconTypes.JSON])
+        vcon_json = self._vcon_forms[VconTypes.JSON]
         if(vcon_json is not None):
           vcon_object = vcon.Vcon()
           vcon_object.loads(vcon_json)
@@ -213,13 +253,13 @@ class MultifariousVcon():
         if(vcon_object is not None):
           self._vcon_forms[VconTypes.OBJECT] = vcon_object
 
-          vcon_dict = vcon_object.dumpd()
+          vcon_dict = vcon_object.dumpd(True, False)
 
       # Cache the dict
       if(vcon_dict is not None):
         self._vcon_forms[VconTypes.DICT] = vcon_dict
 
-      return(vcon_dict)
+      return(self._copy_on_write(vcon_dict, readonly))
 
     if(vcon_type == VconTypes.JSON):
       vcon_json = None
@@ -228,10 +268,10 @@ class MultifariousVcon():
 
       elif(VconTypes.DICT in forms):
         vcon_object = None
-        vcon_dict = copy.deepcopy(self._vcon_forms[VconTypes.DICT])
-        if(vcon_dict is not None):
+        if(self._vcon_forms[VconTypes.DICT] is not None):
           vcon_object = vcon.Vcon()
-          vcon_object.loadd(vcon_dict)
+          # loadd copies the cached dict
+          vcon_object.loadd(self._vcon_forms[VconTypes.DICT])
 
         # Cache the object
         if(vcon_object is not None):
@@ -248,6 +288,17 @@ class MultifariousVcon():
     return(None)
 
 
+  def get_cached_object(self) -> typing.Union[vcon.Vcon, None]:
+    """
+    Get the object form of the vCon if it has already been constructed,
+    without constructing it from the other forms.  The object is shared,
+    not copied, and MUST NOT be modified.
+
+    Returns: the cached **Vcon** object or None if not constructed
+    """
+    return(self._vcon_forms.get(VconTypes.OBJECT, None))
+
+
   @staticmethod
   def get_vcon_type(a_vcon: typing.Union[str, dict, vcon.Vcon]):
     """
@@ -475,6 +526,74 @@ class VconEncryptedObject(pydantic.BaseModel, **vcon.pydantic_utils.SET_ALLOW):
     )
 
 
+def vcon_object_type(vcon_dict: dict) -> typing.Type[pydantic.BaseModel]:
+  """
+  Get the model for the form of the vCon dict from its discriminating keys,
+  rather than trying each model of the union in turn.
+
+  Returns: **VconEncryptedObject** if ciphertext or recipients are present,
+    **VconSignedObject** if payload or signatures are present,
+    otherwise **VconUnsignedObject**
+  """
+  if("ciphertext" in vcon_dict or "recipients" in vcon_dict):
+    return(VconEncryptedObject)
+
+  if("payload" in vcon_dict or "signatures" in vcon_dict):
+    return(VconSignedObject)
+
+  return(VconUnsignedObject)
+
+
+def remove_none_values(value: typing.Any) -> None:
+  """
+  Remove the parameters with null (None) values from the dicts in the value,
+  in place, as is done for models dumped with exclude_none.  None elements
+  of lists are kept.
+  """
+  if(isinstance(value, dict)):
+    for key in [key for key, element in value.items() if element is None]:
+      del value[key]
+    for element in value.values():
+      remove_none_values(element)
+
+  elif(isinstance(value, list)):
+    for element in value:
+      remove_none_values(element)
+
+
+def validate_vcon_dict(vcon_dict: typing.Any) -> dict:
+  """
+  Validate the vCon dict (e.g. parsed from a request body) using the
+  validator compiled for the model of its form (see **vcon_object_type**).
+  The dict is validated in place, rather than converted to and from a model,
+  so that it is only parsed once.  Parameters with null values are removed
+  (see **remove_none_values**).  Missing vcon version and created_at are
+  set to their defaults in unsigned vCons, as in **VconUnsignedObject**.
+
+  Parameters:
+    **vcon_dict** (Any) - vCon in unsigned, signed or encrypted form
+
+  Raises: **vcon.pydantic_utils.ValidationErrorType** if not valid
+
+  Returns: the given vCon dict
+  """
+  if(not isinstance(vcon_dict, dict)):
+    # let the model report the error
+    vcon.pydantic_utils.validate_construct(VconUnsignedObject, vcon_dict)
+
+  object_type = vcon_object_type(vcon_dict)
+  validated = vcon.pydantic_utils.validate_construct(object_type, vcon_dict)
+  remove_none_values(vcon_dict)
+
+  if(object_type is VconUnsignedObject):
+    if("vcon" not in vcon_dict and validated.vcon is not None):
+      vcon_dict["vcon"] = validated.vcon
+    if("created_at" not in vcon_dict and validated.created_at is not None):
+      vcon_dict["created_at"] = validated.created_at
+
+  return(vcon_dict)
+
+
 class VconProcessorInitOptions(pydantic.BaseModel):
   """
   Base class to options passed to initalize a **VconProcessor**
@@ -569,6 +688,28 @@ class VconProcessorIO():
     self._parameters: typing.Dict[str, typing.Any] = {}
     self._jobs_to_queue: typing.List[typing.Dict[str, any]] = []
     self._vcon_storage = vcon_storage
+    # Set while a VconProcessor, which has a policy that it does not modify vCons, is processing
+    self._readonly_access = False
+
+
+  @contextlib.contextmanager
+  def readonly_access(self, readonly: bool) -> typing.Iterator[None]:
+    """
+    Context in which the **Vcon**s are got readonly by default (see **get_vcon**),
+    e.g. while processed by a **VconProcessor** which has the policy that it does
+    not modify **Vcon**s.  The prior readonly access is restored on exit.
+
+    Parameters:
+      **readonly** (bool) - if True, **get_vcon** shares rather than copies the
+        object and dict forms, unless readonly is given
+    """
+    prior_readonly = self._readonly_access
+    self._readonly_access = readonly
+    try:
+      yield
+
+    finally:
+      self._readonly_access = prior_readonly
 
 
   def is_vcon_modified(self,
@@ -594,16 +735,30 @@ class VconProcessorIO():
 
   async def get_vcon(self,
     index: int = 0,
-    vcon_type: VconTypes = VconTypes.OBJECT
+    vcon_type: VconTypes = VconTypes.OBJECT,
+    readonly: typing.Union[bool, None] = None
     ) -> typing.Union[str, dict, vcon.Vcon, None]:
-    """ Get the Vcon at index in the form indicated by vcon_type """
+    """
+    Get the Vcon at index in the form indicated by vcon_type
+
+    Parameters:
+      **index** (int) - index of the Vcon in this **VconProcessorIO**
+      **vcon_type** (VconTypes) - the form of the Vcon to get
+      **readonly** (bool) - if True, the object or dict form is shared, not
+        copied, and MUST NOT be modified (see **MultifariousVcon.get_vcon**).
+        If None (default), the Vcon is readonly while being processed by a
+        **VconProcessor** which has the policy that it does not modify **Vcon**s
+        in a **Pipeline**.
+    """
 
     if(index >= len(self._vcons)):
       raise VconNotFound("index: {} is beyond the end of the Vcon array of length: {}".format(
         index,
         len(self._vcons)))
 
-    vCon = await self._vcons[index].get_vcon(vcon_type)
+    if(readonly is None):
+      readonly = self._readonly_access
+    vCon = await self._vcons[index].get_vcon(vcon_type, readonly)
     if(vCon is None):
       raise VconNotFound("Vcon type: {} at index: {} in Vcon array of length: {} not found".format(
         vcon_type,
@@ -695,7 +850,13 @@ class VconProcessorIO():
             uuid,
             index))
 
-        self._vcons[index] = mVcon
+        # Replace the forms in the existing MultifariousVcon, keeping any
+        # forms constructed in getting the UUID
+        vCon.update_vcon(
+            modified_vcon,
+            vcon_uuid = uuid,
+            vcon_object = mVcon.get_cached_object()
+          )
         self._vcon_update[index] = True
         return(index)
 
@@ -2,7 +2,7 @@
 
 import typing
 import pydantic
-import pyjq
+import vcon.jq_cache
 import vcon.pydantic_utils
 import py_vcon_server.processor
 
@@ -70,7 +70,8 @@ class JQProcessor(py_vcon_server.processor.VconProcessor):
     # Add dict form of vCons
     for mVcon in processor_input._vcons:
       # Need to use the object form so that we can get verified or locally signed dict form
-      a_vcon = await mVcon.get_vcon(py_vcon_server.processor.VconTypes.OBJECT)
+      # Only reading, no need for a copy
+      a_vcon = await mVcon.get_vcon(py_vcon_server.processor.VconTypes.OBJECT, True)
       logger.debug("jq processor adding vcon state={}".format(a_vcon._state))
       dict_to_query["vcons"].append(a_vcon.dumpd(signed = False, deepcopy = False))
 
@@ -83,7 +84,7 @@ class JQProcessor(py_vcon_server.processor.VconProcessor):
           options.jq_queries[parameter_name]
         ))
 
-      query_result = pyjq.all(options.jq_queries[parameter_name],
+      query_result = vcon.jq_cache.query_all(options.jq_queries[parameter_name],
         dict_to_query)[0]
       logger.debug("setting parameter: {} to {}".format(
           parameter_name,
@@ -2,7 +2,6 @@
 
 import typing
 import pydantic
-import pyjq
 import vcon.filter_plugins.impl.jq_redaction
 import vcon.filter_plugins.impl.redact_pii
 import py_vcon_server.processor
@@ -8,11 +8,16 @@
    "queues" hash of names of queues
    "queue:<queue_name" list of jobs
    "inprogress" hash of job ids for in progress jobs
+
+   Pub/sub channels:
+
+   "queue_jobs" the name of a queue is published when a job is pushed
+     to it, waking up idle servers waiting on the queue
 """
 import asyncio
 import typing
 import copy
-import json
+import vcon.json_codec
 import py_vcon_server.db.redis.redis_mgr
 import py_vcon_server.logging_utils
 
@@ -22,6 +27,7 @@ JOB_ID_KEY = "jobid"
 QUEUE_NAMES_KEY = "queues"
 IN_PROGRESS_JOBS_KEY = "inprogress"
 QUEUE_NAME_PREFIX = "queue:"
+JOB_NOTICE_CHANNEL = "queue_jobs"
 
 JOB_QUEUE = None
 
@@ -85,11 +91,13 @@ class JobQueue():
     self._do_lua_delete_queue = redis_con.register_script(lua_script_delete_queue)
 
     # KEYS = [ QUEUE_NAMES_KEY, QUEUE_NAME_PREFIX + name]
-    # ARGV = [ name, vcon_uuids]
+    # ARGV = [ name, vcon_uuids, JOB_NOTICE_CHANNEL ]
     lua_script_push_vcon_uuid_queue_job = """
     if redis.call("SISMEMBER", KEYS[1], ARGV[1]) == 1 then
       -- add job to end of list
       local num_jobs = redis.call("RPUSH", KEYS[2], ARGV[2])
+      -- wake up servers waiting for jobs on this queue
+      redis.call("PUBLISH", ARGV[3], ARGV[1])
       return num_jobs
     else
       -- error queue does not exist
@@ -146,8 +154,51 @@ class JobQueue():
     """
     self._do_lua_pop_queued_job = redis_con.register_script(lua_script_pop_queued_job)
 
+    # KEYS = [ QUEUE_NAMES_KEY, QUEUE_NAME_PREFIX + name, JOB_ID_KEY, IN_PROGRESS_JOBS_KEY ]
+    # ARGS = [ name, server_key, max_jobs ]
+    lua_script_pop_queued_jobs = """
+    -- if the queue exists
+    if redis.call("SISMEMBER", KEYS[1], ARGV[1]) == 1 then
+      local queue_jobs = redis.call("LPOP", KEYS[2], ARGV[3])
+      if not queue_jobs then
+        return {}
+      end
+
+      -- reserve the job ids for all of the jobs
+      local last_job_id = redis.call("INCRBY", KEYS[3], #queue_jobs)
+      local time = redis.call("TIME")
+      local dequeued = time[1] .. "." .. time[2]
+      local in_progress_jobs = {}
+      local in_progress_fields = {}
+      for index, queue_job in ipairs(queue_jobs) do
+        local new_job_id = tostring(last_job_id - #queue_jobs + index)
+
+        -- build an in progress object
+        local in_progress_job = {}
+        in_progress_job["id"] = new_job_id
+        in_progress_job["queue"] = ARGV[1]
+        in_progress_job["server"] = ARGV[2]
+        in_progress_job["dequeued"] = dequeued
+        in_progress_job["job"] = cjson.decode(queue_job)
+
+        local in_progress_job_json = cjson.encode(in_progress_job)
+        in_progress_jobs[index] = in_progress_job_json
+        in_progress_fields[2 * index - 1] = new_job_id
+        in_progress_fields[2 * index] = in_progress_job_json
+      end
+
+      -- add them to the in progress hash
+      redis.call("HSET", KEYS[4], unpack(in_progress_fields))
+      return in_progress_jobs
+    else
+      -- error queue does not exist
+      return -1
+    end
+    """
+    self._do_lua_pop_queued_jobs = redis_con.register_script(lua_script_pop_queued_jobs)
+
     # KEYS = [ IN_PROGRESS_JOBS_KEY, QUEUE_NAMES_KEY ]
-    # ARGV = [ job_id, QUEUE_NAME_PREFIX ]
+    # ARGV = [ job_id, QUEUE_NAME_PREFIX, JOB_NOTICE_CHANNEL ]
     lua_script_requeue_in_progress_job = """
     local job_json = redis.call("HGET", KEYS[1], ARGV[1])
     if job_json then
@@ -173,6 +224,7 @@ class JobQueue():
         -- push failed??
         return -3
       end
+      redis.call("PUBLISH", ARGV[3], name)
 
       -- remove the job from the in progress list
       if redis.call("HDEL", KEYS[1], ARGV[1]) then
@@ -208,14 +260,107 @@ class JobQueue():
     """
     self._do_lua_remove_in_progress_job = redis_con.register_script(lua_script_remove_in_progress_job)
 
+    # Job notices, see start_job_notices
+    self._notice_task: typing.Union[asyncio.Task, None] = None
+    self._notice: typing.Union[asyncio.Event, None] = None
+    self._notice_queues: typing.Set[str] = set()
+
 
   async def shutdown(self):
+    if(self._notice_task is not None):
+      self._notice_task.cancel()
+      try:
+        await self._notice_task
+
+      except asyncio.CancelledError:
+        pass
+      self._notice_task = None
+
     if(self._redis_mgr):
       logger.debug("shutting down JobQueue redis_mgr")
       await self._redis_mgr.shutdown_pool()
       self._redis_mgr = None
       logger.info("shutdown JobQueue redis_mgr")
     
+  async def start_job_notices(self) -> None:
+    """
+    Start listening for notices of jobs pushed to queues, so that
+    **wait_for_job_notice** wakes up as soon as a job is queued.
+    """
+    if(self._notice_task is None):
+      self._notice = asyncio.Event()
+      self._notice_task = asyncio.create_task(self._subscribe_job_notices())
+
+
+  def clear_job_notice(self, names: typing.Iterable[str]) -> None:
+    """
+    Forget prior job notices.  Call this before checking the queues for
+    jobs, so that a job pushed while checking is not missed by the following
+    **wait_for_job_notice**.
+
+    Parameters:
+      **names** (Iterable[str]) - names of the queues to wait on
+    """
+    self._notice_queues = set(names)
+    if(self._notice is not None):
+      self._notice.clear()
+
+
+  async def wait_for_job_notice(self, timeout: float) -> bool:
+    """
+    Wait until a job is pushed to one of the queues given to
+    **clear_job_notice**, since it was called, or until the timeout.
+    Without notices (**start_job_notices** not called), just waits for the
+    timeout.
+
+    Parameters:
+      **timeout** (float) - maximum seconds to wait
+
+    Returns: True if woken up by a job notice, False on timeout
+    """
+    if(self._notice is None):
+      await asyncio.sleep(timeout)
+      return(False)
+
+    try:
+      await asyncio.wait_for(self._notice.wait(), timeout)
+      return(True)
+
+    except asyncio.TimeoutError:
+      return(False)
+
+
+  async def _subscribe_job_notices(self) -> None:
+    """ Listen for jobs pushed to queues, until cancelled """
+    while(self._redis_mgr is not None):
+      pubsub = None
+      try:
+        redis_con = self._redis_mgr.get_client()
+        pubsub = redis_con.pubsub()
+        await pubsub.subscribe(JOB_NOTICE_CHANNEL)
+        # Notices may have been missed while not subscribed
+        self._notice.set()
+        async for message in pubsub.listen():
+          if(message.get("type", None) == "message" and
+            message["data"] in self._notice_queues):
+            self._notice.set()
+
+      except asyncio.CancelledError:
+        raise
+
+      except Exception as e:
+        logger.warning("job notice subscription failed: {}".format(e))
+        self._notice.set()
+        await asyncio.sleep(1.0)
+
+      finally:
+        if(pubsub is not None):
+          try:
+            await pubsub.reset()
+          except Exception:
+            pass
+
+
   async def get_queue_names(self) -> typing.List[str]:
     """ Get the list of names of all of the existing job queues """
     redis_con = self._redis_mgr.get_client()
@@ -233,7 +378,7 @@ class JobQueue():
 
     job_dicts = []
     for job in jobs:
-     job_dicts.append(json.loads(job))
+     job_dicts.append(vcon.json_codec.loads(job))
 
     return(job_dicts)
 
@@ -270,7 +415,7 @@ class JobQueue():
 
     job_dicts = []
     for job in jobs:
-     job_dicts.append(json.loads(job))
+     job_dicts.append(vcon.json_codec.loads(job))
 
     return(job_dicts)
 
@@ -304,7 +449,7 @@ class JobQueue():
     if(job == 0):
       raise EmptyJobQueue("No jobs in queue: {}".format(name))
 
-    job_json = json.loads(job)
+    job_json = vcon.json_codec.loads(job)
     # convert the start time string to a float
     if(isinstance(job_json.get("dequeued", None), str)):
       job_json["dequeued"] = float(job_json["dequeued"])
@@ -315,6 +460,45 @@ class JobQueue():
     return(job_json)
 
 
+  async def pop_queued_jobs(self,
+    name: str,
+    server_key: str,
+    max_jobs: int
+    ) -> typing.List[typing.Dict[str, typing.Any]]:
+    """
+    Retrieve up to **max_jobs** of the next available jobs
+    from the named queue for the named server, in one
+    atomic operation.  Each job is assigned a job id and
+    added to the in progress hash, as with **pop_queued_job**.
+
+    Returns: list of in progress job objects (dict), in
+      queue order, empty if the queue is empty.
+      See **pop_queued_job** for the in progress job keys.
+    """
+
+    if(max_jobs < 1):
+      return([])
+
+    keys = [ QUEUE_NAMES_KEY, QUEUE_NAME_PREFIX + name, JOB_ID_KEY, IN_PROGRESS_JOBS_KEY ]
+    args = [ name, server_key, max_jobs ]
+    jobs = await self._do_lua_pop_queued_jobs(keys = keys, args = args)
+    if(jobs == -1):
+      raise QueueDoesNotExist("pop_queue_jobs({}) queue does not exist".format(name))
+
+    job_dicts = []
+    for job in jobs:
+      job_json = vcon.json_codec.loads(job)
+      # convert the start time string to a float
+      if(isinstance(job_json.get("dequeued", None), str)):
+        job_json["dequeued"] = float(job_json["dequeued"])
+      # convert the job id string to a int
+      if(isinstance(job_json.get("id", None), int)):
+        job_json["id"] = str(job_json["id"])
+      job_dicts.append(job_json)
+
+    return(job_dicts)
+
+
   async def get_in_progress_jobs(self) -> typing.Dict[int, dict]:
     """
     Get the list of jobs which are in progress
@@ -324,7 +508,7 @@ class JobQueue():
     jobs_dict = await redis_con.hgetall(IN_PROGRESS_JOBS_KEY)
 
     for jobid in jobs_dict:
-      job_dict = json.loads(jobs_dict[jobid])
+      job_dict = vcon.json_codec.loads(jobs_dict[jobid])
 
       # convert the start time string to a float
       if(isinstance(job_dict.get("dequeued", None), str)):
@@ -348,7 +532,7 @@ class JobQueue():
     """
 
     keys = [ IN_PROGRESS_JOBS_KEY, QUEUE_NAMES_KEY ]
-    args = [ job_id, QUEUE_NAME_PREFIX ]
+    args = [ job_id, QUEUE_NAME_PREFIX, JOB_NOTICE_CHANNEL ]
     result = await self._do_lua_requeue_in_progress_job(keys = keys, args = args)
     if(result == -1):
       raise JobDoesNotExist("requeue_in_progress_job({}): job does not exist".format(job_id))
@@ -375,7 +559,7 @@ class JobQueue():
     if(isinstance(job_json, int) and job_json != 0):
       raise Exception("remove_in_progress_job({}): unknown error: {}".format(job_id, job_json))
 
-    job_dict = json.loads(job_json)
+    job_dict = vcon.json_codec.loads(job_json)
     # convert the start time string to a float
     if(isinstance(job_dict.get("dequeued", None), str)):
       job_dict["dequeued"] = float(job_dict["dequeued"])
@@ -423,7 +607,7 @@ class JobQueue():
       job_json["failed_job_id"] = failed_job
 
     keys = [ QUEUE_NAMES_KEY, QUEUE_NAME_PREFIX + name]
-    args = [ name, json.dumps(job_json)]
+    args = [ name, vcon.json_codec.dumpb(job_json), JOB_NOTICE_CHANNEL ]
     num_jobs = await self._do_lua_push_vcon_uuid_queue_job(keys = keys, args = args)
     if(num_jobs == -1):
       raise QueueDoesNotExist("push_vcon_uuid_queue_job({}): queue does not exist".format(name))
@@ -454,6 +638,11 @@ class QueueIterator():
     return(len(self._queue_snapshot.keys()))
 
 
+  def get_queue_names(self) -> typing.List[str]:
+    """ Return the names of the queues configured """
+    return(list(self._queue_snapshot.keys()))
+
+
   def get_cycle_count(self) -> int:
     if(self._queue_sequence == None):
       seq = []
@@ -478,6 +667,26 @@ class QueueIterator():
     return(next_q)
 
 
+  def get_next_queue_run(self, max_turns: int) -> typing.Tuple[str, int]:
+    """
+    Get the next queue name to use considering weights, as with **get_next_queue**,
+    and the number of turns in a row (no more than **max_turns**) the queue has
+    in the weighted sequence, so that the jobs for all of those turns may be
+    taken at once.  The iterator is advanced past all of the turns.
+
+    Returns: tuple of the queue name and the number of turns
+    """
+    cycle_count = self.get_cycle_count()
+    next_q = self.get_next_queue()
+    turns = 1
+    while(turns < max_turns and
+      self._queue_sequence[self._next_queue_index % cycle_count] == next_q):
+      self._next_queue_index += 1
+      turns += 1
+
+    return((next_q, turns))
+
+
   def check_update(self) -> bool:
     """
     Check if the configured queues for this server have changed.
@@ -1,11 +1,13 @@
 # Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
 """ Common setup and components for the RESTful APIs """
 import typing
+import hashlib
 import traceback
 import pydantic
 import fastapi
 import fastapi.middleware.cors
 import vcon
+import vcon.json_codec
 from py_vcon_server import __version__
 import py_vcon_server.logging_utils
 import py_vcon_server.settings
@@ -27,28 +29,95 @@ ERROR_RESPONSES = {
 }
 
 
-class NotFoundResponse(fastapi.responses.JSONResponse):
+class JSONResponse(fastapi.responses.JSONResponse):
+  """ JSON response rendered with the vcon package JSON codec (see **vcon.json_codec**) """
+  def render(self, content: typing.Any) -> bytes:
+    return(vcon.json_codec.dumpb(content))
+
+
+class NotFoundResponse(JSONResponse):
   """ Helper class to handle 404 Not Found cases """
   def __init__(self, detail: str):
     super().__init__(status_code = 404,
       content = {"detail": detail})
 
 
-class ValidationError(fastapi.responses.JSONResponse):
+class ValidationError(JSONResponse):
   """ Helper class to handle 422 validation error case"""
   def __init__(self, detail: str):
     super().__init__(status_code = 422,
       content = {"detail": detail})
 
 
-class ProcessingTimeout(fastapi.responses.JSONResponse):
+class PreconditionFailedResponse(JSONResponse):
+  """ Helper class to handle 412 Precondition Failed case (e.g. If-Match does not match) """
+  def __init__(self, detail: str):
+    super().__init__(status_code = 412,
+      content = {"detail": detail})
+
+
+class NotModifiedResponse(fastapi.responses.Response):
+  """ Helper class to handle 304 Not Modified case (If-None-Match matches the ETag) """
+  def __init__(self, etag: str):
+    super().__init__(status_code = 304,
+      headers = {"ETag": etag})
+
+
+def make_etag(revision: str, *variants: str) -> str:
+  """
+  Get the HTTP entity tag for the representation of a vCon at the
+  given revision (see **VconStorage.get_revision**).
+
+  Parameters:
+    **revision** (str) - the revision of the vCon in storage
+    **variants** (str) - the query parameters (e.g. jq transform) which
+      select a representation other than the whole vCon.
+
+  Returns: quoted strong entity tag
+  """
+  if(len(variants) > 0):
+    variant_hash = hashlib.sha256("\n".join(variants).encode("utf-8")).hexdigest()[0:16]
+    return("\"{}-{}\"".format(revision, variant_hash))
+
+  return("\"{}\"".format(revision))
+
+
+def parse_etags(header: typing.Union[str, None]) -> typing.List[str]:
+  """
+  Parse the entity tags from an If-Match or If-None-Match header.
+
+  Returns: list of the entity tags without the weak prefix (W/),
+    "*" for any entity tag, empty list if no header
+  """
+  if(header is None):
+    return([])
+
+  etags = []
+  for etag in header.split(","):
+    etag = etag.strip()
+    if(etag.startswith("W/")):
+      etag = etag[2:]
+    if(etag != ""):
+      etags.append(etag)
+
+  return(etags)
+
+
+def etag_matches(header: typing.Union[str, None], etag: str) -> bool:
+  """ Check if the If-None-Match header matches the entity tag (weak comparison) """
+  etags = parse_etags(header)
+
+  return("*" in etags or etag in etags)
+
+
+class ProcessingTimeout(JSONResponse):
   """ Helper class to indicate timeouts when processing or waiting for subordinate request """
   def __init__(self, detail: str):
     super().__init__(status_code = 430,
       content = {"detail": detail})
 
 
-class InternalErrorResponse(fastapi.responses.JSONResponse):
+class InternalErrorResponse(JSONResponse):
   """ Helper class to handle 500 internal server error case """
 
   def __init__(
@@ -217,7 +286,8 @@ def init() -> fastapi.FastAPI:
     license_info = {
       "name": "MIT License"
       },
-    openapi_tags = openapi_tags
+    openapi_tags = openapi_tags,
+    default_response_class = JSONResponse
     )
 
   logger.debug("CORS_ORIGINS: {}".format(py_vcon_server.settings.CORS_ORIGINS))
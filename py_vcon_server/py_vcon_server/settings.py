@@ -1,12 +1,28 @@
 # Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
 import os
-import multiprocessing
 from pathlib import Path
 
 VCON_STORAGE_URL = os.getenv("VCON_STORAGE_URL", "redis://localhost")
 QUEUE_DB_URL = os.getenv("QUEUE_DB__URL", VCON_STORAGE_URL)
 PIPELINE_DB_URL = os.getenv("PIPELINE_DB_URL", VCON_STORAGE_URL)
 STATE_DB_URL = os.getenv("STATE_DB_URL", VCON_STORAGE_URL)
+# In process read-through vCon cache (0 entries disables it)
+try:
+  VCON_CACHE_MAX_ENTRIES = int(os.getenv("VCON_CACHE_MAX_ENTRIES", 0))
+except:
+  VCON_CACHE_MAX_ENTRIES = 0
+try:
+  VCON_CACHE_MAX_BYTES = int(os.getenv("VCON_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+except:
+  VCON_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Redis on which vCon changes are published to invalidate the vCon caches, the
+# vCon storage Redis as that is where the changes are published
+VCON_CACHE_INVALIDATION_URL = os.getenv("VCON_CACHE_INVALIDATION_URL", VCON_STORAGE_URL)
+# Max number of vCons saved or got from VconStorage in one request by the bulk vCon APIs
+try:
+  VCON_BULK_BATCH_SIZE = int(os.getenv("VCON_BULK_BATCH_SIZE", 500))
+except:
+  VCON_BULK_BATCH_SIZE = 500
 REST_URL = os.getenv("REST_URL", "http://localhost:8000")
 LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG")
 LOGGING_CONFIG_FILE = os.getenv("LOGGING_CONFIG_FILE", Path(__file__).parent / 'logging.conf')
@@ -27,9 +43,10 @@ if(isinstance(RUN_BACKGROUND_JOBS, str)):
   else:
     RUN_BACKGROUND_JOBS = False
 
-# Number of pipeline server workers (currently disabled)
+# Number of pipeline server worker processes.  0 runs the pipeline jobs
+# in the server's event loop, one at a time.
 try:
-  NUM_WORKERS = int(os.getenv("NUM_WORKERS", 0)) #Python Multiprocessing, Syncio, Redis issue os.cpu_count()))
+  NUM_WORKERS = int(os.getenv("NUM_WORKERS", 0))
 except:
   NUM_WORKERS = 0
 if(not isinstance(NUM_WORKERS, int)):
@@ -44,8 +61,6 @@ if(cors_origins_string != ""):
   CORS_ORIGINS = cors_origins_string.split(", ")
 
 # parse out optional weights from name for each queue
-manager = multiprocessing.Manager()
-#WORK_QUEUES: multiprocessing.managers.DictProxy = manager.dict({})
 WORK_QUEUES = {}
 queue_tokens = os.getenv("WORK_QUEUES", "").split(",")
 for token in queue_tokens:
@@ -34,8 +34,8 @@ import os
 import urllib
 import time
 import typing
-import json
 import vcon
+import vcon.json_codec
 import py_vcon_server.db.redis.redis_mgr
 import py_vcon_server.logging_utils
 # Should remove this when abstracted from Redis
@@ -117,7 +117,7 @@ class ServerState:
     # save to a redis hash
     logger.info("setting server state: {}".format(server_dict))
     try:
-      await redis_con.hset(self._hash_key, self.server_key(), value = json.dumps(server_dict))
+      await redis_con.hset(self._hash_key, self.server_key(), value = vcon.json_codec.dumpb(server_dict))
     except redis.exceptions.ConnectionError as redis_except:
       logger.exception(redis_except)
       logger.debug("Unable to connect to Redis State DB: host: {} port: {}".format(
@@ -159,7 +159,7 @@ class ServerState:
     redis_con = self._redis_mgr.get_client()
     server_json_string = await redis_con.hget(self._hash_key, self.server_key())
     if(server_json_string):
-      server_json_string = json.loads(server_json_string)
+      server_json_string = vcon.json_codec.loads(server_json_string)
     return(server_json_string)
 
 
@@ -169,7 +169,7 @@ class ServerState:
 
     # Need to deserialize the values for each server
     for server in server_key_value_pairs:
-      server_key_value_pairs[server] = json.loads(server_key_value_pairs[server])
+      server_key_value_pairs[server] = vcon.json_codec.loads(server_key_value_pairs[server])
 
     logger.info("Got servers: {}".format(server_key_value_pairs))
 
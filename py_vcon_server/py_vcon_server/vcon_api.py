@@ -10,12 +10,99 @@ import fastapi.responses
 import py_vcon_server.db
 import py_vcon_server.processor
 import py_vcon_server.logging_utils
+import py_vcon_server.settings
 import vcon
 import vcon.utils
 import vcon.pydantic_utils
+import vcon.json_codec
 
 logger = py_vcon_server.logging_utils.init_logger(__name__)
 
+NDJSON_CONTENT_TYPES = ["application/x-ndjson", "application/jsonl", "application/json-seq"]
+
+
+class VconBulkStatus(pydantic.BaseModel):
+  index: int = pydantic.Field(
+    title = "index of the vCon in the request",
+    )
+  uuid: typing.Union[str, None] = pydantic.Field(
+    title = "vCon UUID",
+    description = "UUID of the vCon, null if it could not be parsed"
+    )
+  status: int = pydantic.Field(
+    title = "HTTP status for the vCon",
+    description = "204 stored, 422 invalid vCon, 500 storage error",
+    examples = [204]
+    )
+  detail: typing.Union[str, None] = pydantic.Field(
+    default = None,
+    title = "reason the vCon was not stored"
+    )
+
+
+# The request body is read and validated by get_request_vcon, rather than by FastAPI
+# trying each model of the union, the models document the body in OpenAPI.
+VCON_REQUEST_BODY = {
+  "requestBody": {
+    "required": True,
+    "content": {
+      "application/json": {
+        "schema": {
+          "anyOf": [
+            {"$ref": "#/components/schemas/{}".format(model.__name__)} for model in [
+              py_vcon_server.processor.VconUnsignedObject,
+              py_vcon_server.processor.VconSignedObject,
+              py_vcon_server.processor.VconEncryptedObject
+            ]
+          ]
+        }
+      }
+    }
+  }
+}
+
+
+async def get_request_vcon(request: fastapi.Request) -> dict:
+  """
+  Parse and validate the vCon in the request body (see **VCON_REQUEST_BODY**).
+
+  Raises: ValueError if the body is not JSON or not a valid vCon
+
+  Returns: the vCon dict
+  """
+  return(py_vcon_server.processor.validate_vcon_dict(vcon.json_codec.loads(await request.body())))
+
+
+def parse_bulk_vcons(body: bytes, content_type: str) -> typing.List[typing.Union[dict, Exception]]:
+  """
+  Parse the vCons from the body of a bulk request.
+
+  Parameters:
+    **body** (bytes) - JSON array of vCons or NDJSON (one vCon per line)
+    **content_type** (str) - Content-Type of the body
+
+  Returns: list of vCon dicts or the exception for those which could not be parsed
+  """
+  if(content_type.split(";")[0].strip().lower() in NDJSON_CONTENT_TYPES):
+    items = []
+    for line in body.splitlines():
+      line = line.strip(b" \t\r\x1e")
+      if(len(line) == 0):
+        continue
+      try:
+        items.append(vcon.json_codec.loads(line))
+
+      except Exception as e:
+        items.append(e)
+
+    return(items)
+
+  items = vcon.json_codec.loads(body)
+  if(not isinstance(items, list)):
+    raise Exception("expected JSON array of vCons, got: {}".format(type(items).__name__))
+
+  return(items)
+
 
 def init(restapi):
   @restapi.get("/vcon/{vcon_uuid}",
@@ -26,16 +113,59 @@ def init(restapi):
       ],
     responses = py_vcon_server.restful_api.ERROR_RESPONSES,
     tags = [ py_vcon_server.restful_api.VCON_TAG ])
-  async def get_vcon(vcon_uuid: str):
+  async def get_vcon(
+      vcon_uuid: str,
+      exclude: typing.Union[str, None] = None,
+      if_none_match: typing.Union[str, None] = fastapi.Header(default = None)
+    ):
     """
     Get the vCon object identified by the given UUID.
 
+    The vCon JSON is returned as stored, without parsing and serializing it again.
+
+    The ETag response header identifies the revision of the vCon, read
+    from storage together with the vCon.  If the If-None-Match request
+    header matches the ETag, 304 Not Modified is returned without reading
+    the vCon from storage.
+
+    **exclude** is an optional comma separated list of the parts of the vCon
+    to exclude (e.g. "dialog.body,attachments.body").  Each is either a top
+    level key (e.g. "attachments") or an object array and the parameter to
+    exclude from each of its objects (e.g. "dialog.body").  Only the rest of
+    the vCon is read from storage and returned.  Signed and encrypted vCons
+    are always returned whole.
+
     Returns: dict - vCon object which may be in the unencrypted, signed or encrypted JSON forms
     """
 
     try:
+      partial = exclude is not None and exclude.strip() != ""
+      etag_values = [exclude] if partial else []
+      if(if_none_match is not None):
+        revision = await py_vcon_server.db.VCON_STORAGE.get_revision(vcon_uuid)
+        if(revision is None):
+          raise py_vcon_server.db.VconNotFound("vCon not found for UUID: {}".format(vcon_uuid))
+        etag = py_vcon_server.restful_api.make_etag(revision, *etag_values)
+        if(py_vcon_server.restful_api.etag_matches(if_none_match, etag)):
+          logger.debug("vcon UUID: {} not modified".format(vcon_uuid))
+          return(py_vcon_server.restful_api.NotModifiedResponse(etag))
+
+      # The ETag is for the revision read with the vCon, it may have been saved since the above
+      if(partial):
+        logger.debug("getting vcon UUID: {} excluding: {}".format(vcon_uuid, exclude))
+        partial_vcon, revision = await py_vcon_server.db.VCON_STORAGE.get_partial(vcon_uuid, exclude)
+        return(py_vcon_server.restful_api.JSONResponse(
+            content = partial_vcon.dumpd(True, False),
+            headers = {"ETag": py_vcon_server.restful_api.make_etag(revision, *etag_values)}
+          ))
+
       logger.debug("getting vcon UUID: {}".format(vcon_uuid))
-      vCon = await py_vcon_server.db.VCON_STORAGE.get(vcon_uuid)
+      vcon_json, revision = await py_vcon_server.db.VCON_STORAGE.get_raw(vcon_uuid)
+      etag = py_vcon_server.restful_api.make_etag(revision, *etag_values)
+
+    except py_vcon_server.db.InvalidExclusion as e:
+      py_vcon_server.restful_api.log_exception(e)
+      return(py_vcon_server.restful_api.ValidationError(str(e)))
 
     except py_vcon_server.db.VconNotFound as e:
       py_vcon_server.restful_api.log_exception(e)
@@ -46,25 +176,41 @@ def init(restapi):
       return(py_vcon_server.restful_api.InternalErrorResponse(e))
 
     logger.debug(
-      "Returning whole vcon for {} found: {}".format(vcon_uuid, vCon is not None))
+      "Returning whole vcon for {} length: {}".format(vcon_uuid, len(vcon_json)))
 
-    return(fastapi.responses.JSONResponse(content=vCon.dumpd()))
+    return(fastapi.responses.Response(
+        content = vcon_json,
+        media_type = "application/json",
+        headers = {"ETag": etag}
+      ))
 
   @restapi.post("/vcon",
     status_code = 204,
     responses = py_vcon_server.restful_api.ERROR_RESPONSES,
+    openapi_extra = VCON_REQUEST_BODY,
     tags = [ py_vcon_server.restful_api.VCON_TAG ])
-  async def post_vcon(inbound_vcon: typing.Union[
-      py_vcon_server.processor.VconUnsignedObject,
-      py_vcon_server.processor.VconSignedObject,
-      py_vcon_server.processor.VconEncryptedObject
-    ]):
+  async def post_vcon(
+    request: fastapi.Request,
+    if_match: typing.Union[str, None] = fastapi.Header(default = None)
+    ):
     """
     Store the given vCon in VconStorage, replace if it exists for the given UUID
+
+    If the If-Match request header is given, the vCon is only replaced if
+    the ETag of the stored vCon (from GET /vcon/{vcon_uuid}) matches.
+    Otherwise 412 Precondition Failed is returned, so that a vCon changed
+    by someone else since it was got is not overwritten.  "*" matches any
+    stored revision of the vCon.
+
+    The ETag of the stored vCon is returned in the response headers.
     """
     try:
-      vcon_dict = vcon.pydantic_utils.get_dict(inbound_vcon, exclude_none = True)
+      vcon_dict = await get_request_vcon(request)
 
+    except ValueError as e:
+      return(py_vcon_server.restful_api.ValidationError(str(e)))
+
+    try:
       vcon_uuid = vcon_dict.get("uuid", None)
       logger.debug("setting vcon UUID: {}".format(vcon_uuid))
 
@@ -72,15 +218,137 @@ def init(restapi):
         return(py_vcon_server.restful_api.ValidationError("vCon UUID: not set"))
 
       vcon_object = vcon.Vcon()
-      vcon_object.loadd(vcon_dict)
+      # The dict was just parsed from the request, no need to copy it
+      vcon_object.loadd(vcon_dict, True)
+
+      revision = None
+      etags = py_vcon_server.restful_api.parse_etags(if_match)
+      if("*" in etags):
+        revision = "*"
+      elif(len(etags) == 1):
+        revision = etags[0].strip("\"")
+      elif(len(etags) > 1):
+        # Any of the given revisions, the one saved now if listed
+        current_revision = await py_vcon_server.db.VCON_STORAGE.get_revision(vcon_uuid)
+        if(current_revision is None or
+          py_vcon_server.restful_api.make_etag(current_revision) not in etags):
+          raise py_vcon_server.db.RevisionMismatch("vCon: {} revision: {} does not match: {}".format(
+              vcon_uuid,
+              current_revision,
+              if_match
+            ))
+        revision = current_revision
+
+      saved_revision = await py_vcon_server.db.VCON_STORAGE.set_if_revision(vcon_object, revision)
+
+    except py_vcon_server.db.RevisionMismatch as e:
+      py_vcon_server.restful_api.log_exception(e)
+      return(py_vcon_server.restful_api.PreconditionFailedResponse(
+        "vCon UUID: {} does not match If-Match: {}".format(vcon_uuid, if_match)))
+
+    except Exception as e:
+      py_vcon_server.restful_api.log_exception(e)
+      return(py_vcon_server.restful_api.InternalErrorResponse(e))
+
+    # 204, no content
+    return(fastapi.responses.Response(
+        status_code = 204,
+        headers = {"ETag": py_vcon_server.restful_api.make_etag(saved_revision)}
+      ))
+
+  @restapi.post("/vcons",
+    response_model = typing.List[VconBulkStatus],
+    responses = py_vcon_server.restful_api.ERROR_RESPONSES,
+    tags = [ py_vcon_server.restful_api.VCON_TAG ])
+  async def post_vcons(request: fastapi.Request):
+    """
+    Store the given vCons in VconStorage, replacing those which exist for the given UUIDs.
+
+    The request body is either a JSON array of vCons or, with Content-Type
+    application/x-ndjson, one vCon JSON object per line.  The vCons are
+    saved in batches, each in one request to VconStorage.
+
+    Each vCon is stored or rejected independently.  The status of each is returned,
+    in the same order as the request: 204 stored, 422 not a valid vCon,
+    500 failed to save.
 
-      await py_vcon_server.db.VCON_STORAGE.set(vcon_dict)
+    Returns: list - status of each vCon
+    """
+    try:
+      items = parse_bulk_vcons(await request.body(), request.headers.get("content-type", ""))
+
+    except Exception as e:
+      py_vcon_server.restful_api.log_exception(e)
+      return(py_vcon_server.restful_api.ValidationError("invalid bulk vCon request body: {}".format(e)))
+
+    results = []
+    valid = []
+    for index, item in enumerate(items):
+      status = {"index": index, "uuid": None, "status": 204}
+      results.append(status)
+      try:
+        if(isinstance(item, Exception)):
+          raise item
+        if(not isinstance(item, dict)):
+          raise Exception("expected vCon JSON object, got: {}".format(type(item).__name__))
+        py_vcon_server.processor.validate_vcon_dict(item)
+        status["uuid"] = item.get("uuid", None)
+        if(status["uuid"] is None or len(status["uuid"]) < 1):
+          raise Exception("vCon UUID: not set")
+
+        vcon_object = vcon.Vcon()
+        # The dict was just parsed from the request, no need to copy it
+        vcon_object.loadd(item, True)
+        valid.append((status, vcon_object))
+
+      except Exception as e:
+        status["status"] = 422
+        status["detail"] = str(e)
+
+    logger.debug("setting {} of {} vCons".format(len(valid), len(items)))
+    batch_size = max(1, py_vcon_server.settings.VCON_BULK_BATCH_SIZE)
+    for start in range(0, len(valid), batch_size):
+      batch = valid[start:start + batch_size]
+      try:
+        await py_vcon_server.db.VCON_STORAGE.set_many([vcon_object for status, vcon_object in batch])
+
+      except Exception as e:
+        py_vcon_server.restful_api.log_exception(e)
+        for status, vcon_object in batch:
+          status["status"] = 500
+          status["detail"] = "Exception: {} {}".format(e.__class__.__name__, e)
+
+    return(py_vcon_server.restful_api.JSONResponse(content = results))
+
+  @restapi.get("/vcons",
+    response_model = typing.List[typing.Union[
+        py_vcon_server.processor.VconUnsignedObject,
+        py_vcon_server.processor.VconSignedObject,
+        py_vcon_server.processor.VconEncryptedObject,
+        None
+      ]],
+    responses = py_vcon_server.restful_api.ERROR_RESPONSES,
+    tags = [ py_vcon_server.restful_api.VCON_TAG ])
+  async def get_vcons(uuid: typing.List[str] = fastapi.Query(default = [])):
+    """
+    Get the vCon objects identified by the given UUIDs (e.g. /vcons?uuid=...&uuid=...).
+    The vCons are got in batches, each in one request to VconStorage.
+
+    Returns: list - vCon objects in the same order as the UUIDs, null for those not found
+    """
+    try:
+      logger.debug("getting {} vcons".format(len(uuid)))
+      vcon_dicts = []
+      batch_size = max(1, py_vcon_server.settings.VCON_BULK_BATCH_SIZE)
+      for start in range(0, len(uuid), batch_size):
+        vcons = await py_vcon_server.db.VCON_STORAGE.get_many(uuid[start:start + batch_size])
+        vcon_dicts.extend([None if a_vcon is None else a_vcon.dumpd(True, False) for a_vcon in vcons])
 
     except Exception as e:
       py_vcon_server.restful_api.log_exception(e)
       return(py_vcon_server.restful_api.InternalErrorResponse(e))
 
-    # No return should emmit 204, no content
+    return(py_vcon_server.restful_api.JSONResponse(content = vcon_dicts))
 
   @restapi.delete("/vcon/{vcon_uuid}",
     status_code = 204,
@@ -107,13 +375,28 @@ def init(restapi):
   @restapi.get("/vcon/{vcon_uuid}/jq",
     responses = py_vcon_server.restful_api.ERROR_RESPONSES,
     tags = [ py_vcon_server.restful_api.VCON_TAG ])
-  async def get_vcon_jq_transform(vcon_uuid: str, jq_transform: str):
+  async def get_vcon_jq_transform(
+      vcon_uuid: str,
+      jq_transform: str,
+      if_none_match: typing.Union[str, None] = fastapi.Header(default = None)
+    ):
     """
     Apply the given jq transform to the vCon identified by the given UUID and return the results.
 
+    The ETag response header identifies the revision of the vCon and the
+    transform.  If the If-None-Match request header matches the ETag,
+    304 Not Modified is returned without reading the vCon from storage.
+
     Returns: list - containing jq tranform of the vCon.
     """
     try:
+      revision = await py_vcon_server.db.VCON_STORAGE.get_revision(vcon_uuid)
+      if(revision is None):
+        return(py_vcon_server.restful_api.NotFoundResponse("vCon UUID: {} not found".format(vcon_uuid)))
+      etag = py_vcon_server.restful_api.make_etag(revision, "jq", jq_transform)
+      if(py_vcon_server.restful_api.etag_matches(if_none_match, etag)):
+        return(py_vcon_server.restful_api.NotModifiedResponse(etag))
+
       logger.info("vcon UID: {} jq transform string: {}".format(vcon_uuid, jq_transform))
       transform_result = await py_vcon_server.db.VCON_STORAGE.jq_query(vcon_uuid, jq_transform)
       logger.debug("jq  transform result: {}".format(transform_result))
@@ -122,19 +405,32 @@ def init(restapi):
       py_vcon_server.restful_api.log_exception(e)
       return(py_vcon_server.restful_api.InternalErrorResponse(e))
 
-    return(fastapi.responses.JSONResponse(content=transform_result))
+    return(py_vcon_server.restful_api.JSONResponse(content=transform_result, headers = {"ETag": etag}))
 
   @restapi.get("/vcon/{vcon_uuid}/jsonpath",
     responses = py_vcon_server.restful_api.ERROR_RESPONSES,
     tags = [ py_vcon_server.restful_api.VCON_TAG ])
-  async def get_vcon_jsonpath_query(vcon_uuid: str, path_string: str):
+  async def get_vcon_jsonpath_query(
+      vcon_uuid: str,
+      path_string: str,
+      if_none_match: typing.Union[str, None] = fastapi.Header(default = None)
+    ):
     """
     Apply the given JSONpath query to the vCon idntified by the given UUID.
 
+    The ETag and If-None-Match headers are handled as for the jq transform.
+
     Returns: list - the JSONpath query results
     """
 
     try:
+      revision = await py_vcon_server.db.VCON_STORAGE.get_revision(vcon_uuid)
+      if(revision is None):
+        return(py_vcon_server.restful_api.NotFoundResponse("vCon UUID: {} not found".format(vcon_uuid)))
+      etag = py_vcon_server.restful_api.make_etag(revision, "jsonpath", path_string)
+      if(py_vcon_server.restful_api.etag_matches(if_none_match, etag)):
+        return(py_vcon_server.restful_api.NotModifiedResponse(etag))
+
       logger.info("vcon UID: {} jsonpath query string: {}".format(vcon_uuid, path_string))
       query_result = await py_vcon_server.db.VCON_STORAGE.json_path_query(vcon_uuid, path_string)
       logger.debug("jsonpath query result: {}".format(query_result))
@@ -143,7 +439,7 @@ def init(restapi):
       py_vcon_server.restful_api.log_exception(e)
       return(py_vcon_server.restful_api.InternalErrorResponse(e))
 
-    return(fastapi.responses.JSONResponse(content=query_result))
+    return(py_vcon_server.restful_api.JSONResponse(content=query_result, headers = {"ETag": etag}))
 
 
   processor_names = py_vcon_server.processor.VconProcessorRegistry.get_processor_names()
@@ -226,7 +522,7 @@ def init(restapi):
             })
         return(exception_error_content)
 
-      return(fastapi.responses.JSONResponse(content = vcon.pydantic_utils.get_dict(response_output, exclude_none = True)))
+      return(py_vcon_server.restful_api.JSONResponse(content = vcon.pydantic_utils.get_dict(response_output, exclude_none = True)))
 
 
   processor_names = py_vcon_server.processor.VconProcessorRegistry.get_processor_names()
@@ -330,7 +626,7 @@ def init(restapi):
             })
         return(exception_error_content)
 
-      return(fastapi.responses.JSONResponse(content = vcon.pydantic_utils.get_dict(response_output, exclude_none = True)))
+      return(py_vcon_server.restful_api.JSONResponse(content = vcon.pydantic_utils.get_dict(response_output, exclude_none = True)))
 
 
   async def do_run_pipeline(
@@ -376,7 +672,7 @@ def init(restapi):
       # Optionally return the pipeline output
       if(return_results):
         pipe_out = await pipeline_output.get_output()
-        return(fastapi.responses.JSONResponse(content = vcon.pydantic_utils.get_dict(pipe_out, exclude_none=True)))
+        return(py_vcon_server.restful_api.JSONResponse(content = vcon.pydantic_utils.get_dict(pipe_out, exclude_none=True)))
 
 
   pipeline_responses = copy.deepcopy(py_vcon_server.restful_api.ERROR_RESPONSES)
@@ -385,14 +681,11 @@ def init(restapi):
   @restapi.post("/pipeline/{name}/run",
     response_model = typing.Union[py_vcon_server.processor.VconProcessorOutput, None],
     summary = "Run a pipeline of processors on the vCon given in the request body",
+    openapi_extra = VCON_REQUEST_BODY,
     tags = [ py_vcon_server.restful_api.PIPELINE_RUN_TAG ])
   async def run_pipeline(
       name: str,
-      vCon: typing.Union[
-          py_vcon_server.processor.VconUnsignedObject,
-          py_vcon_server.processor.VconSignedObject,
-          py_vcon_server.processor.VconEncryptedObject
-        ],
+      request: fastapi.Request,
       save_vcons: bool = False,
       return_results: bool = True
     ):
@@ -409,7 +702,7 @@ def init(restapi):
 
       **name** (str) - name of the pipeline defined in the pipeline DB
 
-      **vCon** (py_vcon_server.processor.VconUnsignedObject or 
+      **request** body (py_vcon_server.processor.VconUnsignedObject or 
         py_vcon_server.processor.VconSignedObject or
         py_vcon_server.processor.VconEncryptObject) - 
           vCon from body, assumes vCon/UUID does NOT exist in storage
@@ -424,16 +717,23 @@ def init(restapi):
       If return_results is true, return the VconProcessorOutput, otherwise return None
     """
 
+    try:
+      vcon_dict = await get_request_vcon(request)
+
+    except ValueError as e:
+      return(py_vcon_server.restful_api.ValidationError(str(e)))
+
     logger.debug("run_pipeline( pipeline: {} vCon with UUID: {} save: {} return: {}".format(
         name,
-        vcon.pydantic_utils.get_dict(vCon, exclude_none=True).get("uuid", None),
+        vcon_dict.get("uuid", None),
         save_vcons,
         return_results
       ))
 
     try:
       vcon_object = vcon.Vcon()
-      vcon_object.loadd(vcon.pydantic_utils.get_dict(vCon, exclude_none=True))
+      # The dict was just parsed from the request, no need to copy it
+      vcon_object.loadd(vcon_dict, True)
 
       # TODO: verify the UUID for the given vCon does not exist in storage
 
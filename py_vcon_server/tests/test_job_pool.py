@@ -12,12 +12,9 @@ import pytest_asyncio
 import py_vcon_server.job_worker_pool
 #from py_vcon_server.pipeline import PipelineDb
 import logging
-import nest_asyncio
 
 logger = logging.getLogger(__name__)
 
-nest_asyncio.apply()
-
 TOL_FACTOR = 2.5
 
 #logger.debug("sleeping job creating PipelineDB")
@@ -393,6 +390,7 @@ async def start_run_stop_job_worker(jobs: list, tasks = 4):
       test_jobber.do_job,
       test_jobber
     )
+  assert(await job_pool.wait_for_init() == tasks)
 
   job_to_run = await test_jobber.get_job()
   assert(job_to_run)
@@ -512,6 +510,119 @@ async def test_job_worker_pool_four():
   test_jobber.verify_canceled_jobs(0)
 
 
+@pytest.mark.asyncio
+async def test_job_worker_pool_check_jobs_latency():
+  """ check_jobs does not block the event loop and returns as soon as a job finishes """
+  test_jobber = UnitJobber([])
+  manager = multiprocessing.Manager()
+  run_states: multiprocessing.managers.DictProxy = manager.dict(
+      {
+        "run": True
+      })
+  run_list: multiprocessing.managers.ListProxy = manager.list([])
+  job_pool = py_vcon_server.job_worker_pool.JobWorkerPool(
+      2,
+      run_states,
+      run_list,
+      test_jobber.do_job,
+      test_jobber
+    )
+  assert(await job_pool.wait_for_init() == 2)
+  # handle the worker start up jobs
+  while(await job_pool.check_jobs(1.0)):
+    pass
+
+  ticks = 0
+  async def tick():
+    nonlocal ticks
+    while(True):
+      await asyncio.sleep(0.01)
+      ticks += 1
+  ticker = asyncio.create_task(tick())
+
+  latencies = []
+  for index in range(3):
+    job_def = copy.deepcopy(SHORT_SLEEP_JOB)
+    job_def["id"] = "sleep{}".format(index)
+    job_def["sleep_time"] = 1
+    job_pool.run_job(job_def)
+    ticks_before = ticks
+    # long timeout, returns when the job finishes
+    while(await job_pool.check_jobs(10.0)):
+      pass
+    returned = time.time()
+    assert(test_jobber.get_finished_count() == index + 1)
+    latencies.append(returned - test_jobber._finished_jobs[index]["finish"])
+    # event loop ran while waiting on the job
+    assert(ticks - ticks_before > 25)
+
+  ticker.cancel()
+  job_pool.wait_for_workers()
+  print("job finish to check_jobs return latency (seconds): {}".format(
+      ["{:.4f}".format(latency) for latency in latencies]
+    ))
+  assert(max(latencies) < 0.5)
+
+
+@pytest.mark.asyncio
+async def test_job_scheduler_saturated_workers():
+  """ The scheduler waits, rather than spins, while all workers are busy """
+  test_jobber = UnitJobber([])
+  manager = multiprocessing.Manager()
+  run_states: multiprocessing.managers.DictProxy = manager.dict(
+      {
+        "run": True
+      })
+  run_list: multiprocessing.managers.ListProxy = manager.list([])
+  job_pool = py_vcon_server.job_worker_pool.JobWorkerPool(
+      2,
+      run_states,
+      run_list,
+      test_jobber.do_job,
+      test_jobber
+    )
+  assert(await job_pool.wait_for_init() == 2)
+  # handle the worker start up jobs
+  while(await job_pool.check_jobs(1.0)):
+    pass
+
+  check_count = 0
+  check_jobs = job_pool.check_jobs
+  async def counting_check_jobs(*args, **kwargs):
+    nonlocal check_count
+    check_count += 1
+    return(await check_jobs(*args, **kwargs))
+  job_pool.check_jobs = counting_check_jobs
+
+  scheduler = asyncio.create_task(py_vcon_server.job_worker_pool.JobScheduler.do_scheduling(
+      run_states,
+      run_list,
+      2,
+      test_jobber,
+      job_pool
+    ))
+  # idle with no jobs, the scheduler waits for job notices
+  await asyncio.sleep(0.5)
+  for index in range(2):
+    job_def = copy.deepcopy(SHORT_SLEEP_JOB)
+    job_def["id"] = "sleep{}".format(index)
+    job_def["sleep_time"] = 4
+    test_jobber._job_list.append(job_def)
+  await asyncio.sleep(1.0)
+  assert(test_jobber.remaining_jobs() == 0)
+
+  # both workers busy
+  check_count = 0
+  await asyncio.sleep(2.0)
+  saturated_checks = check_count
+  run_states["run"] = False
+  await scheduler
+
+  print("check_jobs calls in 2 seconds with saturated workers: {}".format(saturated_checks))
+  assert(saturated_checks < 10)
+  assert(test_jobber.get_finished_count() == 2)
+
+
 async def run_jobs_in_scheduler(jobs: list):
   test_jobber = UnitJobber(jobs)
   job_count = len(jobs)
@@ -812,3 +923,47 @@ async def test_job_async_scheduler_manager_none():
   test_jobber.verify_exception_jobs(0)
   test_jobber.verify_canceled_jobs(0)
 
+
+
+async def cpu_jobs_per_second(num_workers: int, num_jobs: int) -> float:
+  """ Run CPU bound jobs in the async scheduler, returning the job throughput """
+  jobs = []
+  for index in range(num_jobs):
+    cpu_job = copy.deepcopy(SHORT_CPU_JOB)
+    cpu_job["id"] = "cpu{}".format(index)
+    cpu_job["cpu_time"] = 2
+    jobs.append(cpu_job)
+  test_jobber = UnitJobber(jobs)
+
+  job_manager = py_vcon_server.job_worker_pool.JobSchedulerManager(num_workers, test_jobber)
+  await job_manager.async_start()
+  give_up = time.time() + 30 * num_jobs
+  while(test_jobber.get_finished_count() < num_jobs and time.time() < give_up):
+    await asyncio.sleep(0.1)
+  await job_manager.finish()
+
+  assert(test_jobber.get_finished_count() == num_jobs)
+  first_start = min(job["start"] for job in test_jobber._finished_jobs)
+  last_finish = max(job["finish"] for job in test_jobber._finished_jobs)
+  return(num_jobs / (last_finish - first_start))
+
+
+@pytest.mark.asyncio
+async def test_job_async_scheduler_manager_scaling():
+  """ CPU bound job throughput scales with the number of spawned worker processes """
+  num_workers = 4
+  one_worker_rate = await cpu_jobs_per_second(1, 4)
+  workers_rate = await cpu_jobs_per_second(num_workers, 4 * num_workers)
+  print("CPU jobs/second 1 worker: {:.2f} {} workers: {:.2f} speedup: {:.2f} cpus: {}".format(
+      one_worker_rate,
+      num_workers,
+      workers_rate,
+      workers_rate / one_worker_rate,
+      os.cpu_count()
+    ))
+
+  # Cannot scale beyond the number of cores
+  if((os.cpu_count() or 1) >= num_workers):
+    assert(workers_rate / one_worker_rate > 0.7 * num_workers)
+  else:
+    assert(workers_rate / one_worker_rate > 0.5)
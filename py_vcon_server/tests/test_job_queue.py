@@ -5,6 +5,7 @@ import time
 import fastapi.testclient
 import pytest_asyncio
 import py_vcon_server.queue
+import py_vcon_server.settings
 from py_vcon_server.settings import QUEUE_DB_URL
 
 CREATED_JOBS = []
@@ -492,3 +493,148 @@ async def test_in_progress_api(job_queue):
     not_found_details = get_response.json()
     print("queue not found details: {}".format(not_found_details))
 
+
+
+@pytest.mark.asyncio
+async def test_job_notice(job_queue):
+  """ Waiting servers are woken up when a job is pushed to their queues """
+  q1 = "test_queue_notice_1"
+  q2 = "test_queue_notice_2"
+  for name in [q1, q2]:
+    try:
+      await job_queue.delete_queue(name)
+    except py_vcon_server.queue.QueueDoesNotExist as e:
+      pass
+    await job_queue.create_new_queue(name)
+
+  await job_queue.start_job_notices()
+  # let the subscription get setup, which wakes up waits for missed notices
+  await asyncio.sleep(0.5)
+  server_key = "pytest_run:-1:-1:{}".format(time.time())
+
+  # push to a queue not waited on
+  job_queue.clear_job_notice([q1])
+  await job_queue.push_vcon_uuid_queue_job(q2, ["fake_uuid"])
+  assert(not await job_queue.wait_for_job_notice(0.5))
+
+  latencies = []
+  for index in range(5):
+    job_queue.clear_job_notice([q1, "other_queue"])
+    waiter = asyncio.create_task(job_queue.wait_for_job_notice(5.0))
+    await asyncio.sleep(0.1)
+    pushed = time.time()
+    await job_queue.push_vcon_uuid_queue_job(q1, ["fake_uuid{}".format(index)])
+    assert(await waiter)
+    latencies.append(time.time() - pushed)
+
+    # still moved atomically to in progress
+    in_progress_job = await job_queue.pop_queued_job(q1, server_key)
+    CREATED_JOBS.append(in_progress_job["id"])
+    assert(in_progress_job["job"]["vcon_uuid"] == ["fake_uuid{}".format(index)])
+
+  print("job push to wake up latency (seconds): {}".format(
+      ["{:.4f}".format(latency) for latency in latencies]
+    ))
+  assert(max(latencies) < 0.1)
+
+  # requeued jobs wake up waiting servers too
+  job_queue.clear_job_notice([q1])
+  await job_queue.requeue_in_progress_job(in_progress_job["id"])
+  assert(await job_queue.wait_for_job_notice(1.0))
+
+  for name in [q1, q2]:
+    await job_queue.delete_queue(name)
+
+
+@pytest.mark.asyncio
+async def test_pop_queued_jobs(job_queue):
+  q1 = "test_queue_batch_1"
+  try:
+    await job_queue.delete_queue(q1)
+  except py_vcon_server.queue.QueueDoesNotExist as e:
+    pass
+  server_key = "pytest_run:-1:-1:{}".format(time.time())
+
+  try:
+    await job_queue.pop_queued_jobs(q1, server_key, 2)
+    raise Exception("Expect exception as the queue does not exist")
+  except py_vcon_server.queue.QueueDoesNotExist as e:
+    pass
+
+  await job_queue.create_new_queue(q1)
+  assert(await job_queue.pop_queued_jobs(q1, server_key, 2) == [])
+
+  for index in range(5):
+    await job_queue.push_vcon_uuid_queue_job(q1, ["fake_uuid{}".format(index)])
+
+  jobs = await job_queue.pop_queued_jobs(q1, server_key, 3)
+  CREATED_JOBS.extend([job["id"] for job in jobs])
+  assert([job["job"]["vcon_uuid"] for job in jobs] == [["fake_uuid0"], ["fake_uuid1"], ["fake_uuid2"]])
+  job_ids = [int(job["id"]) for job in jobs]
+  assert(job_ids == list(range(job_ids[0], job_ids[0] + 3)))
+  in_progress_jobs = await job_queue.get_in_progress_jobs()
+  for job in jobs:
+    assert(job["queue"] == q1)
+    assert(job["server"] == server_key)
+    assert(isinstance(job["dequeued"], float))
+    assert(in_progress_jobs[job["id"]] == job)
+  assert(len(await job_queue.get_queue_jobs(q1)) == 2)
+
+  # fewer jobs in the queue than asked for
+  jobs = await job_queue.pop_queued_jobs(q1, server_key, 10)
+  CREATED_JOBS.extend([job["id"] for job in jobs])
+  assert([job["job"]["vcon_uuid"] for job in jobs] == [["fake_uuid3"], ["fake_uuid4"]])
+  assert(await job_queue.pop_queued_jobs(q1, server_key, 10) == [])
+
+  # Refill many idle workers one job at a time vs. all at once
+  num_workers = 32
+  num_jobs = 8 * num_workers
+  rates = []
+  for batch in [1, num_workers]:
+    for index in range(num_jobs):
+      await job_queue.push_vcon_uuid_queue_job(q1, ["fake_uuid{}".format(index)])
+    popped = 0
+    start = time.time()
+    while(popped < num_jobs):
+      if(batch == 1):
+        for worker in range(num_workers):
+          job = await job_queue.pop_queued_job(q1, server_key)
+          CREATED_JOBS.append(job["id"])
+          popped += 1
+      else:
+        jobs = await job_queue.pop_queued_jobs(q1, server_key, num_workers)
+        CREATED_JOBS.extend([job["id"] for job in jobs])
+        popped += len(jobs)
+    rates.append(num_jobs / (time.time() - start))
+  print("jobs dequeued/second for {} workers one at a time: {:.0f} batched: {:.0f}".format(
+      num_workers,
+      rates[0],
+      rates[1]
+    ))
+  assert(rates[1] > rates[0])
+
+  await job_queue.delete_queue(q1)
+
+
+def test_queue_iterator_runs():
+  """ Consecutive turns of a queue in the weighted sequence are taken together """
+  saved_queues = py_vcon_server.settings.WORK_QUEUES
+  try:
+    py_vcon_server.settings.WORK_QUEUES = {"a": {"weight": 1}, "b": {"weight": 4}, "c": None}
+    q_itr = py_vcon_server.queue.QueueIterator()
+    assert(q_itr.get_cycle_count() == 6)
+    assert(q_itr.get_queue_names() == ["a", "b", "c"])
+    assert(q_itr.get_next_queue_run(10) == ("a", 1))
+    assert(q_itr.get_next_queue_run(3) == ("b", 3))
+    assert(q_itr.get_next_queue_run(3) == ("b", 1))
+    assert(q_itr.get_next_queue_run(3) == ("c", 1))
+    assert(q_itr.get_next_queue() == "a")
+    assert(q_itr.get_next_queue_run(1) == ("b", 1))
+
+    # only one queue, all turns are its
+    py_vcon_server.settings.WORK_QUEUES = {"a": {"weight": 2}}
+    q_itr = py_vcon_server.queue.QueueIterator()
+    assert(q_itr.get_next_queue_run(5) == ("a", 5))
+
+  finally:
+    py_vcon_server.settings.WORK_QUEUES = saved_queues
@@ -1,11 +1,13 @@
 # Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
 """ Unit tests for Pipeline and related data objects """
+import asyncio
 import pydantic
 import pytest
 import pytest_asyncio
 import copy
 import fastapi.testclient
 import vcon
+import vcon.json_codec
 import vcon.pydantic_utils
 import py_vcon_server.pipeline
 from py_vcon_server.settings import PIPELINE_DB_URL
@@ -279,6 +281,102 @@ async def test_pipeline_db():
     pass
 
 
+@pytest.mark.asyncio
+async def test_pipeline_cache():
+  """ Pipeline cache bookkeeping, with the DB read stubbed out """
+  pdb = PIPELINE_DB
+  pipelines = {"first_pipe": py_vcon_server.pipeline.PipelineDefinition(**PIPE_DEF1_DICT)}
+  loads = []
+  db_version = [3]
+  async def load_pipeline(name):
+    loads.append(name)
+    return(db_version[0], pipelines.get(name, None))
+  pdb._load_pipeline = load_pipeline
+
+  # not cached until subscribed to the change notices
+  await pdb.get_pipeline("first_pipe")
+  await pdb.get_pipeline("first_pipe")
+  assert(loads == ["first_pipe", "first_pipe"])
+  assert(pdb.cache_stats()["entries"] == 0)
+
+  pdb._cached = True
+  pdb._version = 3
+  loads.clear()
+  pipe_got = await pdb.get_pipeline("first_pipe")
+  assert(await pdb.get_pipeline("first_pipe") is pipe_got)
+  assert(pipe_got.pipeline_options.timeout == 33)
+  assert(loads == ["first_pipe"])
+  # not found is cached too
+  for index in range(2):
+    try:
+      await pdb.get_pipeline("bogus")
+      raise Exception("Expected get to fail with not found")
+    except py_vcon_server.pipeline.PipelineNotFound:
+      # expected
+      pass
+  assert(loads == ["first_pipe", "bogus"])
+  stats = pdb.cache_stats()
+  assert(stats["hits"] == 2)
+  # including the 2 uncached gets
+  assert(stats["misses"] == 4)
+  assert(stats["entries"] == 2)
+
+  # changed pipeline dropped
+  pipelines["first_pipe"] = py_vcon_server.pipeline.PipelineDefinition(**PIPE_DEF2_DICT)
+  db_version[0] = 4
+  pdb._on_change_notice(vcon.json_codec.dumps({"name": "first_pipe", "version": 4}))
+  assert(pdb.cache_stats()["entries"] == 1)
+  assert((await pdb.get_pipeline("first_pipe")).pipeline_options.timeout == PIPE_DEF2_DICT["pipeline_options"]["timeout"])
+  assert(pdb.cache_stats()["version"] == 4)
+
+  # pipeline read before a change that was already noticed is not cached
+  pdb._on_change("first_pipe", 5)
+  await pdb.get_pipeline("first_pipe")
+  assert("first_pipe" not in pdb._pipelines)
+
+  # bad notice drops everything
+  pdb._on_change_notice("garbage")
+  assert(pdb.cache_stats()["entries"] == 0)
+
+
+@pytest.mark.asyncio
+async def test_pipeline_cache_changes():
+  """ Pipeline changes seen by the caches in other PipelineDbs via redis pub/sub """
+  pdbs = [py_vcon_server.pipeline.PipelineDb(PIPELINE_DB_URL) for index in range(2)]
+  try:
+    for pdb in pdbs:
+      await pdb.start_cache()
+    # let the subscriptions get setup
+    await asyncio.sleep(0.5)
+
+    await pdbs[0].set_pipeline("cache_pipe", PIPE_DEF1_DICT)
+    for pdb in pdbs:
+      assert(pdb.cache_stats()["cached"])
+      assert((await pdb.get_pipeline("cache_pipe")).pipeline_options.timeout == 33)
+      assert((await pdb.get_pipeline("cache_pipe")).pipeline_options.timeout == 33)
+      assert(pdb.cache_stats()["hits"] == 1)
+
+    await pdbs[0].set_pipeline("cache_pipe", PIPE_DEF2_DICT)
+    await asyncio.sleep(0.5)
+    for pdb in pdbs:
+      assert((await pdb.get_pipeline("cache_pipe")).pipeline_options.timeout ==
+        PIPE_DEF2_DICT["pipeline_options"]["timeout"])
+
+    await pdbs[1].delete_pipeline("cache_pipe")
+    await asyncio.sleep(0.5)
+    for pdb in pdbs:
+      try:
+        await pdb.get_pipeline("cache_pipe")
+        raise Exception("Expected get to fail with not found")
+      except py_vcon_server.pipeline.PipelineNotFound:
+        # expected as it was deleted
+        pass
+
+  finally:
+    for pdb in pdbs:
+      await pdb.shutdown()
+
+
 @pytest.mark.asyncio
 async def test_pipeline_restapi(make_inline_audio_vcon: vcon.Vcon):
 
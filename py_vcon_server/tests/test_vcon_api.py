@@ -1,12 +1,48 @@
 # Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
 import asyncio
+import time
 import pytest
 import pytest_asyncio
 import py_vcon_server
+import py_vcon_server.processor
 import vcon
+import vcon.pydantic_utils
 import fastapi.testclient
+from py_vcon_server.settings import VCON_STORAGE_URL
 from common_setup import UUID, make_2_party_tel_vcon
 
+def test_validate_vcon_dict(make_2_party_tel_vcon: vcon.Vcon):
+  vcon_dict = make_2_party_tel_vcon.dumpd()
+  assert(py_vcon_server.processor.vcon_object_type(vcon_dict) == py_vcon_server.processor.VconUnsignedObject)
+  assert(py_vcon_server.processor.vcon_object_type({"payload": "", "signatures": []}) ==
+    py_vcon_server.processor.VconSignedObject)
+  assert(py_vcon_server.processor.vcon_object_type({"ciphertext": "", "recipients": []}) ==
+    py_vcon_server.processor.VconEncryptedObject)
+
+  # validated in place, defaults set
+  del vcon_dict["created_at"]
+  assert(py_vcon_server.processor.validate_vcon_dict(vcon_dict) is vcon_dict)
+  assert(vcon_dict["parties"][0]["tel"] == "1234")
+  assert(vcon_dict["created_at"] != "")
+
+  # nulls removed, as in the dict dumped from the model with exclude_none
+  with_nulls = {"uuid": UUID, "dialog": None, "parties": [{"tel": "1", "name": None}], "created_at": "2025-01-01T00:00:00+00:00"}
+  model_dict = vcon.pydantic_utils.get_dict(py_vcon_server.processor.VconUnsignedObject(**with_nulls), exclude_none = True)
+  validated = py_vcon_server.processor.validate_vcon_dict(with_nulls)
+  assert("dialog" not in validated)
+  assert(validated["parties"] == [{"tel": "1"}])
+  assert(validated == model_dict)
+
+  for invalid in [[vcon_dict], {"uuid": UUID, "parties": [{"tel": 1234}]}, {"ciphertext": "abc"}]:
+    try:
+      py_vcon_server.processor.validate_vcon_dict(invalid)
+      raise Exception("Expected validation error for: {}".format(invalid))
+
+    except vcon.pydantic_utils.ValidationErrorType:
+      # expected
+      pass
+
+
 @pytest.mark.asyncio
 async def test_set_get_delete(make_2_party_tel_vcon: vcon.Vcon):
   vCon = make_2_party_tel_vcon
@@ -29,6 +65,11 @@ async def test_set_get_delete(make_2_party_tel_vcon: vcon.Vcon):
     assert(got_vcon.parties[0]["tel"] == "1234")
     assert(got_vcon.parties[1]["tel"] == "5678")
 
+    set_response = client.post("/vcon", json={"uuid": UUID, "parties": [{"tel": 1234}]})
+    assert(set_response.status_code == 422)
+    set_response = client.post("/vcon", content="{not json")
+    assert(set_response.status_code == 422)
+
     delete_response = client.delete("/vcon/{}".format(UUID))
     assert(delete_response.status_code == 204)
     assert(delete_response.text == "")
@@ -87,3 +128,140 @@ async def test_jsonpath(make_2_party_tel_vcon: vcon.Vcon):
     assert(query_list[0]["tel"] == "1234")
     assert(query_list[1]["tel"] == "5678")
 
+
+@pytest.mark.asyncio
+async def test_conditional(make_2_party_tel_vcon: vcon.Vcon):
+  vCon = make_2_party_tel_vcon
+
+  with fastapi.testclient.TestClient(py_vcon_server.restapi) as client:
+
+    set_response = client.post("/vcon", json=vCon.dumpd())
+    assert(set_response.status_code == 204)
+    etag = set_response.headers["ETag"]
+
+    get_response = client.get("/vcon/{}".format(UUID))
+    assert(get_response.status_code == 200)
+    assert(get_response.headers["ETag"] == etag)
+
+    # unchanged
+    get_response = client.get("/vcon/{}".format(UUID), headers={"If-None-Match": etag})
+    assert(get_response.status_code == 304)
+    assert(get_response.headers["ETag"] == etag)
+    assert(get_response.text == "")
+    get_response = client.get("/vcon/{}".format(UUID), headers={"If-None-Match": "\"bogus\", W/{}".format(etag)})
+    assert(get_response.status_code == 304)
+
+    # different representations have different ETags
+    jq_response = client.get("/vcon/{}/jq".format(UUID), params={"jq_transform": ".parties[]"})
+    assert(jq_response.status_code == 200)
+    jq_etag = jq_response.headers["ETag"]
+    assert(jq_etag != etag)
+    jq_response = client.get("/vcon/{}/jq".format(UUID), params={"jq_transform": ".parties[]"},
+      headers={"If-None-Match": jq_etag})
+    assert(jq_response.status_code == 304)
+    jq_response = client.get("/vcon/{}/jq".format(UUID), params={"jq_transform": ".parties[0]"},
+      headers={"If-None-Match": jq_etag})
+    assert(jq_response.status_code == 200)
+
+    # optimistic concurrency
+    vCon.set_party_parameter("name", "Alice", 0)
+    set_response = client.post("/vcon", json=vCon.dumpd(), headers={"If-Match": etag})
+    assert(set_response.status_code == 204)
+    new_etag = set_response.headers["ETag"]
+    assert(new_etag != etag)
+    # lost update
+    set_response = client.post("/vcon", json=vCon.dumpd(), headers={"If-Match": etag})
+    assert(set_response.status_code == 412)
+    set_response = client.post("/vcon", json=vCon.dumpd(), headers={"If-Match": "\"bogus\", {}".format(new_etag)})
+    assert(set_response.status_code == 204)
+
+    get_response = client.get("/vcon/{}".format(UUID), headers={"If-None-Match": etag})
+    assert(get_response.status_code == 200)
+    assert(get_response.json()["parties"][0]["name"] == "Alice")
+
+    delete_response = client.delete("/vcon/{}".format(UUID))
+    assert(delete_response.status_code == 204)
+    set_response = client.post("/vcon", json=vCon.dumpd(), headers={"If-Match": "*"})
+    assert(set_response.status_code == 412)
+
+@pytest.mark.asyncio
+async def test_bulk(make_2_party_tel_vcon: vcon.Vcon):
+  vcons = [make_2_party_tel_vcon]
+  for index in range(2):
+    a_vcon = vcon.Vcon()
+    a_vcon.set_uuid("py-vcon.org")
+    a_vcon.set_party_parameter("tel", str(index))
+    vcons.append(a_vcon)
+
+  with fastapi.testclient.TestClient(py_vcon_server.restapi) as client:
+
+    set_response = client.post("/vcons", json=[vcons[0].dumpd(), {"parties": []}, vcons[1].dumpd()])
+    assert(set_response.status_code == 200)
+    statuses = set_response.json()
+    assert([status["status"] for status in statuses] == [204, 422, 204])
+    assert(statuses[0]["uuid"] == UUID)
+    assert(statuses[1]["uuid"] is None)
+
+    # NDJSON
+    set_response = client.post("/vcons",
+      content="\n".join([vcons[2].dumps(), "{not json", ""]),
+      headers={"content-type": "application/x-ndjson"})
+    assert(set_response.status_code == 200)
+    assert([status["status"] for status in set_response.json()] == [204, 422])
+
+    set_response = client.post("/vcons", json=vcons[0].dumpd())
+    assert(set_response.status_code == 422)
+
+    get_uuids = [vcons[2].uuid, "bogus", UUID, vcons[1].uuid]
+    get_response = client.get("/vcons", params={"uuid": get_uuids})
+    assert(get_response.status_code == 200)
+    vcon_dicts = get_response.json()
+    assert(len(vcon_dicts) == 4)
+    assert(vcon_dicts[0]["parties"][0]["tel"] == "1")
+    assert(vcon_dicts[1] is None)
+    assert(vcon_dicts[2]["parties"][1]["tel"] == "5678")
+    assert(vcon_dicts[3]["uuid"] == vcons[1].uuid)
+
+
+@pytest.mark.skipif(not VCON_STORAGE_URL.startswith("redis"),
+  reason = "throughput comparison is only meaningful against Redis (with RedisJSON) vCon storage")
+@pytest.mark.asyncio
+async def test_bulk_throughput(make_2_party_tel_vcon: vcon.Vcon):
+  """
+  Compare storing vCons one at a time with POST /vcon to POST /vcons.
+  Requires Redis vCon storage with the RedisJSON module loaded as the
+  rates measured against any other backend say nothing about the
+  pipelined bulk path.
+  """
+  count = 500
+  vcon_dicts = []
+  for index in range(count):
+    vcon_dict = make_2_party_tel_vcon.dumpd()
+    vcon_dict["uuid"] = vcon.Vcon.uuid8_domain_name("py-vcon.org")
+    vcon_dicts.append(vcon_dict)
+
+  with fastapi.testclient.TestClient(py_vcon_server.restapi) as client:
+    start = time.time()
+    for vcon_dict in vcon_dicts:
+      set_response = client.post("/vcon", json=vcon_dict)
+      assert(set_response.status_code == 204)
+    single_rate = count / (time.time() - start)
+
+    start = time.time()
+    set_response = client.post("/vcons", json=vcon_dicts)
+    assert(set_response.status_code == 200)
+    bulk_rate = count / (time.time() - start)
+    assert(all(status["status"] == 204 for status in set_response.json()))
+
+    start = time.time()
+    get_response = client.get("/vcons", params={"uuid": [vcon_dict["uuid"] for vcon_dict in vcon_dicts]})
+    assert(get_response.status_code == 200)
+    get_rate = count / (time.time() - start)
+    assert(None not in get_response.json())
+
+    print("vCons/sec POST /vcon: {:.0f} POST /vcons: {:.0f} GET /vcons: {:.0f}".format(
+        single_rate,
+        bulk_rate,
+        get_rate
+      ))
+    assert(bulk_rate > single_rate)
@@ -0,0 +1,308 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+""" Unit tests for the read-through **CachedVconStorage** """
+
+import time
+import asyncio
+import pytest
+from common_setup import UUID, make_inline_audio_vcon, make_2_party_tel_vcon
+import py_vcon_server.db
+import py_vcon_server.db.vcon_cache
+import py_vcon_server.processor
+import py_vcon_server.settings
+import vcon
+import vcon.json_codec
+
+
+class JsonVconStorage(py_vcon_server.db.VconStorage):
+  """ VconStorage keeping vCons as JSON in memory, so that the cache can be tested without a DB """
+  def __init__(self):
+    self.vcons = {}
+    self.gets = 0
+
+  async def shutdown(self) -> None:
+    pass
+
+  async def set(self, save_vcon) -> None:
+    if(isinstance(save_vcon, vcon.Vcon)):
+      save_vcon = save_vcon.dumpd()
+    self.vcons[vcon.Vcon.get_dict_uuid(save_vcon)] = vcon.json_codec.dumps(save_vcon)
+
+  async def get(self, vcon_uuid: str) -> vcon.Vcon:
+    self.gets += 1
+    if(vcon_uuid not in self.vcons):
+      raise py_vcon_server.db.VconNotFound("vCon not found for UUID: {}".format(vcon_uuid))
+    a_vcon = vcon.Vcon()
+    a_vcon.loads(self.vcons[vcon_uuid])
+    a_vcon.start_journal()
+    return(a_vcon)
+
+  async def delete(self, vcon_uuid: str) -> None:
+    self.vcons.pop(vcon_uuid, None)
+
+
+class RevisionedJsonVconStorage(JsonVconStorage):
+  """ JsonVconStorage which keeps a revision for each save, as the Redis binding does """
+  def __init__(self):
+    super().__init__()
+    self.revisions = {}
+    self.saves = 0
+
+  async def set(self, save_vcon) -> None:
+    await super().set(save_vcon)
+    self.saves += 1
+    vcon_uuid = save_vcon.uuid if isinstance(save_vcon, vcon.Vcon) else vcon.Vcon.get_dict_uuid(save_vcon)
+    self.revisions[vcon_uuid] = str(self.saves)
+
+  async def get(self, vcon_uuid: str) -> vcon.Vcon:
+    a_vcon = await super().get(vcon_uuid)
+    a_vcon.start_journal(self.revisions[vcon_uuid])
+    return(a_vcon)
+
+  async def get_raw(self, vcon_uuid: str):
+    if(vcon_uuid not in self.vcons):
+      raise py_vcon_server.db.VconNotFound("vCon not found for UUID: {}".format(vcon_uuid))
+    return(self.vcons[vcon_uuid].encode("utf-8"), self.revisions[vcon_uuid])
+
+  async def get_revision(self, vcon_uuid: str):
+    return(self.revisions.get(vcon_uuid, None))
+
+  async def delete(self, vcon_uuid: str) -> None:
+    await super().delete(vcon_uuid)
+    self.revisions.pop(vcon_uuid, None)
+
+
+@pytest.mark.asyncio
+async def test_vcon_cache(make_2_party_tel_vcon: vcon.Vcon, make_inline_audio_vcon: vcon.Vcon) -> None:
+  storage = RevisionedJsonVconStorage()
+  cache = py_vcon_server.db.vcon_cache.CachedVconStorage(storage, 2, 10 * 1024 * 1024)
+  vcon1 = make_2_party_tel_vcon
+  vcon2 = make_inline_audio_vcon
+  vcon2.set_uuid("py-vcon.org", True)
+  vcon3 = vcon.Vcon()
+  vcon3.set_uuid("py-vcon.org")
+  await cache.set_many([vcon1, vcon2.dumps(), vcon3.dumpd()])
+
+  got1 = await cache.get(UUID)
+  assert(got1.dumpd() == vcon1.dumpd())
+  got1_again = await cache.get(UUID)
+  assert(got1_again.dumpd() == vcon1.dumpd())
+  assert(storage.gets == 1)
+  stats = cache.stats()
+  assert(stats["hits"] == 1)
+  assert(stats["misses"] == 1)
+  assert(stats["hit_rate"] == 0.5)
+  assert(stats["entries"] == 1)
+
+  # Cached vCons are copies, changes are not seen by other gets until saved
+  assert(got1_again is not got1)
+  assert(got1_again.get_journal_operations() == [])
+  got1_again.set_party_parameter("name", "Alice", 0)
+  assert("name" not in (await cache.get(UUID)).parties[0])
+
+  # LRU limited to 2 entries
+  vcons = await cache.get_many([vcon2.uuid, vcon3.uuid, "bogus"])
+  assert([a_vcon.uuid for a_vcon in vcons[0:2]] == [vcon2.uuid, vcon3.uuid])
+  assert(vcons[2] is None)
+  assert(cache.stats()["entries"] == 2)
+  gets = storage.gets
+  await cache.get(vcon3.uuid)
+  assert(storage.gets == gets)
+  await cache.get(UUID)
+  assert(storage.gets == gets + 1)
+
+  try:
+    await cache.get("bogus")
+    raise Exception("Expected exception for vCon not found")
+
+  except py_vcon_server.db.VconNotFound:
+    # expected
+    pass
+
+  # JSON and the revision it was got with served from the cache
+  hits = cache.stats()["hits"]
+  vcon_json, revision = await cache.get_raw(UUID)
+  assert(vcon.json_codec.loads(vcon_json) == vcon1.dumpd())
+  assert(revision == await storage.get_revision(UUID))
+  assert(cache.stats()["hits"] == hits + 1)
+  vcon_json, revision = await cache.get_raw(vcon2.uuid)
+  assert(vcon.json_codec.loads(vcon_json) == vcon2.dumpd())
+  assert(revision == await storage.get_revision(vcon2.uuid))
+
+  # not served from the cache if the storage revision is not known
+  unrevisioned_cache = py_vcon_server.db.vcon_cache.CachedVconStorage(JsonVconStorage())
+  await unrevisioned_cache.set(vcon1)
+  await unrevisioned_cache.get(UUID)
+  vcon_json, revision = await unrevisioned_cache.get_raw(UUID)
+  assert(revision == await unrevisioned_cache.get_revision(UUID))
+  assert(unrevisioned_cache.stats()["hits"] == 0)
+
+  # Invalidated on commit
+  io_object = py_vcon_server.processor.VconProcessorIO(cache)
+  await io_object.add_vcon(got1_again, "fake_lock", False)
+  await io_object.update_vcon(got1_again)
+  await cache.commit(io_object)
+  assert(UUID not in cache._entries)
+  assert((await cache.get(UUID)).parties[0]["name"] == "Alice")
+  assert(cache.stats()["invalidations"] == 1)
+
+  # Invalidated on delete
+  await cache.delete(UUID)
+  try:
+    await cache.get(UUID)
+    raise Exception("Expected exception for deleted vCon")
+
+  except py_vcon_server.db.VconNotFound:
+    # expected
+    pass
+
+  # Invalidation published by the storage
+  await cache.get(vcon3.uuid)
+  await cache.get(vcon2.uuid)
+  cache._on_invalidation(vcon.json_codec.dumps({"uuids": [vcon3.uuid]}))
+  assert(vcon3.uuid not in cache._entries)
+  assert(vcon2.uuid in cache._entries)
+  # bad message, may have missed invalidations
+  cache._on_invalidation("garbage")
+  assert(cache.stats()["entries"] == 0)
+
+  # bytes limit
+  cache = py_vcon_server.db.vcon_cache.CachedVconStorage(storage, 10, 20000)
+  await cache.get(vcon2.uuid)
+  assert(cache.stats()["entries"] == 0)
+  await cache.get(vcon3.uuid)
+  assert(cache.stats()["entries"] == 1)
+  assert(0 < cache.stats()["bytes"] < 20000)
+
+  # get racing with set does not cache the old vCon
+  cache.invalidate([vcon3.uuid])
+  generation = cache._generation
+  old_vcon = await storage.get(vcon3.uuid)
+  cache.invalidate([vcon3.uuid])
+  cache._add(vcon3.uuid, old_vcon, generation)
+  assert(vcon3.uuid not in cache._entries)
+
+
+@pytest.mark.asyncio
+async def test_vcon_revision(make_2_party_tel_vcon: vcon.Vcon) -> None:
+  """ The default content hash revision, through the cache """
+  storage = JsonVconStorage()
+  cache = py_vcon_server.db.vcon_cache.CachedVconStorage(storage)
+  assert(await cache.get_revision(UUID) is None)
+  try:
+    await cache.set_if_revision(make_2_party_tel_vcon, "*")
+    raise Exception("Expected exception for vCon not saved")
+
+  except py_vcon_server.db.RevisionMismatch:
+    # expected
+    pass
+
+  revision1 = await cache.set_if_revision(make_2_party_tel_vcon.dumps(), None)
+  await cache.get(UUID)
+  assert(await storage.get_revision(UUID) == revision1)
+  # content hash, same content same revision
+  assert(await cache.set_if_revision(make_2_party_tel_vcon.dumpd(), revision1) == revision1)
+
+  make_2_party_tel_vcon.set_party_parameter("name", "Alice", 0)
+  revision2 = await cache.set_if_revision(make_2_party_tel_vcon, "*")
+  assert(revision2 != revision1)
+  assert((await cache.get(UUID)).parties[0]["name"] == "Alice")
+  try:
+    await cache.set_if_revision(make_2_party_tel_vcon, revision1)
+    raise Exception("Expected exception for old revision")
+
+  except py_vcon_server.db.RevisionMismatch:
+    # expected
+    pass
+
+
+@pytest.mark.asyncio
+async def test_vcon_cache_benchmark(make_inline_audio_vcon: vcon.Vcon) -> None:
+  storage = JsonVconStorage()
+  await storage.set(make_inline_audio_vcon)
+  cache = py_vcon_server.db.vcon_cache.CachedVconStorage(storage)
+  count = 50
+
+  start = time.process_time()
+  for index in range(count):
+    await storage.get(UUID)
+  uncached_time = (time.process_time() - start) / count
+
+  start = time.process_time()
+  for index in range(count):
+    await cache.get(UUID)
+  cached_time = (time.process_time() - start) / count
+
+  print("vCon get parsed: {:.6f} sec cached: {:.6f} sec hit rate: {}".format(
+      uncached_time,
+      cached_time,
+      cache.stats()["hit_rate"]
+    ))
+  assert(cache.stats()["hit_rate"] == (count - 1) / count)
+  assert(cached_time < uncached_time)
+
+
+@pytest.mark.asyncio
+async def test_vcon_cache_redis_invalidation(make_2_party_tel_vcon: vcon.Vcon) -> None:
+  """ Invalidation across servers via redis pub/sub """
+  caches = [py_vcon_server.db.vcon_cache.CachedVconStorage(
+      py_vcon_server.db.VconStorage.instantiate(py_vcon_server.settings.VCON_STORAGE_URL),
+      invalidation_url = py_vcon_server.settings.VCON_STORAGE_URL
+    ) for index in range(2)]
+  try:
+    for cache in caches:
+      await cache.start()
+    # let the subscriptions get setup
+    await asyncio.sleep(0.5)
+
+    await caches[0].set(make_2_party_tel_vcon)
+    for cache in caches:
+      await cache.get(UUID)
+      assert(UUID in cache._entries)
+
+    make_2_party_tel_vcon.set_party_parameter("name", "Bob", 1)
+    await caches[0].set(make_2_party_tel_vcon)
+    await asyncio.sleep(0.5)
+    assert(UUID not in caches[1]._entries)
+    assert((await caches[1].get(UUID)).parties[1]["name"] == "Bob")
+
+  finally:
+    for cache in caches:
+      await cache.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_vcon_cache_storage_invalidation(make_2_party_tel_vcon: vcon.Vcon) -> None:
+  """ Changes saved by another, uncached VconStorage instance invalidate the cache """
+  cache = py_vcon_server.db.vcon_cache.CachedVconStorage(
+      py_vcon_server.db.VconStorage.instantiate(py_vcon_server.settings.VCON_STORAGE_URL),
+      invalidation_url = py_vcon_server.settings.VCON_STORAGE_URL
+    )
+  storage = py_vcon_server.db.VconStorage.instantiate(py_vcon_server.settings.VCON_STORAGE_URL)
+  try:
+    await cache.start()
+    # let the subscription get setup
+    await asyncio.sleep(0.5)
+
+    await storage.set(make_2_party_tel_vcon)
+    await asyncio.sleep(0.5)
+    await cache.get(UUID)
+    assert(UUID in cache._entries)
+
+    # journaled update, as done by pipeline jobs
+    a_vcon = await storage.get(UUID)
+    a_vcon.set_party_parameter("name", "Carol", 0)
+    await storage.update(a_vcon)
+    await asyncio.sleep(0.5)
+    assert(UUID not in cache._entries)
+    assert((await cache.get(UUID)).parties[0]["name"] == "Carol")
+    vcon_json, revision = await cache.get_raw(UUID)
+    assert(vcon.json_codec.loads(vcon_json)["parties"][0]["name"] == "Carol")
+    assert(revision == await storage.get_revision(UUID))
+
+    await storage.delete(UUID)
+    await asyncio.sleep(0.5)
+    assert(UUID not in cache._entries)
+
+  finally:
+    await cache.shutdown()
+    await storage.shutdown()
@@ -0,0 +1,172 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+""" Unit tests and benchmark for the copy-on-write vCon forms in MultifariousVcon and VconProcessorIO """
+
+import os
+import time
+import datetime
+import pytest
+import py_vcon_server.processor
+from common_setup import UUID, make_2_party_tel_vcon
+import vcon
+
+
+def make_large_vcon(word_count: int, body_size: int) -> vcon.Vcon:
+  """ vCon with a large recording and a transcript with word time stamps """
+  vCon = vcon.Vcon()
+  vCon._vcon_dict["uuid"] = UUID
+  vCon.set_party_parameter("tel", "1234")
+  vCon.set_party_parameter("tel", "5678")
+  vCon.add_dialog_inline_recording(
+      os.urandom(body_size),
+      datetime.datetime.utcnow(),
+      0,
+      [0, 1],
+      vcon.Vcon.MEDIATYPE_AUDIO_WAV,
+      "recording.wav"
+    )
+  words = [{"word": "word{}".format(index), "start": index * 0.5, "end": index * 0.5 + 0.4, "probability": 0.9}
+    for index in range(word_count)]
+  vCon.add_analysis_transcript(0, {"segments": [{"words": words}]}, "openai", "whisper_word_timestamps")
+
+  return(vCon)
+
+
+@pytest.mark.asyncio
+async def test_shared_forms(make_2_party_tel_vcon: vcon.Vcon) -> None:
+  mVcon = py_vcon_server.processor.MultifariousVcon(None)
+  mVcon.update_vcon(make_2_party_tel_vcon)
+
+  # readers share the cached forms
+  reader_object = await mVcon.get_vcon(py_vcon_server.processor.VconTypes.OBJECT, True)
+  assert(reader_object is make_2_party_tel_vcon)
+  reader_dict = await mVcon.get_vcon(py_vcon_server.processor.VconTypes.DICT, True)
+  assert(reader_dict is await mVcon.get_vcon(py_vcon_server.processor.VconTypes.DICT, True))
+  assert(reader_dict["parties"] is reader_object.parties)
+  assert(mVcon.copies == 0)
+
+  # writers get a private copy
+  writer_object = await mVcon.get_vcon(py_vcon_server.processor.VconTypes.OBJECT)
+  assert(writer_object is not reader_object)
+  writer_dict = await mVcon.get_vcon(py_vcon_server.processor.VconTypes.DICT)
+  assert(writer_dict is not reader_dict)
+  assert(mVcon.copies == 2)
+  writer_dict["parties"].append({"tel": "0000"})
+  writer_object.set_party_parameter("tel", "9999")
+  assert(len(reader_object.parties) == 2)
+  assert(len(reader_dict["parties"]) == 2)
+  assert(mVcon.updates == 0)
+
+  # The modified copy replaces the shared forms
+  mVcon.update_vcon(writer_object)
+  assert(mVcon.updates == 1)
+  assert(len((await mVcon.get_vcon(py_vcon_server.processor.VconTypes.DICT, True))["parties"]) == 3)
+  assert('"9999"' in await mVcon.get_vcon(py_vcon_server.processor.VconTypes.JSON))
+  # readers holding the prior forms are not affected
+  assert(len(reader_object.parties) == 2)
+
+  # forms built from JSON
+  mVcon.update_vcon(make_2_party_tel_vcon.dumps())
+  assert(await mVcon.get_vcon(py_vcon_server.processor.VconTypes.UUID) == UUID)
+  json_dict = await mVcon.get_vcon(py_vcon_server.processor.VconTypes.DICT, True)
+  assert(json_dict == make_2_party_tel_vcon.dumpd())
+  assert(json_dict is (await mVcon.get_vcon(py_vcon_server.processor.VconTypes.OBJECT, True))._vcon_dict)
+
+  # Only the object form already constructed, without conversion or copy
+  mVcon.update_vcon(make_2_party_tel_vcon.dumps())
+  assert(mVcon.get_cached_object() is None)
+  object_form = await mVcon.get_vcon(py_vcon_server.processor.VconTypes.OBJECT, True)
+  copies = mVcon.copies
+  assert(mVcon.get_cached_object() is object_form)
+  assert(mVcon.copies == copies)
+
+
+@pytest.mark.asyncio
+async def test_processor_io_readonly(make_2_party_tel_vcon: vcon.Vcon) -> None:
+  proc_io = py_vcon_server.processor.VconProcessorIO(None)
+  await proc_io.add_vcon(make_2_party_tel_vcon, "fake_lock", False)
+
+  assert(await proc_io.get_vcon(0) is not make_2_party_tel_vcon)
+  assert(await proc_io.get_vcon(0, readonly = True) is make_2_party_tel_vcon)
+
+  # As set by the Pipeline for a VconProcessor which does not modify vCons
+  with proc_io.readonly_access(True):
+    assert(await proc_io.get_vcon(0) is make_2_party_tel_vcon)
+    assert(await proc_io.get_vcon(0, readonly = False) is not make_2_party_tel_vcon)
+    with proc_io.readonly_access(False):
+      assert(await proc_io.get_vcon(0) is not make_2_party_tel_vcon)
+    # prior readonly access restored
+    assert(await proc_io.get_vcon(0) is make_2_party_tel_vcon)
+
+  assert(await proc_io.get_vcon(0) is not make_2_party_tel_vcon)
+
+  # restored when the VconProcessor raises
+  try:
+    with proc_io.readonly_access(True):
+      raise Exception("processor failed")
+
+  except Exception as e:
+    assert(str(e) == "processor failed")
+
+  assert(await proc_io.get_vcon(0) is not make_2_party_tel_vcon)
+
+  # The updated object is kept, not copied
+  copies = proc_io._vcons[0].copies
+  modified_vcon = await proc_io.get_vcon(0)
+  modified_vcon.set_subject("modified")
+  await proc_io.update_vcon(modified_vcon)
+  assert(proc_io._vcons[0].copies == copies + 1)
+  assert(await proc_io.get_vcon(0, readonly = True) is modified_vcon)
+
+
+async def run_stages(
+    proc_io: py_vcon_server.processor.VconProcessorIO,
+    stages: str,
+    copy_on_write: bool
+  ) -> None:
+  """ Simulate a pipeline, the VconProcessors in which read (r) or modify (w) the vCon """
+  for stage_index, stage in enumerate(stages):
+    with proc_io.readonly_access(copy_on_write and stage == "r"):
+      stage_vcon = await proc_io.get_vcon(0)
+      if(stage == "w"):
+        stage_vcon.add_analysis(0, "summary", "stage {}".format(stage_index), "fake vendor")
+        await proc_io.update_vcon(stage_vcon)
+
+      else:
+        assert(stage_vcon.find_analysis(0, "transcript") == [0])
+
+
+@pytest.mark.asyncio
+async def test_copy_on_write_benchmark() -> None:
+  large_vcon = make_large_vcon(20000, 4 * 1024 * 1024)
+  stages = "rrrwrrrr"
+  count = 3
+  results = {}
+
+  for copy_on_write in (False, True):
+    start = time.process_time()
+    for index in range(count):
+      proc_io = py_vcon_server.processor.VconProcessorIO(None)
+      await proc_io.add_vcon(large_vcon, "fake_lock", False)
+      await run_stages(proc_io, stages, copy_on_write)
+      out_dict = await proc_io.get_vcon(0, py_vcon_server.processor.VconTypes.DICT, True)
+    results[copy_on_write] = (
+        (time.process_time() - start) / count,
+        proc_io._vcons[0].copies,
+        out_dict
+      )
+
+  # Same result, the shared vCon was not modified by the writer
+  assert(results[True][2] == results[False][2])
+  assert(len(results[True][2]["analysis"]) == 2)
+  assert(len(large_vcon.analysis) == 1)
+
+  print("{} stage pipeline: deepcopy per access: {:.4f} sec {} copies copy-on-write: {:.4f} sec {} copies".format(
+      len(stages),
+      results[False][0],
+      results[False][1],
+      results[True][0],
+      results[True][1]
+    ))
+
+  assert(results[True][1] == stages.count("w"))
+  assert(results[True][0] * 2 < results[False][0])
@@ -0,0 +1,150 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+""" Unit tests for getting partial **Vcon**s from **VconStorage** """
+
+import pytest
+import pytest_asyncio
+import fastapi.testclient
+from common_setup import UUID, make_inline_audio_vcon, make_2_party_tel_vcon
+from test_vcon_cache import RevisionedJsonVconStorage
+import py_vcon_server
+import py_vcon_server.db
+import py_vcon_server.db.vcon_cache
+import vcon
+import vcon.json_codec
+
+
+def test_exclusions(make_inline_audio_vcon: vcon.Vcon) -> None:
+  assert(py_vcon_server.db.parse_exclusions(" dialog.body, attachments,,dialog.body") ==
+    [("dialog", "body"), ("attachments", None)])
+  assert(py_vcon_server.db.parse_exclusions(["analysis.body"]) == [("analysis", "body")])
+  assert(py_vcon_server.db.exclusion_paths([("dialog", "body"), ("attachments", None)]) ==
+    ["dialog.body", "attachments"])
+  for bad_path in ["uuid", "vcon", "dialog.body.x", "dialog.", ".body"]:
+    try:
+      py_vcon_server.db.parse_exclusions(bad_path)
+      raise Exception("Expected exception for invalid exclusion: {}".format(bad_path))
+
+    except py_vcon_server.db.InvalidExclusion:
+      # expected
+      pass
+
+  vcon_dict = make_inline_audio_vcon.dumpd()
+  partial_dict = py_vcon_server.db.project_vcon_dict(vcon_dict, [("dialog", "body"), ("attachments", None)])
+  assert("attachments" not in partial_dict)
+  assert("body" not in partial_dict["dialog"][0])
+  assert(partial_dict["dialog"][0]["mediatype"] == vcon.Vcon.MEDIATYPE_AUDIO_WAV)
+  # shared, not copied
+  assert(partial_dict["parties"] is vcon_dict["parties"])
+  assert("body" in vcon_dict["dialog"][0])
+
+
+@pytest.mark.asyncio
+async def test_get_partial(make_inline_audio_vcon: vcon.Vcon) -> None:
+  """ The default get_partial and the cached get_partial """
+  storage = RevisionedJsonVconStorage()
+  await storage.set(make_inline_audio_vcon)
+  cache = py_vcon_server.db.vcon_cache.CachedVconStorage(storage)
+
+  for vcon_storage in (storage, cache, cache):
+    partial_vcon, revision = await vcon_storage.get_partial(UUID, "dialog.body,analysis")
+    assert(revision == await storage.get_revision(UUID))
+    assert(partial_vcon.is_partial())
+    assert("analysis" not in partial_vcon.dumpd())
+    assert("body" not in partial_vcon.dialog[0])
+    assert(partial_vcon.parties == make_inline_audio_vcon.parties)
+    # journal is not started
+    assert(partial_vcon.get_journal_operations() is None)
+    if(vcon_storage is cache):
+      await cache.get(UUID)
+
+  assert(cache.stats()["hits"] == 2)
+
+  # cached copy not changed
+  partial_vcon.parties[0]["tel"] = "bogus"
+  assert((await cache.get(UUID)).parties[0]["tel"] == "1234")
+
+  try:
+    py_vcon_server.db.check_savable(partial_vcon)
+    raise Exception("Expected exception for saving partial vCon")
+
+  except py_vcon_server.db.PartialVconNotSaved:
+    # expected
+    pass
+  py_vcon_server.db.check_savable(make_inline_audio_vcon)
+
+
+VCON_STORAGE = None
+
+@pytest_asyncio.fixture()
+async def redis_storage():
+  """ Setup Vcon storage connection before test """
+  vs = py_vcon_server.db.VconStorage.instantiate()
+  global VCON_STORAGE
+  VCON_STORAGE = vs
+
+  yield
+
+  VCON_STORAGE = None
+  await vs.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_redis_get_partial(redis_storage, make_inline_audio_vcon: vcon.Vcon) -> None:
+  make_inline_audio_vcon.add_analysis(0, "summary", "a summary", "fake vendor")
+  make_inline_audio_vcon.add_attachment_inline(b"attachment body", "2025-01-01T00:00:00Z", 0, "text/plain")
+  await VCON_STORAGE.set(make_inline_audio_vcon)
+
+  partial_vcon, revision = await VCON_STORAGE.get_partial(UUID, ["dialog.body", "attachments.body", "analysis"])
+  assert(revision == await VCON_STORAGE.get_revision(UUID))
+  expected_dict = py_vcon_server.db.project_vcon_dict(
+      make_inline_audio_vcon.dumpd(),
+      [("dialog", "body"), ("attachments", "body"), ("analysis", None)]
+    )
+  assert(partial_vcon.dumpd() == expected_dict)
+  assert(partial_vcon.is_partial())
+
+  # one path
+  partial_vcon, revision = await VCON_STORAGE.get_partial(UUID, "dialog,parties,analysis,attachments,group,redacted,appended,amended,created_at,subject")
+  assert(partial_vcon.uuid == UUID)
+
+  # a partial vCon cannot replace the whole vCon
+  try:
+    await VCON_STORAGE.set(partial_vcon)
+    raise Exception("Expected exception for saving partial vCon")
+
+  except py_vcon_server.db.PartialVconNotSaved:
+    # expected
+    pass
+  assert((await VCON_STORAGE.get(UUID)).dumpd() == make_inline_audio_vcon.dumpd())
+
+  try:
+    await VCON_STORAGE.get_partial("bogus", "dialog.body")
+    raise Exception("Expected exception for vCon not found")
+
+  except py_vcon_server.db.VconNotFound:
+    # expected
+    pass
+
+
+def test_api_get_partial(make_inline_audio_vcon: vcon.Vcon) -> None:
+  with fastapi.testclient.TestClient(py_vcon_server.restapi) as client:
+    set_response = client.post("/vcon", json = make_inline_audio_vcon.dumpd())
+    assert(set_response.status_code == 204)
+
+    get_response = client.get("/vcon/{}".format(UUID), params = {"exclude": "dialog.body"})
+    assert(get_response.status_code == 200)
+    partial_dict = get_response.json()
+    assert("body" not in partial_dict["dialog"][0])
+    assert(partial_dict["parties"] == make_inline_audio_vcon.parties)
+
+    # ETag of the revision read with the vCon
+    partial_etag = get_response.headers["ETag"]
+    get_response = client.get("/vcon/{}".format(UUID))
+    assert(get_response.headers["ETag"] == set_response.headers["ETag"])
+    assert(partial_etag != set_response.headers["ETag"])
+    get_response = client.get("/vcon/{}".format(UUID), params = {"exclude": "dialog.body"},
+      headers = {"If-None-Match": partial_etag})
+    assert(get_response.status_code == 304)
+
+    get_response = client.get("/vcon/{}".format(UUID), params = {"exclude": "uuid"})
+    assert(get_response.status_code == 422)
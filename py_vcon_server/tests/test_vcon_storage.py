@@ -8,6 +8,7 @@ import py_vcon_server
 import py_vcon_server.processor
 from py_vcon_server.db import VconStorage
 import vcon
+import vcon.json_codec
 
 VCON_STORAGE = None
 
@@ -143,3 +144,205 @@ async def test_processor_io_commit(
     # expected
     pass
 
+
+
+@pytest.mark.asyncio
+async def test_redis_update(make_inline_audio_vcon: vcon.Vcon):
+  """ Test **VconStorage.update** writing only the changes to a **Vcon** """
+  vCon = make_inline_audio_vcon
+  await VCON_STORAGE.set(vCon)
+
+  retrieved_vcon = await VCON_STORAGE.get(UUID)
+  assert(retrieved_vcon.get_journal_operations() == [])
+  retrieved_vcon.add_analysis(0, "summary", "a summary", "fake vendor")
+  retrieved_vcon.add_analysis(0, "sentiment", "happy", "fake vendor")
+  retrieved_vcon.set_party_parameter("name", "Alice", 0)
+  retrieved_vcon.set_subject("journaled")
+  operations = retrieved_vcon.get_journal_operations()
+  assert(len(operations) == 3)
+
+  # Commit via VconProcessorIO the way a pipeline does
+  io_object = py_vcon_server.processor.VconProcessorIO(VCON_STORAGE)
+  await io_object.add_vcon(retrieved_vcon, "fake_lock", False)
+  await io_object.update_vcon(await io_object.get_vcon(0))
+  await VCON_STORAGE.commit(io_object)
+  committed_vcon = await io_object.get_vcon(0, py_vcon_server.processor.VconTypes.OBJECT, True)
+  # Journal restarted after the update
+  assert(committed_vcon.get_journal_operations() == [])
+
+  updated_vcon = await VCON_STORAGE.get(UUID)
+  assert(updated_vcon.dumpd() == committed_vcon.dumpd())
+  assert([analysis["type"] for analysis in updated_vcon.analysis] == ["summary", "sentiment"])
+  assert(updated_vcon.parties[0]["name"] == "Alice")
+  assert(updated_vcon.subject == "journaled")
+  assert(updated_vcon.dialog[0]["body"] == vCon.dialog[0]["body"])
+
+  # List replaced, set in full
+  updated_vcon._vcon_dict["attachments"] = [{"type": "tags", "encoding": "none", "body": ""}]
+  await VCON_STORAGE.update(updated_vcon)
+  assert((await VCON_STORAGE.get(UUID)).attachments == updated_vcon.attachments)
+
+  # Changed in place, whole vCon written with a new revision
+  in_place_vcon = await VCON_STORAGE.get(UUID)
+  revision = await VCON_STORAGE.get_revision(UUID)
+  assert(in_place_vcon.get_journal_revision() == revision)
+  in_place_vcon.parties[0]["name"] = "Bob"
+  assert(in_place_vcon.get_journal_operations() is None)
+  await VCON_STORAGE.update(in_place_vcon)
+  assert((await VCON_STORAGE.get(UUID)).parties[0]["name"] == "Bob")
+  assert(await VCON_STORAGE.get_revision(UUID) != revision)
+  assert(in_place_vcon.get_journal_revision() == await VCON_STORAGE.get_revision(UUID))
+
+  # Saved since got, the other update is not overwritten
+  stale_vcon = await VCON_STORAGE.get(UUID)
+  stale_in_place_vcon = await VCON_STORAGE.get(UUID)
+  other_vcon = await VCON_STORAGE.get(UUID)
+  other_vcon.set_subject("saved in between")
+  await VCON_STORAGE.update(other_vcon)
+  stale_vcon.add_analysis(0, "topic", "weather", "fake vendor")
+  assert(len(stale_vcon.get_journal_operations()) == 1)
+  try:
+    await VCON_STORAGE.update(stale_vcon)
+    raise Exception("Expected RevisionMismatch for update of vCon saved since got")
+
+  except py_vcon_server.db.RevisionMismatch as e:
+    # expected
+    pass
+
+  stale_in_place_vcon.parties[0]["name"] = "Carol"
+  assert(stale_in_place_vcon.get_journal_operations() is None)
+  try:
+    await VCON_STORAGE.update_many([stale_in_place_vcon])
+    raise Exception("Expected RevisionMismatch for whole vCon write of vCon saved since got")
+
+  except py_vcon_server.db.RevisionMismatch as e:
+    # expected
+    pass
+
+  assert((await VCON_STORAGE.get(UUID)).dumpd() == other_vcon.dumpd())
+  assert(other_vcon.get_journal_revision() == await VCON_STORAGE.get_revision(UUID))
+
+  # Got again, the changes apply to the current revision
+  current_vcon = await VCON_STORAGE.get(UUID)
+  current_vcon.add_analysis(0, "topic", "weather", "fake vendor")
+  await VCON_STORAGE.update(current_vcon)
+  updated_vcon = await VCON_STORAGE.get(UUID)
+  assert(updated_vcon.subject == "saved in between")
+  assert(updated_vcon.analysis[-1]["body"] == "weather")
+
+  # Not from storage, whole vCon written
+  vCon.set_subject("not journaled")
+  assert(vCon.get_journal_operations() is None)
+  await VCON_STORAGE.update(vCon)
+  assert((await VCON_STORAGE.get(UUID)).dumpd() == vCon.dumpd())
+
+
+@pytest.mark.asyncio
+async def test_redis_many(
+  make_2_party_tel_vcon: vcon.Vcon,
+  make_inline_audio_vcon: vcon.Vcon
+  ):
+  """ Test the bulk set, get, update and delete of **Vcon**s """
+  vcon1 = make_2_party_tel_vcon
+  vcon2 = make_inline_audio_vcon
+  vcon2.set_uuid("py-vcon.org", True)
+  missing_uuid = vcon.Vcon().set_uuid("py-vcon.org")
+
+  await VCON_STORAGE.set_many([vcon1, vcon2.dumpd()])
+  retrieved_vcons = await VCON_STORAGE.get_many([vcon2.uuid, missing_uuid, vcon1.uuid])
+  assert(len(retrieved_vcons) == 3)
+  assert(retrieved_vcons[0].dumpd() == vcon2.dumpd())
+  assert(retrieved_vcons[1] is None)
+  assert(retrieved_vcons[2].dumpd() == vcon1.dumpd())
+  assert(await VCON_STORAGE.get_many([]) == [])
+
+  # Journaled changes and a new vCon committed together
+  retrieved_vcons[0].add_analysis(0, "summary", "a summary", "fake vendor")
+  retrieved_vcons[2].set_party_parameter("name", "Bob", 1)
+  vcon3 = vcon.Vcon()
+  vcon3.set_uuid("py-vcon.org")
+  vcon3.set_party_parameter("tel", "9999")
+  io_object = py_vcon_server.processor.VconProcessorIO(VCON_STORAGE)
+  await io_object.add_vcon(retrieved_vcons[0], "fake_lock", False)
+  await io_object.add_vcon(retrieved_vcons[2], "fake_lock", False)
+  await io_object.add_vcon(vcon3, None, False)
+  await VCON_STORAGE.commit(io_object)
+
+  updated_vcons = await VCON_STORAGE.get_many([vcon1.uuid, vcon2.uuid, vcon3.uuid])
+  assert(updated_vcons[0].parties[1]["name"] == "Bob")
+  assert(updated_vcons[1].analysis[0]["type"] == "summary")
+  assert(updated_vcons[1].dialog[0]["body"] == vcon2.dialog[0]["body"])
+  assert(updated_vcons[2].parties[0]["tel"] == "9999")
+
+  await VCON_STORAGE.delete_many([vcon1.uuid, vcon2.uuid, vcon3.uuid, missing_uuid])
+  assert(await VCON_STORAGE.get_many([vcon1.uuid, vcon2.uuid, vcon3.uuid]) == [None, None, None])
+
+
+@pytest.mark.asyncio
+async def test_redis_get_raw(make_2_party_tel_vcon: vcon.Vcon):
+  """ Test getting the stored JSON of a **Vcon** without parsing it """
+  vCon = make_2_party_tel_vcon
+  await VCON_STORAGE.set(vCon)
+
+  vcon_json, revision = await VCON_STORAGE.get_raw(UUID)
+  assert(isinstance(vcon_json, bytes))
+  assert(vcon.json_codec.loads(vcon_json) == vCon.dumpd())
+  assert(revision == await VCON_STORAGE.get_revision(UUID))
+
+  # older version is migrated
+  old_dict = vCon.dumpd()
+  old_dict["vcon"] = "0.0.1"
+  await VCON_STORAGE.set(old_dict)
+  vcon_json, revision = await VCON_STORAGE.get_raw(UUID)
+  assert(vcon.json_codec.loads(vcon_json)["vcon"] == vcon.Vcon.CURRENT_VCON_VERSION)
+
+  await VCON_STORAGE.delete(UUID)
+  try:
+    await VCON_STORAGE.get_raw(UUID)
+    raise Exception("vCon deleted, this should fail")
+  except py_vcon_server.db.VconNotFound as e:
+    # expected
+    pass
+
+
+@pytest.mark.asyncio
+async def test_redis_revision(make_2_party_tel_vcon: vcon.Vcon):
+  """ Test the revision kept for each save and saving only if at the expected revision """
+  vCon = make_2_party_tel_vcon
+  await VCON_STORAGE.delete(UUID)
+  assert(await VCON_STORAGE.get_revision(UUID) is None)
+
+  # must exist to match any revision
+  try:
+    await VCON_STORAGE.set_if_revision(vCon, "*")
+    raise Exception("vCon does not exist, this should fail")
+  except py_vcon_server.db.RevisionMismatch as e:
+    # expected
+    pass
+
+  revision1 = await VCON_STORAGE.set_if_revision(vCon, None)
+  assert(await VCON_STORAGE.get_revision(UUID) == revision1)
+  assert(await VCON_STORAGE.get_revision(UUID) == revision1)
+
+  vCon.set_party_parameter("name", "Alice", 0)
+  revision2 = await VCON_STORAGE.set_if_revision(vCon, revision1)
+  assert(revision2 != revision1)
+  try:
+    await VCON_STORAGE.set_if_revision(vCon, revision1)
+    raise Exception("Old revision, this should fail")
+  except py_vcon_server.db.RevisionMismatch as e:
+    # expected
+    pass
+  assert(await VCON_STORAGE.get_revision(UUID) == revision2)
+
+  # update, set and set_many change the revision
+  got_vcon = await VCON_STORAGE.get(UUID)
+  got_vcon.set_party_parameter("name", "Bob", 1)
+  await VCON_STORAGE.update(got_vcon)
+  revision3 = await VCON_STORAGE.get_revision(UUID)
+  assert(revision3 != revision2)
+  await VCON_STORAGE.set_many([vCon])
+  assert(await VCON_STORAGE.get_revision(UUID) != revision3)
+
+  await VCON_STORAGE.delete(UUID)
+  assert(await VCON_STORAGE.get_revision(UUID) is None)
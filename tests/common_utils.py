@@ -1,4 +1,5 @@
 """ Common Vcon unit test fixtures, data and funcitons """
+import os
 import pytest
 import vcon
 
@@ -37,3 +38,23 @@ def two_party_tel_vcon(empty_vcon : vcon.Vcon) -> vcon.Vcon:
   assert(second_party == 1)
   return(a_vcon)
 
+
+def build_large_vcon(body_size: int = 8 * 1024 * 1024) -> vcon.Vcon:
+  """ vCon with two large inline recordings, similar to what we get from storage """
+  large_vcon = vcon.Vcon()
+  large_vcon.set_uuid("py-vcon.dev")
+  large_vcon.set_party_parameter("tel", "+12345678901")
+  large_vcon.set_party_parameter("tel", "+12345678902")
+  for channel in range(2):
+    large_vcon.add_dialog_inline_recording(
+        os.urandom(body_size),
+        "2023-11-11T11:11:11.000+00:00",
+        body_size / 16000,
+        [0, 1],
+        vcon.Vcon.MEDIATYPE_AUDIO_WAV,
+        "channel_{}.wav".format(channel)
+      )
+    large_vcon.add_analysis(channel, "summary", "a summary of the conversation", "fake vendor")
+
+  return(large_vcon)
+
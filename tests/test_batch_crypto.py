@@ -0,0 +1,219 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+""" Unit tests and benchmark for batch sign, verify, encrypt and decrypt """
+
+import os
+import time
+import vcon
+import vcon.security
+from tests.common_utils import call_data
+
+CA_CERT = "certs/fake_ca_root.crt"
+CA2_CERT = "certs/fake_ca2_root.crt"
+DIVISION_CERT = "certs/fake_div.crt"
+DIVISION_PRIVATE_KEY = "certs/fake_div.key"
+GROUP_CERT = "certs/fake_grp.crt"
+GROUP_PRIVATE_KEY = "certs/fake_grp.key"
+CERT_CHAIN = [GROUP_CERT, DIVISION_CERT, CA_CERT]
+
+
+def build_vcon_jsons(count: int):
+  """ generate serialized unsigned vCons, each with a different subject """
+  for index in range(count):
+    unsigned_vcon = vcon.Vcon()
+    unsigned_vcon.set_party_parameter("tel", call_data['source'])
+    unsigned_vcon.set_party_parameter("tel", call_data['destination'])
+    unsigned_vcon.set_subject("vCon {}".format(index))
+    unsigned_vcon.set_uuid("vcon.dev")
+    yield(unsigned_vcon.dumps())
+
+
+def test_encrypter_decrypter() -> None:
+  encrypter = vcon.security.Encrypter(DIVISION_CERT)
+  decrypter = vcon.security.Decrypter(DIVISION_PRIVATE_KEY, DIVISION_CERT)
+  signer = vcon.security.Signer(GROUP_PRIVATE_KEY, CERT_CHAIN)
+
+  for vcon_json in build_vcon_jsons(2):
+    signed_vcon = vcon.Vcon()
+    signed_vcon.loads(vcon_json)
+    signed_vcon.sign(signer)
+    signed_vcon.encrypt(encrypter)
+    assert(signed_vcon._state == vcon.VconStates.ENCRYPTED)
+    encrypted_json = signed_vcon.dumps()
+
+    # decrypt using PEM files
+    encrypted_vcon = vcon.Vcon()
+    encrypted_vcon.loads(encrypted_json)
+    encrypted_vcon.decrypt(DIVISION_PRIVATE_KEY, DIVISION_CERT)
+    assert(encrypted_vcon._state == vcon.VconStates.UNVERIFIED)
+
+    encrypted_vcon = vcon.Vcon()
+    encrypted_vcon.loads(encrypted_json)
+    encrypted_vcon.decrypt(decrypter)
+    assert(encrypted_vcon._state == vcon.VconStates.UNVERIFIED)
+    encrypted_vcon.verify([CA_CERT])
+    assert(encrypted_vcon._state == vcon.VconStates.VERIFIED)
+    assert(encrypted_vcon.subject.startswith("vCon "))
+
+  try:
+    vcon.security.Decrypter(DIVISION_PRIVATE_KEY, GROUP_CERT)
+    raise Exception("Expected exception for cert which does not match private key")
+
+  except AttributeError as error:
+    assert("does not match" in str(error))
+
+
+def test_batch_crypto() -> None:
+  count = 20
+  unsigned_jsons = list(build_vcon_jsons(count))
+
+  for processes in [0, 2]:
+    stats = vcon.security.BatchCryptoStats(vcon.security.SIGN)
+    signed_jsons = list(vcon.security.batch_crypto(
+        vcon.security.SIGN,
+        iter(unsigned_jsons),
+        private_key_pem_file = GROUP_PRIVATE_KEY,
+        cert_pem_files = CERT_CHAIN,
+        processes = processes,
+        chunk_size = 3,
+        stats = stats
+      ))
+    assert(len(signed_jsons) == count)
+    assert(stats.count == count)
+    assert(stats.errors == 0)
+    assert(stats.input_bytes == sum(len(unsigned_json) for unsigned_json in unsigned_jsons))
+    assert(stats.vcons_per_second > 0.0)
+    print(stats)
+
+    encrypted_jsons = list(vcon.security.batch_crypto(
+        vcon.security.ENCRYPT,
+        signed_jsons,
+        cert_pem_files = [DIVISION_CERT],
+        processes = processes
+      ))
+    decrypted_jsons = list(vcon.security.batch_crypto(
+        vcon.security.DECRYPT,
+        encrypted_jsons,
+        private_key_pem_file = DIVISION_PRIVATE_KEY,
+        cert_pem_files = [DIVISION_CERT],
+        processes = processes
+      ))
+    verified_jsons = list(vcon.security.batch_crypto(
+        vcon.security.VERIFY,
+        decrypted_jsons,
+        cert_pem_files = [CA_CERT],
+        processes = processes
+      ))
+
+    # order preserved through all of the operations
+    for index, verified_json in enumerate(verified_jsons):
+      verified_vcon = vcon.Vcon()
+      verified_vcon.loads(verified_json)
+      assert(verified_vcon._state == vcon.VconStates.UNSIGNED)
+      assert(verified_vcon.subject == "vCon {}".format(index))
+
+
+def test_batch_crypto_errors() -> None:
+  signed_jsons = list(vcon.security.batch_crypto(
+      vcon.security.SIGN,
+      build_vcon_jsons(4),
+      private_key_pem_file = GROUP_PRIVATE_KEY,
+      cert_pem_files = CERT_CHAIN,
+      processes = 0
+    ))
+  # already verified, can't verify again
+  signed_jsons[2] = list(vcon.security.batch_crypto(
+      vcon.security.VERIFY,
+      [signed_jsons[2]],
+      cert_pem_files = [CA_CERT],
+      processes = 0
+    ))[0]
+
+  try:
+    list(vcon.security.batch_crypto(
+        vcon.security.VERIFY,
+        signed_jsons,
+        cert_pem_files = [CA_CERT],
+        processes = 2
+      ))
+    raise Exception("Expected exception for unsigned vCon")
+
+  except vcon.security.BatchCryptoError as error:
+    assert("vCon[2]" in str(error))
+
+  stats = vcon.security.BatchCryptoStats(vcon.security.VERIFY)
+  results = list(vcon.security.batch_crypto(
+      vcon.security.VERIFY,
+      signed_jsons,
+      cert_pem_files = [CA2_CERT],
+      processes = 2,
+      raise_errors = False,
+      stats = stats
+    ))
+  assert(len(results) == 4)
+  assert(stats.errors == 4)
+  assert(all(isinstance(result, vcon.security.BatchCryptoError) for result in results))
+
+  # Bad keys fail before starting the pool
+  try:
+    list(vcon.security.batch_crypto(
+        vcon.security.SIGN,
+        signed_jsons,
+        private_key_pem_file = "certs/does_not_exist.key",
+        cert_pem_files = CERT_CHAIN,
+        processes = 2
+      ))
+    raise Exception("Expected exception for missing key file")
+
+  except FileNotFoundError:
+    # expected
+    pass
+
+  try:
+    list(vcon.security.batch_crypto("bogus", signed_jsons, processes = 2))
+    raise Exception("Expected exception for unsupported operation")
+
+  except AttributeError:
+    # expected
+    pass
+
+
+def test_batch_crypto_benchmark() -> None:
+  count = 1000
+  processes = min(4, os.cpu_count())
+  unsigned_jsons = list(build_vcon_jsons(count))
+
+  start = time.perf_counter()
+  for unsigned_json in unsigned_jsons[:20]:
+    unsigned_vcon = vcon.Vcon()
+    unsigned_vcon.loads(unsigned_json)
+    unsigned_vcon.sign(GROUP_PRIVATE_KEY, CERT_CHAIN)
+    unsigned_vcon.dumps()
+  one_at_a_time = (time.perf_counter() - start) / 20
+  print("sign one at a time (PEM files): {:.1f} vCons/sec".format(1.0 / one_at_a_time))
+
+  results = {}
+  for pool_size in [0, processes]:
+    stats = {}
+    for operation, key, certs in (
+        (vcon.security.SIGN, GROUP_PRIVATE_KEY, CERT_CHAIN),
+        (vcon.security.ENCRYPT, None, [DIVISION_CERT]),
+        (vcon.security.DECRYPT, DIVISION_PRIVATE_KEY, [DIVISION_CERT]),
+        (vcon.security.VERIFY, None, [CA_CERT])
+      ):
+      stats[operation] = vcon.security.BatchCryptoStats(operation)
+      output_jsons = list(vcon.security.batch_crypto(
+          operation,
+          unsigned_jsons if operation == vcon.security.SIGN else output_jsons,
+          private_key_pem_file = key,
+          cert_pem_files = certs,
+          processes = pool_size,
+          stats = stats[operation]
+        ))
+      print("processes: {} {}".format(pool_size, stats[operation]))
+
+    results[pool_size] = stats
+
+  assert(results[0][vcon.security.SIGN].vcons_per_second > 1.0 / one_at_a_time)
+  if(processes > 1):
+    assert(results[processes][vcon.security.SIGN].vcons_per_second >
+      results[0][vcon.security.SIGN].vcons_per_second)
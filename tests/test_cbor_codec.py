@@ -0,0 +1,233 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+""" Unit tests and benchmark for CBOR encoding of vCons with binary bodies """
+
+import os
+import time
+import cbor2
+import jose.utils
+import vcon
+import vcon.cbor_codec
+from tests.common_utils import empty_vcon, two_party_tel_vcon, call_data, build_large_vcon
+
+CA_CERT = "certs/fake_ca_root.crt"
+DIVISION_CERT = "certs/fake_div.crt"
+DIVISION_PRIVATE_KEY = "certs/fake_div.key"
+GROUP_CERT = "certs/fake_grp.crt"
+GROUP_PRIVATE_KEY = "certs/fake_grp.key"
+
+
+def add_recording(test_vcon: vcon.Vcon, recording: bytes) -> int:
+  return(test_vcon.add_dialog_inline_recording(
+      recording,
+      call_data["rfc2822"],
+      call_data["duration"],
+      [0, 1],
+      vcon.Vcon.MEDIATYPE_AUDIO_WAV,
+      "recording.wav"
+    ))
+
+
+def test_base64_to_bytes() -> None:
+  value = os.urandom(100)
+  for size in range(0, 5):
+    text = jose.utils.base64url_encode(value[:size]).decode("ascii")
+    assert(vcon.cbor_codec.bytes_to_base64url(value[:size]) == text)
+    assert(vcon.cbor_codec.base64url_to_bytes(text) == value[:size])
+
+  # non-canonical, padded or not base64url
+  assert(vcon.cbor_codec.base64url_to_bytes("AB") is None)
+  assert(vcon.cbor_codec.base64url_to_bytes("AA==") is None)
+  assert(vcon.cbor_codec.base64url_to_bytes("A+/A") is None)
+  assert(vcon.cbor_codec.base64url_to_bytes("ABCDE") is None)
+  assert(vcon.cbor_codec.base64url_to_bytes("hello world") is None)
+  assert(vcon.cbor_codec.base64url_to_bytes(12) is None)
+
+  assert(vcon.cbor_codec.base64_to_bytes("AA==") == b"\x00")
+  assert(vcon.cbor_codec.base64_to_bytes("AB==") is None)
+  assert(vcon.cbor_codec.base64_to_bytes("A-_A") is None)
+
+
+def test_unsigned_round_trip(two_party_tel_vcon: vcon.Vcon) -> None:
+  two_party_tel_vcon.set_uuid("py-vcon.dev")
+  recording = os.urandom(10000)
+  add_recording(two_party_tel_vcon, recording)
+  two_party_tel_vcon.add_dialog_inline_text("hello", call_data["rfc2822"], 0, 0, "text/plain")
+  two_party_tel_vcon.add_attachment_inline(recording[:99], call_data["rfc2822"], 0, "application/octet-stream")
+  two_party_tel_vcon.add_analysis(0, "summary", "a summary", "fake vendor")
+  two_party_tel_vcon._vcon_dict["redacted"] = {"uuid": two_party_tel_vcon.uuid,
+    "type": "PII", "body": jose.utils.base64url_encode(b"redacted").decode("ascii"),
+    "encoding": "base64url"}
+
+  cbor_bytes = two_party_tel_vcon.dumpc()
+  json_dict = two_party_tel_vcon.dumpd()
+
+  # bodies stored as tagged byte strings
+  raw_dict = cbor2.loads(cbor_bytes)
+  assert(raw_dict["dialog"][0]["body"] == cbor2.CBORTag(vcon.cbor_codec.TAG_BASE64URL, recording))
+  assert(raw_dict["dialog"][1]["body"] == "hello")
+  assert(raw_dict["attachments"][0]["body"] == cbor2.CBORTag(vcon.cbor_codec.TAG_BASE64URL, recording[:99]))
+  assert(raw_dict["redacted"]["body"] == cbor2.CBORTag(vcon.cbor_codec.TAG_BASE64URL, b"redacted"))
+  assert(raw_dict["analysis"][0]["body"] == "a summary")
+
+  # dumpc does not modify the vCon
+  assert(two_party_tel_vcon.dumpd() == json_dict)
+
+  # JSON compatible dict unless the dialog bodies are asked to be left as bytes
+  assert(vcon.cbor_codec.loads(cbor_bytes) == json_dict)
+  lazy_dict = vcon.cbor_codec.loads(cbor_bytes, lazy_dialog_bodies = True)
+  assert(isinstance(lazy_dict["dialog"][0]["body"], vcon.cbor_codec.Base64urlBytes))
+  assert(lazy_dict["attachments"][0]["body"] == json_dict["attachments"][0]["body"])
+  assert(list(lazy_dict["dialog"][0].keys()) == list(json_dict["dialog"][0].keys()))
+
+  loaded_vcon = vcon.Vcon()
+  loaded_vcon.loadc(cbor_bytes)
+
+  # body primed from the byte string, not decoded again
+  body_handle = loaded_vcon.get_dialog_inline_body(0)
+  assert(body_handle.decoded)
+  assert(body_handle.get() == recording)
+  assert(loaded_vcon.get_dialog_inline_body(1).get() == "hello")
+
+  # base64url text not created to use the body or dump as CBOR
+  assert(isinstance(loaded_vcon._vcon_dict["dialog"][0]["body"], vcon.cbor_codec.Base64urlBytes))
+  assert(loaded_vcon.dumpc() == cbor_bytes)
+  assert(isinstance(loaded_vcon._vcon_dict["dialog"][0]["body"], vcon.cbor_codec.Base64urlBytes))
+
+  # created when dumped as JSON, the primed body is still current
+  assert(loaded_vcon.dumpd() == json_dict)
+  assert(loaded_vcon._vcon_dict["dialog"][0]["body"] == json_dict["dialog"][0]["body"])
+  assert(loaded_vcon.get_dialog_inline_body(0) is body_handle)
+  assert(body_handle.decoded)
+
+  # or when the dialogs are used
+  dialog_vcon = vcon.Vcon()
+  dialog_vcon.loadc(cbor_bytes)
+  assert(dialog_vcon.dialog[0]["body"] == json_dict["dialog"][0]["body"])
+  assert(dialog_vcon.get_dialog_inline_body(0).decoded)
+
+  # modified body is not the primed one
+  loaded_vcon.dialog[0]["body"] = jose.utils.base64url_encode(b"abc").decode("ascii")
+  assert(loaded_vcon.get_dialog_inline_body(0).get() == b"abc")
+  assert(cbor2.loads(loaded_vcon.dumpc())["dialog"][0]["body"].value == b"abc")
+
+
+def test_non_canonical_body(empty_vcon: vcon.Vcon) -> None:
+  empty_vcon.set_uuid("py-vcon.dev")
+  empty_vcon.set_party_parameter("tel", call_data["source"])
+  add_recording(empty_vcon, b"\x00")
+  # unused bits set, would not encode back to the same text
+  empty_vcon.dialog[0]["body"] = "AB"
+  json_dict = empty_vcon.dumpd()
+
+  cbor_bytes = empty_vcon.dumpc()
+  assert(cbor2.loads(cbor_bytes)["dialog"][0]["body"] == "AB")
+  loaded_vcon = vcon.Vcon()
+  loaded_vcon.loadc(cbor_bytes)
+  assert(loaded_vcon.dumpd() == json_dict)
+
+
+def test_legacy_binary_encoding(two_party_tel_vcon: vcon.Vcon) -> None:
+  two_party_tel_vcon.set_uuid("py-vcon.dev")
+  recording = os.urandom(1000)
+  add_recording(two_party_tel_vcon, recording)
+  legacy_dict = two_party_tel_vcon.dumpd()
+  legacy_dict["dialog"][0]["body"] = cbor2.CBORTag(vcon.cbor_codec.TAG_BASE64URL, recording)
+  legacy_dict["dialog"][0]["encoding"] = "binary"
+
+  loaded_vcon = vcon.Vcon()
+  loaded_vcon.loadc(cbor2.dumps(legacy_dict))
+  assert(loaded_vcon.dialog[0]["encoding"] == "base64url")
+  assert(loaded_vcon.dialog[0]["body"] == two_party_tel_vcon.dialog[0]["body"])
+  assert(loaded_vcon.get_dialog_inline_body(0).get() == recording)
+
+
+def test_signed_encrypted_round_trip(two_party_tel_vcon: vcon.Vcon) -> None:
+  two_party_tel_vcon.set_uuid("py-vcon.dev")
+  add_recording(two_party_tel_vcon, os.urandom(5000))
+  two_party_tel_vcon.sign(GROUP_PRIVATE_KEY, [GROUP_CERT, DIVISION_CERT, CA_CERT])
+
+  signed_cbor = two_party_tel_vcon.dumpc()
+  raw_dict = cbor2.loads(signed_cbor)
+  assert(isinstance(raw_dict["payload"], cbor2.CBORTag))
+  assert(raw_dict["payload"].tag == vcon.cbor_codec.TAG_BASE64URL)
+  assert(raw_dict["signatures"][0]["signature"].tag == vcon.cbor_codec.TAG_BASE64URL)
+  assert(all(cert.tag == vcon.cbor_codec.TAG_BASE64 for cert in raw_dict["signatures"][0]["header"]["x5c"]))
+  assert(len(signed_cbor) < len(two_party_tel_vcon.dumps()))
+
+  signed_vcon = vcon.Vcon()
+  signed_vcon.loadc(signed_cbor)
+  assert(signed_vcon._state == vcon.VconStates.UNVERIFIED)
+  assert(signed_vcon._jws_dict == two_party_tel_vcon._jws_dict)
+  signed_vcon.verify([CA_CERT])
+  assert(signed_vcon._state == vcon.VconStates.VERIFIED)
+  assert(signed_vcon.dialog[0] == two_party_tel_vcon.dialog[0])
+
+  two_party_tel_vcon.encrypt(DIVISION_CERT)
+  encrypted_cbor = two_party_tel_vcon.dumpc()
+  raw_dict = cbor2.loads(encrypted_cbor)
+  assert(raw_dict["ciphertext"].tag == vcon.cbor_codec.TAG_BASE64URL)
+  assert(raw_dict["recipients"][0]["encrypted_key"].tag == vcon.cbor_codec.TAG_BASE64URL)
+
+  encrypted_vcon = vcon.Vcon()
+  encrypted_vcon.loadc(encrypted_cbor)
+  assert(encrypted_vcon._state == vcon.VconStates.ENCRYPTED)
+  encrypted_vcon.decrypt(DIVISION_PRIVATE_KEY, DIVISION_CERT)
+  encrypted_vcon.verify([CA_CERT])
+  assert(encrypted_vcon._state == vcon.VconStates.VERIFIED)
+
+
+def test_cbor_benchmark() -> None:
+  large_vcon = build_large_vcon(4 * 1024 * 1024)
+  count = 3
+
+  start = time.process_time()
+  for index in range(count):
+    vcon_json = large_vcon.dumps()
+  json_dump_time = (time.process_time() - start) / count
+
+  start = time.process_time()
+  for index in range(count):
+    vcon_cbor = large_vcon.dumpc()
+  cbor_dump_time = (time.process_time() - start) / count
+
+  start = time.process_time()
+  for index in range(count):
+    json_vcon = vcon.Vcon()
+    json_vcon.loads(vcon_json)
+    for dialog_index in range(len(json_vcon.dialog)):
+      json_vcon.get_dialog_inline_body(dialog_index).get()
+  json_load_time = (time.process_time() - start) / count
+
+  start = time.process_time()
+  for index in range(count):
+    cbor_vcon = vcon.Vcon()
+    cbor_vcon.loadc(vcon_cbor)
+    for dialog_index in range(len(cbor_vcon.dialog)):
+      cbor_vcon.get_dialog_inline_body(dialog_index).get()
+  cbor_load_time = (time.process_time() - start) / count
+
+  assert(cbor_vcon.dumpd() == json_vcon.dumpd())
+
+  # Bodies already decoded (e.g. after loadc or transcription) are not decoded again
+  start = time.process_time()
+  for index in range(count):
+    json_vcon.dumps()
+  json_redump_time = (time.process_time() - start) / count
+
+  start = time.process_time()
+  for index in range(count):
+    assert(cbor_vcon.dumpc() == vcon_cbor)
+  cbor_redump_time = (time.process_time() - start) / count
+
+  print("size JSON: {} CBOR: {} ratio: {:.3f}".format(
+      len(vcon_json),
+      len(vcon_cbor),
+      len(vcon_cbor) / len(vcon_json)
+    ))
+  print("dump JSON: {:.4f} sec CBOR: {:.4f} sec".format(json_dump_time, cbor_dump_time))
+  print("dump decoded JSON: {:.4f} sec CBOR: {:.4f} sec".format(json_redump_time, cbor_redump_time))
+  print("load and get bodies JSON: {:.4f} sec CBOR: {:.4f} sec".format(json_load_time, cbor_load_time))
+
+  assert(len(vcon_cbor) < len(vcon_json) * 0.8)
+  assert(cbor_load_time < json_load_time)
+  assert(cbor_redump_time < json_redump_time)
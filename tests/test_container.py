@@ -0,0 +1,205 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+""" Unit tests and benchmark for the multi-vCon container file """
+
+import os
+import time
+import pytest
+import vcon
+import vcon.container
+from tests.common_utils import call_data
+
+CA_CERT = "certs/fake_ca_root.crt"
+DIVISION_CERT = "certs/fake_div.crt"
+DIVISION_PRIVATE_KEY = "certs/fake_div.key"
+GROUP_CERT = "certs/fake_grp.crt"
+GROUP_PRIVATE_KEY = "certs/fake_grp.key"
+
+
+def build_vcon(index: int, body_size: int = 100) -> vcon.Vcon:
+  new_vcon = vcon.Vcon()
+  new_vcon.set_uuid("py-vcon.dev")
+  new_vcon.set_party_parameter("tel", call_data["source"])
+  new_vcon.set_party_parameter("tel", call_data["destination"])
+  new_vcon.set_subject("vCon {}".format(index))
+  new_vcon.add_dialog_inline_recording(
+      os.urandom(body_size),
+      call_data["rfc2822"],
+      call_data["duration"],
+      [0, 1],
+      vcon.Vcon.MEDIATYPE_AUDIO_WAV,
+      "recording.wav"
+    )
+  return(new_vcon)
+
+
+@pytest.mark.parametrize("container_format", vcon.container.CONTAINER_FORMATS)
+def test_container(tmp_path, container_format: str) -> None:
+  container_file = tmp_path / "test.vcons"
+  vcons = [build_vcon(index) for index in range(5)]
+
+  # Signed and encrypted forms
+  vcons[3].sign(GROUP_PRIVATE_KEY, [GROUP_CERT, DIVISION_CERT, CA_CERT])
+  vcons[4].sign(GROUP_PRIVATE_KEY, [GROUP_CERT, DIVISION_CERT, CA_CERT])
+  vcons[4].encrypt(DIVISION_CERT)
+
+  with vcon.container.VconContainerWriter(container_file, container_format) as writer:
+    for index, add_vcon in enumerate(vcons):
+      assert(writer.add(add_vcon) == index)
+
+    try:
+      writer.add(vcons[0])
+      raise Exception("Expected exception for duplicate UUID")
+
+    except vcon.container.VconContainerError as error:
+      assert("already in container" in str(error))
+
+  with vcon.container.VconContainerReader(container_file) as reader:
+    assert(reader.format == container_format)
+    assert(reader.indexed)
+    assert(len(reader) == 5)
+    assert(reader.uuids == [vcon_object.uuid for vcon_object in vcons])
+    assert(vcons[2].uuid in reader)
+    assert("bogus" not in reader)
+
+    # random access by UUID and by position
+    got_vcon = reader.get(vcons[2].uuid)
+    assert(got_vcon.dumpd() == vcons[2].dumpd())
+    assert(got_vcon.get_dialog_inline_body(0).get() == vcons[2].get_dialog_inline_body(0).get())
+    assert(reader.get(1).subject == "vCon 1")
+
+    signed_vcon = reader.get(vcons[3].uuid)
+    assert(signed_vcon._state == vcon.VconStates.UNVERIFIED)
+    signed_vcon.verify([CA_CERT])
+    assert(signed_vcon.subject == "vCon 3")
+
+    encrypted_vcon = reader.get(vcons[4].uuid)
+    assert(encrypted_vcon._state == vcon.VconStates.ENCRYPTED)
+    encrypted_vcon.decrypt(DIVISION_PRIVATE_KEY, DIVISION_CERT)
+    encrypted_vcon.verify([CA_CERT])
+    assert(encrypted_vcon.subject == "vCon 4")
+
+    if(container_format == vcon.container.JSON):
+      assert(reader.get_bytes(0) == bytes(vcons[0].dumps(), "utf-8"))
+
+    assert([vcon_object.uuid for vcon_object in reader] == reader.uuids)
+
+    try:
+      reader.get("bogus")
+      raise Exception("Expected exception for UUID not in container")
+
+    except KeyError:
+      # expected
+      pass
+
+  # Without the trailer, the records are scanned to build the index
+  trailer_size = vcon.container.CBOR_TRAILER_SIZE if container_format == vcon.container.CBOR \
+    else vcon.container.JSON_TRAILER_SIZE
+  truncated_file = tmp_path / "truncated.vcons"
+  truncated_file.write_bytes(container_file.read_bytes()[:-trailer_size])
+
+  with vcon.container.VconContainerReader(truncated_file) as reader:
+    assert(not reader.indexed)
+    assert(reader.uuids == [vcon_object.uuid for vcon_object in vcons])
+    assert(reader.get(vcons[1].uuid).subject == "vCon 1")
+
+
+def test_container_jsonl(tmp_path) -> None:
+  """ plain JSON lines file and add_bytes """
+  vcons = [build_vcon(index) for index in range(3)]
+  jsonl_file = tmp_path / "plain.jsonl"
+  with open(jsonl_file, "w") as jsonl:
+    for add_vcon in vcons:
+      jsonl.write(add_vcon.dumps() + "\n")
+    jsonl.write("\n")
+
+  with vcon.container.VconContainerReader(jsonl_file) as reader:
+    assert(not reader.indexed)
+    assert(len(reader) == 3)
+    assert(reader.get(vcons[2].uuid).subject == "vCon 2")
+
+  container_file = tmp_path / "test.vcons"
+  with vcon.container.VconContainerWriter(container_file) as writer:
+    writer.add_bytes(vcons[0].dumps())
+    # pretty printed is put on one line
+    writer.add_bytes(vcons[1].dumps(indent = 2))
+    writer.add_bytes(bytes(vcons[2].dumps(), "utf-8"), vcons[2].uuid)
+
+  with vcon.container.VconContainerReader(container_file) as reader:
+    assert(reader.indexed)
+    assert(reader.uuids == [vcon_object.uuid for vcon_object in vcons])
+    assert(reader.get(vcons[1].uuid).dumpd() == vcons[1].dumpd())
+
+  try:
+    writer.add(vcons[0])
+    raise Exception("Expected exception for closed writer")
+
+  except vcon.container.VconContainerError as error:
+    assert("closed" in str(error))
+
+  empty_file = tmp_path / "empty.vcons"
+  empty_file.write_bytes(b"")
+  try:
+    vcon.container.VconContainerReader(empty_file)
+    raise Exception("Expected exception for empty file")
+
+  except vcon.container.VconContainerError as error:
+    assert("empty" in str(error))
+
+  with vcon.container.VconContainerWriter(empty_file) as writer:
+    pass
+  with vcon.container.VconContainerReader(empty_file) as reader:
+    assert(reader.indexed)
+    assert(len(reader) == 0)
+
+  try:
+    vcon.container.VconContainerWriter(empty_file, "xml")
+    raise Exception("Expected exception for unsupported format")
+
+  except vcon.container.VconContainerError as error:
+    assert("xml" in str(error))
+
+
+def test_container_benchmark(tmp_path) -> None:
+  count = 2000
+  container_file = tmp_path / "benchmark.vcons"
+  jsonl_file = tmp_path / "benchmark.jsonl"
+  uuids = []
+
+  with vcon.container.VconContainerWriter(container_file) as writer, open(jsonl_file, "w") as jsonl:
+    for index in range(count):
+      add_vcon = build_vcon(index, 20000)
+      writer.add(add_vcon)
+      jsonl.write(add_vcon.dumps() + "\n")
+      uuids.append(add_vcon.uuid)
+
+  file_size = os.path.getsize(container_file)
+  lookup_uuids = [uuids[count - 1], uuids[count // 2], uuids[10]]
+
+  # Parse JSON lines until the vCon is found
+  start = time.perf_counter()
+  for uuid in lookup_uuids:
+    with open(jsonl_file, "r") as jsonl:
+      for line in jsonl:
+        scan_vcon = vcon.Vcon()
+        scan_vcon.loads(line)
+        if(scan_vcon.uuid == uuid):
+          break
+  scan_time = (time.perf_counter() - start) / len(lookup_uuids)
+
+  # Open the container, read the index and get the vCon
+  start = time.perf_counter()
+  for uuid in lookup_uuids:
+    with vcon.container.VconContainerReader(container_file) as reader:
+      indexed_vcon = reader.get(uuid)
+  indexed_time = (time.perf_counter() - start) / len(lookup_uuids)
+  assert(indexed_vcon.uuid == uuid)
+  assert(indexed_vcon.dumps() == scan_vcon.dumps())
+
+  print("get one of {} vCons ({:.1f} MB): scan JSON lines: {:.4f} sec container index: {:.4f} sec".format(
+      count,
+      file_size / 1000000,
+      scan_time,
+      indexed_time
+    ))
+
+  assert(indexed_time * 10 < scan_time)
@@ -0,0 +1,213 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+""" Unit tests and benchmark for lazy inline dialog body decoding """
+
+import io
+import os
+import time
+import tracemalloc
+import jose.utils
+import vcon
+import vcon.dialog_body
+from tests.common_utils import build_large_vcon
+
+
+def test_inline_body_cached():
+  test_vcon = build_large_vcon(4096)
+  recording = jose.utils.base64url_decode(bytes(test_vcon.dialog[0]["body"], "utf-8"))
+
+  body_handle = test_vcon.get_dialog_inline_body(0)
+  assert(body_handle.encoding == "base64url")
+  assert(not body_handle.decoded)
+  # length is known without decoding
+  assert(len(body_handle) == len(recording))
+  assert(not body_handle.decoded)
+
+  decoded = test_vcon.decode_dialog_inline_body(0)
+  assert(decoded == recording)
+  assert(body_handle.decoded)
+
+  # Same handle and same bytes object on subsequent calls
+  assert(test_vcon.get_dialog_inline_body(0) is body_handle)
+  assert(test_vcon.decode_dialog_inline_body(0) is decoded)
+  view = body_handle.memoryview()
+  assert(view.readonly)
+  assert(view.obj is decoded)
+
+  # each dialog has its own handle
+  assert(test_vcon.get_dialog_inline_body(1) is not body_handle)
+  assert(test_vcon.decode_dialog_inline_body(1) != decoded)
+
+  body_handle.release()
+  assert(not body_handle.decoded)
+  assert(body_handle.get() == recording)
+
+
+def test_inline_body_mutated():
+  test_vcon = build_large_vcon(4096)
+  body_handle = test_vcon.get_dialog_inline_body(0)
+  body_handle.get()
+
+  new_recording = os.urandom(3001)
+  test_vcon.dialog[0]["body"] = jose.utils.base64url_encode(new_recording).decode("utf-8")
+  assert(not body_handle.is_current())
+  assert(test_vcon.decode_dialog_inline_body(0) == new_recording)
+  assert(test_vcon.get_dialog_inline_body(0) is not body_handle)
+
+  # Replacing the dialog object
+  new_dialog = dict(test_vcon.dialog[1])
+  test_vcon.dialog[0] = new_dialog
+  assert(test_vcon.decode_dialog_inline_body(0) == test_vcon.decode_dialog_inline_body(1))
+  assert(test_vcon.get_dialog_inline_body(0).is_current(new_dialog))
+
+  # Loading new content drops the handles
+  vcon_json = test_vcon.dumps()
+  loaded_vcon = vcon.Vcon()
+  loaded_vcon.loads(vcon_json)
+  assert(loaded_vcon._dialog_bodies == {})
+  assert(loaded_vcon.decode_dialog_inline_body(1) == test_vcon.decode_dialog_inline_body(1))
+
+
+def test_inline_body_chunks():
+  test_vcon = build_large_vcon(1024)
+  for size in [0, 1, 2, 3, 4, 5, 6, 1000, 1001, 1002, 1003]:
+    recording = os.urandom(size)
+    test_vcon.add_dialog_inline_recording(
+        recording,
+        "2023-11-11T11:11:11.000+00:00",
+        1.0,
+        [0, 1],
+        vcon.Vcon.MEDIATYPE_AUDIO_WAV,
+        "size_{}.wav".format(size)
+      )
+    dialog_index = len(test_vcon.dialog) - 1
+    body_handle = test_vcon.get_dialog_inline_body(dialog_index)
+    assert(len(body_handle) == size)
+
+    # chunk sizes which are and are not a multiple of 4
+    for chunk_size in [4, 7, 8, 400, 1024 * 1024]:
+      out_file = io.BytesIO()
+      assert(body_handle.write_to(out_file, chunk_size) == size)
+      assert(out_file.getvalue() == recording)
+      assert(not body_handle.decoded)
+
+    assert(body_handle.get() == recording)
+
+    # from the cached body
+    out_file = io.BytesIO()
+    assert(body_handle.write_to(out_file, 8) == size)
+    assert(out_file.getvalue() == recording)
+
+
+def test_inline_body_line_wrapped():
+  test_vcon = build_large_vcon(1024)
+  for size in [0, 1, 2, 56, 57, 58, 1000, 1001, 1002]:
+    recording = os.urandom(size)
+    encoded = jose.utils.base64url_encode(recording).decode("utf-8")
+    # wrapped as MIME base64 with padding
+    encoded += "=" * (-len(encoded) % 4)
+    wrapped = "\r\n".join(encoded[start:start + 76] for start in range(0, len(encoded), 76))
+    test_vcon.add_dialog_inline_recording(
+        recording,
+        "2023-11-11T11:11:11.000+00:00",
+        1.0,
+        [0, 1],
+        vcon.Vcon.MEDIATYPE_AUDIO_WAV,
+        "wrapped_{}.wav".format(size)
+      )
+    dialog_index = len(test_vcon.dialog) - 1
+    test_vcon.dialog[dialog_index]["body"] = wrapped + "\n "
+    body_handle = test_vcon.get_dialog_inline_body(dialog_index)
+    assert(len(body_handle) == size)
+
+    for chunk_size in [4, 7, 8, 76, 78, 400, 1024 * 1024]:
+      out_file = io.BytesIO()
+      assert(body_handle.write_to(out_file, chunk_size) == size)
+      assert(out_file.getvalue() == recording)
+
+    assert(test_vcon.decode_dialog_inline_body(dialog_index) == recording)
+
+
+def test_inline_body_text():
+  test_vcon = vcon.Vcon()
+  test_vcon.set_party_parameter("tel", "+12345678901")
+  test_vcon.add_dialog_inline_text("hello Zoë", "2023-11-11T11:11:11.000+00:00", 0, 0, vcon.Vcon.MEDIATYPE_TEXT_PLAIN)
+  body_handle = test_vcon.get_dialog_inline_body(0)
+  assert(body_handle.encoding == "none")
+  # size in UTF-8 bytes, before and after decoding
+  assert(len(body_handle) == len(bytes("hello Zoë", "utf-8")) == 10)
+  assert(test_vcon.decode_dialog_inline_body(0) == "hello Zoë")
+  assert(len(body_handle) == 10)
+  assert(bytes(body_handle.memoryview()) == bytes("hello Zoë", "utf-8"))
+  assert(test_vcon.decode_dialog_inline_body(0) == "hello Zoë")
+  out_file = io.BytesIO()
+  body_handle.write_to(out_file, 4)
+  assert(out_file.getvalue() == bytes("hello Zoë", "utf-8"))
+
+
+def test_inline_body_invalid():
+  test_vcon = build_large_vcon(1024)
+  test_vcon.dialog[0]["body"] = "abcde"
+  try:
+    test_vcon.decode_dialog_inline_body(0)
+    raise Exception("Expected exception for invalid base64url body")
+
+  except vcon.dialog_body.InvalidBodyEncoding:
+    # expected
+    pass
+
+  test_vcon.dialog[1]["encoding"] = "bogus"
+  try:
+    test_vcon.decode_dialog_inline_body(1)
+    raise Exception("Expected exception for unsupported encoding")
+
+  except vcon.UnsupportedVconVersion:
+    # expected
+    pass
+
+
+def measure(function, *args) -> (float, int):
+  """ returns CPU seconds and peak bytes allocated """
+  tracemalloc.start()
+  start = time.process_time()
+  function(*args)
+  cpu_time = time.process_time() - start
+  current, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return(cpu_time, peak)
+
+
+def test_inline_body_benchmark():
+  body_size = 8 * 1024 * 1024
+  large_vcon = build_large_vcon(body_size)
+
+  def old_decode(dialog_index: int) -> None:
+    # How decode_dialog_inline_body used to decode, on every call
+    for count in range(3):
+      jose.utils.base64url_decode(bytes(large_vcon.dialog[dialog_index]["body"], 'utf-8'))
+
+  def cached_decode(dialog_index: int) -> None:
+    for count in range(3):
+      large_vcon.decode_dialog_inline_body(dialog_index)
+
+  def stream_decode(dialog_index: int) -> None:
+    with open(os.devnull, "wb") as out_file:
+      large_vcon.get_dialog_inline_body(dialog_index).write_to(out_file)
+
+  results = {}
+  for label, decode_function, dialog_index in (
+      ("decode x3 (old)", old_decode, 0),
+      ("decode x3 cached", cached_decode, 0),
+      # dialog 1 is not decoded and cached yet
+      ("stream to file", stream_decode, 1)
+    ):
+    results[label] = measure(decode_function, dialog_index)
+    print("{}: cpu: {:.4f} sec peak memory: {:.2f} MB (recording size: {:.2f} MB)".format(
+        label,
+        results[label][0],
+        results[label][1] / 1000000,
+        body_size / 1000000
+      ))
+
+  assert(results["decode x3 cached"][1] < results["decode x3 (old)"][1])
+  assert(results["stream to file"][1] < body_size / 2)
+
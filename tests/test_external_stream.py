@@ -0,0 +1,215 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+"""
+Unit tests and benchmark for adding and getting externally referenced
+recordings in chunks (streaming).
+"""
+
+import io
+import os
+import tempfile
+import tracemalloc
+import pytest
+import vcon
+import vcon.security
+from tests.common_utils import empty_vcon, two_party_tel_vcon, call_data
+
+RECORDING_PATH = "/recording.wav"
+
+
+def add_recording(test_vcon: vcon.Vcon, recording: bytes, url: str) -> int:
+  return(test_vcon.add_dialog_external_recording(
+      recording,
+      call_data["rfc2822"],
+      call_data["duration"],
+      [0, 1],
+      url,
+      vcon.Vcon.MEDIATYPE_AUDIO_WAV,
+      "recording.wav"
+    ))
+
+
+async def chunk_iterator(data: bytes, chunk_size: int):
+  for start in range(0, len(data), chunk_size):
+    yield(data[start:start + chunk_size])
+
+
+def test_sha512_hasher():
+  data = os.urandom(100001)
+  hasher = vcon.security.Sha512Hasher()
+  for start in range(0, len(data), 4096):
+    hasher.update(data[start:start + 4096])
+  assert(hasher.size == len(data))
+  assert(hasher.hash() == vcon.security.sha_512_hash(data))
+
+
+@pytest.mark.asyncio
+async def test_add_external_recording_stream(two_party_tel_vcon: vcon.Vcon) -> None:
+  recording = os.urandom(300000)
+  url = "https://example.com/recording.wav"
+  add_recording(two_party_tel_vcon, recording, url)
+  expected_dialog = two_party_tel_vcon.dialog[0]
+  assert(expected_dialog["content_hash"].startswith("sha512-"))
+
+  with tempfile.NamedTemporaryFile() as recording_file:
+    recording_file.write(recording)
+    recording_file.flush()
+
+    # From a path
+    dialog_index = await two_party_tel_vcon.add_dialog_external_recording_stream(
+        recording_file.name,
+        call_data["rfc2822"],
+        call_data["duration"],
+        [0, 1],
+        url,
+        vcon.Vcon.MEDIATYPE_AUDIO_WAV,
+        "recording.wav",
+        chunk_size = 4096
+      )
+    assert(dialog_index == 1)
+    assert(two_party_tel_vcon.dialog[dialog_index] == expected_dialog)
+
+  # From a file object
+  dialog_index = await two_party_tel_vcon.add_dialog_external_recording_stream(
+      io.BytesIO(recording),
+      call_data["rfc2822"],
+      call_data["duration"],
+      [0, 1],
+      url,
+      vcon.Vcon.MEDIATYPE_AUDIO_WAV,
+      "recording.wav",
+      chunk_size = 1000
+    )
+  assert(dialog_index == 2)
+  assert(two_party_tel_vcon.dialog[dialog_index] == expected_dialog)
+
+  # From an async iterator
+  dialog_index = await two_party_tel_vcon.add_dialog_external_recording_stream(
+      chunk_iterator(recording, 777),
+      call_data["rfc2822"],
+      call_data["duration"],
+      [0, 1],
+      url,
+      vcon.Vcon.MEDIATYPE_AUDIO_WAV,
+      "recording.wav",
+      originator = 1
+    )
+  assert(dialog_index == 3)
+  assert(two_party_tel_vcon.dialog[dialog_index]["originator"] == 1)
+  assert(two_party_tel_vcon.dialog[dialog_index]["content_hash"] == expected_dialog["content_hash"])
+  two_party_tel_vcon.verify_dialog_external_recording(dialog_index, recording)
+
+  try:
+    await two_party_tel_vcon.add_dialog_external_recording_stream(
+        recording,
+        call_data["rfc2822"],
+        call_data["duration"],
+        [0, 1],
+        url
+      )
+    raise Exception("Expected exception for bytes which is not a stream")
+
+  except AttributeError as error:
+    # expected
+    pass
+
+
+@pytest.mark.asyncio
+async def test_get_external_recording_stream(two_party_tel_vcon: vcon.Vcon, httpserver) -> None:
+  recording = os.urandom(200000)
+  httpserver.expect_request(RECORDING_PATH).respond_with_data(recording, content_type = "audio/x-wav")
+  dialog_index = add_recording(two_party_tel_vcon, recording, httpserver.url_for(RECORDING_PATH))
+
+  with await two_party_tel_vcon.get_dialog_external_recording_stream(dialog_index) as body_file:
+    assert(body_file.read() == recording)
+
+  # Force spooling to disk
+  body_file = await two_party_tel_vcon.get_dialog_external_recording_stream(
+      dialog_index,
+      max_memory_size = 1024,
+      chunk_size = 1000
+    )
+  assert(body_file._rolled)
+  assert(body_file.read() == recording)
+  body_file.close()
+
+
+@pytest.mark.asyncio
+async def test_get_external_recording_stream_errors(two_party_tel_vcon: vcon.Vcon, httpserver) -> None:
+  recording = os.urandom(20000)
+  httpserver.expect_request(RECORDING_PATH).respond_with_data(recording[1:])
+  dialog_index = add_recording(two_party_tel_vcon, recording, httpserver.url_for(RECORDING_PATH))
+
+  try:
+    await two_party_tel_vcon.get_dialog_external_recording_stream(dialog_index)
+    raise Exception("Expected exception for modified recording")
+
+  except vcon.InvalidVconHash:
+    # expected
+    pass
+
+  dialog_index = add_recording(two_party_tel_vcon, recording, httpserver.url_for("/not_found.wav"))
+  try:
+    await two_party_tel_vcon.get_dialog_external_recording_stream(dialog_index)
+    raise Exception("Expected exception for HTTP error")
+
+  except vcon.InvalidVconHash:
+    raise
+
+  except Exception as error:
+    assert("error: 500" in str(error) or "error: 404" in str(error))
+
+
+@pytest.mark.asyncio
+async def test_external_stream_benchmark(two_party_tel_vcon: vcon.Vcon, httpserver) -> None:
+  recording_size = 32 * 1024 * 1024
+  recording = os.urandom(recording_size)
+  url = httpserver.url_for(RECORDING_PATH)
+  httpserver.expect_request(RECORDING_PATH).respond_with_data(recording)
+
+  with tempfile.NamedTemporaryFile() as recording_file:
+    recording_file.write(recording)
+    recording_file.flush()
+    del recording
+
+    tracemalloc.start()
+    with open(recording_file.name, "rb") as read_file:
+      add_recording(two_party_tel_vcon, read_file.read(), url)
+    in_memory_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    dialog_index = await two_party_tel_vcon.add_dialog_external_recording_stream(
+        recording_file.name,
+        call_data["rfc2822"],
+        call_data["duration"],
+        [0, 1],
+        url,
+        vcon.Vcon.MEDIATYPE_AUDIO_WAV,
+        "recording.wav"
+      )
+    stream_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+  assert(two_party_tel_vcon.dialog[dialog_index] == two_party_tel_vcon.dialog[0])
+
+  spool_size = 4 * 1024 * 1024
+  tracemalloc.start()
+  body_file = await two_party_tel_vcon.get_dialog_external_recording_stream(
+      dialog_index,
+      max_memory_size = spool_size
+    )
+  fetch_peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  body_file.close()
+
+  print("add peak memory: in memory: {:.2f} MB stream: {:.2f} MB get stream: {:.2f} MB (recording size: {:.2f} MB)".format(
+      in_memory_peak / 1000000,
+      stream_peak / 1000000,
+      fetch_peak / 1000000,
+      recording_size / 1000000
+    ))
+
+  assert(stream_peak < recording_size / 8)
+  # Spooled file is copied when rolled over to disk, plus a chunk being read
+  assert(fetch_peak < spool_size * 2 + 2 * vcon.Vcon.EXTERNAL_CHUNK_SIZE)
+
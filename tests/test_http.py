@@ -2,7 +2,13 @@
 """ Unit test for HTTP depdendent Vcon functionality (e.g. get and post) """
 
 #import httpretty
+import os
+import time
+import asyncio
+import threading
+import werkzeug
 import vcon
+import vcon.http_client
 from tests.common_utils import empty_vcon, two_party_tel_vcon, call_data
 import pytest
 import pytest_httpserver
@@ -94,3 +100,127 @@ async def test_vcon_post(two_party_tel_vcon, httpserver: pytest_httpserver.HTTPS
   # assert(posted_vcon.parties[1]['tel'] == call_data['destination'])
   # assert(posted_vcon.uuid == UUID)
 
+
+
+@pytest.fixture(scope="function")
+def threaded_httpserver() -> pytest_httpserver.HTTPServer:
+  """ HTTP server which handles concurrent requests """
+  server = pytest_httpserver.HTTPServer(threaded = True)
+  server.start()
+  yield(server)
+  server.clear()
+  if(server.is_running()):
+    server.stop()
+
+
+def delayed_response(body: bytes, delay: float, counters: dict):
+  """ build request handler which responds with body after delay, counting concurrent requests """
+  lock = threading.Lock()
+
+  def handler(request: werkzeug.Request) -> werkzeug.Response:
+    with lock:
+      counters["active"] += 1
+      counters["max_active"] = max(counters["max_active"], counters["active"])
+    time.sleep(delay)
+    with lock:
+      counters["active"] -= 1
+    return(werkzeug.Response(body, content_type = vcon.Vcon.MEDIATYPE_AUDIO_WAV))
+
+  return(handler)
+
+
+@pytest.mark.asyncio
+async def test_fetch_external_dialogs(two_party_tel_vcon, threaded_httpserver: pytest_httpserver.HTTPServer):
+  counters = {"active": 0, "max_active": 0}
+  recordings = {}
+  delay = 0.2
+  num_recordings = 8
+  for recording_index in range(num_recordings):
+    recording = os.urandom(10000 + recording_index)
+    path = "/recording_{}.wav".format(recording_index)
+    threaded_httpserver.expect_request(path).respond_with_handler(delayed_response(recording, delay, counters))
+    dialog_index = two_party_tel_vcon.add_dialog_external_recording(
+        recording,
+        call_data["rfc2822"],
+        call_data["duration"],
+        [0, 1],
+        threaded_httpserver.url_for(path),
+        vcon.Vcon.MEDIATYPE_AUDIO_WAV
+      )
+    recordings[dialog_index] = recording
+    # inline recordings are not fetched
+    two_party_tel_vcon.add_dialog_inline_recording(
+        recording,
+        call_data["rfc2822"],
+        call_data["duration"],
+        [0, 1],
+        vcon.Vcon.MEDIATYPE_AUDIO_WAV
+      )
+
+  # While fetching, the event loop must not be blocked
+  ticks = 0
+  async def ticker():
+    nonlocal ticks
+    while(True):
+      await asyncio.sleep(0.01)
+      ticks += 1
+
+  ticker_task = asyncio.create_task(ticker())
+  start = time.time()
+  bodies = await two_party_tel_vcon.fetch_external_dialogs(max_concurrent = 4)
+  duration = time.time() - start
+  ticker_task.cancel()
+
+  assert(bodies == recordings)
+  assert(counters["max_active"] <= 4)
+  assert(counters["max_active"] > 1)
+  # 8 requests, 4 at a time
+  assert(duration < delay * num_recordings / 2 + 0.5)
+  assert(ticks > 10)
+
+  # subset of dialogs
+  bodies = await two_party_tel_vcon.fetch_external_dialogs([2, 4], max_concurrent = 1)
+  assert(bodies == {2: recordings[2], 4: recordings[4]})
+
+
+@pytest.mark.asyncio
+async def test_fetch_external_dialogs_failure(two_party_tel_vcon, threaded_httpserver: pytest_httpserver.HTTPServer):
+  recording = os.urandom(1000)
+  threaded_httpserver.expect_request("/good.wav").respond_with_data(recording)
+  threaded_httpserver.expect_request("/bad.wav").respond_with_data(recording[:-1])
+  for path in ["/good.wav", "/bad.wav", "/good.wav"]:
+    two_party_tel_vcon.add_dialog_external_recording(
+        recording,
+        call_data["rfc2822"],
+        call_data["duration"],
+        [0, 1],
+        threaded_httpserver.url_for(path),
+        vcon.Vcon.MEDIATYPE_AUDIO_WAV
+      )
+
+  try:
+    await two_party_tel_vcon.fetch_external_dialogs()
+    raise Exception("Expected exception for recording which does not match hash")
+
+  except vcon.InvalidVconHash:
+    # expected
+    pass
+
+
+@pytest.mark.asyncio
+async def test_http_client_pool():
+  settings = vcon.http_client.configure()
+  try:
+    vcon.http_client.configure(max_connections = 3, timeout = 5.0)
+    await vcon.http_client.close_client()
+    client = vcon.http_client.get_client()
+    assert(vcon.http_client.get_client() is client)
+    assert(client.timeout.read == 5.0)
+
+    await vcon.http_client.close_client()
+    assert(client.is_closed)
+    assert(vcon.http_client.get_client() is not client)
+
+  finally:
+    vcon.http_client.configure(**settings)
+    await vcon.http_client.close_client()
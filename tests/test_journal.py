@@ -0,0 +1,154 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+""" Unit tests for the vCon change journal """
+
+import copy
+import vcon
+import vcon.journal
+import vcon.json_codec
+from tests.common_utils import empty_vcon, two_party_tel_vcon, call_data, build_large_vcon
+
+GROUP_CERT = "certs/fake_grp.crt"
+GROUP_PRIVATE_KEY = "certs/fake_grp.key"
+DIVISION_CERT = "certs/fake_div.crt"
+CA_CERT = "certs/fake_ca_root.crt"
+
+
+def stored_vcon(a_vcon: vcon.Vcon) -> vcon.Vcon:
+  """ load the vCon as vCon storage does and start the journal """
+  loaded_vcon = vcon.Vcon()
+  loaded_vcon.loads(a_vcon.dumps())
+  loaded_vcon.start_journal()
+  return(loaded_vcon)
+
+
+def test_json_path() -> None:
+  assert(vcon.journal.json_path() == "$")
+  assert(vcon.journal.json_path("parties", 0, "tel") == "$.parties[0].tel")
+  assert(vcon.journal.json_path("a-b", "c\"d") == "$[\"a-b\"][\"c\\\"d\"]")
+
+
+def test_journal_operations(two_party_tel_vcon: vcon.Vcon) -> None:
+  two_party_tel_vcon.set_uuid("py-vcon.dev")
+  two_party_tel_vcon.add_dialog_inline_text("hello", call_data["rfc2822"], 0, 0, vcon.Vcon.MEDIATYPE_TEXT_PLAIN)
+  assert(two_party_tel_vcon.get_journal_operations() is None)
+
+  test_vcon = stored_vcon(two_party_tel_vcon)
+  assert(test_vcon.get_journal_operations() == [])
+
+  analysis_index = test_vcon.add_analysis(0, "summary", "a summary", "fake vendor")
+  test_vcon.add_analysis(0, "sentiment", "happy", "fake vendor")
+  test_vcon.set_party_parameter("name", "Alice", 1)
+  # new party, part of the append, not set separately
+  new_party = test_vcon.set_party_parameter("tel", "+15555551212")
+  test_vcon.set_party_parameter("name", "Bob", new_party)
+  test_vcon.set_subject("a subject")
+  assert(test_vcon.get_journal_operations() == [
+      (vcon.journal.APPEND, "$.parties", [test_vcon.parties[2]]),
+      (vcon.journal.APPEND, "$.analysis", test_vcon.analysis[analysis_index:]),
+      (vcon.journal.SET, "$.subject", "a subject"),
+      (vcon.journal.SET, "$.parties[1].name", "Alice")
+    ])
+
+  # Applying the operations to the stored form results in the changed vCon
+  applied_dict = stored_vcon(two_party_tel_vcon).dumpd()
+  for operation, path, value in test_vcon.get_journal_operations():
+    path_elements = path.replace("[", ".").replace("]", "").split(".")[1:]
+    target = applied_dict
+    for element in path_elements[:-1]:
+      target = target[int(element) if element.isdigit() else element]
+    last = path_elements[-1]
+    if(operation == vcon.journal.APPEND):
+      target.setdefault(last, []).extend(copy.deepcopy(value))
+    else:
+      target[int(last) if last.isdigit() else last] = copy.deepcopy(value)
+  assert(applied_dict == test_vcon.dumpd())
+
+  # Copies of the vCon have their own copy of the journal
+  copied_vcon = copy.deepcopy(test_vcon)
+  assert(copied_vcon.get_journal_operations() == test_vcon.get_journal_operations())
+  copied_vcon.set_dialog_parameter("mediatype", vcon.Vcon.MEDIATYPE_TEXT_PLAIN, 0)
+  assert((vcon.journal.SET, "$.dialog[0].mediatype", vcon.Vcon.MEDIATYPE_TEXT_PLAIN) in
+    copied_vcon.get_journal_operations())
+  assert(len(copied_vcon.get_journal_operations()) == len(test_vcon.get_journal_operations()) + 1)
+
+  # Restarted, as after saving
+  test_vcon.start_journal()
+  assert(test_vcon.get_journal_operations() == [])
+
+
+def test_journal_full_write(two_party_tel_vcon: vcon.Vcon) -> None:
+  two_party_tel_vcon.set_uuid("py-vcon.dev")
+  two_party_tel_vcon.add_analysis(0, "summary", "a summary", "fake vendor")
+
+  # list objects removed or replaced, whole list set
+  test_vcon = stored_vcon(two_party_tel_vcon)
+  del test_vcon.parties[1]
+  test_vcon.analysis[0] = {"type": "sentiment", "dialog": 0}
+  assert(test_vcon.get_journal_operations() == [
+      (vcon.journal.SET, "$.parties", test_vcon.parties),
+      (vcon.journal.SET, "$.analysis", test_vcon.analysis)
+    ])
+
+  # removed value cannot be journaled
+  test_vcon = stored_vcon(two_party_tel_vcon)
+  del test_vcon._vcon_dict["analysis"]
+  assert(test_vcon.get_journal_operations() is None)
+
+  # loaded again, the journal is no longer valid
+  test_vcon = stored_vcon(two_party_tel_vcon)
+  test_vcon._state = vcon.VconStates.UNSIGNED
+  test_vcon.loadd(two_party_tel_vcon.dumpd())
+  assert(test_vcon.get_journal_operations() is None)
+
+  # changed in place, not by the Vcon methods
+  test_vcon = stored_vcon(two_party_tel_vcon)
+  test_vcon.parties[0]["name"] = "Alice"
+  assert(test_vcon.get_journal_operations() is None)
+  test_vcon = stored_vcon(two_party_tel_vcon)
+  test_vcon.analysis[0]["body"] = "another summary"
+  assert(test_vcon.get_journal_operations() is None)
+  test_vcon = stored_vcon(two_party_tel_vcon)
+  del test_vcon.parties[1]["tel"]
+  assert(test_vcon.get_journal_operations() is None)
+  test_vcon = stored_vcon(two_party_tel_vcon)
+  test_vcon.analysis[0].setdefault("meta", {})["a"] = 1
+  assert(test_vcon.get_journal_operations() is None)
+  # the parameter set through the Vcon method is journaled, other changes
+  # to the same object are not
+  test_vcon = stored_vcon(two_party_tel_vcon)
+  test_vcon.set_party_parameter("name", "Alice", 0)
+  assert(test_vcon.get_journal_operations() == [(vcon.journal.SET, "$.parties[0].name", "Alice")])
+  test_vcon.parties[0]["role"] = "agent"
+  assert(test_vcon.get_journal_operations() is None)
+
+  # signed
+  test_vcon = stored_vcon(two_party_tel_vcon)
+  test_vcon.sign(GROUP_PRIVATE_KEY, [GROUP_CERT, DIVISION_CERT, CA_CERT])
+  assert(test_vcon.get_journal_operations() is None)
+  test_vcon.start_journal()
+  assert(test_vcon.get_journal_operations() is None)
+
+
+def test_journal_revision(two_party_tel_vcon: vcon.Vcon) -> None:
+  two_party_tel_vcon.set_uuid("py-vcon.dev")
+  test_vcon = stored_vcon(two_party_tel_vcon)
+  assert(test_vcon.get_journal_revision() is None)
+  test_vcon.start_journal("abc123")
+  assert(test_vcon.get_journal_revision() == "abc123")
+  assert(copy.deepcopy(test_vcon).get_journal_revision() == "abc123")
+  two_party_tel_vcon.sign(GROUP_PRIVATE_KEY, [GROUP_CERT, DIVISION_CERT, CA_CERT])
+  two_party_tel_vcon.start_journal("abc123")
+  assert(two_party_tel_vcon.get_journal_revision() is None)
+
+
+def test_journal_size() -> None:
+  large_vcon = build_large_vcon(4 * 1024 * 1024)
+  test_vcon = stored_vcon(large_vcon)
+  test_vcon.add_analysis(0, "summary", "a summary", "fake vendor")
+
+  operations = test_vcon.get_journal_operations()
+  operations_size = sum(len(path) + len(vcon.json_codec.dumpb(value)) for operation, path, value in operations)
+  full_size = len(vcon.json_codec.dumpb(test_vcon.dumpd()))
+  print("update size full: {} journaled: {}".format(full_size, operations_size))
+
+  assert(operations_size * 1000 < full_size)
@@ -0,0 +1,130 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+""" Unit tests and benchmark for the compiled jq program cache """
+
+import copy
+import time
+import pyjq
+import vcon
+import vcon.jq_cache
+from tests.common_utils import empty_vcon, two_party_tel_vcon, call_data, build_large_vcon
+
+
+def test_jq_cache_stats() -> None:
+  vcon.jq_cache.clear()
+  assert(vcon.jq_cache.stats()["size"] == 0)
+  value = {"a": [1, 2, 3], "b": {"c": "d"}}
+
+  assert(vcon.jq_cache.query_all(".a[]", value) == [1, 2, 3])
+  assert(vcon.jq_cache.query_all(".a[]", value) == [1, 2, 3])
+  assert(vcon.jq_cache.query_first(".b.c", value) == "d")
+  assert(vcon.jq_cache.query_first(".x[]?", value, "none") == "none")
+  stats = vcon.jq_cache.stats()
+  assert(stats["hits"] == 1)
+  assert(stats["misses"] == 3)
+  assert(stats["size"] == 3)
+
+  # Least recently used dropped first
+  max_size = stats["max_size"]
+  try:
+    vcon.jq_cache.configure(2)
+    assert(vcon.jq_cache.stats()["size"] == 2)
+    vcon.jq_cache.query_all(".b", value)
+    vcon.jq_cache.query_all(".a", value)
+    assert(vcon.jq_cache.stats()["misses"] == 5)
+    vcon.jq_cache.query_all(".b", value)
+    assert(vcon.jq_cache.stats()["hits"] == 2)
+    vcon.jq_cache.query_all(".a[]", value)
+    assert(vcon.jq_cache.stats()["misses"] == 6)
+
+    # not cached
+    vcon.jq_cache.configure(0)
+    vcon.jq_cache.query_all(".a", value)
+    vcon.jq_cache.query_all(".a", value)
+    assert(vcon.jq_cache.stats()["size"] == 0)
+    assert(vcon.jq_cache.stats()["misses"] == 8)
+
+  finally:
+    vcon.jq_cache.configure(max_size)
+
+  try:
+    vcon.jq_cache.query_all(".a[", value)
+    raise Exception("Expected exception for invalid query")
+
+  except ValueError:
+    # expected
+    pass
+
+  # combined queries
+  assert(vcon.jq_cache.query_all_many([".a[] # comment", "empty", ".b.c"], value) == [[1, 2, 3], [], ["d"]])
+  assert(vcon.jq_cache.query_all_many([], value) == [])
+  try:
+    vcon.jq_cache.query_all_many([".a", ".b["], value)
+    raise Exception("Expected exception for invalid query")
+
+  except ValueError as error:
+    assert(".b[" in str(error))
+
+  # input not modified
+  assert(vcon.jq_cache.query_all(".a |= map(. + 1)", value) == [{"a": [2, 3, 4], "b": {"c": "d"}}])
+  assert(value == {"a": [1, 2, 3], "b": {"c": "d"}})
+
+
+def test_vcon_jq(two_party_tel_vcon: vcon.Vcon) -> None:
+  two_party_tel_vcon.set_uuid("py-vcon.dev")
+  vcon_dict = two_party_tel_vcon.dumpd()
+  vcon.jq_cache.clear()
+
+  assert(two_party_tel_vcon.jq(".parties[0].tel") == [call_data["source"]])
+  results = two_party_tel_vcon.jq({
+      "party_count": ".parties | length",
+      "tel": ".parties[1].tel"
+    })
+  assert(results == {"party_count": 2, "tel": call_data["destination"]})
+
+  # results are not references into the vCon
+  parties = two_party_tel_vcon.jq(".parties")[0]
+  parties[0]["tel"] = "bogus"
+  parties.append({})
+  assert(two_party_tel_vcon.dumpd() == vcon_dict)
+
+  assert(two_party_tel_vcon.jq(".parties[0].tel") == [call_data["source"]])
+  assert(vcon.jq_cache.stats()["hits"] == 1)
+
+
+def time_queries(test_vcon: vcon.Vcon, queries: dict, count: int) -> tuple:
+  # The way Vcon.jq used to query
+  start = time.process_time()
+  for index in range(count):
+    vcon_dict = copy.deepcopy(test_vcon.dumpd(True, False))
+    uncached_results = {}
+    for query_name, query_string in queries.items():
+      uncached_results[query_name] = pyjq.all(query_string, vcon_dict)[0]
+  uncached_time = (time.process_time() - start) / count
+
+  start = time.process_time()
+  for index in range(count):
+    cached_results = test_vcon.jq(queries)
+  cached_time = (time.process_time() - start) / count
+
+  assert(cached_results == uncached_results)
+  return(uncached_time, cached_time)
+
+
+def test_jq_cache_benchmark() -> None:
+  small_vcon = build_large_vcon(1024)
+  large_vcon = build_large_vcon(4 * 1024 * 1024)
+  queries = {
+      "party_count": ".parties | length",
+      "dialog_types": "[.dialog[].type]",
+      "has_transcript": "[.analysis[]? | select(.type == \"transcript\")] | length > 0"
+    }
+  for test_vcon in (small_vcon, large_vcon):
+    uncached_time, cached_time = time_queries(test_vcon, queries, 5)
+    print("jq {} queries on {} byte vCon: compile and deepcopy: {:.4f} sec cached: {:.4f} sec".format(
+        len(queries),
+        len(test_vcon.dumps()),
+        uncached_time,
+        cached_time
+      ))
+
+    assert(cached_time < uncached_time)
@@ -0,0 +1,141 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+""" Unit tests and backend benchmark for vcon.json_codec """
+
+import json
+import time
+import vcon
+import vcon.json_codec
+from tests.common_utils import build_large_vcon
+
+
+def test_backend_selection():
+  backends = vcon.json_codec.available_backends()
+  assert(backends[-1] == vcon.json_codec.JSON)
+  assert(vcon.json_codec.get_backend() in backends)
+
+  original = vcon.json_codec.get_backend()
+  try:
+    assert(vcon.json_codec.set_backend(vcon.json_codec.JSON) == vcon.json_codec.JSON)
+    assert(vcon.json_codec.get_backend() == vcon.json_codec.JSON)
+
+    try:
+      vcon.json_codec.set_backend("bogus_json")
+      raise Exception("Expected exception for unknown backend")
+
+    except vcon.json_codec.UnsupportedJsonBackend:
+      # expected
+      pass
+
+    assert(vcon.json_codec.set_backend(None) == backends[0])
+
+  finally:
+    vcon.json_codec.set_backend(original)
+
+
+def test_dumps_compatible():
+  """ dumps text must be the same regardless of the backend selected """
+  test_vcon = build_large_vcon(256)
+  test_vcon.set_party_parameter("name", "Zoë", 0)
+  vcon_dict = test_vcon.dumpd()
+
+  original = vcon.json_codec.get_backend()
+  try:
+    for backend in vcon.json_codec.available_backends():
+      vcon.json_codec.set_backend(backend)
+      assert(vcon.json_codec.dumps(vcon_dict) == json.dumps(vcon_dict))
+      assert(vcon.json_codec.dumps(vcon_dict, indent = 2) == json.dumps(vcon_dict, indent = 2))
+      assert(test_vcon.dumps() == json.dumps(vcon_dict))
+
+  finally:
+    vcon.json_codec.set_backend(original)
+
+
+def test_dumpb_loads():
+  test_vcon = build_large_vcon(256)
+  test_vcon.set_party_parameter("name", "Zoë", 0)
+  vcon_dict = test_vcon.dumpd()
+
+  original = vcon.json_codec.get_backend()
+  try:
+    for backend in vcon.json_codec.available_backends():
+      vcon.json_codec.set_backend(backend)
+      vcon_bytes = vcon.json_codec.dumpb(vcon_dict)
+      assert(isinstance(vcon_bytes, bytes))
+      assert(json.loads(vcon_bytes) == vcon_dict)
+      assert(vcon.json_codec.loads(vcon_bytes) == vcon_dict)
+      assert(vcon.json_codec.loads(vcon_bytes.decode("utf-8")) == vcon_dict)
+      assert(vcon.json_codec.loads(memoryview(vcon_bytes)) == vcon_dict)
+      assert(vcon.json_codec.loads(vcon.json_codec.dumpb(vcon_dict, indent = 2)) == vcon_dict)
+
+      # things the fast backends may not natively handle
+      assert(vcon.json_codec.loads(vcon.json_codec.dumpb({"big": 2**70})) == {"big": 2**70})
+      assert(vcon.json_codec.loads(vcon.json_codec.dumpb({1: "a"})) == {"1": "a"})
+      assert(vcon.json_codec.loads('{"a": NaN}')["a"] != 0.0)
+
+      try:
+        vcon.json_codec.loads("{not json")
+        raise Exception("Expected exception for invalid JSON")
+
+      except json.JSONDecodeError:
+        # expected
+        pass
+
+      # Round trip through the Vcon object
+      loaded_vcon = vcon.Vcon()
+      loaded_vcon.loads(vcon_bytes)
+      assert(loaded_vcon.dumpd() == vcon_dict)
+
+  finally:
+    vcon.json_codec.set_backend(original)
+
+
+def test_encoder_decoder():
+  """ json.JSONEncoder/JSONDecoder like interface (e.g. for redis-py) """
+  data = {"job_type": "vcon_uuid", "vcon_uuid": ["0123"]}
+  encoded = vcon.json_codec.ENCODER.encode(data)
+  assert(vcon.json_codec.DECODER.decode(encoded) == data)
+  assert(vcon.json_codec.DECODER.decode(encoded.decode("utf-8")) == data)
+
+
+def time_it(function, *args, repeat: int = 5) -> float:
+  """ best of **repeat** CPU seconds to run function """
+  best = None
+  for count in range(repeat):
+    start = time.process_time()
+    function(*args)
+    cpu_time = time.process_time() - start
+    if(best is None or cpu_time < best):
+      best = cpu_time
+
+  return(best)
+
+
+def test_json_codec_benchmark():
+  large_vcon = build_large_vcon(2 * 1024 * 1024)
+  vcon_dict = large_vcon.dumpd()
+
+  original = vcon.json_codec.get_backend()
+  results = {}
+  try:
+    for backend in vcon.json_codec.available_backends():
+      vcon.json_codec.set_backend(backend)
+      vcon_bytes = vcon.json_codec.dumpb(vcon_dict)
+      results[backend] = (
+          time_it(vcon.json_codec.dumpb, vcon_dict),
+          time_it(vcon.json_codec.loads, vcon_bytes)
+        )
+      print("{}: dumpb: {:.4f} sec loads: {:.4f} sec (vCon JSON size: {:.2f} MB)".format(
+          backend,
+          results[backend][0],
+          results[backend][1],
+          len(vcon_bytes) / 1000000
+        ))
+
+  finally:
+    vcon.json_codec.set_backend(original)
+
+  # The default backend should never be slower than stdlib by much
+  default_backend = vcon.json_codec.available_backends()[0]
+  assert(results[default_backend][0] <= results[vcon.json_codec.JSON][0] * 1.5 + 0.01)
+  assert(results[default_backend][1] <= results[vcon.json_codec.JSON][1] * 1.5 + 0.01)
+
@@ -0,0 +1,200 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+""" Unit tests and benchmark for loading vCons from dict (Vcon.loadd) """
+
+import copy
+import json
+import time
+import tracemalloc
+import vcon
+import vcon.security
+from tests.common_utils import build_large_vcon
+
+CA_CERT = "certs/fake_ca_root.crt"
+DIVISION_CERT = "certs/fake_div.crt"
+GROUP_CERT = "certs/fake_grp.crt"
+GROUP_PRIVATE_KEY = "certs/fake_grp.key"
+
+
+def test_loadd_copy():
+  in_vcon = build_large_vcon(1024)
+  vcon_dict = in_vcon.dumpd()
+
+  out_vcon = vcon.Vcon()
+  out_vcon.loadd(vcon_dict)
+  assert(out_vcon.uuid == in_vcon.uuid)
+  assert(out_vcon._vcon_dict == vcon_dict)
+
+  # default is to copy, so modifying the vCon does not change the given dict
+  assert(out_vcon._vcon_dict is not vcon_dict)
+  out_vcon.set_party_parameter("name", "Alice", 0)
+  assert(vcon_dict["parties"][0].get("name", None) is None)
+
+
+def test_loadd_take_ownership():
+  in_vcon = build_large_vcon(1024)
+  vcon_dict = in_vcon.dumpd()
+
+  out_vcon = vcon.Vcon()
+  out_vcon.loadd(vcon_dict, True)
+  assert(out_vcon._vcon_dict is vcon_dict)
+  assert(out_vcon.dialog[1]["body"] is vcon_dict["dialog"][1]["body"])
+  assert(out_vcon.decode_dialog_inline_body(0) == in_vcon.decode_dialog_inline_body(0))
+
+
+def test_loadd_migrate():
+  vcon_dict = json.loads(vcon.security.load_string_from_file("tests/ab_call_ext_rec_0.0.1.vcon"))
+  original_dict = copy.deepcopy(vcon_dict)
+
+  # copy mode must not migrate the caller's dict
+  copied_vcon = vcon.Vcon()
+  copied_vcon.loadd(vcon_dict)
+  assert(vcon_dict == original_dict)
+  assert(copied_vcon.vcon == "0.0.2")
+  assert(copied_vcon.dialog[0]["mediatype"] == "audio/x-wav")
+  assert("signature" not in copied_vcon.dialog[0])
+
+  # ownership mode migrates in place
+  owned_vcon = vcon.Vcon()
+  owned_vcon.loadd(vcon_dict, True)
+  assert(vcon_dict["vcon"] == "0.0.2")
+  assert(owned_vcon.dumpd(True, False) is vcon_dict)
+  assert(owned_vcon.dumpd() == copied_vcon.dumpd())
+
+
+def test_loadd_signed_encrypted():
+  in_vcon = build_large_vcon(1024)
+  in_vcon.sign(GROUP_PRIVATE_KEY, [GROUP_CERT, DIVISION_CERT, CA_CERT])
+  jws_dict = in_vcon.dumpd()
+
+  signed_vcon = vcon.Vcon()
+  signed_vcon.loadd(jws_dict, True)
+  assert(signed_vcon._state == vcon.VconStates.UNVERIFIED)
+  assert(signed_vcon.uuid == in_vcon.uuid)
+  signed_vcon.verify([CA_CERT])
+  assert(signed_vcon._state == vcon.VconStates.VERIFIED)
+  assert(signed_vcon.dialog[0]["body"] == in_vcon.dialog[0]["body"])
+
+  in_vcon.encrypt(GROUP_CERT)
+  jwe_dict = in_vcon.dumpd()
+  encrypted_vcon = vcon.Vcon()
+  encrypted_vcon.loadd(jwe_dict)
+  assert(encrypted_vcon._state == vcon.VconStates.ENCRYPTED)
+  assert(encrypted_vcon.uuid == in_vcon.uuid)
+
+
+def test_loadd_invalid():
+  bad_vcon = vcon.Vcon()
+  try:
+    bad_vcon.loadd({"foo": "bar"})
+    raise Exception("Expected exception for dict which is not a vCon")
+
+  except vcon.InvalidVconJson:
+    # expected
+    pass
+
+  try:
+    bad_vcon.loadd({"vcon": "0.0.0", "parties": []})
+    raise Exception("Expected exception for unsupported version")
+
+  except vcon.UnsupportedVconVersion:
+    # expected
+    pass
+
+
+def test_loadd_partial():
+  in_vcon = build_large_vcon(1024)
+  in_vcon.start_journal()
+  assert(not in_vcon.is_partial())
+  assert(in_vcon.get_partial_paths() is None)
+  assert(in_vcon.get_state() == vcon.VconStates.UNSIGNED)
+  partial_dict = {
+      "vcon": in_vcon.vcon,
+      "uuid": in_vcon.uuid,
+      "dialog": [{key: value for key, value in dialog.items() if key != "body"} for dialog in in_vcon.dialog]
+    }
+
+  # Without the exclusions, not recognized as a vCon
+  try:
+    vcon.Vcon().loadd({"vcon": in_vcon.vcon, "uuid": in_vcon.uuid})
+    raise Exception("Expected exception for dict without object arrays")
+
+  except vcon.InvalidVconJson:
+    # expected
+    pass
+
+  partial_vcon = vcon.Vcon()
+  partial_vcon.loadd(partial_dict, False, ["dialog.body", "parties", "analysis", "attachments"])
+  assert(partial_vcon.is_partial())
+  assert(partial_vcon.get_partial_paths() == ["dialog.body", "parties", "analysis", "attachments"])
+  # a copy, changes do not make the vCon whole
+  partial_vcon.get_partial_paths().clear()
+  assert(partial_vcon.is_partial())
+  assert(partial_vcon.uuid == in_vcon.uuid)
+  assert(len(partial_vcon.dialog) == len(in_vcon.dialog))
+  assert("body" not in partial_vcon.dialog[0])
+
+  # Changes to a partial vCon cannot be journaled
+  partial_vcon.start_journal()
+  assert(partial_vcon.get_journal_operations() is None)
+
+  # Loading the whole vCon, is no longer partial
+  partial_vcon.loadd(in_vcon.dumpd())
+  assert(not partial_vcon.is_partial())
+  assert(partial_vcon.get_partial_paths() is None)
+
+
+def measure_load(load_function, vcon_dict: dict) -> (float, int):
+  """ returns CPU seconds and peak bytes allocated to load the dict """
+  tracemalloc.start()
+  start = time.process_time()
+  loaded_vcon = load_function(vcon_dict)
+  cpu_time = time.process_time() - start
+  current, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  assert(loaded_vcon.uuid == vcon_dict["uuid"])
+  return(cpu_time, peak)
+
+
+def json_round_trip_load(vcon_dict: dict) -> vcon.Vcon:
+  """ How Vcon.loadd used to load a dict """
+  loaded_vcon = vcon.Vcon()
+  loaded_vcon.loads(json.dumps(vcon_dict))
+  return(loaded_vcon)
+
+
+def copy_load(vcon_dict: dict) -> vcon.Vcon:
+  loaded_vcon = vcon.Vcon()
+  loaded_vcon.loadd(vcon_dict)
+  return(loaded_vcon)
+
+
+def owned_load(vcon_dict: dict) -> vcon.Vcon:
+  loaded_vcon = vcon.Vcon()
+  loaded_vcon.loadd(vcon_dict, True)
+  return(loaded_vcon)
+
+
+def test_loadd_benchmark():
+  large_vcon = build_large_vcon()
+  vcon_dict = large_vcon.dumpd()
+  encoded_size = len(large_vcon.dumps())
+
+  results = {}
+  for label, load_function in (
+      ("json round trip", json_round_trip_load),
+      ("loadd copy", copy_load),
+      ("loadd take_ownership", owned_load)
+    ):
+    results[label] = measure_load(load_function, copy.deepcopy(vcon_dict))
+    print("{}: cpu: {:.4f} sec peak memory: {:.2f} MB (vCon JSON size: {:.2f} MB)".format(
+        label,
+        results[label][0],
+        results[label][1] / 1000000,
+        encoded_size / 1000000
+      ))
+
+  # The round trip holds at least one extra copy of the bodies
+  assert(results["loadd copy"][1] < results["json round trip"][1] / 2)
+  assert(results["loadd take_ownership"][1] < results["json round trip"][1] / 2)
+  assert(results["loadd take_ownership"][1] <= results["loadd copy"][1])
+
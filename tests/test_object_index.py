@@ -0,0 +1,173 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+""" Unit tests and benchmark for the dialog, analysis and attachment indices """
+
+import time
+import vcon
+import vcon.accessors
+from tests.common_utils import empty_vcon, two_party_tel_vcon, call_data
+
+WHISPER_ACCESSORS = [
+    ("whisper", "", "whisper_word_timestamps"),
+    ("openai", "whisper", "whisper_word_timestamps")
+  ]
+
+
+def scan_transcript_for_dialog(test_vcon: vcon.Vcon, dialog_index: int, transcript_accessors) -> int:
+  """ search the analysis list the way find_transcript_for_dialog used to """
+  for analysis_index, analysis in enumerate(test_vcon.analysis):
+    if(analysis["type"] == "transcript" and
+      analysis["dialog"] == dialog_index
+      ):
+      generator_tuple = (
+        analysis.get("vendor", "").lower(),
+        analysis.get("product", "").lower(),
+        analysis.get("schema", "").lower()
+        )
+      if(generator_tuple in transcript_accessors):
+        return(analysis_index)
+
+  return(None)
+
+
+def build_vcon(dialog_count: int) -> vcon.Vcon:
+  test_vcon = vcon.Vcon()
+  test_vcon.set_uuid("py-vcon.dev")
+  test_vcon.set_party_parameter("tel", call_data["source"])
+  test_vcon.set_party_parameter("tel", call_data["destination"])
+  for dialog_index in range(dialog_count):
+    test_vcon.add_dialog_external_recording(
+        b"",
+        call_data["rfc2822"],
+        call_data["duration"],
+        [0, 1],
+        "https://example.com/recording_{}.wav".format(dialog_index),
+        vcon.Vcon.MEDIATYPE_AUDIO_WAV
+      )
+    test_vcon.add_analysis(dialog_index, "summary", "summary {}".format(dialog_index), "Fake Vendor")
+    test_vcon.add_analysis_transcript(
+        dialog_index,
+        {"text": "hello {}".format(dialog_index)},
+        "OpenAI",
+        "Whisper_Word_Timestamps",
+        product = "Whisper"
+      )
+
+  return(test_vcon)
+
+
+def test_find_transcript(two_party_tel_vcon: vcon.Vcon) -> None:
+  test_vcon = build_vcon(4)
+  for dialog_index in range(4):
+    assert(test_vcon.find_transcript_for_dialog(dialog_index, True, WHISPER_ACCESSORS) == dialog_index * 2 + 1)
+    assert(test_vcon.find_transcript_for_dialog(dialog_index, False) == dialog_index * 2 + 1)
+  assert(test_vcon.find_transcript_for_dialog(4, True, WHISPER_ACCESSORS) is None)
+  assert(test_vcon.find_transcript_for_dialog(0, True, [("deepgram", "transcription", "deepgram_prerecorded")]) is None)
+
+  # Earliest in the analysis list wins across accessors
+  test_vcon.add_analysis_transcript(2, {}, "whisper", "whisper_word_timestamps")
+  assert(test_vcon.find_transcript_for_dialog(2, True, list(reversed(WHISPER_ACCESSORS))) == 5)
+
+  # Transcript for a list of dialogs is not a transcript for the dialog
+  test_vcon.add_analysis_transcript([0, 3], {}, "openai", "whisper_word_timestamps", product = "whisper")
+  assert(test_vcon.find_transcript_for_dialog(3, True, WHISPER_ACCESSORS) == 7)
+  assert(test_vcon.find_analysis(3, "transcript") == [7, 9])
+
+  # Loading rebuilds the index
+  loaded_vcon = vcon.Vcon()
+  loaded_vcon.loads(test_vcon.dumps())
+  for dialog_index in range(5):
+    assert(loaded_vcon.find_transcript_for_dialog(dialog_index, True, WHISPER_ACCESSORS) ==
+      scan_transcript_for_dialog(loaded_vcon, dialog_index, WHISPER_ACCESSORS))
+
+
+def test_index_updates() -> None:
+  test_vcon = build_vcon(3)
+  assert(test_vcon.find_analysis(1, "summary") == [2])
+  assert(test_vcon.find_analysis(1, "summary", "fake vendor") == [2])
+  assert(test_vcon.find_analysis(1, "summary", "fake vendor", "bogus") == [])
+  assert(test_vcon.find_analysis(1, "transcript", "openai", "whisper", "whisper_word_timestamps") == [3])
+  rebuilds = test_vcon._object_index.analysis.rebuilds
+
+  # appended directly to the list, incrementally indexed
+  test_vcon.analysis.append({"type": "summary", "dialog": 1, "vendor": "other", "encoding": "none", "body": ""})
+  assert(test_vcon.find_analysis(1, "summary") == [2, 6])
+  assert(test_vcon._object_index.analysis.rebuilds == rebuilds)
+
+  # changed in place
+  test_vcon.analysis[2]["dialog"] = 0
+  assert(test_vcon.find_analysis(1, "summary") == [6])
+  assert(test_vcon.find_analysis(0, "summary") == [0, 2])
+
+  # replaced
+  test_vcon.analysis[6] = {"type": "sentiment", "dialog": 1}
+  assert(test_vcon.find_analysis(1, "summary") == [])
+  assert(test_vcon.find_analysis(1, "sentiment") == [6])
+
+  # removed
+  del test_vcon.analysis[0]
+  assert(test_vcon.find_analysis(0, "summary") == [1])
+  test_vcon._vcon_dict["analysis"] = []
+  assert(test_vcon.find_analysis(0, "summary") == [])
+  assert(test_vcon.find_transcript_for_dialog(0) is None)
+
+
+def test_find_dialogs_and_attachments(two_party_tel_vcon: vcon.Vcon) -> None:
+  two_party_tel_vcon.add_dialog_inline_text("hello", call_data["rfc2822"], 0, 0, vcon.Vcon.MEDIATYPE_TEXT_PLAIN)
+  two_party_tel_vcon.add_dialog_external_recording(
+      b"",
+      call_data["rfc2822"],
+      call_data["duration"],
+      [0, 1],
+      "https://example.com/recording.wav",
+      vcon.Vcon.MEDIATYPE_AUDIO_WAV
+    )
+  two_party_tel_vcon.add_dialog_inline_text("bye", call_data["rfc2822"], 0, 1, vcon.Vcon.MEDIATYPE_TEXT_PLAIN)
+  assert(two_party_tel_vcon.find_dialogs_by_type("text") == [0, 2])
+  assert(two_party_tel_vcon.find_dialogs_by_type("recording") == [1])
+  assert(two_party_tel_vcon.find_dialogs_by_type("transfer") == [])
+
+  two_party_tel_vcon.add_attachment_inline(b"abc", call_data["rfc2822"], 0, vcon.Vcon.MEDIATYPE_TEXT_PLAIN)
+  two_party_tel_vcon.attachments.append({"type": "lawful_basis", "encoding": "none", "body": ""})
+  two_party_tel_vcon.attachments.append({"type": "tags", "encoding": "none", "body": ""})
+  assert(two_party_tel_vcon.find_attachments_by_type("lawful_basis") == [1])
+  assert(two_party_tel_vcon.find_attachments_by_type("tags") == [2])
+
+  # changed in place to have a new key is not found until the index is cleared
+  two_party_tel_vcon.attachments[0]["type"] = "tags"
+  assert(two_party_tel_vcon.find_attachments_by_type("tags") == [2])
+  two_party_tel_vcon._object_index.clear()
+  assert(two_party_tel_vcon.find_attachments_by_type("tags") == [0, 2])
+
+
+def test_object_index_benchmark() -> None:
+  dialog_count = 1000
+  test_vcon = build_vcon(dialog_count)
+  accessors = list(vcon.accessors.transcript_accessors.keys())
+
+  # As the whisper plugin and get_dialog_text do, three lookups and then one more per dialog
+  start = time.perf_counter()
+  for dialog_index in range(dialog_count):
+    for lookup in range(3):
+      scan_result = scan_transcript_for_dialog(test_vcon, dialog_index, WHISPER_ACCESSORS)
+    scan_result = scan_transcript_for_dialog(test_vcon, dialog_index, accessors)
+  scan_time = time.perf_counter() - start
+
+  start = time.perf_counter()
+  index_results = []
+  for dialog_index in range(dialog_count):
+    for lookup in range(3):
+      index_result = test_vcon.find_transcript_for_dialog(dialog_index, True, WHISPER_ACCESSORS)
+    index_results.append(test_vcon.find_transcript_for_dialog(dialog_index))
+  index_time = time.perf_counter() - start
+
+  for dialog_index, index_result in enumerate(index_results):
+    assert(index_result == scan_transcript_for_dialog(test_vcon, dialog_index, accessors))
+
+  print("find transcripts for {} dialogs, {} analysis: scan: {:.4f} sec index: {:.4f} sec".format(
+      dialog_count,
+      len(test_vcon.analysis),
+      scan_time,
+      index_time
+    ))
+
+  assert(index_time * 5 < scan_time)
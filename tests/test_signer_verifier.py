@@ -0,0 +1,206 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+""" Unit tests and benchmark for reusable JWS Signer and Verifier """
+
+import time
+import pytest
+import vcon
+import vcon.security
+from tests.common_utils import empty_vcon, two_party_tel_vcon, call_data
+
+CA_CERT = "certs/fake_ca_root.crt"
+CA2_CERT = "certs/fake_ca2_root.crt"
+DIVISION_CERT = "certs/fake_div.crt"
+GROUP_CERT = "certs/fake_grp.crt"
+GROUP_PRIVATE_KEY = "certs/fake_grp.key"
+
+
+def build_signed_vcon(signer) -> vcon.Vcon:
+  """ construct, sign and serialize a vCon, returning it reloaded as unverified """
+  signed_vcon = vcon.Vcon()
+  signed_vcon.set_party_parameter("tel", call_data['source'])
+  signed_vcon.set_party_parameter("tel", call_data['destination'])
+  signed_vcon.set_uuid("vcon.dev")
+  if(isinstance(signer, vcon.security.Signer)):
+    signed_vcon.sign(signer)
+  else:
+    signed_vcon.sign(GROUP_PRIVATE_KEY, [GROUP_CERT, DIVISION_CERT, CA_CERT])
+
+  loaded_vcon = vcon.Vcon()
+  loaded_vcon.loads(signed_vcon.dumps())
+  return(loaded_vcon)
+
+
+def test_signer_verifier() -> None:
+  signer = vcon.security.Signer(GROUP_PRIVATE_KEY, [GROUP_CERT, DIVISION_CERT, CA_CERT])
+  assert(signer.algorithm == "RS256")
+  assert(len(signer.header["x5c"]) == 3)
+  # header is a copy
+  signer.header["x5c"].append("bogus")
+  assert(len(signer.header["x5c"]) == 3)
+
+  verifier = vcon.security.Verifier([CA_CERT])
+  for count in range(3):
+    signed_vcon = build_signed_vcon(signer)
+    assert(signed_vcon._state == vcon.VconStates.UNVERIFIED)
+    assert(signed_vcon._jws_dict["signatures"][0]["header"]["uuid"] == signed_vcon.uuid)
+    assert("uuid" not in signer.header)
+    signed_vcon.verify(verifier)
+    assert(signed_vcon._state == vcon.VconStates.VERIFIED)
+    assert(signed_vcon.parties[0]["tel"] == call_data['source'])
+
+  # chain only validated once
+  assert(verifier.cache_stats == {"size": 1, "hits": 2, "misses": 1})
+
+  # Same JWS headers as signing with the PEM files
+  pem_signed_vcon = build_signed_vcon(None)
+  pem_signature = pem_signed_vcon._jws_dict["signatures"][0]
+  signature = signed_vcon._jws_dict["signatures"][0]
+  assert(pem_signature["protected"] == signature["protected"])
+  assert(pem_signature["header"]["x5c"] == signature["header"]["x5c"])
+  assert(pem_signature["header"]["alg"] == signature["header"]["alg"])
+  pem_signed_vcon.verify([CA_CERT])
+  assert(pem_signed_vcon._state == vcon.VconStates.VERIFIED)
+
+  # Cached chain must not bypass checking the signature
+  tampered_vcon = build_signed_vcon(signer)
+  tampered_vcon._jws_dict["signatures"][0]["signature"] = \
+    pem_signed_vcon._jws_dict["signatures"][0]["signature"][:-4] + "AAAA"
+  try:
+    tampered_vcon.verify(verifier)
+    raise Exception("Expected exception for invalid signature")
+
+  except vcon.security.jose.exceptions.JWSError:
+    # expected
+    pass
+  assert(tampered_vcon._state == vcon.VconStates.UNVERIFIED)
+
+  verifier.clear_cache()
+  assert(verifier.cache_stats["size"] == 0)
+
+
+def test_verifier_wrong_ca() -> None:
+  signer = vcon.security.Signer(GROUP_PRIVATE_KEY, [GROUP_CERT, DIVISION_CERT, CA_CERT])
+  verifier = vcon.security.Verifier([CA2_CERT])
+  for count in range(2):
+    signed_vcon = build_signed_vcon(signer)
+    try:
+      signed_vcon.verify(verifier)
+      raise Exception("Expected exception for chain not issued by CA2")
+
+    except vcon.security.cryptography.exceptions.InvalidSignature:
+      # expected
+      pass
+
+  # chains which fail are not cached
+  assert(verifier.cache_stats == {"size": 0, "hits": 0, "misses": 2})
+
+
+def test_verifier_cache_expiry() -> None:
+  signer = vcon.security.Signer(GROUP_PRIVATE_KEY, [GROUP_CERT, DIVISION_CERT, CA_CERT])
+  verifier = vcon.security.Verifier([CA_CERT], chain_cache_ttl = 0.05)
+  build_signed_vcon(signer).verify(verifier)
+  build_signed_vcon(signer).verify(verifier)
+  time.sleep(0.1)
+  build_signed_vcon(signer).verify(verifier)
+  assert(verifier.cache_stats == {"size": 1, "hits": 1, "misses": 2})
+
+  # no caching
+  verifier = vcon.security.Verifier([CA_CERT], chain_cache_ttl = 0)
+  build_signed_vcon(signer).verify(verifier)
+  build_signed_vcon(signer).verify(verifier)
+  assert(verifier.cache_stats == {"size": 0, "hits": 0, "misses": 2})
+
+
+@pytest.mark.asyncio
+async def test_filter_plugins_reuse(two_party_tel_vcon: vcon.Vcon) -> None:
+  sign_options = {
+      "private_pem_key": vcon.security.load_string_from_file(GROUP_PRIVATE_KEY),
+      "cert_chain_pems": [
+        vcon.security.load_string_from_file(GROUP_CERT),
+        vcon.security.load_string_from_file(DIVISION_CERT),
+        vcon.security.load_string_from_file(CA_CERT)
+      ]
+    }
+  verify_options = {
+      "allowed_ca_cert_pems": [vcon.security.load_string_from_file(CA_CERT)]
+    }
+
+  sign_plugin = vcon.filter_plugins.FilterPluginRegistry.get("signfilter").plugin()
+  verify_plugin = vcon.filter_plugins.FilterPluginRegistry.get("verifyfilter").plugin()
+  # plugins are shared with other tests, so only count the change in cache stats
+  verifier = verify_plugin.get_verifier(verify_options["allowed_ca_cert_pems"])
+  start_stats = verifier.cache_stats
+  two_party_tel_vcon.set_uuid("vcon.dev")
+  for count in range(3):
+    unsigned_vcon = vcon.Vcon()
+    unsigned_vcon.loadd(two_party_tel_vcon.dumpd())
+    await unsigned_vcon.signfilter(sign_options)
+    signed_vcon = vcon.Vcon()
+    signed_vcon.loads(unsigned_vcon.dumps())
+    await signed_vcon.verifyfilter(verify_options)
+    assert(signed_vcon._state == vcon.VconStates.VERIFIED)
+
+  assert(sign_plugin.get_signer(
+      sign_options["private_pem_key"],
+      sign_options["cert_chain_pems"]
+    ) is sign_plugin.get_signer(
+      sign_options["private_pem_key"],
+      sign_options["cert_chain_pems"]
+    ))
+  assert(verify_plugin.get_verifier(verify_options["allowed_ca_cert_pems"]) is verifier)
+  assert(verifier.cache_stats["misses"] - start_stats["misses"] <= 1)
+  assert(verifier.cache_stats["hits"] - start_stats["hits"] >= 2)
+
+
+def test_signer_verifier_benchmark() -> None:
+  count = 50
+  signer = vcon.security.Signer(GROUP_PRIVATE_KEY, [GROUP_CERT, DIVISION_CERT, CA_CERT])
+  verifier = vcon.security.Verifier([CA_CERT])
+
+  unsigned_vcons = []
+  for index in range(count * 2):
+    unsigned_vcon = vcon.Vcon()
+    unsigned_vcon.set_party_parameter("tel", call_data['source'])
+    unsigned_vcon.set_uuid("vcon.dev")
+    unsigned_vcons.append(unsigned_vcon)
+
+  start = time.process_time()
+  for unsigned_vcon in unsigned_vcons[:count]:
+    unsigned_vcon.sign(GROUP_PRIVATE_KEY, [GROUP_CERT, DIVISION_CERT, CA_CERT])
+  pem_sign_time = time.process_time() - start
+
+  start = time.process_time()
+  for unsigned_vcon in unsigned_vcons[count:]:
+    unsigned_vcon.sign(signer)
+  signer_sign_time = time.process_time() - start
+
+  signed_jsons = [signed_vcon.dumps() for signed_vcon in unsigned_vcons]
+  signed_vcons = []
+  for signed_json in signed_jsons:
+    signed_vcon = vcon.Vcon()
+    signed_vcon.loads(signed_json)
+    signed_vcons.append(signed_vcon)
+
+  start = time.process_time()
+  for signed_vcon in signed_vcons[:count]:
+    signed_vcon.verify([CA_CERT])
+  pem_verify_time = time.process_time() - start
+
+  start = time.process_time()
+  for signed_vcon in signed_vcons[count:]:
+    signed_vcon.verify(verifier)
+  verifier_verify_time = time.process_time() - start
+
+  print("sign {} vCons: PEM files: {:.4f} sec Signer: {:.4f} sec".format(
+      count,
+      pem_sign_time,
+      signer_sign_time
+    ))
+  print("verify {} vCons: PEM files: {:.4f} sec Verifier: {:.4f} sec".format(
+      count,
+      pem_verify_time,
+      verifier_verify_time
+    ))
+
+  assert(signer_sign_time < pem_sign_time)
+  assert(verifier_verify_time < pem_verify_time)
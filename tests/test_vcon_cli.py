@@ -484,6 +484,42 @@ async def test_post(two_party_tel_vcon, capsys, httpserver: pytest_httpserver.HT
   assert(out_vcon.uuid == uuid)
 
 
+@pytest.mark.asyncio
+async def test_batch(capsys, tmp_path):
+  """ Test batch sign and verify of a stream of vCons """
+  # Importing vcon here so that we catch any junk stdout which will break ths CLI
+  import vcon.cli
+  in_file_name = str(tmp_path / "unsigned.jsonl")
+  signed_file_name = str(tmp_path / "signed.jsonl")
+  verified_file_name = str(tmp_path / "verified.jsonl")
+  with open(in_file_name, "w") as in_file:
+    for index in range(5):
+      in_vcon = vcon.Vcon()
+      in_vcon.set_party_parameter("tel", call_data['source'])
+      in_vcon.set_subject("batch {}".format(index))
+      in_vcon.set_uuid("vcon.dev")
+      in_file.write(in_vcon.dumps() + "\n")
+
+  assert(await vcon.cli.main(["-i", in_file_name, "-o", signed_file_name, "batch", "sign",
+    "-k", "certs/fake_grp.key", "-j", "2", "certs/fake_grp.crt", "certs/fake_div.crt", "certs/fake_ca_root.crt"]) == 0)
+  assert(await vcon.cli.main(["-i", signed_file_name, "-o", verified_file_name, "batch", "verify",
+    "-j", "0", "certs/fake_ca_root.crt"]) == 0)
+
+  out, error = capsys.readouterr()
+  # As we captured the stderr, we need to re-emmit it for unit test feedback
+  print("stderr: {}".format(error), file=sys.stderr)
+  assert(out == "")
+  assert("verify: 5 vCons (0 errors)" in error)
+
+  with open(verified_file_name) as verified_file:
+    lines = verified_file.readlines()
+  assert(len(lines) == 5)
+  for index, line in enumerate(lines):
+    out_vcon = vcon.Vcon()
+    out_vcon.loads(line)
+    assert(out_vcon.subject == "batch {}".format(index))
+
+
 # TODO:
 # vcon sign
 # vcon verify
@@ -493,3 +529,50 @@ async def test_post(two_party_tel_vcon, capsys, httpserver: pytest_httpserver.HT
 # vcon -i
 # vcon -o
 
+
+
+@pytest.mark.asyncio
+async def test_container(capsys, tmp_path):
+  """ Test container pack, extract and unpack """
+  # Importing vcon here so that we catch any junk stdout which will break ths CLI
+  import vcon.cli
+  jsonl_file_name = str(tmp_path / "in.jsonl")
+  container_file_name = str(tmp_path / "archive.vcons")
+  extract_file_name = str(tmp_path / "extract.jsonl")
+  uuids = []
+  with open(jsonl_file_name, "w") as jsonl_file:
+    for index in range(4):
+      in_vcon = vcon.Vcon()
+      in_vcon.set_party_parameter("tel", call_data['source'])
+      in_vcon.set_subject("container {}".format(index))
+      in_vcon.set_uuid("vcon.dev")
+      uuids.append(in_vcon.uuid)
+      jsonl_file.write(in_vcon.dumps() + "\n")
+
+  for pack_options in [[], ["--cbor"]]:
+    assert(await vcon.cli.main(["-i", jsonl_file_name, "container", "pack", container_file_name] + pack_options) == 0)
+    assert(await vcon.cli.main(["-o", extract_file_name, "container", "extract", container_file_name,
+      uuids[2], uuids[0]]) == 0)
+
+    with open(extract_file_name) as extract_file:
+      lines = extract_file.readlines()
+    assert(len(lines) == 2)
+    for line, index in zip(lines, [2, 0]):
+      out_vcon = vcon.Vcon()
+      out_vcon.loads(line)
+      assert(out_vcon.subject == "container {}".format(index))
+
+  unpack_dir = tmp_path / "unpacked"
+  unpack_dir.mkdir()
+  assert(await vcon.cli.main(["container", "unpack", container_file_name, "-d", str(unpack_dir)]) == 0)
+  assert(sorted(os.listdir(unpack_dir)) == sorted(["{}.vcon".format(uuid) for uuid in uuids]))
+
+  assert(await vcon.cli.main(["-o", extract_file_name, "container", "extract", container_file_name,
+    "not-a-uuid"]) == 1)
+
+  out, error = capsys.readouterr()
+  # As we captured the stderr, we need to re-emmit it for unit test feedback
+  print("stderr: {}".format(error), file=sys.stderr)
+  assert(out == "")
+  assert("packed 4 vCons" in error)
+  assert("not-a-uuid not in container" in error)
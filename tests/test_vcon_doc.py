@@ -101,7 +101,9 @@ def test_vcon_doc():
   print("got {} tagged of {} methods".format(num_tagged_methods, total_methods))
   print("untagged methods: {}".format(untagged_methods))
   print("tags: {}".format(list(tagged_methods.keys())))
-  assert(total_methods - num_tagged_methods <= 17)
+  # private helper methods need not be tagged
+  public_untagged_methods = [name for name in untagged_methods if not name.startswith("_")]
+  assert(len(public_untagged_methods) <= 13)
   # if the tags change, may need to check the layout and order
   assert(len(tagged_methods) == 10)
 
@@ -9,6 +9,7 @@ import importlib
 import pkgutil
 import typing
 import sys
+import asyncio
 import os
 import copy
 import logging
@@ -18,17 +19,23 @@ import jose.constants
 import cbor2
 import time
 import hashlib
+import tempfile
 import inspect
 import functools
 import warnings
 import datetime
 import email
 import pathlib
-import pyjq
 import uuid6
-import requests
 import pythonjsonlogger.jsonlogger
 import vcon.utils
+import vcon.json_codec
+import vcon.cbor_codec
+import vcon.dialog_body
+import vcon.object_index
+import vcon.journal
+import vcon.jq_cache
+import vcon.http_client
 import vcon.security
 import vcon.filter_plugins
 import vcon.accessors
@@ -70,14 +77,9 @@ import jose.utils
 import jose.jws
 import jose.jwe
 
-try:
-  import simplejson as json
-  dumps_options = {"ignore_nan" : True}
-  logger.info("using simplejson")
-except Exception as import_error:
-  import json
-  dumps_options = {}
-  logger.info("using json")
+# for backward compatibility, use vcon.json_codec.dumps_options
+dumps_options = vcon.json_codec.dumps_options
+logger.info("using {} JSON backend".format(vcon.json_codec.get_backend()))
 
 
 _LAST_V8_TIMESTAMP = None
@@ -315,6 +317,10 @@ class VconDictList(VconAttribute):
   def __get__(self, instance_object, class_type = None):
     got_value = super().__get__(instance_object, class_type)
 
+    # Dialog bodies loaded from CBOR get their base64url text once the dialogs are used
+    if(self.name == Vcon.DIALOG and instance_object._lazy_dialog_bodies):
+      instance_object._encode_dialog_bodies()
+
     # Always return a list to avoid having to test for null and empty
     if(got_value is None):
       got_value = []
@@ -399,6 +405,11 @@ class Vcon():
 
   CURRENT_VCON_VERSION = "0.0.2"
 
+  # chunk size for reading and hashing external recordings
+  EXTERNAL_CHUNK_SIZE = 1024 * 1024
+  # size at which fetched external recordings are spooled to disk
+  EXTERNAL_SPOOL_SIZE = 16 * 1024 * 1024
+
   # Dict keys
   VCON_VERSION = "vcon"
   UUID = "uuid"
@@ -496,6 +507,16 @@ class Vcon():
     self._state = VconStates.UNSIGNED
     self._jws_dict = None
     self._jwe_dict = None
+    # cache of InlineDialogBody handles by dialog index
+    self._dialog_bodies = {}
+    # dialog bodies loaded from CBOR which are still bytes, see loadc
+    self._lazy_dialog_bodies = False
+    # indices for finding dialog, analysis and attachment objects
+    self._object_index = vcon.object_index.VconObjectIndex()
+    # changes since loaded from storage, see start_journal
+    self._journal = None
+    # paths excluded if only part of the vCon was loaded, see is_partial
+    self._partial = None
 
     self._vcon_dict = {}
     self._vcon_dict[Vcon.VCON_VERSION] = Vcon.CURRENT_VCON_VERSION
@@ -649,6 +670,8 @@ class Vcon():
 
     # TODO parameter specific validation
     self._vcon_dict[Vcon.PARTIES][party_index][parameter_name] = parameter_value
+    if(self._journal is not None):
+      self._journal.parameter_set(Vcon.PARTIES, party_index, parameter_name)
 
     return(party_index)
 
@@ -717,6 +740,21 @@ class Vcon():
     return(found)
 
 
+  @tag_dialog
+  def find_dialogs_by_type(self, dialog_type: str) -> typing.List[int]:
+    """
+    Find the dialog objects of the given type, using an index rather than
+    searching the dialog list.
+
+    Parameters:  
+      **dialog_type** (str) - dialog type (e.g. recording, text, transfer, incomplete)
+
+    Returns:  
+      list of indices (int) to the matching dialog objects in this Vcon, in order
+    """
+    return(self._object_index.dialog.find(self.dialog, (dialog_type,)))
+
+
   @tag_dialog
   def add_dialog_inline_text(self,
     body : str,
@@ -1042,27 +1080,63 @@ class Vcon():
         None if not found.
     """
     if(transcript_accessors is None):
-      transcript_accessors = list(vcon.accessors.transcript_accessors.keys())
-    logger.debug("accessors: {}".format(transcript_accessors))
+      transcript_accessors = vcon.accessors.transcript_accessors.keys()
+
+    if(not transcript_accessor_exists):
+      transcript_indices = self._find_transcripts(dialog_index, ())
+      return(transcript_indices[0] if len(transcript_indices) > 0 else None)
 
-    for analysis_index, analysis in enumerate(self.analysis or []):
-      if(analysis["type"] == "transcript" and
-        analysis["dialog"] == dialog_index
-        ):
-        if(not transcript_accessor_exists):
-          return(analysis_index)
+    found_index = None
+    for generator_tuple in transcript_accessors:
+      transcript_indices = self._find_transcripts(dialog_index, tuple(generator_tuple))
+      if(len(transcript_indices) > 0 and
+        (found_index is None or transcript_indices[0] < found_index)):
+        found_index = transcript_indices[0]
 
-        generator_tuple = (
-          analysis.get("vendor", "").lower(),
-          analysis.get("product", "").lower(),
-          analysis.get("schema", "").lower()
-          )
+    return(found_index)
 
-        logger.debug("generator: {}".format(generator_tuple))
-        if(generator_tuple in transcript_accessors):
-          return(analysis_index)
 
-    return(None)
+  def _find_transcripts(self, dialog_index: int, generator_tuple: tuple) -> typing.List[int]:
+    # Only transcripts for the single dialog, not for a list of dialogs
+    analysis_list = self.analysis
+    return([analysis_index for analysis_index in self._object_index.analysis.find(
+        analysis_list,
+        (dialog_index, "transcript") + generator_tuple
+      ) if analysis_list[analysis_index]["dialog"] == dialog_index
+    ])
+
+
+  @tag_analysis
+  def find_analysis(
+    self,
+    dialog_index: int,
+    analysis_type: str,
+    vendor: typing.Union[str, None] = None,
+    product: typing.Union[str, None] = None,
+    schema: typing.Union[str, None] = None
+    ) -> typing.List[int]:
+    """
+    Find the analysis objects of the given type for the indicated dialog, using
+    an index rather than searching the analysis list.
+
+    Parameters:  
+      **dialog_index** (int) - index of the dialog which the analysis is for.  Analysis
+        for a list of dialogs including this one is also found.  
+      **analysis_type** (str) - analysis type (e.g. transcript, summary)  
+      **vendor** (str) - if any of vendor, product or schema are provided, only find analysis
+        objects with exactly the given vendor, product and schema, where not provided
+        matches an empty or absent parameter.  Case insensitive.  
+      **product** (str) - product to match (see vendor)  
+      **schema** (str) - schema to match (see vendor)
+
+    Returns:  
+      list of indices (int) to the matching analysis objects in this Vcon, in order
+    """
+    key = (dialog_index, analysis_type)
+    if(vendor is not None or product is not None or schema is not None):
+      key += ((vendor or "").lower(), (product or "").lower(), (schema or "").lower())
+
+    return(self._object_index.analysis.find(self.analysis, key))
 
 
   @tag_dialog
@@ -1096,6 +1170,8 @@ class Vcon():
   def decode_dialog_inline_body(self, dialog_index : int) -> typing.Union[str, bytes]:
     """
     Get the dialog recording at the given index, decoding it and returning the raw bytes.
+    The decoded body is cached until the dialog body is changed, so repeated
+    calls do not decode again (see **get_dialog_inline_body**).
 
     Parameters:  
       **dialog_index** (int): index the the dialog in the dialog list, containing the inline recording
@@ -1103,27 +1179,46 @@ class Vcon():
     Returns:  
       (bytes): the bytes for the recording file
     """
-    dialog = self.dialog[dialog_index]
+    return(self.get_dialog_inline_body(dialog_index).get())
+
+
+  @tag_dialog
+  def get_dialog_inline_body(self, dialog_index : int) -> vcon.dialog_body.InlineDialogBody:
+    """
+    Get a lazy handle to the inline body of the dialog at the given index.
+    The body is not decoded until asked for.  It is then decoded once and
+    cached until the dialog body is changed.  The handle can also decode in
+    chunks to a file or pipe, without holding the whole decoded body in memory
+    (see **InlineDialogBody.write_to**).
+
+    Parameters:  
+      **dialog_index** (int): index the the dialog in the dialog list, containing the inline recording
+
+    Returns:  
+      (InlineDialogBody): handle to the decoded body
+    """
+    if(self._lazy_dialog_bodies):
+      # Bodies loaded from CBOR are used from their bytes, without creating the base64url text
+      dialog = self._vcon_dict[Vcon.DIALOG][dialog_index]
+    else:
+      dialog = self.dialog[dialog_index]
     if(dialog["type"] not in ["text", "recording"]):
       raise AttributeError("dialog[{}] type: {} is not supported".format(dialog_index, dialog["type"]))
     if(dialog.get("body") is None):
       raise AttributeError("dialog[{}] does not contain an inline body/file".format(dialog_index))
 
-    encoding = Vcon.get_object_encoding(dialog, "dialog[{}]".format(dialog_index))
-
-    if(encoding == "base64url"):
-      # This is wrong.  decode should take a string not bytes, but it fails without the bytes conversion
-      # this is a bug in jose.baseurl_decode
-      decoded_body = jose.utils.base64url_decode(bytes(dialog["body"], 'utf-8'))
-
-    # No encoding
-    elif(encoding == "none"):
-      decoded_body = dialog["body"]
+    body_handle = self._dialog_bodies.get(dialog_index, None)
+    if(body_handle is not None and body_handle.is_current(dialog)):
+      return(body_handle)
 
-    else:
+    encoding = Vcon.get_object_encoding(dialog, "dialog[{}]".format(dialog_index))
+    if(encoding not in ["base64url", "none"]):
       raise UnsupportedVconVersion("dialog[{}] body encoding: {} not supported".format(dialog_index, dialog["encoding"]))
 
-    return(decoded_body)
+    body_handle = vcon.dialog_body.InlineDialogBody(dialog, encoding, "dialog[{}]".format(dialog_index))
+    self._dialog_bodies[dialog_index] = body_handle
+
+    return(body_handle)
 
 
   @tag_dialog
@@ -1140,6 +1235,7 @@ class Vcon():
     Add a recording of a portion of the conversation, as a reference via the given
     URL, to the dialog and generate a signature and key for the content.  This
     method has the limitation that the entire recording must be passed in in-memory.
+    See **add_dialog_external_recording_stream** for large recordings.
 
     Parameters:  
     **body** (bytes): bytes for the audio or video recording (e.g. wave or MP3 file).  
@@ -1167,23 +1263,17 @@ class Vcon():
     """
     # TODO should return dialog index not byte count
 
-    # TODO: need a streaming/chunk version of this so that we don't have to have the whole file in memory.
-
     self._attempting_modify()
 
-    new_dialog: typing.Dict[str, typing.Any] = {}
-    new_dialog['type'] = "recording"
-    new_dialog['start'] = vcon.utils.cannonize_date(start_time)
-    new_dialog['duration'] = duration
-    new_dialog['parties'] = parties
-    new_dialog['url'] = external_url
-    if(media_type is not None):
-      new_dialog['mediatype'] = media_type
-    if(file_name is not None):
-      new_dialog['filename'] = file_name
-    if(originator is not None and originator >= 0):
-      new_dialog['originator'] = originator
-
+    new_dialog = Vcon._new_external_recording_dialog(
+      start_time,
+      duration,
+      parties,
+      external_url,
+      media_type,
+      file_name,
+      originator
+      )
 
     if (body):
       if(sign_type == "LM-OTS"):
@@ -1209,6 +1299,129 @@ class Vcon():
     return(dialog_index)
 
 
+  @tag_dialog
+  async def add_dialog_external_recording_stream(self,
+    body : typing.Union[str, os.PathLike, typing.BinaryIO, typing.AsyncIterable[bytes]],
+    start_time : typing.Union[str, int, float, datetime.datetime],
+    duration : typing.Union[int, float],
+    parties : typing.Union[int, typing.List[int], typing.List[typing.List[int]]],
+    external_url: str,
+    media_type : typing.Union[str, None] = None,
+    file_name : typing.Union[str, None] = None,
+    originator : typing.Union[int, None] = None,
+    chunk_size : int = EXTERNAL_CHUNK_SIZE
+    ) -> int:
+    """
+    Add a recording of a portion of the conversation, as a reference via the given
+    URL, to the dialog and generate the SHA-512 content_hash for the content.
+    Unlike **add_dialog_external_recording**, the recording is read and hashed
+    in chunks, so that it is never entirely in memory.
+
+    Parameters:  
+    **body** (str, os.PathLike, BinaryIO, AsyncIterable[bytes]): path to the recording
+               file, a binary file object open for read or an async iterator
+               providing the bytes of the recording in chunks.  
+    **start_time** (str, int, float, datetime.datetime): Date, time of the start of
+               the recording.
+               string containing RFC 2822 or RFC 3339 date time stamp or int/float
+               containing epoch time (since 1970) in seconds.  
+    **duration** (int or float): duration of the recording in seconds  
+    **parties** (int, List[int], List[List[int]]): party indices speaking in each
+               channel of the recording.  
+    **external_url** (string): https URL where the body is stored securely  
+    **media_type** (str): media type of the recording (optional)  
+    **file_name** (str): file name of the recording (optional)  
+    **originator** (int): index into the Vcon.parties array of the party that originated
+               this dialog, if not the first party (see **add_dialog_external_recording**)  
+    **chunk_size** (int): size in bytes of the chunks read from a file or file object
+
+    Returns:  
+            Index to the added dialog
+    """
+    self._attempting_modify()
+
+    hasher = vcon.security.Sha512Hasher()
+    async for chunk in Vcon._read_chunks(body, chunk_size):
+      hasher.update(chunk)
+
+    new_dialog = Vcon._new_external_recording_dialog(
+      start_time,
+      duration,
+      parties,
+      external_url,
+      media_type,
+      file_name,
+      originator
+      )
+
+    if(hasher.size > 0):
+      new_dialog["content_hash"] = vcon.security.build_content_hash_token("SHA-512", hasher.hash())
+
+    if(self.dialog is None):
+      self._vcon_dict[Vcon.DIALOG] = []
+
+    dialog_index = len(self.dialog)
+    self._vcon_dict[Vcon.DIALOG].append(new_dialog)
+
+    return(dialog_index)
+
+
+  @staticmethod
+  def _new_external_recording_dialog(
+    start_time : typing.Union[str, int, float, datetime.datetime],
+    duration : typing.Union[int, float],
+    parties : typing.Union[int, typing.List[int], typing.List[typing.List[int]]],
+    external_url: str,
+    media_type : typing.Union[str, None],
+    file_name : typing.Union[str, None],
+    originator : typing.Union[int, None]
+    ) -> typing.Dict[str, typing.Any]:
+    """ Construct a recording dialog object referencing the given URL, without content_hash """
+    new_dialog: typing.Dict[str, typing.Any] = {}
+    new_dialog['type'] = "recording"
+    new_dialog['start'] = vcon.utils.cannonize_date(start_time)
+    new_dialog['duration'] = duration
+    new_dialog['parties'] = parties
+    new_dialog['url'] = external_url
+    if(media_type is not None):
+      new_dialog['mediatype'] = media_type
+    if(file_name is not None):
+      new_dialog['filename'] = file_name
+    if(originator is not None and originator >= 0):
+      new_dialog['originator'] = originator
+
+    return(new_dialog)
+
+
+  @staticmethod
+  async def _read_chunks(
+    source : typing.Union[str, os.PathLike, typing.BinaryIO, typing.AsyncIterable[bytes]],
+    chunk_size : int
+    ) -> typing.AsyncIterator[bytes]:
+    """ Iterate over the bytes in the given file path, file object or async iterator in chunks """
+    if(isinstance(source, (str, os.PathLike))):
+      with open(source, "rb") as source_file:
+        while(True):
+          chunk = source_file.read(chunk_size)
+          if(not chunk):
+            break
+          yield(chunk)
+
+    elif(hasattr(source, "__aiter__")):
+      async for chunk in source:
+        yield(chunk)
+
+    elif(hasattr(source, "read")):
+      while(True):
+        chunk = source.read(chunk_size)
+        if(not chunk):
+          break
+        yield(chunk)
+
+    else:
+      raise AttributeError("Unsupported recording source type: {}.  Must be a path, file or async iterator".format(type(source)))
+
+
   @tag_dialog
   async def get_dialog_external_recording(self,
     dialog_index : int,
@@ -1222,23 +1435,23 @@ class Vcon():
     Parameters:  
       **dialog_index** (int) - index into the Vcon.dialog array indicating
         which external recording is to be retrieved and verified.  
-      **get_kwargs** (dict) - kwargs passed to **requests.get** method
-        defaults to {"timeout": = 20} seconds
+      **get_kwargs** (dict) - kwargs passed to **httpx.AsyncClient.get** method
+        defaults to the shared client settings (see **vcon.http_client**)
 
     Returns:  
       verified content/bytes for the recording
     """
-    # Get body from URL using requests
+    # Get body from URL using the shared async client
     url = self.dialog[dialog_index]["url"]
     if(get_kwargs is None):
-      get_kwargs = {"timeout": 20}
-    req = requests.get(url, **get_kwargs)
-    if(not(200 <= req.status_code < 300)):
+      get_kwargs = {}
+    response = await vcon.http_client.get_client().get(url, **get_kwargs)
+    if(not(200 <= response.status_code < 300)):
       raise Exception("get of {} resulted in error: {}".format(
         url,
-        req.status_code
+        response.status_code
         ))
-    body = req.content
+    body = response.content
 
     # verify the body
     self.verify_dialog_external_recording(dialog_index, body)
@@ -1246,6 +1459,119 @@ class Vcon():
     return(body)
 
 
+  @tag_dialog
+  async def get_dialog_external_recording_stream(self,
+    dialog_index : int,
+    get_kwargs: typing.Union[dict, None] = None,
+    max_memory_size: int = EXTERNAL_SPOOL_SIZE,
+    chunk_size : int = EXTERNAL_CHUNK_SIZE
+    ) -> typing.BinaryIO:
+    """
+    Get the externally referenced dialog recording via the dialog's url,
+    streaming it into a temporary file while verifying its integrity using
+    the content_hash in the dialog object.  Unlike **get_dialog_external_recording**,
+    memory use is bounded by **max_memory_size**, beyond which the recording
+    is kept on disk.
+
+    Parameters:  
+      **dialog_index** (int) - index into the Vcon.dialog array indicating
+        which external recording is to be retrieved and verified.  
+      **get_kwargs** (dict) - kwargs passed to **httpx.AsyncClient.stream** method
+        defaults to the shared client settings (see **vcon.http_client**)  
+      **max_memory_size** (int) - size in bytes that the recording may be
+        held in memory before it is spooled to disk  
+      **chunk_size** (int) - size in bytes of chunks read from the HTTP response
+
+    Returns:  
+      tempfile.SpooledTemporaryFile containing the verified recording,
+      positioned at the start.  The caller should close it when done.
+    """
+    # Check the dialog has a hash we can verify before we bother downloading
+    hash_string = self._get_dialog_content_hash(dialog_index)
+
+    url = self.dialog[dialog_index]["url"]
+    if(get_kwargs is None):
+      get_kwargs = {}
+
+    hasher = vcon.security.Sha512Hasher()
+    body_file = tempfile.SpooledTemporaryFile(max_size = max_memory_size)
+    try:
+      async with vcon.http_client.get_client().stream("GET", url, **get_kwargs) as response:
+        if(not(200 <= response.status_code < 300)):
+          raise Exception("get of {} resulted in error: {}".format(
+            url,
+            response.status_code
+            ))
+
+        async for chunk in response.aiter_bytes(chunk_size):
+          hasher.update(chunk)
+          body_file.write(chunk)
+
+      sig_hash = hasher.hash()
+      if(hash_string != sig_hash):
+        logger.warning("dialog[{}] content_hash: {} hash: {} size: {}".format(dialog_index, hash_string, sig_hash, hasher.size))
+        raise InvalidVconHash("SHA-512 hash in signature does not match the given body for dialog[{}]".format(dialog_index))
+
+    except Exception as get_error:
+      body_file.close()
+      raise get_error
+
+    body_file.seek(0)
+
+    return(body_file)
+
+
+  @tag_dialog
+  async def fetch_external_dialogs(self,
+    dialog_indices: typing.Union[typing.List[int], None] = None,
+    max_concurrent: int = 8,
+    get_kwargs: typing.Union[dict, None] = None
+    ) -> typing.Dict[int, bytes]:
+    """
+    Get and verify the externally referenced recordings for the given dialogs
+    concurrently.  At most **max_concurrent** recordings are fetched at a time.
+    If any get or verification fails, the fetches still outstanding are
+    cancelled and the exception is raised.
+
+    Parameters:  
+      **dialog_indices** (List[int]) - indices into the Vcon.dialog array of the
+        dialogs to get.  Default of None gets all of the recording dialogs which
+        reference their content by url.  
+      **max_concurrent** (int) - maximum number of recordings fetched at once  
+      **get_kwargs** (dict) - kwargs passed to **httpx.AsyncClient.get** method
+
+    Returns:  
+      dict of the verified content/bytes for each recording, keyed by dialog index
+    """
+    if(dialog_indices is None):
+      dialog_indices = []
+      for dialog_index, dialog in enumerate(self.dialog or []):
+        if(dialog.get("type", None) == "recording" and
+          dialog.get("url", None) and
+          not dialog.get("body", None)
+          ):
+          dialog_indices.append(dialog_index)
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrent))
+
+    async def fetch_dialog(dialog_index: int) -> bytes:
+      async with semaphore:
+        return(await self.get_dialog_external_recording(dialog_index, get_kwargs))
+
+    tasks = [asyncio.ensure_future(fetch_dialog(dialog_index)) for dialog_index in dialog_indices]
+    try:
+      bodies = await asyncio.gather(*tasks)
+
+    except Exception as fetch_error:
+      for task in tasks:
+        task.cancel()
+      # let the cancelled tasks finish
+      await asyncio.gather(*tasks, return_exceptions = True)
+      raise fetch_error
+
+    return(dict(zip(dialog_indices, bodies)))
+
+
   @tag_dialog
   def set_dialog_parameter(self,
     parameter_name : str,
@@ -1272,6 +1598,8 @@ class Vcon():
 
     # TODO parameter specific validation
     self._vcon_dict[Vcon.DIALOG][dialog_index][parameter_name] = parameter_value
+    if(self._journal is not None):
+      self._journal.parameter_set(Vcon.DIALOG, dialog_index, parameter_name)
 
     return(dialog_index)
 
@@ -1292,6 +1620,20 @@ class Vcon():
     Raises exceptions if the signature and public key fail to verify the body.
     """
 
+    hash_string = self._get_dialog_content_hash(dialog_index)
+
+    sig_hash = vcon.security.sha_512_hash(body)
+    if( hash_string != sig_hash):
+      print("dialog[\"signature\"]: {} hash: {} size: {}".format(hash_string, sig_hash, len(body)))
+      print("dialog: {}".format(vcon.json_codec.dumps(self.dialog[dialog_index], indent=2)))
+      raise InvalidVconHash("SHA-512 hash in signature does not match the given body for dialog[{}]".format(dialog_index))
+
+
+  def _get_dialog_content_hash(self, dialog_index : int) -> str:
+    """
+    Get the SHA-512 hash from the content_hash of the indicated recording dialog.
+    Raises exceptions if the dialog does not have a supported content_hash.
+    """
     dialog = self.dialog[dialog_index]
 
     if(dialog['type'] != "recording"):
@@ -1305,16 +1647,11 @@ class Vcon():
     # TODO support array of content_hash tokens
     alg, hash_string = vcon.security.split_content_hash_token(dialog["content_hash"])
 
-    if(alg == 'sha512'):
-      sig_hash = vcon.security.sha_512_hash(body)
-      if( hash_string != sig_hash):
-        print("dialog[\"signature\"]: {} hash: {} size: {}".format(hash_string, sig_hash, len(body)))
-        print("dialog: {}".format(json.dumps(dialog, indent=2)))
-        raise InvalidVconHash("SHA-512 hash in signature does not match the given body for dialog[{}]".format(dialog_index))
-
-    else:
+    if(alg != 'sha512'):
       raise AttributeError("dialog[{}] alg: {} not supported.  Must be SHA-512".format(dialog_index, alg))
 
+    return(hash_string)
+
 
   @tag_analysis
   def add_analysis_transcript(self,
@@ -1357,6 +1694,7 @@ class Vcon():
       self._vcon_dict[Vcon.ANALYSIS] = []
 
     self._vcon_dict[Vcon.ANALYSIS].append(analysis_element)
+    self._object_index.analysis.update(self.analysis)
 
   @tag_analysis
   def add_analysis(self,
@@ -1402,6 +1740,22 @@ class Vcon():
       self._vcon_dict[Vcon.ANALYSIS] = []
 
     self._vcon_dict[Vcon.ANALYSIS].append(analysis_element)
+    self._object_index.analysis.update(self.analysis)
+
+
+  @tag_attachment
+  def find_attachments_by_type(self, attachment_type: str) -> typing.List[int]:
+    """
+    Find the attachment objects having the given type, using an index rather
+    than searching the attachments list.
+
+    Parameters:  
+      **attachment_type** (str) - value of the attachment **type** parameter
+
+    Returns:  
+      list of indices (int) to the matching attachment objects in this Vcon, in order
+    """
+    return(self._object_index.attachments.find(self.attachments, (attachment_type,)))
 
 
   @tag_attachment
@@ -1464,6 +1818,7 @@ class Vcon():
       self._vcon_dict[Vcon.ATTACHMENTS] = []
 
     self._vcon_dict[Vcon.ATTACHMENTS].append(new_attachment)
+    self._object_index.attachments.update(self.attachments)
 
     return(len(self.attachments) - 1)
 
@@ -1494,6 +1849,109 @@ class Vcon():
       file_handle.close()
 
 
+  @tag_operation
+  def start_journal(self, revision: typing.Union[str, None] = None) -> None:
+    """
+    Start the journal of changes made to this vCon (see **vcon.journal**).
+    Used by vCon storage, after loading or saving the vCon, so that only
+    the changes need to be written when it is next saved.  Only unsigned
+    vCons are journaled.
+
+    Parameters:
+      **revision** (str) - optional revision of the vCon in storage, so that
+        storage can check that the changes are applied to the same revision
+
+    Returns: none
+    """
+    if(self._state == VconStates.UNSIGNED and self._partial is None):
+      if(self._lazy_dialog_bodies):
+        self._encode_dialog_bodies()
+      self._journal = vcon.journal.VconJournal(self._vcon_dict, revision)
+
+    else:
+      self._journal = None
+
+
+  @tag_operation
+  def get_journal_operations(self) -> typing.Union[typing.List[typing.Tuple[str, str, typing.Any]], None]:
+    """
+    Get the operations to apply the changes made to this vCon since the
+    journal was started (see **start_journal** and **vcon.journal**).
+
+    Parameters: none
+
+    Returns:
+      list of (operation, JSON path, value) tuples or None if there is no
+      journal or the changes cannot be provided as operations, in which case
+      the whole vCon must be saved.
+    """
+    if(self._journal is None or self._state != VconStates.UNSIGNED):
+      return(None)
+
+    return(self._journal.operations(self._vcon_dict))
+
+
+  @tag_operation
+  def get_journal_revision(self) -> typing.Union[str, None]:
+    """
+    Get the storage revision given when the journal was started (see **start_journal**).
+
+    Parameters: none
+
+    Returns:
+      revision string or None if there is no journal or the revision was not given
+    """
+    if(self._journal is None):
+      return(None)
+
+    return(self._journal.revision)
+
+
+  @tag_operation
+  def is_partial(self) -> bool:
+    """
+    Check if only part of the vCon was loaded (e.g. without the dialog
+    bodies, see **loadd** **partial**).  A partial vCon must not be saved
+    over the full vCon.
+
+    Parameters: none
+
+    Returns:
+      True if parameters or objects were excluded when this vCon was loaded
+    """
+    return(self._partial is not None)
+
+
+  @tag_operation
+  def get_partial_paths(self) -> typing.Union[typing.List[str], None]:
+    """
+    Get the paths of the parameters or objects excluded when this vCon was
+    loaded (see **is_partial** and **loadd** **partial**).
+
+    Parameters: none
+
+    Returns:
+      list of the excluded paths (e.g. "dialog.body") or None if the whole vCon was loaded
+    """
+    if(self._partial is None):
+      return(None)
+
+    return(list(self._partial))
+
+
+  @tag_operation
+  def get_state(self) -> VconStates:
+    """
+    Get the signing and encryption state of this vCon (e.g. unsigned, signed, encrypted).
+
+    Parameters: none
+
+    Returns:
+      the **VconStates** value for the current state
+    """
+    return(self._state)
+
+
   @tag_serialize
   def dumps(
       self,
@@ -1511,7 +1969,7 @@ class Vcon():
     Returns:  
              String containing JSON representation of the vCon.
     """
-    return(json.dumps(self.dumpd(signed, False), indent = indent, default=lambda o: o.__dict__, **dumps_options))
+    return(vcon.json_codec.dumps(self.dumpd(signed, False), indent = indent, default=lambda o: o.__dict__))
 
 
   class VconBase64Bytes():
@@ -1582,43 +2040,39 @@ class Vcon():
       raise(Exception("Unsupported type: {} for CBOR encoding"))
 
 
-  @experimental("CBOR format is non-standard for vCon")
   @tag_serialize
   def dumpc(
-      self
+      self,
+      signed: bool = True
     ) -> bytes:
     """
-    Dump the vCon as CBOR format bytes.
+    Dump the vCon as CBOR format bytes.  Base64url encoded bodies and
+    JOSE fields are stored as raw byte strings (see **vcon.cbor_codec**).
 
-    Parameters:
+    Parameters:  
+    **signed** (Boolean): If the vCon is signed locally or verfied,  
+        True: serialize the signed version  
+        False: serialize the unsigned version
 
     Returns:  
-             String containing JSON representation of the vCon.
+             bytes containing the CBOR representation of the vCon.
     """
+    # without copy as the codec does not modify the dict and without
+    # creating the base64url text of bodies loaded from CBOR
+    vcon_dict = self._get_dump_dict(signed)
 
-    # TODO: would be better not to deep copy the dict
-    vcon_dict = self.dumpd(False, True) # deep copy as we modify the copy and do not want this to be permient
-
-    # Iterate body parameters in redacted and ammended
-    for reference in ["redacted", "ammended"]:
-      # change the base64 encoded bodies to an object so that it will be tagged and change the encoding label to "binary"
-      if(reference in vcon_dict and
-          Vcon.VconBase64Bytes.isBase64Object(vcon_dict["redacted"])
-        ):
-        Vcon.VconBase64Bytes.objectizeBase64Object(vcon_dict["redacted"])
+    # Use the bodies which have already been decoded, rather than decoding again
+    decoded_bodies = {}
+    if(vcon_dict is self._vcon_dict):
+      dialogs = self._vcon_dict.get(Vcon.DIALOG, None) or []
+      for dialog_index, body_handle in self._dialog_bodies.items():
+        if(body_handle.decoded and
+          body_handle.encoding == "base64url" and
+          dialog_index < len(dialogs) and
+          body_handle.is_current(dialogs[dialog_index])):
+          decoded_bodies[dialog_index] = body_handle.get()
 
-    # Iterate body parameters in objects in group, parties, dialog, attachments and analysis arrays
-    for object_array_name in ["group", "dialog", "attachemnts", "analysis"]:
-      object_array = vcon_dict.get(object_array_name, None)
-      if(object_array):
-        for reference_object in object_array:
-          # change the base64 encoded bodies to an object so that it will be tagged and change the encoding label to "binary"
-          if(reference_object is not None and
-              Vcon.VconBase64Bytes.isBase64Object(reference_object)
-            ):
-            Vcon.VconBase64Bytes.objectizeBase64Object(reference_object)
-
-    return(cbor2.dumps(vcon_dict, default = Vcon.vcon_object_cbor_encoder))
+    return(vcon.cbor_codec.dumpb(vcon_dict, decoded_bodies))
 
 
   @tag_serialize
@@ -1644,9 +2098,19 @@ class Vcon():
     Returns:
              dict containing JSON representation of the vCon.
     """
+    vcon_dict = self._get_dump_dict(signed)
+    if(vcon_dict is self._vcon_dict and self._lazy_dialog_bodies):
+      self._encode_dialog_bodies()
 
+    if(deepcopy):
+      return(copy.deepcopy(vcon_dict))
+
+    return(vcon_dict)
 
 
+  def _get_dump_dict(self, signed: bool) -> dict:
+    """ Get the dict to be serialized for the current state, see **dumpd** """
+
     # TODO: Should it throw an acception if its not signed?  Could have argument to
     # not throw if it not signed.
     vcon_dict = None
@@ -1671,12 +2135,24 @@ class Vcon():
     else:
       raise InvalidVconState("vCon state: {} is not valid for dumps".format(self._state))
 
-    if(deepcopy):
-      return(copy.deepcopy(vcon_dict))
-
     return(vcon_dict)
 
 
+  def _encode_dialog_bodies(self) -> None:
+    """
+    Create the base64url text for the dialog bodies which are still the
+    bytes loaded from CBOR (see **loadc**).  The decoded bodies are kept.
+    """
+    self._lazy_dialog_bodies = False
+    for dialog_index, dialog in enumerate(self._vcon_dict.get(Vcon.DIALOG, None) or []):
+      if(isinstance(dialog, dict) and isinstance(dialog.get("body", None), vcon.cbor_codec.Base64urlBytes)):
+        body_handle = self._dialog_bodies.get(dialog_index, None)
+        if(body_handle is not None and body_handle.is_current(dialog)):
+          body_handle.set_body(dialog["body"].text())
+        else:
+          dialog["body"] = dialog["body"].text()
+
+
   @tag_serialize
   async def post(
     self,
@@ -1693,28 +2169,34 @@ class Vcon():
     **base_url** (str) - template URL for HTTP post  
     **host** (str) - host IP or DNS name to use in URL  
     **port** (int) - HTTP port to use  
-    **post_kwargs** (dict) - extra args to pass to requests.post
+    **post_kwargs** (dict) - extra args to pass to **httpx.AsyncClient.post**
 
     Return: none
     """
     if(post_kwargs is None):
-      post_kwargs = {
-          "timeout": 20,
-          "content-type": vcon.Vcon.MEDIATYPE_JSON
-        }
+      post_kwargs = {"timeout": 20}
 
     uri = base_uri.format(
       host = host,
       port = port
       )
 
-    req = requests.post(uri, json = self.dumpd(), **post_kwargs)
-    if(not(200 <= req.status_code < 300)):
+    post_kwargs = dict(post_kwargs)
+    headers = dict(post_kwargs.pop("headers", {}))
+    headers.setdefault("content-type", vcon.Vcon.MEDIATYPE_JSON)
+    # dumpd without copy as it is serialized right away
+    response = await vcon.http_client.get_client().post(
+        uri,
+        content = vcon.json_codec.dumpb(self.dumpd(True, False)),
+        headers = headers,
+        **post_kwargs
+      )
+    if(not(200 <= response.status_code < 300)):
       raise Exception("post of {} resulted in error code: {} text: {} content: {}".format(
         uri,
-        req.status_code,
-        req.text,
-        req.content
+        response.status_code,
+        response.text,
+        response.content
         ))
 
 
@@ -1745,7 +2227,12 @@ class Vcon():
 
 
   @tag_serialize
-  def loadd(self, vcon_dict : dict) -> None:
+  def loadd(
+      self,
+      vcon_dict : dict,
+      take_ownership: bool = False,
+      partial: typing.Union[typing.List[str], None] = None
+    ) -> None:
     """
     Load the vCon from the JSON style dict.
     Assumes that this vCon is an empty vCon as it is not cleared.
@@ -1756,44 +2243,54 @@ class Vcon():
     3) JWE vCon must have a ciphertext and recipients
 
     Parameters:  
-      **vcon_dict** (dict): dict containing JSON representation of a vCon
+      **vcon_dict** (dict): dict containing JSON representation of a vCon  
+      **take_ownership** (bool): if True, this Vcon takes ownership of **vcon_dict**
+        and uses it as is, without making a copy.  The caller MUST NOT use or
+        modify **vcon_dict** after this call as the Vcon may modify it in place
+        (e.g. migration from older vCon versions).  If False (default), the
+        containers in **vcon_dict** are deep copied (strings such as large
+        base64url encoded bodies are immutable and are shared, not copied)
+        and the given dict is not modified.  
+      **partial** (List[str]): if **vcon_dict** is only part of an unsigned vCon,
+        the paths which were excluded (e.g. ["dialog.body", "attachments"]).
+        The Vcon is marked as partial (see **is_partial**) and none of the
+        object arrays are required.  None (default) for a whole vCon.
 
     Returns: none
     """
 
-    # TODO:  Should refactor this and loads to work with dict.  This is very
-    # inefficient as we are serializing and then deserializing.
-    vcon_string = json.dumps(vcon_dict)
+    self._attempting_modify()
 
-    return(self.loads(vcon_string))
+    if(not isinstance(vcon_dict, dict)):
+      raise InvalidVconJson("loadd expected dict, got: {}".format(type(vcon_dict)))
 
+    if(not take_ownership):
+      vcon_dict = copy.deepcopy(vcon_dict)
 
-  @tag_serialize
-  def loads(self, vcon_json : str) -> None:
-    """
-    Load the vCon from a JSON string.
-    Assumes that this vCon is an empty vCon as it is not cleared.
+    self._load_dict(vcon_dict, partial)
 
-    Decision as to what json form to be deserialized is:
-    1) unsigned vcon must have a vcon and one or more of the following elements: parties, dialog, analysis, attachments
-    2) JWS vCon must have a payload and signatures
-    3) JWE vCon must have a ciphertext and recipients
-
-    Parameters:  
-      **vcon_json** (str): string containing JSON representation of a vCon
 
-    Returns: none
+  def _load_dict(
+      self,
+      vcon_dict : dict,
+      partial: typing.Union[typing.List[str], None] = None
+    ) -> None:
+    """
+    Classify the form of the given dict (unsigned, JWS or JWE) and set it as
+    the internal state of this Vcon.  The dict is owned by this Vcon after the
+    call.  Unsigned forms are migrated to the current version in place.
     """
-
-    self._attempting_modify()
-
-    #TODO: Should check unsafe stuff is not loaded
 
     # TODO should use self._attempting_modify() ???
     if(self._state != VconStates.UNSIGNED):
       raise InvalidVconState("Cannot load Vcon unless current state is UNSIGNED.  Current state: {}".format(self._state))
 
-    vcon_dict = json.loads(vcon_json)
+    # Bodies decoded, objects indexed and changes journaled from the prior content are no longer valid
+    self._dialog_bodies = {}
+    self._lazy_dialog_bodies = False
+    self._object_index.clear()
+    self._journal = None
+    self._partial = None
 
     # we need to check the format as to whether it is signed or
     # not and deconstruct the loaded object.
@@ -1819,6 +2316,8 @@ class Vcon():
 
     # Unsigned vCon has to have vcon version and
     elif((self.VCON_VERSION in vcon_dict) and (
+      # arrays may have been excluded from a partial vCon
+      partial is not None or
       # one of the following arrays
       ('parties' in vcon_dict) or
       ('dialog' in vcon_dict) or
@@ -1832,10 +2331,13 @@ class Vcon():
         raise UnsupportedVconVersion("loads of JSON vcon version: \"{}\" not supported".format(version_string))
 
       if(vcon_dict["vcon"] == "0.0.1"):
-        self._vcon_dict = self.migrate_0_0_1_vcon(vcon_dict)
-        vcon_dict = self._vcon_dict
+        vcon_dict = self.migrate_0_0_1_vcon(vcon_dict)
       if(vcon_dict["vcon"] == "0.0.2"):
-        self._vcon_dict = self.migrate_0_0_2_vcon(vcon_dict)
+        vcon_dict = self.migrate_0_0_2_vcon(vcon_dict)
+
+      self._vcon_dict = vcon_dict
+      if(partial is not None):
+        self._partial = list(partial)
 
     # Unknown
     else:
@@ -1846,11 +2348,10 @@ class Vcon():
         )
 
 
-  @experimental("CBOR format is non-standard for vCon")
   @tag_serialize
-  def loadc(self, vcon_cbor : bytes) -> None:
+  def loads(self, vcon_json : typing.Union[str, bytes]) -> None:
     """
-    Load the vCon from a CBOR bytes array.
+    Load the vCon from a JSON string.
     Assumes that this vCon is an empty vCon as it is not cleared.
 
     Decision as to what json form to be deserialized is:
@@ -1868,92 +2369,53 @@ class Vcon():
 
     #TODO: Should check unsafe stuff is not loaded
 
-    # TODO should use self._attempting_modify() ???
-    if(self._state != VconStates.UNSIGNED):
-      raise InvalidVconState("Cannot load Vcon unless current state is UNSIGNED.  Current state: {}".format(self._state))
+    vcon_dict = vcon.json_codec.loads(vcon_json)
 
-    vcon_dict = cbor2.loads(vcon_cbor)
+    # The freshly parsed dict is not referenced by anyone else
+    self._load_dict(vcon_dict)
 
-    # TODO: iterate object and replace CBORTag 21 with base64url encoded string and set encoding to "base64url"
 
-    # we need to check the format as to whether it is signed or
-    # not and deconstruct the loaded object.
-    # load differently based upon the contents of the JSON
+  @tag_serialize
+  def loadc(self, vcon_cbor : typing.Union[bytes, bytearray, memoryview]) -> None:
+    """
+    Load the vCon from a CBOR bytes array.
+    Assumes that this vCon is an empty vCon as it is not cleared.
 
-    # Signed vCon (JWS)
-    if(("payload" in vcon_dict) and
-      ("signatures" in vcon_dict)
-      ):
-      self._vcon_dict = {}
+    Decision as to what form to be deserialized is:
+    1) unsigned vcon must have a vcon and one or more of the following elements: parties, dialog, analysis, attachments
+    2) JWS vCon must have a payload and signatures
+    3) JWE vCon must have a ciphertext and recipients
 
-      self._state = VconStates.UNVERIFIED
-      self._jws_dict = vcon_dict
+    Dialog bodies stored as byte strings are kept as bytes.  They are not
+    base64url decoded when accessed (see **get_dialog_inline_body**) or
+    encoded again by **dumpc**.  Their base64url text is only created when
+    the dialogs are used or the vCon is dumped as JSON.
 
-    # encrypted vCon (JWE)
-    elif(("ciphertext" in vcon_dict) and
-      ("recipients" in vcon_dict)
-      ):
-      self._vcon_dict = {}
+    Parameters:  
+      **vcon_cbor** (bytes): CBOR representation of a vCon (see **dumpc**)
 
-      self._state = VconStates.ENCRYPTED
-      self._jwe_dict = vcon_dict
+    Returns: none
+    """
 
-    # Unsigned vCon has to have vcon version and
-    elif((self.VCON_VERSION in vcon_dict) and (
-      # one of the following arrays
-      ('parties' in vcon_dict) or
-      ('dialog' in vcon_dict) or
-      ('analysis' in vcon_dict) or
-      ('attachments' in vcon_dict)
-      )):
+    self._attempting_modify()
 
-      # Check for CBOR tags that need to be replaced
-      # This is not easily done with hooks int the CBOR parser as we need to change the body and the encoding parameters.
-
-      # Iterate body parameters in redacted and ammended
-      for reference in ["redacted", "ammended"]:
-        # change the base64 encoded bodies to an object so that it will be tagged and change the encoding label to "binary"
-        if(reference in vcon_dict and
-           "body" in vcon_dict[reference] and
-           isinstance(vcon_dict[reference]["body"], cbor2.CBORTag)):
-          raise Exception("unimplemented CBORTag for: {}".format(reference))
-
-      for object_array_name in ["group", "dialog", "attachemnts", "analysis"]:
-        object_array = vcon_dict.get(object_array_name, None)
-        if(object_array):
-          for reference_object in object_array:
-            # change the base64 encoded bodies to an object so that it will be tagged and change the encoding label to "binary"
-            if(reference_object is not None and
-               "body" in reference_object and
-               isinstance(reference_object["body"], cbor2.CBORTag)
-              ):
-              if(reference_object["body"].tag != 21):
-                raise Exception("CBOR tag: {} not support in: {}".format(
-                    reference_object["body"].tag,
-                    object_array_name
-                  ))
-
-              reference_object["body"] = jose.utils.base64url_encode(reference_object["body"].value).decode('utf-8')
-              reference_object["encoding"] = "base64url"
+    #TODO: Should check unsafe stuff is not loaded
 
-      # validate version
-      version_string = vcon_dict.get(self.VCON_VERSION, "not set")
-      if(version_string not in ["0.0.1", "0.0.2"]):
-        raise UnsupportedVconVersion("loads of JSON vcon version: \"{}\" not supported".format(version_string))
+    vcon_dict = vcon.cbor_codec.loads(vcon_cbor, lazy_dialog_bodies = True)
 
-      if(vcon_dict["vcon"] == "0.0.1"):
-        self._vcon_dict = self.migrate_0_0_1_vcon(vcon_dict)
-        vcon_dict = self._vcon_dict
-      if(vcon_dict["vcon"] == "0.0.2"):
-        self._vcon_dict = self.migrate_0_0_2_vcon(vcon_dict)
+    self._load_dict(vcon_dict)
 
-    # Unknown
-    else:
-      raise InvalidVconJson("Not recognized as a unsigned , signed or encrypted form of JSON vCon." +
-        "  Unsigned vcon must have vcon version and at least one of: parties, dialog, analyisis or attachment object arrays." +
-        "  Signed vcon must have payload and signatures fields." +
-        "  Encrypted vcon must have ciphertext and recipients fields."
-        )
+    # Keep the raw bytes of the dialog bodies for when they are used
+    if(self._state == VconStates.UNSIGNED):
+      for dialog_index, dialog in enumerate(self._vcon_dict.get(Vcon.DIALOG, None) or []):
+        if(isinstance(dialog, dict) and isinstance(dialog.get("body", None), vcon.cbor_codec.Base64urlBytes)):
+          self._dialog_bodies[dialog_index] = vcon.dialog_body.InlineDialogBody(
+              dialog,
+              "base64url",
+              "dialog[{}]".format(dialog_index),
+              dialog["body"].value
+            )
+          self._lazy_dialog_bodies = True
 
 
   @tag_serialize
@@ -1976,7 +2438,7 @@ class Vcon():
     **host** (str) - host IP or DNS name to use in URL  
     **port** (int) - HTTP port to use  
     **path** (str) - template path for the URL  
-    **get_kwargs** (dict) - extra args to pass to requests.get
+    **get_kwargs** (dict) - extra args to pass to **httpx.AsyncClient.get**
 
     Return: none
     """
@@ -1988,22 +2450,29 @@ class Vcon():
       port = port,
       path = path.format(uuid = uuid)
       )
-    req = requests.get(uri, **get_kwargs)
-    if(not(200 <= req.status_code < 300)):
+    response = await vcon.http_client.get_client().get(uri, **get_kwargs)
+    if(not(200 <= response.status_code < 300)):
       raise Exception("get of {} resulted in error: {}".format(
         uri,
-        req.status_code
+        response.status_code
         ))
-    vcon_json = req.content
+    vcon_json = response.content
     self.loads(vcon_json)
 
   @tag_signing
-  def sign(self, private_key_pem_file: str, cert_chain_pem_files : typing.List[str]) -> None:
+  def sign(
+      self,
+      private_key_pem_file: typing.Union[str, vcon.security.Signer],
+      cert_chain_pem_files : typing.Union[typing.List[str], None] = None
+    ) -> None:
     """
     Sign the vcon using the given private key from the give certificate chain.
 
     Parameters:  
     **private_key_pem_file** (str): file name or string containing PEM format private key to use for signing the vcon.  
+        Alternatively a **vcon.security.Signer** may be provided, in which case **cert_chain_pem_files**
+        is not used.  Reuse a **Signer** when signing many vCons with the same key, to avoid
+        reloading and parsing the key and chain for each vCon.  
     **cert_chain_pem_files** (List[str]): file names or PEM strings, for the pem format certicate chain for the
         private key to use for signing.  The cert/public key corresponding to the private key should be the
         first cert.  THe certificate authority root should be the last cert.
@@ -2020,13 +2489,15 @@ class Vcon():
     if(self.uuid is None or len(self.uuid) < 1):
       raise InvalidVconState("vCon has no UUID set.  Use set_uuid method before signing.")
 
-    header, signing_jwk = vcon.security.build_signing_jwk_from_pem_files(private_key_pem_file, cert_chain_pem_files)
+    if(isinstance(private_key_pem_file, vcon.security.Signer)):
+      signer = private_key_pem_file
+    else:
+      signer = vcon.security.Signer(private_key_pem_file, cert_chain_pem_files)
 
-    # dot separated JWS token.  First part is the payload, second part is the signature (both base64url encoded)
-    jws_token = jose.jws.sign(self._vcon_dict, signing_jwk, headers=header, algorithm=signing_jwk["alg"])
-    #print(jws_token.split('.'))
-    protected_header, payload, signature = jws_token.split('.')
-    #print("decoded header: {}".format(jose.utils.base64url_decode(bytes(protected_header, 'utf-8'))))
+    if(self._lazy_dialog_bodies):
+      self._encode_dialog_bodies()
+    protected_header, payload, signature = signer.sign(self._vcon_dict)
+    header = signer.header
 
     # For convenience add the uuid to the header
     header[Vcon.UUID] = self.uuid
@@ -2045,13 +2516,16 @@ class Vcon():
 
 
   @tag_signing
-  def verify(self, ca_cert_pem_files : typing.List[str]) -> None:
+  def verify(self, ca_cert_pem_files : typing.Union[typing.List[str], vcon.security.Verifier]) -> None:
     """
     Verify the signed vCon and its certificate chain which should be issued by one of the given CAs
 
     Parameters:  
       **ca_cert_pem_files** (List[str]): file name or PEM string list containing Certificate Authority certificates 
         to verify the vCon's certificate chain.
+        Alternatively a **vcon.security.Verifier** may be provided.  Reuse a **Verifier** when
+        verifying many vCons, to avoid reloading the CA certs and revalidating the same
+        certificate chains for each vCon.
 
     Returns: none
 
@@ -2076,10 +2550,10 @@ class Vcon():
       ):
       raise InvalidVconState("Vcon JWS invalid")
 
-    # Load an array of CA certficate objects to use to verify acceptable cert chains
-    ca_cert_object_list = []
-    for ca in ca_cert_pem_files:
-      ca_cert_object_list.append(vcon.security.load_pem_cert(ca)[0])
+    if(isinstance(ca_cert_pem_files, vcon.security.Verifier)):
+      verifier = ca_cert_pem_files
+    else:
+      verifier = vcon.security.Verifier(ca_cert_pem_files, chain_cache_ttl = 0)
 
     # TODO: what does it mean if ca_cert_pem_files is empty?  Should we verify and
     # assume that the cert chain is trusted?
@@ -2088,65 +2562,34 @@ class Vcon():
     for signature in self._jws_dict['signatures']:
       if('header' in signature):
         if('x5c' in signature['header']):
-          x5c = signature['header']['x5c']
           chain_count += 1
 
-          cert_chain_objects = vcon.security.der_to_certs(x5c)
-
-          # TODO: some of this should be move to the security submodule
-          # e.g. the iterating over CAs
-
           # TODO: need to do something a little smarter on the exception raise to
           # give a clue of the best/closest chain and CA that failed.  Perhaps
           # even all of the failures.
 
           try:
-            vcon.security.verify_cert_chain(cert_chain_objects)
-
-            # We have a valid chain, check if its from one of the accepted CAs
-            for ca_object in ca_cert_object_list:
-              try:
-                vcon.security.verify_cert(cert_chain_objects[len(cert_chain_objects) - 1], ca_object)
-
-                # IF we get here, we have a valid chain: cert_chain_objects issued from one of our accepted
-                # CAs: ca_object.
-                # The assumtion is that it is safe to trust this cert chain.  So we
-                # can use it to build a JWK and verify the signature.
-                verification_jwk = {}
-                verification_jwk["kty"] = "RSA"
-                verification_jwk["use"] = "sig"
-                verification_jwk["alg"] = signature['header']['alg']
-                verification_jwk["e"] = jose.utils.base64url_encode(jose.utils.
-                  long_to_bytes(cert_chain_objects[0].public_key().public_numbers().e)).decode('utf-8')
-                verification_jwk["n"] = jose.utils.base64url_encode(jose.utils.
-                  long_to_bytes(cert_chain_objects[0].public_key().public_numbers().n)).decode('utf-8')
-
-                jws_token = signature['protected'] + "." + self._jws_dict['payload'] + "." + signature['signature']
-                verified_payload = jose.jws.verify(jws_token, verification_jwk, verification_jwk["alg"])
-
-                # If we get here, the payload was verified
-                #print("verified payload: {}".format(verified_payload))
-                #print("verified payload type: {}".format(type(verified_payload)))
-                vcon_dict = json.loads(verified_payload.decode('utf-8'))
-                if(vcon_dict["vcon"] == "0.0.1"):
-                  self._vcon_dict = self.migrate_0_0_1_vcon(vcon_dict)
-                  vcon_dict = self._vcon_dict
-                if(vcon_dict["vcon"] == "0.0.2"):
-                  self._vcon_dict = self.migrate_0_0_2_vcon(vcon_dict)
-
-                self._state = VconStates.VERIFIED
-
-                return(None)
-
-              # This valid chain, is not issued from the CA for this ca_objjwk
-              except Exception as e:
-                last_exception = e
-                # Keep trying other CAs until we run out or succeed
-
-          # Invalid chain
+            # Verifies the chain is valid and issued from one of the accepted CAs
+            # and then the signature using the signing cert in the chain.
+            verified_payload = verifier.verify(signature, self._jws_dict['payload'])
+
+          # Invalid chain, not issued by one of the CAs or invalid signature
           except Exception as e:
             last_exception = e
             # Keep trying other chains until we run out or succeed
+            continue
+
+          # If we get here, the payload was verified
+          vcon_dict = vcon.json_codec.loads(verified_payload)
+          if(vcon_dict["vcon"] == "0.0.1"):
+            self._vcon_dict = self.migrate_0_0_1_vcon(vcon_dict)
+            vcon_dict = self._vcon_dict
+          if(vcon_dict["vcon"] == "0.0.2"):
+            self._vcon_dict = self.migrate_0_0_2_vcon(vcon_dict)
+
+          self._state = VconStates.VERIFIED
+
+          return(None)
 
     if(chain_count == 0):
       raise InvalidVconSignature("None of the signatures contain the x5c chain, which this implementation currenlty requires.")
@@ -2155,7 +2598,7 @@ class Vcon():
 
 
   @tag_encrypting
-  def encrypt(self, cert_pem_file: str) -> None:
+  def encrypt(self, cert_pem_file: typing.Union[str, vcon.security.Encrypter]) -> None:
     """
     encrypt a Signed vcon using the given public key from the give certificate.
 
@@ -2163,6 +2606,8 @@ class Vcon():
 
     Parameters:  
     **cert_pem_file** (str): file name or PEM string for the public key/cert to use for encrypting the vcon.
+        Alternatively a **vcon.security.Encrypter** may be provided, to avoid reloading the
+        cert for each vCon encrypted.
 
     Returns: none
     """
@@ -2173,15 +2618,15 @@ class Vcon():
     if(len(self._jws_dict) < 2):
       raise InvalidVconState("Vcon signature does not seem valid: {}".format(self._jws_dict))
 
-    # both of these work
-    #encryption = "A256GCM"
-    encryption = "A256CBC-HS512"
-
-    encryption_key = vcon.security.build_encryption_jwk_from_pem_file(cert_pem_file)
+    if(isinstance(cert_pem_file, vcon.security.Encrypter)):
+      encrypter = cert_pem_file
+    else:
+      encrypter = vcon.security.Encrypter(cert_pem_file)
+    encryption = encrypter.ENCRYPTION
 
-    plaintext = json.dumps(self._jws_dict, **dumps_options)
+    plaintext = vcon.json_codec.dumpb(self._jws_dict)
 
-    jwe_compact_token = jose.jwe.encrypt(plaintext, encryption_key, encryption, encryption_key['alg']).decode('utf-8')
+    jwe_compact_token = encrypter.encrypt(plaintext)
     jwe_complete_serialization = vcon.security.jwe_compact_token_to_complete_serialization(jwe_compact_token, enc = encryption, x5c = [])
 
     # Add unprotected stuff
@@ -2196,7 +2641,11 @@ class Vcon():
 
 
   @tag_encrypting
-  def decrypt(self, private_key_pem_file: str, cert_pem_file: str) -> None:
+  def decrypt(
+      self,
+      private_key_pem_file: typing.Union[str, vcon.security.Decrypter],
+      cert_pem_file: typing.Union[str, None] = None
+    ) -> None:
     """
     Decrypt a vCon using private and public key file.
 
@@ -2204,6 +2653,8 @@ class Vcon():
 
     Parameters:  
     **private_key_pem_file** (str): file name or PEM string for the private key to use for decrypting the vcon.  
+        Alternatively a **vcon.security.Decrypter** may be provided, in which case **cert_pem_file**
+        is not used.  Reuse a **Decrypter** to avoid reloading the key for each vCon decrypted.  
     **cert_pem_file** (str): file name or PEM string for the public key/cert to use for decrypting the vcon.
 
     Returns: none
@@ -2217,11 +2668,13 @@ class Vcon():
 
     jwe_compact_token_reconstructed = vcon.security.jwe_complete_serialization_to_compact_token(self._jwe_dict)
 
-    (header, signing_key) = vcon.security.build_signing_jwk_from_pem_files(private_key_pem_file, [cert_pem_file])
-    #signing_key['alg'] = encryption_key['alg']
+    if(isinstance(private_key_pem_file, vcon.security.Decrypter)):
+      decrypter = private_key_pem_file
+    else:
+      decrypter = vcon.security.Decrypter(private_key_pem_file, cert_pem_file)
 
-    logger.debug("JWE size: {} key size: {}".format(len(jwe_compact_token_reconstructed), len(signing_key)))
-    plaintext_decrypted = jose.jwe.decrypt(jwe_compact_token_reconstructed, signing_key).decode('utf-8')
+    logger.debug("JWE size: {}".format(len(jwe_compact_token_reconstructed)))
+    plaintext_decrypted = decrypter.decrypt(jwe_compact_token_reconstructed).decode('utf-8')
     # let loads figure out if this is an encrypted JWS vCon or just a vCon
     current_state = self._state
     # Fool loads into thinking this is a raw vCon and its safe to load.  Save state incase we barf.
@@ -2280,7 +2733,8 @@ class Vcon():
     query: typing.Union[str, dict[str, str]]
     ) -> typing.Union[list[str], dict[str, any]]:
     """
-    Perform jq syle queries on the Vcon JSON
+    Perform jq syle queries on the Vcon JSON.  The compiled queries are
+    cached (see **vcon.jq_cache**).
 
     Parameters:  
     **query** (Union[str, dict[str, str]]) - query(s) to be performed on this Vcon
@@ -2295,14 +2749,16 @@ class Vcon():
     if(self._state in [VconStates.UNVERIFIED, VconStates.DECRYPTED]):
       raise InvalidVconState("Vcon state: {} cannot read parameters".format(self._state))
 
+    # No need to deep copy, jq does not modify the dict and builds new objects for the results
+    vcon_dict = self.dumpd(True, False)
     if(isinstance(query, str)):
-      return(pyjq.all(query, self.dumpd()))
+      return(vcon.jq_cache.query_all(query, vcon_dict))
 
     else:
       results = {}
-      vcon_dict = self.dumpd()
-      for query_name, query_string in query.items():
-        results[query_name] = pyjq.all(query_string, vcon_dict)[0]
+      query_results = vcon.jq_cache.query_all_many(list(query.values()), vcon_dict)
+      for query_name, query_result in zip(query.keys(), query_results):
+        results[query_name] = query_result[0]
 
       return(results)
 
@@ -2390,7 +2846,7 @@ class Vcon():
       if(uuid is None):
         # decode the payload and parse JSON to get UUID
         vcon_json_string = jose.utils.base64url_decode(bytes(vcon_dict["payload"], 'utf-8'))
-        payload_vcon_dict = json.loads(vcon_json_string)
+        payload_vcon_dict = vcon.json_codec.loads(vcon_json_string)
         uuid = payload_vcon_dict.get("uuid", None)
 
     # encrypted (JWE) form of vCon
@@ -2501,7 +2957,7 @@ class Vcon():
       # The only programatic way to do this is to instantiate a Vcon, but this seemed a bit
       # heavy.  So for now just testing a manually maintained list of attributes and  blacklisted
       # token names.
-      instance_attributes = ['_jwe_dict', '_jws_dict', '_state', '_vcon_dict', 'vcon', "Vcon", "accessors", "bin", "cli", "docker_dev", "filter_plugins", "filter_plugins_addons", "pydantic_utils", "security", "utils"]
+      instance_attributes = ['_dialog_bodies', '_journal', '_lazy_dialog_bodies', '_jwe_dict', '_jws_dict', '_object_index', '_partial', '_state', '_vcon_dict', 'vcon', "Vcon", "accessors", "bin", "cbor_codec", "cli", "container", "dialog_body", "docker_dev", "filter_plugins", "filter_plugins_addons", "http_client", "jq_cache", "journal", "json_codec", "object_index", "pydantic_utils", "security", "utils"]
       if(name in instance_attributes):
         exists = True
 
@@ -0,0 +1,329 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+"""
+CBOR (RFC8949) encoding of vCons.
+
+The vCon dict is encoded as is, with the exception of base64 encoded
+content, which is stored as raw CBOR byte strings tagged with the
+expected later encoding.  This saves the 33% size of base64 and
+the CPU to encode and decode it:
+
+  * tag 21 (expected conversion to base64url) for:
+    * **body** of dialog, attachment, analysis, group, redacted and amended objects having base64url **encoding**
+    * JWS (signed vCon) **payload** and signature **protected** and **signature**
+    * JWE (encrypted vCon) **protected**, **iv**, **ciphertext**, **tag** and recipient **encrypted_key**
+  * tag 22 (expected conversion to base64) for x5c certificate chains in JWS and JWE headers
+
+Only values which will convert back to exactly the same string are
+stored as bytes, so that signatures over the base64url text remain valid.
+Everything else is stored as is.
+
+When decoding, tagged byte strings are converted back to their base64url
+or base64 text so that the resulting dict is the same as the JSON form.
+Optionally, dialog bodies are left as the raw bytes (see **Base64urlBytes**)
+so that they are neither base64url encoded when loaded nor decoded again
+when they are used.  The base64url text is then only created when needed.
+
+Note: this encoding is specific to py-vcon, CBOR is not part of the vCon standard.
+"""
+import typing
+import base64
+import binascii
+import cbor2
+import jose.utils
+
+TAG_BASE64URL = 21
+TAG_BASE64 = 22
+
+BODY_OBJECT_ARRAYS = ["group", "dialog", "attachments", "analysis"]
+BODY_OBJECTS = ["redacted", "amended"]
+
+_BASE64URL_TO_BASE64 = bytes.maketrans(b"-_", b"+/")
+_BASE64_TO_BASE64URL = bytes.maketrans(b"+/", b"-_")
+
+
+class Base64urlBytes():
+  """
+  Raw bytes of a CBOR tag 21 byte string, for which the base64url text
+  has not yet been created.
+  """
+  __slots__ = ["value"]
+
+  def __init__(self, value: bytes):
+    self.value = value
+
+  def text(self) -> str:
+    """ Get the unpadded base64url text for the bytes """
+    return(bytes_to_base64url(self.value))
+
+
+def base64url_to_bytes(text: typing.Any) -> typing.Union[bytes, None]:
+  """
+  Decode an unpadded base64url string, only if the decoded bytes will
+  encode back to exactly the same string.
+
+  Returns:
+    (bytes) decoded value or None if **text** is not a string in canonical unpadded base64url
+  """
+  if(not isinstance(text, str)):
+    return(None)
+
+  length = len(text)
+  remainder = length % 4
+  if(remainder == 1 or "=" in text or "+" in text or "/" in text):
+    return(None)
+
+  try:
+    encoded = text.encode("ascii")
+    value = base64.b64decode(encoded.translate(_BASE64URL_TO_BASE64) + b"=" * (-length % 4), validate = True)
+
+  except (UnicodeEncodeError, binascii.Error):
+    return(None)
+
+  # Unused bits in the last character must be zero to re-encode the same
+  if(remainder != 0 and
+    jose.utils.base64url_encode(value[-(remainder - 1):]) != encoded[-remainder:]):
+    return(None)
+
+  return(value)
+
+
+def bytes_to_base64url(value: bytes) -> str:
+  """ Encode bytes as an unpadded base64url string (same as jose.utils.base64url_encode, but faster) """
+  return(binascii.b2a_base64(value, newline = False).translate(_BASE64_TO_BASE64URL).rstrip(b"=").decode("ascii"))
+
+
+def base64_to_bytes(text: typing.Any) -> typing.Union[bytes, None]:
+  """
+  Decode a standard padded base64 string (e.g. x5c cert), only if the decoded bytes will
+  encode back to exactly the same string.
+
+  Returns:
+    (bytes) decoded value or None
+  """
+  if(not isinstance(text, str)):
+    return(None)
+
+  try:
+    encoded = text.encode("ascii")
+    value = base64.b64decode(encoded, validate = True)
+
+  except (UnicodeEncodeError, binascii.Error):
+    return(None)
+
+  if(base64.b64encode(value) != encoded):
+    return(None)
+
+  return(value)
+
+
+def _tag_base64url(text: typing.Any) -> typing.Any:
+  value = base64url_to_bytes(text)
+  if(value is None):
+    return(text)
+
+  return(cbor2.CBORTag(TAG_BASE64URL, value))
+
+
+def _tag_x5c(header: typing.Any) -> typing.Any:
+  if(not isinstance(header, dict) or not isinstance(header.get("x5c", None), list)):
+    return(header)
+
+  header = dict(header)
+  x5c = []
+  for cert in header["x5c"]:
+    value = base64_to_bytes(cert)
+    x5c.append(cert if value is None else cbor2.CBORTag(TAG_BASE64, value))
+  header["x5c"] = x5c
+
+  return(header)
+
+
+def _tag_body(
+    body_object: typing.Any,
+    decoded_body: typing.Union[bytes, None] = None
+  ) -> typing.Any:
+  """ shallow copy of body_object with base64url body as tagged bytes """
+  if(not isinstance(body_object, dict) or
+    body_object.get("encoding", None) != "base64url" or
+    not isinstance(body_object.get("body", None), (str, Base64urlBytes))):
+    return(body_object)
+
+  if(isinstance(body_object["body"], Base64urlBytes)):
+    decoded_body = body_object["body"].value
+
+  elif(decoded_body is None):
+    decoded_body = base64url_to_bytes(body_object["body"])
+    if(decoded_body is None):
+      return(body_object)
+
+  body_object = dict(body_object)
+  body_object["body"] = cbor2.CBORTag(TAG_BASE64URL, decoded_body)
+
+  return(body_object)
+
+
+def dumpb(
+    vcon_dict: dict,
+    decoded_bodies: typing.Union[typing.Dict[int, bytes], None] = None
+  ) -> bytes:
+  """
+  Encode the unsigned, signed (JWS) or encrypted (JWE) vCon dict as CBOR.
+  The dict is not modified or deep copied.
+
+  Parameters:
+    **vcon_dict** (dict) - the vCon in any of its JSON dict forms
+    **decoded_bodies** (Dict[int, bytes]) - already decoded dialog bodies by dialog index, to
+      avoid decoding them again.  Must be the decoded value of the dialog's current base64url body.
+      Bodies which are **Base64urlBytes** (see **loads**) are stored from their bytes.
+
+  Returns:
+    (bytes) CBOR encoded vCon
+  """
+  if(decoded_bodies is None):
+    decoded_bodies = {}
+
+  cbor_dict = dict(vcon_dict)
+
+  # Signed vCon (JWS)
+  if("payload" in cbor_dict and "signatures" in cbor_dict):
+    cbor_dict["payload"] = _tag_base64url(cbor_dict["payload"])
+    signatures = []
+    for signature in cbor_dict["signatures"]:
+      if(isinstance(signature, dict)):
+        signature = dict(signature)
+        for name in ["protected", "signature"]:
+          if(name in signature):
+            signature[name] = _tag_base64url(signature[name])
+        if("header" in signature):
+          signature["header"] = _tag_x5c(signature["header"])
+      signatures.append(signature)
+    cbor_dict["signatures"] = signatures
+
+  # Encrypted vCon (JWE)
+  elif("ciphertext" in cbor_dict and "recipients" in cbor_dict):
+    for name in ["protected", "iv", "ciphertext", "tag"]:
+      if(name in cbor_dict):
+        cbor_dict[name] = _tag_base64url(cbor_dict[name])
+    recipients = []
+    for recipient in cbor_dict["recipients"]:
+      if(isinstance(recipient, dict)):
+        recipient = dict(recipient)
+        if("encrypted_key" in recipient):
+          recipient["encrypted_key"] = _tag_base64url(recipient["encrypted_key"])
+        if("header" in recipient):
+          recipient["header"] = _tag_x5c(recipient["header"])
+      recipients.append(recipient)
+    cbor_dict["recipients"] = recipients
+
+  # Unsigned vCon
+  else:
+    for object_name in BODY_OBJECTS:
+      if(object_name in cbor_dict):
+        cbor_dict[object_name] = _tag_body(cbor_dict[object_name])
+
+    for object_array_name in BODY_OBJECT_ARRAYS:
+      object_array = cbor_dict.get(object_array_name, None)
+      if(isinstance(object_array, list)):
+        if(object_array_name == "dialog"):
+          cbor_dict[object_array_name] = [
+              _tag_body(body_object, decoded_bodies.get(index, None))
+              for index, body_object in enumerate(object_array)
+            ]
+        else:
+          cbor_dict[object_array_name] = [_tag_body(body_object) for body_object in object_array]
+
+  return(cbor2.dumps(cbor_dict))
+
+
+def _body_objects(vcon_dict: dict, object_array_names: typing.List[str]) -> typing.List[typing.Any]:
+  body_objects = []
+  for object_array_name in object_array_names:
+    object_array = vcon_dict.get(object_array_name, None)
+    if(isinstance(object_array, list)):
+      body_objects.extend(object_array)
+
+  return(body_objects)
+
+
+def _encode_base64url(value: typing.Any) -> typing.Any:
+  """ replace all Base64urlBytes in the value with their base64url text """
+  if(isinstance(value, Base64urlBytes)):
+    return(value.text())
+
+  if(isinstance(value, dict)):
+    for key, item in value.items():
+      if(isinstance(item, (Base64urlBytes, dict, list))):
+        value[key] = _encode_base64url(item)
+
+  elif(isinstance(value, list)):
+    for index, item in enumerate(value):
+      if(isinstance(item, (Base64urlBytes, dict, list))):
+        value[index] = _encode_base64url(item)
+
+  return(value)
+
+
+def loads(
+    vcon_cbor: typing.Union[bytes, bytearray, memoryview],
+    lazy_dialog_bodies: bool = False
+  ) -> dict:
+  """
+  Decode a CBOR encoded vCon to its JSON compatible dict form.
+
+  Parameters:
+    **vcon_cbor** (bytes) - CBOR encoded vCon
+    **lazy_dialog_bodies** (bool) - leave the base64url bodies of dialogs in
+      an unsigned vCon as **Base64urlBytes**, rather than creating their base64url text.
+
+  Returns:
+    (dict) the vCon dict
+  """
+  base64url_count = 0
+
+  def tag_hook(*args):
+    nonlocal base64url_count
+    # cbor2 5.x calls tag_hook(decoder, tag), 6.x calls tag_hook(tag, immutable)
+    tag = args[0] if isinstance(args[0], cbor2.CBORTag) else args[1]
+    if(isinstance(tag.value, bytes)):
+      if(tag.tag == TAG_BASE64URL):
+        base64url_count += 1
+        return(Base64urlBytes(tag.value))
+
+      if(tag.tag == TAG_BASE64):
+        return(base64.b64encode(tag.value).decode("ascii"))
+
+    return(tag)
+
+  vcon_dict = cbor2.loads(vcon_cbor, tag_hook = tag_hook)
+  if(base64url_count == 0):
+    return(vcon_dict)
+
+  lazy_dialogs = []
+  if(isinstance(vcon_dict, dict)):
+    # Prior versions of py-vcon labeled tagged bodies with the encoding: binary
+    body_objects = [vcon_dict.get(object_name, None) for object_name in BODY_OBJECTS]
+    body_objects.extend(_body_objects(vcon_dict, BODY_OBJECT_ARRAYS))
+    for body_object in body_objects:
+      if(isinstance(body_object, dict) and
+        body_object.get("encoding", None) == "binary" and
+        isinstance(body_object.get("body", None), Base64urlBytes)):
+        body_object["encoding"] = "base64url"
+
+    # Unsigned vCon dialog bodies are left as bytes until the text is needed
+    if(lazy_dialog_bodies and
+      not ("payload" in vcon_dict and "signatures" in vcon_dict) and
+      not ("ciphertext" in vcon_dict and "recipients" in vcon_dict)):
+      for dialog in _body_objects(vcon_dict, ["dialog"]):
+        if(isinstance(dialog, dict) and
+          dialog.get("encoding", None) == "base64url" and
+          isinstance(dialog.get("body", None), Base64urlBytes)):
+          lazy_dialogs.append((dialog, dialog["body"]))
+          # keep the parameter order
+          dialog["body"] = None
+
+  vcon_dict = _encode_base64url(vcon_dict)
+
+  for dialog, body in lazy_dialogs:
+    dialog["body"] = body
+
+  return(vcon_dict)
@@ -19,6 +19,7 @@ import sox
 import pytz
 import ffmpeg
 import vcon
+import vcon.container
 
 VERBOSE = False
 
@@ -430,6 +431,102 @@ def do_in_meet(args, in_vcon: vcon.Vcon) -> vcon.Vcon:
   return(in_vcon)
 
 
+def do_batch(args) -> int:
+  """
+  batch sign, verify, encrypt or decrypt the input vCons, one JSON vCon per line,
+  across a pool of processes.  Output vCons are written one per line in the
+  same order as the input.
+  """
+  def read_vcons(in_file):
+    for line in in_file:
+      line = line.strip()
+      if(len(line) > 0):
+        yield(line)
+
+  operation = args.operation[0]
+  stats = vcon.security.BatchCryptoStats(operation)
+  results = vcon.security.batch_crypto(
+      operation,
+      read_vcons(args.infile),
+      private_key_pem_file = None if args.key is None else str(args.key),
+      cert_pem_files = [str(cert) for cert in args.cert],
+      processes = args.processes,
+      chunk_size = args.chunk_size,
+      raise_errors = not args.skip_errors,
+      stats = stats
+    )
+
+  for result in results:
+    if(isinstance(result, vcon.security.BatchCryptoError)):
+      print(result, file = sys.stderr)
+      continue
+    args.outfile.write(result)
+    args.outfile.write("\n")
+
+  args.outfile.flush()
+  print(stats, file = sys.stderr)
+
+  return(0 if stats.errors == 0 else 1)
+
+
+def do_container(args) -> int:
+  """
+  pack vCons into, unpack vCons from or extract vCons by UUID from a
+  container file (see vcon.container).  vCons are read and written as
+  JSON, one vCon per line.
+  """
+  container_command = args.container_command
+  if(container_command == "pack"):
+    container_format = vcon.container.CBOR if args.cbor else vcon.container.JSON
+    with vcon.container.VconContainerWriter(args.container[0], container_format) as writer:
+      if(len(args.vconfiles) > 0):
+        vcon_jsons = (vcon_file.read_bytes() for vcon_file in args.vconfiles)
+      else:
+        vcon_jsons = (line for line in args.infile if len(line.strip()) > 0)
+
+      for vcon_json in vcon_jsons:
+        if(container_format == vcon.container.CBOR):
+          pack_vcon = vcon.Vcon()
+          pack_vcon.loads(vcon_json)
+          writer.add(pack_vcon)
+        else:
+          writer.add_bytes(vcon_json)
+
+    print("packed {} vCons into: {}".format(len(writer), args.container[0]), file = sys.stderr)
+    return(0)
+
+  with vcon.container.VconContainerReader(args.container[0]) as reader:
+    if(container_command == "unpack"):
+      uuids = reader.uuids
+    elif(container_command == "extract"):
+      uuids = args.uuid
+    else:
+      raise Exception("unsupported container command: {}".format(container_command))
+
+    missing = 0
+    for uuid in uuids:
+      if(uuid not in reader):
+        print("vCon: {} not in container: {}".format(uuid, args.container[0]), file = sys.stderr)
+        missing += 1
+        continue
+
+      if(reader.format == vcon.container.JSON):
+        vcon_json = str(reader.get_bytes(uuid), "utf-8")
+      else:
+        vcon_json = reader.get(uuid).dumps()
+
+      if(container_command == "unpack" and args.directory is not None):
+        with open(args.directory / "{}.vcon".format(uuid), "w") as vcon_file:
+          vcon_file.write(vcon_json)
+      else:
+        args.outfile.write(vcon_json)
+        args.outfile.write("\n")
+
+    args.outfile.flush()
+
+  return(0 if missing == 0 else 1)
+
+
 async def main(argv : typing.Optional[typing.Sequence[str]] = None) -> int:
   parser = argparse.ArgumentParser("vCon operations such as construction, signing, encryption, verification, decrytpion, filtering")
 
@@ -601,6 +698,54 @@ Name of filter plugin (e.g. {}) or default type filter plugin name (e.g. {})
   decrypt_parser.add_argument("privkey", metavar='private_key_file', nargs=1, type=pathlib.Path, default=None)
   decrypt_parser.add_argument("pubkey", metavar='public_key_file', nargs=1, type=pathlib.Path, default=None)
 
+  batch_parser = subparsers_command.add_parser(
+    "batch",
+    help = "sign, verify, encrypt or decrypt a stream of vCons, one JSON vCon per line, across a pool of processes"
+    )
+  batch_parser.add_argument("operation", metavar='operation', nargs=1, type=str, choices=vcon.security.BATCH_OPERATIONS)
+  batch_parser.add_argument(
+    "cert",
+    metavar='cert_file',
+    nargs='+',
+    type=pathlib.Path,
+    help = "cert chain (sign), CA certs (verify), recipient cert (encrypt) or cert for the private key (decrypt)"
+    )
+  batch_parser.add_argument("-k", "--key", metavar='private_key_file', type=pathlib.Path, default=None,
+    help = "private key for sign or decrypt")
+  batch_parser.add_argument("-j", "--processes", metavar='processes', type=int, default=None,
+    help = "number of worker processes (default: number of CPUs, 0: no worker processes)")
+  batch_parser.add_argument("--chunk-size", metavar='chunk_size', type=int, default=vcon.security.BATCH_CHUNK_SIZE,
+    help = "number of vCons sent to a worker process at a time")
+  batch_parser.add_argument("--skip-errors", action="store_true",
+    help = "report vCons which fail on stderr and continue, rather than stopping")
+
+  container_parser = subparsers_command.add_parser(
+    "container",
+    help = "pack, unpack or extract vCons in a container file with an index for random access by UUID"
+    )
+  subparsers_container = container_parser.add_subparsers(dest="container_command", required=True)
+  container_pack_parser = subparsers_container.add_parser(
+    "pack",
+    help = "create a container from the given vCon files or from the input vCons, one JSON vCon per line"
+    )
+  container_pack_parser.add_argument("container", metavar='container_file', nargs=1, type=pathlib.Path)
+  container_pack_parser.add_argument("vconfiles", metavar='vcon_file', nargs='*', type=pathlib.Path)
+  container_pack_parser.add_argument("--cbor", action="store_true",
+    help = "store the vCons as a CBOR sequence rather than JSON lines")
+  container_unpack_parser = subparsers_container.add_parser(
+    "unpack",
+    help = "output all of the vCons in the container, one JSON vCon per line or as files in a directory"
+    )
+  container_unpack_parser.add_argument("container", metavar='container_file', nargs=1, type=pathlib.Path)
+  container_unpack_parser.add_argument("-d", "--directory", metavar='directory', type=pathlib.Path, default=None,
+    help = "write each vCon to the file UUID.vcon in the given directory")
+  container_extract_parser = subparsers_container.add_parser(
+    "extract",
+    help = "output the vCons having the given UUIDs, one JSON vCon per line"
+    )
+  container_extract_parser.add_argument("container", metavar='container_file', nargs=1, type=pathlib.Path)
+  container_extract_parser.add_argument("uuid", metavar='uuid', nargs='+', type=str)
+
   args = parser.parse_args(argv)
 
   print("args: {}".format(args), file=sys.stderr)
@@ -688,9 +833,29 @@ Name of filter plugin (e.g. {}) or default type filter plugin name (e.g. {})
     encrypt x5c1[, x5c2]... signing_private_key
   
     decrypt private_key, ca_cert
+
+    batch sign|verify|encrypt|decrypt [-k private_key] cert [cert ...] [-j processes]
+
+    container pack container_file [vcon_file ...] [--cbor]
+    container unpack container_file [-d directory]
+    container extract container_file uuid [uuid ...]
   
   """
 
+  if(args.command == "batch"):
+    if(args.get or args.newvcon):
+      parser.error("batch reads vCons from the input file, -g and -n cannot be used")
+    if(args.post):
+      parser.error("batch does not support -p")
+    return(do_batch(args))
+
+  if(args.command == "container"):
+    if(args.get or args.newvcon):
+      parser.error("container reads vCons from the input or container file, -g and -n cannot be used")
+    if(args.post):
+      parser.error("container does not support -p")
+    return(do_container(args))
+
   print("reading", file=sys.stderr)
 
   print("out: {}".format(type(args.outfile)), file=sys.stderr)
@@ -837,12 +1002,13 @@ Name of filter plugin (e.g. {}) or default type filter plugin name (e.g. {})
       if(dialog_index > num_dialogs):
         raise AttributeError("Dialog index: {} must be less than the number of dialog in the vCon: {}".format(dialog_index, num_dialogs))
 
-      recording_bytes = in_vcon.decode_dialog_inline_body(dialog_index)
+      body_handle = in_vcon.get_dialog_inline_body(dialog_index)
       stdout_vcon = False
-      if(isinstance(recording_bytes, bytes)):
-        args.outfile.buffer.write(recording_bytes)
+      if(body_handle.encoding == "base64url"):
+        # decode in chunks straight to the output
+        body_handle.write_to(args.outfile.buffer)
       else:
-        args.outfile.write(recording_bytes)
+        args.outfile.write(body_handle.get())
 
   #print("vcon._vcon_dict: {}".format(in_vcon._vcon_dict))
   if(stdout_vcon):
@@ -0,0 +1,437 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+"""
+Container file holding many vCons with a trailing index for random access.
+
+A container is written with **VconContainerWriter** and read with
+**VconContainerReader**.  The reader memory maps the file and reads the
+index from the end of the file, so that a single vCon can be pulled out
+of a multi-GB archive by UUID without parsing any of the other vCons.
+
+The file layout is:
+
+  * the vCon records, in the order added, in one of two formats:
+    * **json** - JSON lines, one JSON vCon (unsigned, signed or encrypted form) per line
+    * **cbor** - CBOR sequence (RFC8742) of vCons (see **Vcon.dumpc**)
+  * the index record: {"vcon_container": 1, "format": ..., "index": [[uuid, offset, length], ...]}
+  * a fixed size trailer record: {"vcon_index_offset": offset of the index record}
+
+The index and trailer are themselves records in the same format, so the
+container is still a valid JSON lines file or CBOR sequence which may be
+read by tools that know nothing of the index.  A container without the
+index (e.g. a plain JSON lines file of vCons or an incompletely written
+container) can still be read, in which case the records are scanned to
+build the index when it is opened.
+"""
+import os
+import mmap
+import typing
+import cbor2
+import vcon
+import vcon.json_codec
+
+CONTAINER_VERSION = 1
+JSON = "json"
+CBOR = "cbor"
+CONTAINER_FORMATS = [JSON, CBOR]
+
+INDEX_KEY = "vcon_container"
+TRAILER_KEY = "vcon_index_offset"
+
+# Fixed size trailers so that they can be found at the end of the file
+JSON_TRAILER_TEMPLATE = '{{"' + TRAILER_KEY + '":"{:016x}"}}\n'
+JSON_TRAILER_SIZE = len(JSON_TRAILER_TEMPLATE.format(0))
+# CBOR map(1), text key, uint64 offset
+CBOR_TRAILER_PREFIX = b"\xa1" + cbor2.dumps(TRAILER_KEY) + b"\x1b"
+CBOR_TRAILER_SIZE = len(CBOR_TRAILER_PREFIX) + 8
+
+
+class VconContainerError(Exception):
+  """ Raised for invalid container file content or usage """
+
+
+def json_trailer(index_offset: int) -> bytes:
+  """ Fixed size JSON lines trailer record pointing to the index record """
+  return(bytes(JSON_TRAILER_TEMPLATE.format(index_offset), "utf-8"))
+
+
+def cbor_trailer(index_offset: int) -> bytes:
+  """ Fixed size CBOR trailer record pointing to the index record """
+  return(CBOR_TRAILER_PREFIX + index_offset.to_bytes(8, "big"))
+
+
+class VconContainerWriter():
+  """
+  Write vCons to a container file.  The index is written when closed.
+
+  Usage:
+    with vcon.container.VconContainerWriter("archive.vcons") as writer:
+      writer.add(my_vcon)
+  """
+  def __init__(
+      self,
+      container_file: typing.Union[str, os.PathLike, typing.BinaryIO],
+      container_format: str = JSON
+    ):
+    """
+    Parameters:
+      **container_file** (str, PathLike or binary file object) - file name to create or file opened
+        for binary write, positioned at the start of the file
+      **container_format** (str) - **json** for JSON lines or **cbor** for a CBOR sequence
+    """
+    if(container_format not in CONTAINER_FORMATS):
+      raise VconContainerError("container format: {} not one of: {}".format(container_format, CONTAINER_FORMATS))
+
+    self._format = container_format
+    if(isinstance(container_file, (str, os.PathLike))):
+      self._file = open(container_file, "wb")
+      self._close_file = True
+    else:
+      self._file = container_file
+      self._close_file = False
+
+    self._offset = 0
+    self._index: typing.List[typing.Tuple[str, int, int]] = []
+    self._uuids: typing.Set[str] = set()
+    self._closed = False
+
+
+  @property
+  def format(self) -> str:
+    """ container format, json or cbor """
+    return(self._format)
+
+
+  def __len__(self) -> int:
+    return(len(self._index))
+
+
+  def __enter__(self) -> "VconContainerWriter":
+    return(self)
+
+
+  def __exit__(self, exc_type, exc_value, traceback) -> None:
+    self.close()
+
+
+  def add(self, vcon_object: vcon.Vcon) -> int:
+    """
+    Serialize and add the vCon, in its current form (unsigned, signed or encrypted), to the container.
+
+    Parameters:
+      **vcon_object** (Vcon) - the vCon to add, must have a UUID
+
+    Returns:
+      (int) index of the vCon in the container
+    """
+    if(self._format == CBOR):
+      vcon_bytes = vcon_object.dumpc()
+    else:
+      vcon_bytes = bytes(vcon_object.dumps(), "utf-8")
+
+    return(self._write_record(vcon.Vcon.get_dict_uuid(vcon_object.dumpd(True, False)), vcon_bytes))
+
+
+  def add_bytes(
+      self,
+      vcon_bytes: typing.Union[bytes, str],
+      uuid: typing.Union[str, None] = None
+    ) -> int:
+    """
+    Add an already serialized vCon to the container, without constructing a Vcon.
+
+    Parameters:
+      **vcon_bytes** (bytes or str) - the serialized vCon, JSON for json containers or CBOR for cbor containers
+      **uuid** (str) - the vCon's UUID, if None it is read from the vCon
+
+    Returns:
+      (int) index of the vCon in the container
+    """
+    if(isinstance(vcon_bytes, str)):
+      vcon_bytes = bytes(vcon_bytes, "utf-8")
+
+    if(self._format == JSON):
+      vcon_bytes = vcon_bytes.strip()
+      if(b"\n" in vcon_bytes):
+        # Pretty printed, so it will not fit on a line
+        vcon_bytes = vcon.json_codec.dumpb(vcon.json_codec.loads(vcon_bytes))
+
+    if(uuid is None):
+      if(self._format == CBOR):
+        vcon_dict = cbor2.loads(vcon_bytes)
+      else:
+        vcon_dict = vcon.json_codec.loads(vcon_bytes)
+      uuid = vcon.Vcon.get_dict_uuid(vcon_dict)
+
+    return(self._write_record(uuid, vcon_bytes))
+
+
+  def _write_record(self, uuid: typing.Union[str, None], vcon_bytes: bytes) -> int:
+    if(self._closed):
+      raise VconContainerError("container already closed")
+    if(uuid is None or uuid == ""):
+      raise VconContainerError("vCon has no UUID, cannot be indexed in container")
+    if(uuid in self._uuids):
+      raise VconContainerError("vCon: {} already in container".format(uuid))
+
+    self._file.write(vcon_bytes)
+    length = len(vcon_bytes)
+    if(self._format == JSON):
+      self._file.write(b"\n")
+    self._index.append((uuid, self._offset, length))
+    self._uuids.add(uuid)
+    self._offset += length + (1 if self._format == JSON else 0)
+
+    return(len(self._index) - 1)
+
+
+  def close(self) -> None:
+    """ Write the index and trailer and close the file (if opened by this writer) """
+    if(self._closed):
+      return
+
+    index_record = {
+        INDEX_KEY: CONTAINER_VERSION,
+        "format": self._format,
+        "index": [list(entry) for entry in self._index]
+      }
+    if(self._format == CBOR):
+      self._file.write(cbor2.dumps(index_record))
+      self._file.write(cbor_trailer(self._offset))
+    else:
+      self._file.write(vcon.json_codec.dumpb(index_record))
+      self._file.write(b"\n")
+      self._file.write(json_trailer(self._offset))
+
+    self._file.flush()
+    self._closed = True
+    if(self._close_file):
+      self._file.close()
+
+
+class VconContainerReader():
+  """
+  Random access to the vCons in a container file by UUID or index.
+
+  The file is memory mapped, only the index and the requested
+  vCons are read and parsed.
+
+  Usage:
+    with vcon.container.VconContainerReader("archive.vcons") as reader:
+      my_vcon = reader.get(uuid)
+  """
+  def __init__(self, container_file: typing.Union[str, os.PathLike]):
+    """
+    Parameters:
+      **container_file** (str or PathLike) - name of the container file
+    """
+    self._file = open(container_file, "rb")
+    self._mmap = None
+    self._index: typing.List[typing.Tuple[str, int, int]] = []
+    self._uuids: typing.Dict[str, int] = {}
+    self._indexed = False
+
+    try:
+      size = os.fstat(self._file.fileno()).st_size
+      if(size == 0):
+        raise VconContainerError("empty container file: {}".format(container_file))
+      self._mmap = mmap.mmap(self._file.fileno(), 0, access = mmap.ACCESS_READ)
+
+      # JSON objects start with "{", CBOR maps have major type 5
+      if(self._mmap[0:1] == b"{"):
+        self._format = JSON
+      elif(self._mmap[0] >> 5 == 5):
+        self._format = CBOR
+      else:
+        raise VconContainerError("container file: {} is not JSON lines or a CBOR sequence".format(container_file))
+
+      index_offset = self._read_trailer()
+      if(index_offset is None):
+        self._scan()
+      else:
+        self._read_index(index_offset)
+
+    except:
+      self.close()
+      raise
+
+    for position, entry in enumerate(self._index):
+      self._uuids[entry[0]] = position
+
+
+  @property
+  def format(self) -> str:
+    """ container format, json or cbor """
+    return(self._format)
+
+
+  @property
+  def indexed(self) -> bool:
+    """ True if the container has a trailing index, False if the records were scanned to build the index """
+    return(self._indexed)
+
+
+  @property
+  def uuids(self) -> typing.List[str]:
+    """ UUIDs of the vCons in the container in the order in which they were added """
+    return([entry[0] for entry in self._index])
+
+
+  def __len__(self) -> int:
+    return(len(self._index))
+
+
+  def __contains__(self, uuid: str) -> bool:
+    return(uuid in self._uuids)
+
+
+  def __iter__(self) -> typing.Iterator[vcon.Vcon]:
+    for position in range(len(self._index)):
+      yield(self.get(position))
+
+
+  def __enter__(self) -> "VconContainerReader":
+    return(self)
+
+
+  def __exit__(self, exc_type, exc_value, traceback) -> None:
+    self.close()
+
+
+  def close(self) -> None:
+    """ Unmap and close the container file """
+    if(self._mmap is not None):
+      self._mmap.close()
+      self._mmap = None
+    if(self._file is not None):
+      self._file.close()
+      self._file = None
+
+
+  def get_bytes(self, uuid: typing.Union[str, int]) -> bytes:
+    """
+    Get the serialized vCon from the container without parsing it.
+
+    Parameters:
+      **uuid** (str or int) - UUID of the vCon or its index in the container
+
+    Returns:
+      (bytes) JSON (json container) or CBOR (cbor container) serialized vCon
+    """
+    uuid, offset, length = self._get_entry(uuid)
+    return(self._mmap[offset:offset + length])
+
+
+  def get(self, uuid: typing.Union[str, int]) -> vcon.Vcon:
+    """
+    Get and deserialize the vCon from the container.
+
+    Parameters:
+      **uuid** (str or int) - UUID of the vCon or its index in the container
+
+    Returns:
+      (Vcon) the vCon in the form that it was stored (unsigned, signed or encrypted)
+    """
+    vcon_bytes = self.get_bytes(uuid)
+    vcon_object = vcon.Vcon()
+    if(self._format == CBOR):
+      vcon_object.loadc(vcon_bytes)
+    else:
+      vcon_object.loads(vcon_bytes)
+
+    return(vcon_object)
+
+
+  def _get_entry(self, uuid: typing.Union[str, int]) -> typing.Tuple[str, int, int]:
+    if(self._mmap is None):
+      raise VconContainerError("container is closed")
+    if(isinstance(uuid, int)):
+      return(self._index[uuid])
+
+    position = self._uuids.get(uuid, None)
+    if(position is None):
+      raise KeyError("vCon: {} not in container".format(uuid))
+
+    return(self._index[position])
+
+
+  def _read_trailer(self) -> typing.Union[int, None]:
+    size = len(self._mmap)
+    if(self._format == CBOR):
+      if(size < CBOR_TRAILER_SIZE or
+        self._mmap[size - CBOR_TRAILER_SIZE:size - 8] != CBOR_TRAILER_PREFIX):
+        return(None)
+      return(int.from_bytes(self._mmap[size - 8:size], "big"))
+
+    if(size < JSON_TRAILER_SIZE):
+      return(None)
+    trailer = self._mmap[size - JSON_TRAILER_SIZE:size]
+    try:
+      index_offset = vcon.json_codec.loads(trailer).get(TRAILER_KEY, None)
+      if(isinstance(index_offset, str) and len(index_offset) == 16):
+        return(int(index_offset, 16))
+
+    except Exception:
+      pass
+
+    return(None)
+
+
+  def _read_index(self, index_offset: int) -> None:
+    size = len(self._mmap)
+    trailer_size = CBOR_TRAILER_SIZE if self._format == CBOR else JSON_TRAILER_SIZE
+    if(index_offset >= size - trailer_size):
+      raise VconContainerError("container index offset: {} beyond end of file".format(index_offset))
+
+    index_bytes = self._mmap[index_offset:size - trailer_size]
+    if(self._format == CBOR):
+      index_record = cbor2.loads(index_bytes)
+    else:
+      index_record = vcon.json_codec.loads(index_bytes)
+
+    if(not isinstance(index_record, dict) or
+      index_record.get(INDEX_KEY, None) != CONTAINER_VERSION or
+      index_record.get("format", None) != self._format):
+      raise VconContainerError("invalid container index record at offset: {}".format(index_offset))
+
+    for uuid, offset, length in index_record["index"]:
+      if(offset + length > index_offset):
+        raise VconContainerError("container index entry for: {} beyond end of records".format(uuid))
+      self._index.append((uuid, offset, length))
+
+    self._indexed = True
+
+
+  def _scan(self) -> None:
+    """ build the index by reading all of the records, for containers without an index """
+    if(self._format == CBOR):
+      self._file.seek(0)
+      decoder = cbor2.CBORDecoder(self._file)
+      size = len(self._mmap)
+      offset = 0
+      while(offset < size):
+        record = decoder.decode()
+        end = self._file.tell()
+        self._add_scanned(record, offset, end - offset)
+        offset = end
+
+    else:
+      offset = 0
+      for line in iter(self._mmap.readline, b""):
+        length = len(line.rstrip())
+        if(length > 0):
+          self._add_scanned(vcon.json_codec.loads(line), offset, length)
+        offset += len(line)
+
+
+  def _add_scanned(self, record: typing.Any, offset: int, length: int) -> None:
+    if(not isinstance(record, dict)):
+      raise VconContainerError("container record at offset: {} is not a vCon".format(offset))
+    # index or trailer of a partially written or concatenated container
+    if(INDEX_KEY in record or TRAILER_KEY in record):
+      return
+
+    uuid = vcon.Vcon.get_dict_uuid(record)
+    if(uuid is None):
+      raise VconContainerError("vCon at offset: {} has no UUID".format(offset))
+    self._index.append((uuid, offset, length))
+
@@ -0,0 +1,229 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+"""
+Lazy access to the content of inline dialog bodies.
+
+Inline recordings are stored base64url encoded in the dialog **body**.
+Decoding a large recording is costly in both time and memory, so
+**InlineDialogBody** decodes once on first access and keeps the result
+for as long as the dialog body is not changed.  It can also decode in
+chunks directly to a file or pipe without ever holding the whole decoded
+body in memory.
+"""
+import re
+import typing
+import base64
+
+# Characters ignored when decoding, as when the whole body is decoded at
+# once (e.g. line breaks in wrapped base64url and padding)
+_NOT_BASE64URL = re.compile("[^A-Za-z0-9_+/-]")
+
+
+class InvalidBodyEncoding(Exception):
+  """ Dialog body content is not valid for its encoding """
+
+
+class InlineDialogBody():
+  """
+  Handle to the decoded content of an inline dialog body.
+
+  Get one from **Vcon.get_dialog_inline_body** rather than constructing
+  it directly.  The handle is bound to the dialog dict and the body value
+  at the time it was created.  Once the dialog **body** or **encoding** is
+  changed, the handle is no longer current (see **is_current**) and a
+  new one must be obtained from the **Vcon**.
+  """
+
+  # Must be a multiple of 4 so that each encoded chunk decodes on its own
+  DEFAULT_CHUNK_SIZE = 4 * 256 * 1024
+
+  def __init__(
+      self,
+      dialog: dict,
+      encoding: str,
+      label: str,
+      decoded: typing.Union[bytes, None] = None
+    ):
+    """
+    Parameters:
+      **dialog** (dict) - the dialog object containing the inline body
+      **encoding** (str) - the body encoding, must be base64url or none
+      **label** (str) - name of the dialog for error messages (e.g. dialog[0])
+      **decoded** (bytes) - the already decoded body if known (e.g. from a binary serialization).
+        Required if the dialog body is not yet base64url text (see **Vcon.loadc**).
+    """
+    self._dialog = dialog
+    self._body = dialog["body"]
+    self._encoding = encoding
+    self._label = label
+    self._decoded = decoded
+
+
+  @property
+  def encoding(self) -> str:
+    """ the encoding of the body in the dialog """
+    return(self._encoding)
+
+
+  @property
+  def decoded(self) -> bool:
+    """ True if the decoded body is cached in this handle """
+    return(self._decoded is not None)
+
+
+  def is_current(self, dialog: typing.Union[dict, None] = None) -> bool:
+    """
+    Test if this handle still reflects the dialog body.
+
+    Parameters:
+      **dialog** (dict) - if provided, also test that this handle is for this dialog object
+
+    Returns:
+      (bool) False if the dialog body or encoding have been changed since this handle was created
+    """
+    if(dialog is not None and dialog is not self._dialog):
+      return(False)
+
+    return(self._dialog.get("body", None) is self._body and
+      self._dialog.get("encoding", self._encoding) == self._encoding)
+
+
+  def __len__(self) -> int:
+    """ size in bytes of the decoded body, computed without decoding """
+    if(self._encoding == "none"):
+      # UTF-8 bytes as written by write_to, not the number of characters
+      if(self._body.isascii()):
+        return(len(self._body))
+
+      return(len(self._body.encode("utf-8")))
+
+    if(self._decoded is not None):
+      return(len(self._decoded))
+
+    encoded_length = len(self._body)
+    if(_NOT_BASE64URL.search(self._body) is not None):
+      encoded_length -= len(_NOT_BASE64URL.findall(self._body))
+
+    return((encoded_length * 3) // 4)
+
+
+  def get(self) -> typing.Union[bytes, str]:
+    """
+    Get the decoded body, decoding on the first call only.
+
+    Returns:
+      (bytes) for base64url encoded bodies, (str) for bodies with no encoding
+    """
+    if(self._decoded is None):
+      if(self._encoding == "none"):
+        self._decoded = self._body
+
+      else:
+        self._decoded = b"".join(self.iter_chunks())
+
+    return(self._decoded)
+
+
+  def memoryview(self) -> memoryview:
+    """
+    Get a read only view of the decoded body bytes.  For base64url
+    encoded bodies, this does not copy the cached decoded body.
+    """
+    decoded = self.get()
+    if(isinstance(decoded, str)):
+      decoded = bytes(decoded, "utf-8")
+
+    return(memoryview(decoded).toreadonly())
+
+
+  def release(self) -> None:
+    """
+    Drop the cached decoded body to free its memory.  Not dropped if the
+    dialog body is still the bytes loaded from CBOR (see **Vcon.loadc**)
+    as there is no other copy of it.
+    """
+    if(isinstance(self._body, str)):
+      self._decoded = None
+
+
+  def set_body(self, body: str) -> None:
+    """
+    Set the base64url text of the dialog body, created from the bytes
+    the handle was constructed with.  The handle remains current.
+
+    Parameters:
+      **body** (str) - base64url encoded text of the decoded body
+    """
+    self._dialog["body"] = body
+    self._body = body
+
+
+  def iter_chunks(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> typing.Iterator[bytes]:
+    """
+    Iterate over the decoded body in chunks.  If the decoded body is
+    not already cached, it is decoded a chunk at a time and is not cached.
+    Whitespace, line breaks and padding in the encoded body are ignored.
+
+    Parameters:
+      **chunk_size** (int) - maximum size in bytes of the encoded input for each chunk,
+        rounded down to a multiple of 4.
+
+    Returns:
+      iterator of (bytes) chunks of the decoded body
+    """
+    chunk_size = max(4, chunk_size - chunk_size % 4)
+
+    if(self._decoded is not None or self._encoding == "none"):
+      decoded = self._decoded if self._decoded is not None else self._body
+      if(isinstance(decoded, str)):
+        decoded = bytes(decoded, "utf-8")
+      view = memoryview(decoded)
+      for start in range(0, len(view), chunk_size):
+        yield(bytes(view[start:start + chunk_size]))
+      return
+
+    body = self._body
+    body_length = len(body)
+    leftover = ""
+    for start in range(0, body_length, chunk_size):
+      chunk = leftover + body[start:start + chunk_size]
+      if(_NOT_BASE64URL.search(chunk) is not None):
+        chunk = _NOT_BASE64URL.sub("", chunk)
+
+      if(start + chunk_size >= body_length):
+        # base64url in vCon omits the padding, decoder requires it
+        chunk += "=" * (-len(chunk) % 4)
+
+      else:
+        # Characters removed above may leave a partial group of 4 to decode with the next chunk
+        aligned_length = len(chunk) - len(chunk) % 4
+        leftover = chunk[aligned_length:]
+        chunk = chunk[:aligned_length]
+
+      try:
+        decoded_chunk = base64.urlsafe_b64decode(chunk)
+
+      except ValueError as decode_error:
+        raise InvalidBodyEncoding("{} body is not valid base64url".format(self._label)) from decode_error
+
+      yield(decoded_chunk)
+
+
+  def write_to(self, out_file: typing.BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    Write the decoded body to the given file, pipe or stream without holding
+    the whole decoded body in memory.
+
+    Parameters:
+      **out_file** - binary file like object with a write method
+      **chunk_size** (int) - maximum size in bytes of each chunk decoded and written
+
+    Returns:
+      (int) number of bytes written
+    """
+    written = 0
+    for chunk in self.iter_chunks(chunk_size):
+      out_file.write(chunk)
+      written += len(chunk)
+
+    return(written)
+
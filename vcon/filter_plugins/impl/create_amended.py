@@ -67,7 +67,7 @@ class AmendedFilterPlugin(vcon.filter_plugins.FilterPlugin):
     """
 
     # Serialize unsigned, verified data, don't deep copy as
-    # it will get desrialized in loadd
+    # loadd makes its own copy
     vcon_dict = in_vcon.dumpd(False, False);
 
     out_vcon = vcon.Vcon()
@@ -3,6 +3,7 @@
 import typing
 import json
 import logging
+import tempfile
 import pydantic
 import requests
 import tenacity
@@ -93,6 +94,10 @@ class Deepgram(vcon.filter_plugins.FilterPlugin):
     transcribe_options: typing.Dict[str, typing.Any]
     ) -> typing.Dict[str, typing.Any]:
     """ synchronous post of deepgram transcrtion request """
+    # Recording file is read from the start again on each retry
+    if(hasattr(recording_data["buffer"], "seek")):
+      recording_data["buffer"].seek(0)
+
     url = "https://api.deepgram.com/v1/listen"
     headers = {
       "accept": "application/json",
@@ -187,63 +192,74 @@ class Deepgram(vcon.filter_plugins.FilterPlugin):
 
         # We have not already transcribed this dialog
         if(transcript_index is None):
-          recording_bytes = await in_vcon.get_dialog_body(dialog_index)
-          logger.debug("deepgram mediatype: {}".format(dialog['mediatype']))
-          if(dialog["mediatype"] == vcon.Vcon.MEDIATYPE_AUDIO_WAV):
-            # wave does not support all codecs (e.g. GSM)
-            #with wave.open(io.BytesIO(recording_bytes), "rb") as wave_file:
-            #  codec_type = wave_file.getcomptype()
-            #  codec_name = wave_file.getcompname()
-            #  logger.info("deepgram transcribe of wav codec type: {} name: {}".format(codec_type, codec_name))
-
-            # the following does not takes a stream or bytes array despite what the AI says
-            # with io.BytesIO(recording_bytes) as recording_io:
-            #   audio_info = pydub.utils.mediainfo(bytes(recording_bytes, 'utf-8'))
-            #   logger.info("wav file info: {}".format(audio_info))
-
-            # So hack it:
-            #  Wav Header should look like this:
-            # "RIFFllllWAVEfmt ffffccCCssaa..."
-            # llll - length
-            # ffff - frame size
-            # cc - codec ID
-            # CC - channel count
-            file_type = recording_bytes[:4]
-            format_type = recording_bytes[8:12]
-            format_label = recording_bytes[12:16]
-            codec_frame_size_bytes = recording_bytes[16:18]
-            codec_bytes =  recording_bytes[18:20]
-            codec_channeld_bytes = recording_bytes[20:22]
-            if(file_type != b'RIFF' or
-                format_type != b'WAVE' or
-                format_label != b'fmt '
-              ):
-              logger.warning("Wav file header not as expected.  file type: '{}' format: '{}' format label: '{}'".format(
-                file_type, format_type, format_label))
-
-          recording_data = {
-            "buffer": recording_bytes,
-            "mediatype": dialog["mediatype"]
-            }
-
-          transcript_dict = self.request_transcribe(
-            recording_data,
-            transcribe_options
-            )
-
-          # For now make synch.
-          # transcript_dict = await self.deepgram_client.transcription.prerecorded(
-          #   recording_data,
-          #   transcribe_options
-          #   )
-          # logger.debug("deepgram return type: {} value: {}".format(type(transcript_dict), transcript_dict))
-          out_vcon.add_analysis_transcript(
-            dialog_index,
-            transcript_dict,
-            "deepgram",
-            "deepgram_prerecorded",
-            **analysis_extras
-            )
+          with tempfile.TemporaryFile() as recording_file:
+            if(dialog.get("body", None) is not None and dialog.get("body", None) != ""):
+              # decode inline recording in chunks straight to the temp file, which is
+              # streamed in the request, rather than holding the decoded recording in memory
+              in_vcon.get_dialog_inline_body(dialog_index).write_to(recording_file)
+              recording_file.seek(0)
+              recording_header = recording_file.read(22)
+              recording_buffer = recording_file
+
+            else:
+              recording_buffer = await in_vcon.get_dialog_body(dialog_index)
+              recording_header = recording_buffer[:22]
+            logger.debug("deepgram mediatype: {}".format(dialog['mediatype']))
+            if(dialog["mediatype"] == vcon.Vcon.MEDIATYPE_AUDIO_WAV):
+              # wave does not support all codecs (e.g. GSM)
+              #with wave.open(io.BytesIO(recording_bytes), "rb") as wave_file:
+              #  codec_type = wave_file.getcomptype()
+              #  codec_name = wave_file.getcompname()
+              #  logger.info("deepgram transcribe of wav codec type: {} name: {}".format(codec_type, codec_name))
+
+              # the following does not takes a stream or bytes array despite what the AI says
+              # with io.BytesIO(recording_bytes) as recording_io:
+              #   audio_info = pydub.utils.mediainfo(bytes(recording_bytes, 'utf-8'))
+              #   logger.info("wav file info: {}".format(audio_info))
+
+              # So hack it:
+              #  Wav Header should look like this:
+              # "RIFFllllWAVEfmt ffffccCCssaa..."
+              # llll - length
+              # ffff - frame size
+              # cc - codec ID
+              # CC - channel count
+              file_type = recording_header[:4]
+              format_type = recording_header[8:12]
+              format_label = recording_header[12:16]
+              codec_frame_size_bytes = recording_header[16:18]
+              codec_bytes =  recording_header[18:20]
+              codec_channeld_bytes = recording_header[20:22]
+              if(file_type != b'RIFF' or
+                  format_type != b'WAVE' or
+                  format_label != b'fmt '
+                ):
+                logger.warning("Wav file header not as expected.  file type: '{}' format: '{}' format label: '{}'".format(
+                  file_type, format_type, format_label))
+
+            recording_data = {
+              "buffer": recording_buffer,
+              "mediatype": dialog["mediatype"]
+              }
+
+            transcript_dict = self.request_transcribe(
+              recording_data,
+              transcribe_options
+              )
+
+            # For now make synch.
+            # transcript_dict = await self.deepgram_client.transcription.prerecorded(
+            #   recording_data,
+            #   transcribe_options
+            #   )
+            # logger.debug("deepgram return type: {} value: {}".format(type(transcript_dict), transcript_dict))
+            out_vcon.add_analysis_transcript(
+              dialog_index,
+              transcript_dict,
+              "deepgram",
+              "deepgram_prerecorded",
+              **analysis_extras
+              )
 
     return(out_vcon)
 
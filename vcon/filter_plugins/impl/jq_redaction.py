@@ -1,7 +1,7 @@
 # Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
 """ FilterPlugin for jq query based redaction of vCon """
 import typing
-import pyjq
+import vcon.jq_cache
 import pydantic
 import vcon.filter_plugins
 
@@ -92,12 +92,13 @@ class JqRedaction(vcon.filter_plugins.FilterPlugin):
     if(redaction_query is None or len(redaction_query) == 0):
       raise Exception("invalid JQ query for redaction: {}".format(redaction_query))
 
-    query_result = pyjq.all(redaction_query,
+    query_result = vcon.jq_cache.query_all(redaction_query,
          vcon_dict)[0]
 
     redacted_uuid = query_result.get("uuid", None)
 
-    out_vcon.loadd(query_result)
+    # query_result is a new dict built by jq, no need to copy it
+    out_vcon.loadd(query_result, True)
     # cannot use same UUID
     if(redacted_uuid in (None, in_vcon.uuid)):
       if(options.uuid_domain in (None, "")):
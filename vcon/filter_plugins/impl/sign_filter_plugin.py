@@ -3,9 +3,13 @@
 import typing
 import pydantic
 import vcon.filter_plugins
+import vcon.security
 
 logger = vcon.build_logger(__name__)
 
+# Maximum number of different key and chain combinations, provided in options, to keep parsed
+MAX_CACHED_SIGNERS = 16
+
 class NoPrivateKey(Exception):
   """ Raised when no provate key is provided """
 
@@ -80,6 +84,34 @@ class SignFilterPlugin(vcon.filter_plugins.FilterPlugin):
       init_options,
       SignFilterPluginOptions
       )
+    # Parsed keys and chains, so that they are not reloaded for every vCon signed
+    self._signers: typing.Dict[typing.Tuple[str, typing.Tuple[str, ...]], vcon.security.Signer] = {}
+
+
+  def get_signer(
+      self,
+      private_key: str,
+      key_chain: typing.List[str]
+    ) -> vcon.security.Signer:
+    """
+    Get the cached **Signer** for the given key and chain, creating it on first use.
+
+    Parameters:
+      **private_key** (str) - PEM format private key or file name
+      **key_chain** (List[str]) - PEM format certificate chain or file names
+
+    Returns:
+      (vcon.security.Signer) signer for the key and chain
+    """
+    signer_key = (private_key, tuple(key_chain))
+    signer = self._signers.get(signer_key, None)
+    if(signer is None):
+      if(len(self._signers) >= MAX_CACHED_SIGNERS):
+        self._signers.clear()
+      signer = vcon.security.Signer(private_key, key_chain)
+      self._signers[signer_key] = signer
+
+    return(signer)
 
 
   async def filter(
@@ -111,7 +143,7 @@ class SignFilterPlugin(vcon.filter_plugins.FilterPlugin):
       key_chain = self._init_options.cert_chain_pems
 
     logger.debug("sign vCon")
-    out_vcon.sign(private_key, key_chain)
+    out_vcon.sign(self.get_signer(private_key, key_chain))
     logger.debug("done signing vCon")
     return(out_vcon)
 
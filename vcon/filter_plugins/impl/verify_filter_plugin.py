@@ -3,6 +3,10 @@
 import typing
 import pydantic
 import vcon.filter_plugins
+import vcon.security
+
+# Maximum number of different CA lists, provided in options, to keep parsed
+MAX_CACHED_VERIFIERS = 16
 
 
 class VerifyFilterPluginInitOptions(
@@ -66,6 +70,33 @@ class VerifyFilterPlugin(vcon.filter_plugins.FilterPlugin):
       init_options,
       VerifyFilterPluginOptions
       )
+    # Parsed CA certs and validated chains, so that they are not reloaded
+    # and revalidated for every vCon verified
+    self._verifiers: typing.Dict[typing.Tuple[str, ...], vcon.security.Verifier] = {}
+
+
+  def get_verifier(
+      self,
+      ca_list: typing.List[str]
+    ) -> vcon.security.Verifier:
+    """
+    Get the cached **Verifier** for the given CA list, creating it on first use.
+
+    Parameters:
+      **ca_list** (List[str]) - trusted CA PEM format certificates or file names
+
+    Returns:
+      (vcon.security.Verifier) verifier for the CA list
+    """
+    verifier_key = tuple(ca_list)
+    verifier = self._verifiers.get(verifier_key, None)
+    if(verifier is None):
+      if(len(self._verifiers) >= MAX_CACHED_VERIFIERS):
+        self._verifiers.clear()
+      verifier = vcon.security.Verifier(ca_list)
+      self._verifiers[verifier_key] = verifier
+
+    return(verifier)
 
 
   async def filter(
@@ -89,7 +120,7 @@ class VerifyFilterPlugin(vcon.filter_plugins.FilterPlugin):
     if(ca_list is None or len(ca_list) == 0):
       ca_list = self._init_options.allowed_ca_cert_pems
 
-    out_vcon.verify(ca_list)
+    out_vcon.verify(self.get_verifier(ca_list))
     return(out_vcon)
 
 
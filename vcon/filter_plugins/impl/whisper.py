@@ -162,13 +162,21 @@ class Whisper(vcon.filter_plugins.FilterPlugin):
           media_type in self._supported_media
           ):
 
-          body_bytes = await in_vcon.get_dialog_body(dialog_index)
+          if(dialog.get("body", None) is not None and dialog.get("body", None) != ""):
+            # decode inline recording in chunks straight to the temp file below
+            body_bytes = in_vcon.get_dialog_inline_body(dialog_index)
+          else:
+            body_bytes = await in_vcon.get_dialog_body(dialog_index)
           if(body_bytes is not None and len(body_bytes)):
             with tempfile.TemporaryDirectory() as temp_dir:
               transcript = None
               suffix = vcon.Vcon.get_media_extension(media_type)
               with tempfile.NamedTemporaryFile(prefix= temp_dir + os.sep, suffix = suffix) as temp_audio_file:
-                temp_audio_file.write(body_bytes)
+                if(isinstance(body_bytes, vcon.dialog_body.InlineDialogBody)):
+                  body_bytes.write_to(temp_audio_file)
+                else:
+                  temp_audio_file.write(body_bytes)
+                temp_audio_file.flush()
                 #rate, samples = scipy.io.wavfile.read(body_io)
                 # ts_num=7 is num of timestamps to get, so 7 is more than the default of 5
                 # stab=True  is disable stabilization so you can do it later with different settings
@@ -0,0 +1,98 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+"""
+Shared async HTTP client and connection pool for the vcon package.
+
+Vcon HTTP operations (e.g. **Vcon.get**, **Vcon.post** and getting externally
+referenced recordings) use this so that they do not block the asyncio event
+loop and so that connections are reused across requests.
+
+An httpx.AsyncClient is bound to the event loop in which it was used.
+So one client (and connection pool) is kept for each running event loop.
+
+The pool is configured using **configure** or with the following environment variables:
+
+  * **VCON_HTTP_MAX_CONNECTIONS** - maximum number of concurrent connections (default: 100)
+  * **VCON_HTTP_MAX_KEEPALIVE_CONNECTIONS** - maximum number of idle connections kept open (default: 20)
+  * **VCON_HTTP_KEEPALIVE_EXPIRY** - seconds before an idle connection is closed (default: 5.0)
+  * **VCON_HTTP_TIMEOUT** - default timeout in seconds for HTTP requests (default: 20.0)
+"""
+import os
+import typing
+import asyncio
+import weakref
+import httpx
+
+_settings = {
+    "max_connections": int(os.getenv("VCON_HTTP_MAX_CONNECTIONS", 100)),
+    "max_keepalive_connections": int(os.getenv("VCON_HTTP_MAX_KEEPALIVE_CONNECTIONS", 20)),
+    "keepalive_expiry": float(os.getenv("VCON_HTTP_KEEPALIVE_EXPIRY", 5.0)),
+    "timeout": float(os.getenv("VCON_HTTP_TIMEOUT", 20.0))
+  }
+
+# httpx.AsyncClient for each event loop
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def configure(
+    max_connections: typing.Union[int, None] = None,
+    max_keepalive_connections: typing.Union[int, None] = None,
+    keepalive_expiry: typing.Union[float, None] = None,
+    timeout: typing.Union[float, None] = None
+  ) -> typing.Dict[str, typing.Any]:
+  """
+  Set the connection pool configuration.  Parameters which are None are
+  not changed.  Only applies to clients created after this call (see **close_client**).
+
+  Parameters:
+    **max_connections** (int) - maximum number of concurrent connections
+    **max_keepalive_connections** (int) - maximum number of idle connections kept open
+    **keepalive_expiry** (float) - seconds before an idle connection is closed
+    **timeout** (float) - default timeout in seconds for HTTP requests
+
+  Returns:
+    dict containing the resulting configuration
+  """
+  for name, value in (
+      ("max_connections", max_connections),
+      ("max_keepalive_connections", max_keepalive_connections),
+      ("keepalive_expiry", keepalive_expiry),
+      ("timeout", timeout)
+    ):
+    if(value is not None):
+      _settings[name] = value
+
+  return(dict(_settings))
+
+
+def get_client() -> httpx.AsyncClient:
+  """
+  Get the shared HTTP client for the currently running event loop.
+  Must be called from within a coroutine.
+
+  Returns:
+    httpx.AsyncClient
+  """
+  loop = asyncio.get_running_loop()
+  client = _clients.get(loop, None)
+  if(client is None or client.is_closed):
+    client = httpx.AsyncClient(
+        limits = httpx.Limits(
+          max_connections = _settings["max_connections"],
+          max_keepalive_connections = _settings["max_keepalive_connections"],
+          keepalive_expiry = _settings["keepalive_expiry"]
+          ),
+        timeout = _settings["timeout"],
+        # requests, which we used to use, follows redirects
+        follow_redirects = True
+      )
+    _clients[loop] = client
+
+  return(client)
+
+
+async def close_client() -> None:
+  """ Close the shared HTTP client and its connections for the currently running event loop """
+  client = _clients.pop(asyncio.get_running_loop(), None)
+  if(client is not None):
+    await client.aclose()
+
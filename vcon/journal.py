@@ -0,0 +1,206 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+"""
+Journal of the changes made to a vCon, so that only the changes need to be
+written to storage (e.g. appended analysis objects) rather than the whole
+vCon with its media.
+
+A journal is started on a vCon dict as loaded from storage (see
+**Vcon.start_journal**).  Objects appended to the vCon lists (e.g. dialog,
+analysis and attachments) and top level values which have been set or replaced
+are found by comparing with the start of the journal.  Parameters of existing
+objects changed by the Vcon methods (e.g. **Vcon.set_party_parameter**) are
+recorded in the journal.
+
+Values existing at the start of the journal, which are changed in place
+other than by the Vcon methods (e.g. vCon.parties[0]["name"] = "Alice"), are
+detected by comparing with a copy of the containers (dicts and lists) taken
+at the start of the journal.  The copy shares the leaf values (e.g. the
+dialog body strings), so it is cheap to take.  The journal is not able to
+provide the operations for such changes and the vCon must be written in full.
+If the vCon lists have been replaced, objects removed or inserted, the whole
+list is set.  If top level values have been removed, the journal is not able
+to provide the operations and the vCon must be written in full.
+
+The journal also carries the revision of the vCon in storage at the start of
+the journal, if provided, so that storage can check that the changes are
+applied to the same revision.
+
+The operations are a list of tuples:
+
+  * (**APPEND**, path, [values]) - append the values to the list at the JSON path
+  * (**SET**, path, value) - set the value at the JSON path
+"""
+import re
+import typing
+import vcon.json_codec
+
+APPEND = "append"
+SET = "set"
+
+_identifier = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def json_path(*path_elements: typing.Union[str, int]) -> str:
+  """
+  Construct the JSONPath (e.g. as used by RedisJSON) for the given keys and list indices.
+
+  Parameters:
+    **path_elements** (Union[str, int]) - dict keys and list indices from the root
+
+  Returns:
+    JSON path string (e.g. "$.parties[0].tel")
+  """
+  path = "$"
+  for element in path_elements:
+    if(isinstance(element, int)):
+      path += "[{}]".format(element)
+    elif(_identifier.match(element)):
+      path += "." + element
+    else:
+      path += "[{}]".format(vcon.json_codec.dumps(element))
+
+  return(path)
+
+
+def _containers_copy(value: typing.Any) -> typing.Any:
+  """ Copy of the dicts and lists in the value, sharing the leaf values """
+  if(isinstance(value, dict)):
+    return({key: _containers_copy(element) for key, element in value.items()})
+
+  if(isinstance(value, list)):
+    return([_containers_copy(element) for element in value])
+
+  return(value)
+
+
+def _unchanged(
+    value: typing.Any,
+    start_copy: typing.Any,
+    ignore_keys: typing.Union[typing.Set[str], None] = None
+  ) -> bool:
+  """
+  Check if the value is the same as the copy taken by **_containers_copy**.
+
+  Parameters:
+    **value** (Any) - current value
+    **start_copy** (Any) - copy of the value at the start of the journal
+    **ignore_keys** (Set[str]) - keys of the top level dict not compared
+  """
+  if(isinstance(value, dict)):
+    if(not isinstance(start_copy, dict)):
+      return(False)
+    if(ignore_keys):
+      keys = set(value.keys()) - ignore_keys
+      if(keys != set(start_copy.keys()) - ignore_keys):
+        return(False)
+    else:
+      if(len(value) != len(start_copy)):
+        return(False)
+      keys = value.keys()
+    return(all(key in start_copy and _unchanged(value[key], start_copy[key]) for key in keys))
+
+  if(isinstance(value, list)):
+    return(isinstance(start_copy, list) and len(value) == len(start_copy) and
+      all(_unchanged(element, start_element) for element, start_element in zip(value, start_copy)))
+
+  return(value is start_copy or (type(value) is type(start_copy) and value == start_copy))
+
+
+class VconJournal():
+  """ Changes made to a vCon dict since the journal was started """
+  def __init__(self, vcon_dict: dict, revision: typing.Union[str, None] = None):
+    """
+    Parameters:
+      **vcon_dict** (dict) - the vCon dict, in its state as stored
+      **revision** (str) - revision of the vCon in storage, None if not known
+    """
+    self._vcon_dict = vcon_dict
+    self.revision = revision
+    # top level values by key at the start
+    self._values = dict(vcon_dict)
+    # objects in the top level lists at the start
+    self._list_objects = {key: list(value) for key, value in vcon_dict.items() if isinstance(value, list)}
+    # (list key, index, parameter) of the parameters set on existing list objects
+    self._parameters_set: typing.List[typing.Tuple[str, int, str]] = []
+    # to detect changes made in place
+    self._start_copy = _containers_copy(vcon_dict)
+
+
+  def parameter_set(self, list_key: str, index: int, parameter_name: str) -> None:
+    """
+    Record that a parameter was set on an object in a top level list (e.g. parties).
+
+    Parameters:
+      **list_key** (str) - top level key of the list (e.g. "parties")
+      **index** (int) - index of the object in the list
+      **parameter_name** (str) - name of the parameter set on the object
+    """
+    change = (list_key, index, parameter_name)
+    if(change not in self._parameters_set):
+      self._parameters_set.append(change)
+
+
+  def operations(self, vcon_dict: dict) -> typing.Union[typing.List[typing.Tuple[str, str, typing.Any]], None]:
+    """
+    Get the operations to apply the changes to the vCon as it was at the start of the journal.
+
+    Parameters:
+      **vcon_dict** (dict) - the vCon dict in its current state
+
+    Returns:
+      list of (operation, path, value) tuples in the order to be applied or
+      None if the changes cannot be provided as operations, in which case the
+      whole vCon must be written.
+    """
+    if(vcon_dict is not self._vcon_dict):
+      return(None)
+
+    # removed values
+    for key in self._values.keys():
+      if(key not in vcon_dict):
+        return(None)
+
+    # parameters set by the Vcon methods, not changes in place
+    parameters_set: typing.Dict[typing.Tuple[str, int], typing.Set[str]] = {}
+    for list_key, index, parameter_name in self._parameters_set:
+      parameters_set.setdefault((list_key, index), set()).add(parameter_name)
+
+    operations = []
+    keys_set = set()
+    for key, value in vcon_dict.items():
+      start_value = self._values.get(key, None)
+      if(key not in self._values or value is not start_value):
+        operations.append((SET, json_path(key), value))
+        keys_set.add(key)
+
+      elif(isinstance(value, list)):
+        start_objects = self._list_objects[key]
+        if(len(value) < len(start_objects) or
+          any(current is not start for current, start in zip(value, start_objects))):
+          # Objects removed, replaced or inserted
+          operations.append((SET, json_path(key), value))
+          keys_set.add(key)
+
+        else:
+          for index, start_object_copy in enumerate(self._start_copy[key]):
+            if(not _unchanged(value[index], start_object_copy, parameters_set.get((key, index), None))):
+              # changed in place
+              return(None)
+
+          if(len(value) > len(start_objects)):
+            operations.append((APPEND, json_path(key), value[len(start_objects):]))
+
+      elif(not _unchanged(value, self._start_copy[key])):
+        # changed in place
+        return(None)
+
+    for list_key, index, parameter_name in self._parameters_set:
+      if(list_key in keys_set or
+        index >= len(self._list_objects.get(list_key, []))):
+        # included in the list set or appended object
+        continue
+      list_object = vcon_dict[list_key][index]
+      if(parameter_name in list_object):
+        operations.append((SET, json_path(list_key, index, parameter_name), list_object[parameter_name]))
+
+    return(operations)
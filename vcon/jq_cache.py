@@ -0,0 +1,160 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+"""
+Process wide cache of compiled jq programs.
+
+**pyjq.all** compiles the jq program every time it is called.  Pipelines
+typically run the same few jq queries (e.g. **Vcon.jq**, the JQ processor
+and the JqRedaction filter plugin) on every vCon, so the compiled programs
+are kept in a least recently used cache keyed by the query string.
+
+jq converts the input value into its own representation and builds new
+objects for the results, so the input dict is never modified.  Callers can
+query a vCon dict by reference (e.g. **Vcon.dumpd(deepcopy = False)**) rather
+than on a deep copy.
+
+The maximum number of compiled programs kept is set using **configure** or
+the **VCON_JQ_CACHE_SIZE** environment variable (default: 256).
+"""
+import os
+import typing
+import collections
+import threading
+import pyjq
+
+_max_size = int(os.getenv("VCON_JQ_CACHE_SIZE", 256))
+_programs: "collections.OrderedDict[str, typing.Any]" = collections.OrderedDict()
+_lock = threading.Lock()
+_hits = 0
+_misses = 0
+
+
+def configure(max_size: int) -> None:
+  """
+  Set the maximum number of compiled jq programs kept in the cache.
+  Least recently used programs are dropped if the cache is larger.
+
+  Parameters:
+    **max_size** (int) - maximum number of compiled programs, 0 disables caching
+  """
+  global _max_size
+  with _lock:
+    _max_size = max_size
+    while(len(_programs) > max(_max_size, 0)):
+      _programs.popitem(last = False)
+
+
+def compile_query(query: str) -> typing.Any:
+  """
+  Get the compiled jq program for the query, compiling it if not already in the cache.
+
+  Parameters:
+    **query** (str) - jq query string
+
+  Returns:
+    compiled pyjq program (see **pyjq.compile**)
+  """
+  global _hits, _misses
+  with _lock:
+    program = _programs.get(query, None)
+    if(program is not None):
+      _programs.move_to_end(query)
+      _hits += 1
+      return(program)
+    _misses += 1
+
+  # compile outside of the lock, a concurrent miss on the same query just compiles twice
+  program = pyjq.compile(query)
+
+  with _lock:
+    if(_max_size > 0):
+      _programs[query] = program
+      _programs.move_to_end(query)
+      while(len(_programs) > _max_size):
+        _programs.popitem(last = False)
+
+  return(program)
+
+
+def query_all(query: str, value: typing.Any) -> typing.List[typing.Any]:
+  """
+  Run the cached jq program for the query on the value.  Same as **pyjq.all**
+  without recompiling the query.
+
+  Parameters:
+    **query** (str) - jq query string
+    **value** (Any) - JSON compatible value to query, it is not modified
+
+  Returns:
+    list of the jq query results
+  """
+  return(compile_query(query).all(value))
+
+
+def query_all_many(queries: typing.List[str], value: typing.Any) -> typing.List[typing.List[typing.Any]]:
+  """
+  Run a set of jq queries on the same value.  Same as calling **query_all** for
+  each query, but the queries are combined into one cached jq program so that
+  the value is only converted into jq's representation once, rather than once
+  per query.  This is significant for vCons with large inline bodies.
+
+  Parameters:
+    **queries** (List[str]) - jq query strings
+    **value** (Any) - JSON compatible value to query, it is not modified
+
+  Returns:
+    list containing the list of results for each query, in the same order as **queries**
+  """
+  if(len(queries) == 0):
+    return([])
+
+  # Each query on its own lines so that comments do not run into the next one
+  combined_query = "[\n" + ",\n".join(["[\n{}\n]".format(query) for query in queries]) + "\n]"
+  try:
+    program = compile_query(combined_query)
+
+  except ValueError:
+    # Some queries (e.g. with module directives) cannot be combined, run
+    # each so that the error is for the query that is not valid.
+    return([query_all(query, value) for query in queries])
+
+  return(program.first(value))
+
+
+def query_first(query: str, value: typing.Any, default: typing.Any = None) -> typing.Any:
+  """
+  Run the cached jq program for the query on the value and return the first result.
+
+  Parameters:
+    **query** (str) - jq query string
+    **value** (Any) - JSON compatible value to query, it is not modified
+    **default** (Any) - returned if the query has no results
+
+  Returns:
+    the first jq query result
+  """
+  return(compile_query(query).first(value, default))
+
+
+def stats() -> typing.Dict[str, int]:
+  """
+  Get the cache statistics.
+
+  Returns:
+    dict containing **hits**, **misses**, **size** and **max_size**
+  """
+  with _lock:
+    return({
+        "hits": _hits,
+        "misses": _misses,
+        "size": len(_programs),
+        "max_size": _max_size
+      })
+
+
+def clear() -> None:
+  """ Drop all of the compiled programs and reset the statistics """
+  global _hits, _misses
+  with _lock:
+    _programs.clear()
+    _hits = 0
+    _misses = 0
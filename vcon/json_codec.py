@@ -0,0 +1,234 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+"""
+JSON encoding and decoding for the vcon and py_vcon_server packages.
+
+The fastest available backend is selected at import time:
+
+  * **orjson** if installed
+  * **simplejson** if installed
+  * **json** from the Python standard library
+
+The backend can be forced by setting the **VCON_JSON_BACKEND** environment
+variable to one of the above names or at runtime using **set_backend**.
+
+Two forms of encoding are provided:
+
+  * **dumps** returns a string formatted exactly as the vcon package
+    always has (i.e. json.dumps separators, ASCII escaping and indent).
+    Use this where the text may be compared, diffed or shown to users.
+  * **dumpb** returns compact UTF-8 encoded bytes using the fastest backend.
+    Use this for storage, queues and HTTP bodies where only the JSON value matters.
+
+**loads** uses the fastest backend for decoding and accepts str or bytes.
+"""
+import os
+import typing
+import json as std_json
+
+try:
+  import simplejson
+except Exception as import_error:
+  simplejson = None
+
+try:
+  import orjson
+except Exception as import_error:
+  orjson = None
+
+
+class UnsupportedJsonBackend(Exception):
+  """ Requested JSON backend is not known or not installed """
+
+
+ORJSON = "orjson"
+SIMPLEJSON = "simplejson"
+JSON = "json"
+
+if(simplejson is not None):
+  dumps_options = {"ignore_nan" : True}
+else:
+  dumps_options = {}
+
+# module name for text encoding (dumps)
+_text_json = simplejson if simplejson is not None else std_json
+
+# Options which make orjson forgiving of the types json.dumps accepts
+if(orjson is not None):
+  _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+  _ORJSON_INDENT_OPTIONS = _ORJSON_OPTIONS | orjson.OPT_INDENT_2
+
+
+def available_backends() -> typing.List[str]:
+  """
+  Get the list of the JSON backends installed.
+
+  Returns:
+    list of backend names (str), fastest first
+  """
+  backends = []
+  if(orjson is not None):
+    backends.append(ORJSON)
+  if(simplejson is not None):
+    backends.append(SIMPLEJSON)
+  backends.append(JSON)
+
+  return(backends)
+
+
+_backend = None
+
+
+def set_backend(name: typing.Union[str, None] = None) -> str:
+  """
+  Select the JSON backend used by **loads** and **dumpb**.
+
+  Parameters:
+    **name** (str) - backend name (orjson, simplejson or json),
+      None selects the fastest installed backend.
+
+  Returns:
+    the name of the selected backend
+  """
+  global _backend
+  backends = available_backends()
+  if(name is None or name == ""):
+    name = backends[0]
+
+  if(name not in backends):
+    raise UnsupportedJsonBackend("JSON backend: {} not available, installed backends: {}".format(
+      name, backends))
+
+  _backend = name
+
+  return(_backend)
+
+
+def get_backend() -> str:
+  """ Returns the name of the JSON backend in use """
+  return(_backend)
+
+
+set_backend(os.getenv("VCON_JSON_BACKEND", None))
+
+
+def loads(data: typing.Union[str, bytes, bytearray, memoryview]) -> typing.Any:
+  """
+  Decode the given JSON text.
+
+  Parameters:
+    **data** (str, bytes, bytearray or memoryview) - JSON text to decode
+
+  Returns:
+    decoded value (dict, list, str, int, float, bool or None)
+  """
+  if(_backend == ORJSON):
+    try:
+      return(orjson.loads(data))
+
+    except orjson.JSONDecodeError as decode_error:
+      # orjson is strict (e.g. no NaN or lone surrogates). Fall back so
+      # that we accept the same input as we always have.  This only costs
+      # on input which orjson rejects.
+      pass
+
+  if(isinstance(data, memoryview)):
+    data = data.tobytes()
+
+  if(_backend == SIMPLEJSON):
+    return(simplejson.loads(data))
+
+  return(std_json.loads(data))
+
+
+def dumps(
+    obj: typing.Any,
+    indent: typing.Union[int, None] = None,
+    default: typing.Union[typing.Callable[[typing.Any], typing.Any], None] = None
+  ) -> str:
+  """
+  Encode to JSON text formatted as json.dumps would (with **dumps_options**).
+
+  Parameters:
+    **obj** - value to encode
+    **indent** (int) - indent for pretty printing, None for no new lines
+    **default** (Callable) - function to convert objects that are not natively serializable
+
+  Returns:
+    JSON string
+  """
+  return(_text_json.dumps(obj, indent = indent, default = default, **dumps_options))
+
+
+def dumpb(
+    obj: typing.Any,
+    indent: typing.Union[int, None] = None,
+    default: typing.Union[typing.Callable[[typing.Any], typing.Any], None] = None
+  ) -> bytes:
+  """
+  Encode to compact UTF-8 JSON bytes using the selected backend.
+
+  The output is valid JSON, but the white space and escaping are not
+  the same as **dumps**.  With orjson or simplejson, NaN and Infinity
+  are encoded as null.
+
+  Parameters:
+    **obj** - value to encode
+    **indent** (int) - None for compact output, otherwise pretty print (orjson only supports indent of 2)
+    **default** (Callable) - function to convert objects that are not natively serializable
+
+  Returns:
+    UTF-8 encoded JSON bytes
+  """
+  if(_backend == ORJSON and indent in (None, 2)):
+    try:
+      return(orjson.dumps(
+          obj,
+          default = default,
+          option = _ORJSON_OPTIONS if indent is None else _ORJSON_INDENT_OPTIONS
+        ))
+
+    except orjson.JSONEncodeError as encode_error:
+      # Things like integers larger than 64 bits, let the slower backend
+      # have a go at it.
+      pass
+
+  if(_backend == SIMPLEJSON or (_backend == ORJSON and simplejson is not None)):
+    return(simplejson.dumps(
+        obj,
+        indent = indent,
+        default = default,
+        separators = (",", ":") if indent is None else None,
+        ensure_ascii = False,
+        ignore_nan = True
+      ).encode("utf-8"))
+
+  return(std_json.dumps(
+      obj,
+      indent = indent,
+      default = default,
+      separators = (",", ":") if indent is None else None,
+      ensure_ascii = False
+    ).encode("utf-8"))
+
+
+class JsonEncoder():
+  """
+  Encoder using **dumpb** for libraries which take a json.JSONEncoder
+  like object (e.g. redis-py json() commands).
+  """
+  def encode(self, obj: typing.Any) -> bytes:
+    return(dumpb(obj))
+
+
+class JsonDecoder():
+  """
+  Decoder using **loads** for libraries which take a json.JSONDecoder
+  like object (e.g. redis-py json() commands).
+  """
+  def decode(self, data: typing.Union[str, bytes]) -> typing.Any:
+    return(loads(data))
+
+
+ENCODER = JsonEncoder()
+DECODER = JsonDecoder()
+
@@ -0,0 +1,163 @@
+# Copyright (C) 2023-2025 SIPez LLC.  All rights reserved.
+"""
+Indices for finding objects in the vCon dialog, analysis and attachments lists.
+
+Scanning the analysis list for the transcript of a dialog, comparing
+lower cased vendor, product and schema strings, is costly for vCons with
+many dialogs and analysis objects, as it is done for each dialog.  The
+indices here map lookup keys to the list positions of the objects having
+that key, so that lookups do not scan the list.
+
+An index is bound to the list object which it indexed.  It is updated
+incrementally for objects appended to the list and rebuilt when the list
+is replaced, shortened or has had an object inserted.  Positions found are
+checked against the object currently at that position, so that objects
+replaced or changed in place are not falsely matched.  However an object
+changed in place such that it has a new key, is not found by that key until
+the index is rebuilt (see **clear**).
+"""
+import typing
+
+
+def analysis_keys(analysis: dict) -> typing.List[typing.Tuple]:
+  """
+  Keys for an analysis object:
+    (dialog index, type) and
+    (dialog index, type, vendor, product, schema) with vendor, product and schema lower cased.
+
+  Analysis objects for a list of dialogs are indexed for each dialog in the list.
+  """
+  dialog = analysis.get("dialog", None)
+  if(isinstance(dialog, list)):
+    dialog_indices = [dialog_index for dialog_index in dialog if isinstance(dialog_index, int)]
+  elif(isinstance(dialog, int)):
+    dialog_indices = [dialog]
+  else:
+    dialog_indices = []
+
+  analysis_type = analysis.get("type", None)
+  generator = (
+      (analysis.get("vendor", None) or "").lower(),
+      (analysis.get("product", None) or "").lower(),
+      (analysis.get("schema", None) or "").lower()
+    )
+
+  keys = []
+  for dialog_index in dialog_indices:
+    keys.append((dialog_index, analysis_type))
+    keys.append((dialog_index, analysis_type) + generator)
+
+  return(keys)
+
+
+def type_keys(vcon_object: dict) -> typing.List[typing.Tuple]:
+  """ Key for a dialog or attachment object: (type,) """
+  return([(vcon_object.get("type", None),)])
+
+
+class ObjectListIndex():
+  """
+  Index of the positions of the objects in a vCon object list (e.g. analysis)
+  by the keys returned from a key function.
+  """
+  def __init__(self, key_function: typing.Callable[[dict], typing.List[typing.Tuple]]):
+    """
+    Parameters:
+      **key_function** (Callable) - function returning the list of keys for an object
+    """
+    self._key_function = key_function
+    self._objects: typing.Union[list, None] = None
+    # the objects indexed, by position
+    self._indexed: typing.List[typing.Any] = []
+    self._positions: typing.Dict[typing.Tuple, typing.List[int]] = {}
+    self.rebuilds = 0
+
+
+  def clear(self) -> None:
+    """ Drop the index, it is rebuilt on the next lookup """
+    self._objects = None
+    self._indexed = []
+    self._positions = {}
+
+
+  def _add(self, position: int, vcon_object: typing.Any) -> None:
+    self._indexed.append(vcon_object)
+    if(not isinstance(vcon_object, dict)):
+      return
+
+    for key in self._key_function(vcon_object):
+      positions = self._positions.get(key, None)
+      if(positions is None):
+        self._positions[key] = [position]
+      # analysis for a list of dialogs may have the same key more than once
+      elif(positions[-1] != position):
+        positions.append(position)
+
+
+  def update(self, objects: typing.Union[list, None]) -> None:
+    """
+    Bring the index up to date with the given object list.  Objects appended
+    since the last update are indexed.  If the list is not the same list
+    indexed previously or has had objects removed or inserted, the
+    index is rebuilt.
+
+    Parameters:
+      **objects** (list) - the vCon object list (e.g. Vcon.analysis)
+    """
+    if(objects is None):
+      objects = []
+
+    indexed_count = len(self._indexed)
+    if(objects is not self._objects or
+      len(objects) < indexed_count or
+      (indexed_count > 0 and objects[indexed_count - 1] is not self._indexed[-1])):
+      self.clear()
+      self._objects = objects
+      indexed_count = 0
+      self.rebuilds += 1
+
+    for position in range(indexed_count, len(objects)):
+      self._add(position, objects[position])
+
+
+  def find(self, objects: typing.Union[list, None], key: typing.Tuple) -> typing.List[int]:
+    """
+    Find the positions of the objects having the given key.
+
+    Parameters:
+      **objects** (list) - the vCon object list (e.g. Vcon.analysis)
+      **key** (tuple) - key as created by the key function
+
+    Returns:
+      list of positions (int) in ascending order
+    """
+    self.update(objects)
+    positions = self._positions.get(key, [])
+
+    # Make sure the objects were not replaced or changed in place since indexed
+    for position in positions:
+      vcon_object = self._objects[position]
+      if(vcon_object is not self._indexed[position] or
+        key not in self._key_function(vcon_object)):
+        self.clear()
+        self.update(objects)
+        positions = self._positions.get(key, [])
+        break
+
+    return(list(positions))
+
+
+class VconObjectIndex():
+  """ Indices for the dialog, analysis and attachments lists of a Vcon """
+  def __init__(self):
+    self.dialog = ObjectListIndex(type_keys)
+    self.analysis = ObjectListIndex(analysis_keys)
+    self.attachments = ObjectListIndex(type_keys)
+
+
+  def clear(self) -> None:
+    """ Drop all of the indices """
+    self.dialog.clear()
+    self.analysis.clear()
+    self.attachments.clear()
+
@@ -7,6 +7,12 @@ import cryptography.x509
 #import re
 import base64
 import jose
+import jose.jwk
+import jose.jws
+import jose.jwe
+import time
+import collections
+import multiprocessing
 import datetime
 import hsslms
 import hashlib
@@ -278,6 +284,244 @@ def verify_cert(cert_to_verify : cryptography.x509.Certificate, issuer_cert : cr
 
   # TODO need to check revokations as well
 
+def build_verification_jwk_from_cert(cert_object : cryptography.x509.Certificate, algorithm : str) -> dict:
+  """
+  Build a JWK for JWS signature verification from the public key in the given certificate.
+
+  Parameters:
+    cert_object (Certificate): the signing cert (first cert in the x5c chain)
+    algorithm (str): the JWS alg the signature was created with
+
+  Returns:
+    JWK containing the public key for verifying a JWS
+  """
+  public_numbers = cert_object.public_key().public_numbers()
+  verification_jwk = {}
+  verification_jwk["kty"] = "RSA"
+  verification_jwk["use"] = "sig"
+  verification_jwk["alg"] = algorithm
+  verification_jwk["e"] = jose.utils.base64url_encode(jose.utils.long_to_bytes(public_numbers.e)).decode('utf-8')
+  verification_jwk["n"] = jose.utils.base64url_encode(jose.utils.long_to_bytes(public_numbers.n)).decode('utf-8')
+
+  return(verification_jwk)
+
+
+def x5c_fingerprint(x5c : typing.List[str]) -> str:
+  """
+  SHA-256 fingerprint of the DER certificates in a x5c chain.
+
+  Parameters:
+    x5c (List[str]): list containing DER foramt cert strings (e.g. RFC7517)
+
+  Returns:
+    hex string fingerprint identifying the chain
+  """
+  hasher = hashlib.sha256()
+  for der in x5c:
+    hasher.update(base64.b64decode(der))
+
+  return(hasher.hexdigest())
+
+
+def copy_header(header: dict) -> dict:
+  """ copy JWS header such that x5c list is not shared """
+  header_copy = dict(header)
+  if("x5c" in header_copy):
+    header_copy["x5c"] = list(header_copy["x5c"])
+
+  return(header_copy)
+
+
+class Signer():
+  """
+  Reusable JWS signer.
+
+  Reads and parses the private key and certificate chain once and
+  keeps the JWS header and a constructed JOSE signing key.  When signing
+  many vCons with the same key, using one **Signer** reduces the cost of
+  each signature to the RSA signing operation itself.
+  """
+  def __init__(self, private_key_pem_file: str, cert_chain_pem_files: typing.List[str]):
+    """
+    Parameters:
+      private_key_pem_file (str): file name or PEM string containing the private key to use for signing.
+
+      cert_chain_pem_files (List{str]): file names or PEM strings containing the pem format certicate chain for the
+        private key to use for signing.  The cert/public key corresponding to the private key should be the
+        first cert.  THe certificate authority root should be the last cert.
+    """
+    self._algorithm = "RS256"
+    self._header = {}
+    self._header['x5c'] = load_x5c_from_pem_certs(cert_chain_pem_files)
+    self._header["alg"] = self._algorithm
+    # jose wraps the cryptography key object as is.  Constructing from a JWK
+    # would parse and check the private key a second time.
+    self._signing_key = jose.jwk.construct(load_pem_key(private_key_pem_file), self._algorithm)
+
+  @property
+  def algorithm(self) -> str:
+    """ JWS alg used for signing """
+    return(self._algorithm)
+
+  @property
+  def header(self) -> dict:
+    """ copy of the JWS unprotected header containing the x5c chain and alg """
+    return(copy_header(self._header))
+
+  def sign(self, payload: typing.Union[dict, bytes]) -> typing.Tuple[str, str, str]:
+    """
+    Sign the given payload.
+
+    Parameters:
+      payload (dict or bytes): the JWS payload (e.g. the vCon dict)
+
+    Returns:
+      Tuple[str, str, str]: base64url encoded protected header, payload and signature
+    """
+    # dot separated JWS token.  First part is the protected header, then the payload, the signature (all base64url encoded)
+    jws_token = jose.jws.sign(payload, self._signing_key, headers = self._header, algorithm = self._algorithm)
+    protected_header, encoded_payload, signature = jws_token.split('.')
+
+    return(protected_header, encoded_payload, signature)
+
+
+class Verifier():
+  """
+  Reusable JWS verifier.
+
+  Reads and parses the trusted CA certificates once.  Certificate
+  chains (x5c) which have already been validated against the CAs are
+  cached, keyed by the chain fingerprint, along with the JOSE verification
+  key built from the signing cert.  When verifying many vCons signed
+  with the same chain, the cost of each verification is reduced to
+  the RSA verification of the JWS signature itself.
+
+  A cached chain is revalidated after **chain_cache_ttl** seconds or when
+  any of the certs in the chain expires, whichever is first.
+
+  NOTE:  DOES NOT CHECK REVOKATION LISTS!!!
+  """
+  DEFAULT_CHAIN_CACHE_TTL = 300.0
+  DEFAULT_MAX_CACHED_CHAINS = 256
+
+  def __init__(
+      self,
+      ca_cert_pem_files: typing.List[str],
+      chain_cache_ttl: float = DEFAULT_CHAIN_CACHE_TTL,
+      max_cached_chains: int = DEFAULT_MAX_CACHED_CHAINS
+    ):
+    """
+    Parameters:
+      ca_cert_pem_files (List[str]): file name or PEM string list containing Certificate Authority certificates
+        to verify the certificate chains.
+      chain_cache_ttl (float): seconds that a validated chain is trusted before it is validated again.
+        0 disables caching of validated chains.
+      max_cached_chains (int): maximum number of validated chains to cache
+    """
+    self._ca_certs = []
+    for ca in ca_cert_pem_files:
+      self._ca_certs.append(load_pem_cert(ca)[0])
+
+    self._chain_cache_ttl = chain_cache_ttl
+    self._max_cached_chains = max_cached_chains
+    # (fingerprint, alg): (expires monotonic time, JOSE verification key)
+    self._chain_cache = collections.OrderedDict()
+    self._cache_hits = 0
+    self._cache_misses = 0
+
+  @property
+  def cache_stats(self) -> typing.Dict[str, int]:
+    """ number of cached chains and the cache hit and miss counts """
+    return({
+        "size": len(self._chain_cache),
+        "hits": self._cache_hits,
+        "misses": self._cache_misses
+      })
+
+  def clear_cache(self) -> None:
+    """ Drop all of the cached validated chains """
+    self._chain_cache.clear()
+
+  def get_verification_key(self, x5c: typing.List[str], algorithm: str) -> jose.jwk.Key:
+    """
+    Get the JOSE key for verifying signatures created by the first cert in the
+    given chain, validating the chain and that it is issued by one of the CAs
+    if not already cached.
+
+    Parameters:
+      x5c (List[str]): list containing DER foramt cert strings (e.g. RFC7517)
+      algorithm (str): the JWS alg the signature was created with
+
+    Returns:
+      JOSE key for verifying the signature
+
+    Raises exceptions for invalid cert chain, invalid cert dates or chain not
+    issued by one of the CAs.
+    """
+    cache_key = (x5c_fingerprint(x5c), algorithm)
+    cached = self._chain_cache.get(cache_key, None)
+    if(cached is not None):
+      if(cached[0] > time.monotonic()):
+        self._cache_hits += 1
+        self._chain_cache.move_to_end(cache_key)
+        return(cached[1])
+
+      self._chain_cache.pop(cache_key, None)
+
+    self._cache_misses += 1
+    cert_chain_objects = der_to_certs(x5c)
+    verify_cert_chain(cert_chain_objects)
+
+    # We have a valid chain, check if its from one of the accepted CAs
+    last_exception = AttributeError("No CA certificates to verify the certificate chain")
+    for ca_object in self._ca_certs:
+      try:
+        verify_cert(cert_chain_objects[len(cert_chain_objects) - 1], ca_object)
+        break
+
+      # This valid chain, is not issued from this CA
+      except Exception as e:
+        last_exception = e
+        # Keep trying other CAs until we run out or succeed
+
+    else:
+      raise last_exception
+
+    verification_key = jose.jwk.construct(build_verification_jwk_from_cert(cert_chain_objects[0], algorithm), algorithm)
+
+    if(self._chain_cache_ttl > 0 and self._max_cached_chains > 0):
+      # Do not trust the chain from the cache beyond the expiration of any of its certs
+      now = datetime.datetime.today()
+      ttl = self._chain_cache_ttl
+      for cert_object in cert_chain_objects:
+        ttl = min(ttl, (cert_object.not_valid_after - now).total_seconds())
+      self._chain_cache[cache_key] = (time.monotonic() + ttl, verification_key)
+      while(len(self._chain_cache) > self._max_cached_chains):
+        self._chain_cache.popitem(last = False)
+
+    return(verification_key)
+
+  def verify(self, signature: dict, payload: str) -> bytes:
+    """
+    Verify one signature from a JWS general JSON serialization.
+
+    Parameters:
+      signature (dict): the signature object containing header (with x5c and alg), protected and signature
+      payload (str): the base64url encoded JWS payload
+
+    Returns:
+      (bytes) the verified payload
+
+    Raises exceptions for invalid cert chain, cert dates, chain not issued by one
+    of the CAs or invalid signature.
+    """
+    header = signature['header']
+    verification_key = self.get_verification_key(header['x5c'], header['alg'])
+
+    jws_token = signature['protected'] + "." + payload + "." + signature['signature']
+    return(jose.jws.verify(jws_token, verification_key, header['alg']))
+
+
 # =============================== JOSE JWE Helper Functions ===========================
 
 def build_encryption_jwk_from_pem_file(cert_pem_file: str) -> dict:
@@ -358,6 +602,69 @@ def jwe_complete_serialization_to_compact_token(jwe_complete_serialization : dic
 
   return(jwe_compact_token)
 
+class Encrypter():
+  """
+  Reusable JWE encrypter.
+
+  Reads and parses the recipient certificate once and keeps its public key.
+  """
+  ALGORITHM = "RSA-OAEP"
+  ENCRYPTION = "A256CBC-HS512"
+
+  def __init__(self, cert_pem_file: str):
+    """
+    Parameters:
+      cert_pem_file (str) - file name or PEM string containing the cert for the public key to encrypt with
+    """
+    cert_object = load_pem_cert(cert_pem_file)[0]
+    self._public_key = cert_object.public_key()
+
+  def encrypt(self, plaintext: bytes) -> str:
+    """
+    Encrypt the plaintext.
+
+    Parameters:
+      plaintext (bytes) - the content to encrypt (e.g. JWS JSON signed vCon)
+
+    Returns:
+      (str) JWE compact token
+    """
+    # jose wraps the cryptography key object as is, without reparsing it
+    return(jose.jwe.encrypt(plaintext, self._public_key, self.ENCRYPTION, self.ALGORITHM).decode('utf-8'))
+
+
+class Decrypter():
+  """
+  Reusable JWE decrypter.
+
+  Reads and parses the private key once.
+  """
+  def __init__(self, private_key_pem_file: str, cert_pem_file: typing.Union[str, None] = None):
+    """
+    Parameters:
+      private_key_pem_file (str) - file name or PEM string for the private key to use for decrypting
+      cert_pem_file (str) - optional file name or PEM string for the cert/public key
+        corresponding to the private key.  If provided, it must match the private key.
+    """
+    self._private_key = load_pem_key(private_key_pem_file)
+    if(cert_pem_file is not None):
+      cert_object = load_pem_cert(cert_pem_file)[0]
+      if(cert_object.public_key().public_numbers() != self._private_key.public_key().public_numbers()):
+        raise AttributeError("certificate public key does not match the private key")
+
+  def decrypt(self, jwe_compact_token: str) -> bytes:
+    """
+    Decrypt the JWE compact token.
+
+    Parameters:
+      jwe_compact_token (str) - JWE compact serialization to decrypt
+
+    Returns:
+      (bytes) decrypted plaintext
+    """
+    return(jose.jwe.decrypt(jwe_compact_token, self._private_key))
+
+
 # =============================== SHA-512 Hash Helper Functions ===========================
 #                            SHA-512 Hash (RFC6234)
 
@@ -373,15 +680,39 @@ def sha_512_hash(data : bytes) -> str:
 
   """
 
-  hasher = hashlib.sha512()
+  hasher = Sha512Hasher()
 
   hasher.update(data)
 
-  sig_hash = jose.utils.base64url_encode(hasher.digest()).decode('utf-8')
+  sig_hash = hasher.hash()
 
   #print("sha_512_hash: {}".format(sig_hash))
   return(sig_hash)
 
+
+class Sha512Hasher():
+  """
+  Generate the SHA-512 hash incrementally for data provided in chunks,
+  so that large content (e.g. recordings) need not be in memory all at once.
+  """
+  def __init__(self):
+    self._hasher = hashlib.sha512()
+    self._size = 0
+
+  def update(self, data: typing.Union[bytes, bytearray, memoryview]) -> None:
+    """ Add the next chunk of data to the hash """
+    self._hasher.update(data)
+    self._size += len(data)
+
+  @property
+  def size(self) -> int:
+    """ total number of bytes hashed so far """
+    return(self._size)
+
+  def hash(self) -> str:
+    """ Returns base64 URL encoded SHA-512 hash of all of the bytes provided so far """
+    return(jose.utils.base64url_encode(self._hasher.digest()).decode('utf-8'))
+
 # =============================== One Time Signature Helper Functions ===========================
 #                            Leighton-Micali One Time Signature (RFC8554)
 
@@ -418,3 +749,233 @@ def verify_lm_one_time_signature(data : bytes, signature : str, public_key : str
 
   public_key_object.verify(data, signature_bytes)
 
+
+
+# =============================== Batch Crypto Operations ===========================
+#               sign, verify, encrypt or decrypt many vCons across a process pool
+
+SIGN = "sign"
+VERIFY = "verify"
+ENCRYPT = "encrypt"
+DECRYPT = "decrypt"
+BATCH_OPERATIONS = [SIGN, VERIFY, ENCRYPT, DECRYPT]
+BATCH_CHUNK_SIZE = 16
+
+
+class BatchCryptoError(Exception):
+  """ Batch operation failed for one of the vCons """
+
+
+class BatchCryptoStats():
+  """ Throughput counters for a batch crypto operation """
+  def __init__(self, operation: str):
+    self.operation = operation
+    self.count = 0
+    self.errors = 0
+    self.input_bytes = 0
+    self.output_bytes = 0
+    self.seconds = 0.0
+
+  @property
+  def vcons_per_second(self) -> float:
+    """ vCons processed per second of elapsed (wall) time """
+    if(self.seconds <= 0.0):
+      return(0.0)
+    return(self.count / self.seconds)
+
+  @property
+  def megabytes_per_second(self) -> float:
+    """ input vCon megabytes processed per second of elapsed (wall) time """
+    if(self.seconds <= 0.0):
+      return(0.0)
+    return(self.input_bytes / 1000000 / self.seconds)
+
+  def __str__(self) -> str:
+    return("{}: {} vCons ({} errors) in {:.3f} sec: {:.1f} vCons/sec {:.2f} MB/sec".format(
+        self.operation,
+        self.count,
+        self.errors,
+        self.seconds,
+        self.vcons_per_second,
+        self.megabytes_per_second
+      ))
+
+
+class BatchCryptoWorker():
+  """
+  Performs one batch crypto operation on serialized vCons.  Keys and certs
+  are loaded and parsed once when the worker is constructed.
+
+  The input and output vCon forms are:
+
+    * **sign** - unsigned JSON vCon to JWS signed vCon
+    * **verify** - JWS signed vCon to unsigned JSON vCon
+    * **encrypt** - JWS signed vCon to JWE encrypted vCon
+    * **decrypt** - JWE encrypted vCon to JWS signed vCon (not verified)
+  """
+  def __init__(
+      self,
+      operation: str,
+      private_key_pem_file: typing.Union[str, None],
+      cert_pem_files: typing.List[str]
+    ):
+    """
+    Parameters:
+      operation (str) - one of: sign, verify, encrypt or decrypt
+      private_key_pem_file (str) - file name or PEM string for the private key used for sign and decrypt
+      cert_pem_files (List[str]) - file names or PEM strings for the certs:
+          sign - the cert chain for the private key
+          verify - the trusted CA certs
+          encrypt - the recipient cert (first only)
+          decrypt - the cert for the private key (first only)
+    """
+    # vcon imports this module, so it is imported here to avoid a circular import
+    import vcon
+    self._vcon_class = vcon.Vcon
+
+    self.operation = operation
+    if(operation == SIGN):
+      self._crypto = Signer(private_key_pem_file, cert_pem_files)
+    elif(operation == VERIFY):
+      self._crypto = Verifier(cert_pem_files)
+    elif(operation == ENCRYPT):
+      self._crypto = Encrypter(cert_pem_files[0])
+    elif(operation == DECRYPT):
+      self._crypto = Decrypter(private_key_pem_file, cert_pem_files[0] if len(cert_pem_files) else None)
+    else:
+      raise AttributeError("unsupported batch operation: {} must be one of: {}".format(
+          operation,
+          BATCH_OPERATIONS
+        ))
+
+  def __call__(self, vcon_json: typing.Union[str, bytes]) -> str:
+    """
+    Perform the operation on the serialized vCon
+
+    Parameters:
+      vcon_json (str or bytes) - the serialized input vCon
+
+    Returns:
+      (str) the serialized output vCon
+    """
+    in_vcon = self._vcon_class()
+    in_vcon.loads(vcon_json)
+    signed = True
+    if(self.operation == SIGN):
+      in_vcon.sign(self._crypto)
+    elif(self.operation == VERIFY):
+      in_vcon.verify(self._crypto)
+      signed = False
+    elif(self.operation == ENCRYPT):
+      in_vcon.encrypt(self._crypto)
+    elif(self.operation == DECRYPT):
+      in_vcon.decrypt(self._crypto)
+
+    return(in_vcon.dumps(signed = signed))
+
+
+# The BatchCryptoWorker for this pool worker process
+_batch_worker = None
+
+
+def _batch_worker_init(
+    operation: str,
+    private_key_pem_file: typing.Union[str, None],
+    cert_pem_files: typing.List[str]
+  ) -> None:
+  """ Pool initializer, load the keys once per worker process """
+  global _batch_worker
+  _batch_worker = BatchCryptoWorker(operation, private_key_pem_file, cert_pem_files)
+
+
+def _batch_worker_run(indexed_vcon: typing.Tuple[int, typing.Union[str, bytes]]) -> typing.Union[str, BatchCryptoError]:
+  """ Pool task, returns output vCon or error so that one bad vCon does not stop the pool """
+  index, vcon_json = indexed_vcon
+  try:
+    return(_batch_worker(vcon_json))
+
+  except Exception as e:
+    return(BatchCryptoError("{} of vCon[{}] failed: {}: {}".format(
+        _batch_worker.operation,
+        index,
+        e.__class__.__name__,
+        e
+      )))
+
+
+def batch_crypto(
+    operation: str,
+    vcon_jsons: typing.Iterable[typing.Union[str, bytes]],
+    private_key_pem_file: typing.Union[str, None] = None,
+    cert_pem_files: typing.Optional[typing.List[str]] = None,
+    processes: typing.Union[int, None] = None,
+    chunk_size: int = BATCH_CHUNK_SIZE,
+    raise_errors: bool = True,
+    stats: typing.Union[BatchCryptoStats, None] = None
+  ) -> typing.Iterator[typing.Union[str, BatchCryptoError]]:
+  """
+  Sign, verify, encrypt or decrypt a stream of serialized vCons across
+  a pool of worker processes.  The keys and certs are loaded once per
+  worker process.  vCons are sent to the workers in chunks and the
+  output vCons are yielded in the same order as the input.
+
+  See **BatchCryptoWorker** for the input and output forms of the vCons
+  for each operation.
+
+  Parameters:
+    operation (str) - one of: sign, verify, encrypt or decrypt
+    vcon_jsons (Iterable[str]) - serialized input vCons.  May be a generator, it is consumed
+        as the workers are able to take more.
+    private_key_pem_file (str) - file name or PEM string for the private key used for sign and decrypt
+    cert_pem_files (List[str]) - file names or PEM strings for the cert chain (sign), trusted CAs (verify),
+        recipient cert (encrypt) or cert for the private key (decrypt)
+    processes (int) - number of worker processes, None for the number of CPUs,
+        0 to run in this process without a pool
+    chunk_size (int) - number of vCons sent to a worker at a time
+    raise_errors (bool) - if True, raise **BatchCryptoError** for the first vCon which fails.
+        If False, the **BatchCryptoError** is yielded in the place of the output vCon and
+        the batch continues.
+    stats (BatchCryptoStats) - optional, updated with throughput counters as the output is consumed
+
+  Returns:
+    iterator of output serialized vCons (str)
+  """
+  if(cert_pem_files is None):
+    cert_pem_files = []
+
+  if(stats is None):
+    stats = BatchCryptoStats(operation)
+
+  start = time.perf_counter()
+
+  def counted(vcon_iter):
+    for index, vcon_json in enumerate(vcon_iter):
+      stats.input_bytes += len(vcon_json)
+      yield((index, vcon_json))
+
+  def collect(results):
+    for result in results:
+      stats.count += 1
+      if(isinstance(result, BatchCryptoError)):
+        stats.errors += 1
+        if(raise_errors):
+          raise result
+      else:
+        stats.output_bytes += len(result)
+      stats.seconds = time.perf_counter() - start
+      yield(result)
+
+  # Load the keys here first so that bad keys or certs fail here, rather than
+  # in the pool initializer where the pool would keep restarting the worker.
+  _batch_worker_init(operation, private_key_pem_file, cert_pem_files)
+
+  if(processes == 0):
+    yield from collect(map(_batch_worker_run, counted(vcon_jsons)))
+    return
+
+  with multiprocessing.Pool(
+      processes,
+      initializer = _batch_worker_init,
+      initargs = (operation, private_key_pem_file, cert_pem_files)
+    ) as pool:
+    yield from collect(pool.imap(_batch_worker_run, counted(vcon_jsons), chunk_size))